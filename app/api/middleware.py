@@ -1,75 +1,138 @@
 """
 Middleware personalizado para FastAPI
+
+RequestLoggingMiddleware es un middleware ASGI puro: envuelve la llamada a la
+app y el canal send en la misma tarea, sin el stream de respuesta ni la tarea
+extra por request que agrega BaseHTTPMiddleware.
 """
 import time
 import uuid
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from contextlib import nullcontext
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
 from app.core.logging import get_logger, log_context, clear_log_context
 from app.core.context import set_trace_id, clear_trace_id
+from app.core.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS, metrics
+from app.core.profiler import profiler
+from app.core.query_stats import track_queries
+from app.core.tracing import start_trace
 
 logger = get_logger(__name__)
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+def _record_http_metrics(scope: Scope, method: str, status_code: int, process_time: float) -> None:
+    """Latencia y conteo por plantilla de ruta (no por path, para acotar la cardinalidad)"""
+    if not metrics.enabled:
+        return
+    route = getattr(scope.get("route"), "path", "unmatched")
+    HTTP_REQUEST_DURATION.labels(method, route).observe(process_time)
+    HTTP_REQUESTS.labels(method, route, status_code).inc()
+
+
+class RequestLoggingMiddleware:
     """Middleware para logging de requests"""
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+
         # Generar o extraer trace_id de headers
-        trace_id = request.headers.get("X-Trace-ID") or str(uuid.uuid4())
-        
+        trace_id = Headers(scope=scope).get("X-Trace-ID") or str(uuid.uuid4())
+
         # Establecer trace_id en el contexto global
         set_trace_id(trace_id)
         log_context(trace_id=trace_id)
 
         # Agregar trace_id al request state
-        request.state.trace_id = trace_id
+        scope.setdefault("state", {})["trace_id"] = trace_id
 
         # Registrar inicio del request
         start_time = time.time()
+        client = scope.get("client")
         logger.info(
             "request_started",
-            method=request.method,
-            path=request.url.path,
-            client_host=request.client.host if request.client else None,
+            method=method,
+            path=path,
+            client_host=client[0] if client else None,
         )
 
-        # Procesar request
+        # Contar el request para una captura del profiler en curso
+        profiled = profiler.request_started(path)
+
+        # Procesar request (midiendo las queries a la BD y las etapas del pipeline)
+        tracker = track_queries() if settings.db_query_stats_enabled else nullcontext()
+        tracer = start_trace() if settings.stage_timing_enabled else nullcontext()
+        status_code = 500
         try:
-            response = await call_next(request)
+            with tracker as query_stats, tracer as trace:
+
+                async def send_wrapper(message: Message) -> None:
+                    nonlocal status_code
+                    if message["type"] == "http.response.start":
+                        status_code = message["status"]
+                        # Agregar headers de respuesta (el cuerpo aún no se envió)
+                        elapsed_ms = (time.time() - start_time) * 1000
+                        headers = MutableHeaders(scope=message)
+                        headers["X-Trace-ID"] = trace_id
+                        headers["X-Process-Time"] = str(round(elapsed_ms, 2))
+                        if query_stats:
+                            headers.update(query_stats.as_headers())
+                        if trace and settings.server_timing_header:
+                            headers["Server-Timing"] = trace.server_timing(total_ms=elapsed_ms)
+                    await send(message)
+
+                await self.app(scope, receive, send_wrapper)
 
             # Calcular tiempo de procesamiento
             process_time = time.time() - start_time
+            db_fields = query_stats.as_log_fields() if query_stats else {}
+            stage_fields = trace.as_log_fields() if trace else {}
 
             # Registrar fin del request
             logger.info(
                 "request_completed",
-                method=request.method,
-                path=request.url.path,
-                status_code=response.status_code,
+                method=method,
+                path=path,
+                status_code=status_code,
                 process_time_ms=round(process_time * 1000, 2),
+                **db_fields,
+                **stage_fields,
             )
+            if query_stats and 0 < settings.db_query_budget_warn < query_stats.queries:
+                logger.warning(
+                    "request_query_budget_exceeded",
+                    method=method,
+                    path=path,
+                    budget=settings.db_query_budget_warn,
+                    **db_fields,
+                )
 
-            # Agregar headers de respuesta
-            response.headers["X-Trace-ID"] = trace_id
-            response.headers["X-Process-Time"] = str(round(process_time * 1000, 2))
-
-            return response
+            _record_http_metrics(scope, method, status_code, process_time)
 
         except Exception as e:
             # Log error
             process_time = time.time() - start_time
             logger.error(
                 "request_failed",
-                method=request.method,
-                path=request.url.path,
+                method=method,
+                path=path,
                 error=str(e),
                 process_time_ms=round(process_time * 1000, 2),
             )
+            _record_http_metrics(scope, method, 500, process_time)
             raise
 
         finally:
+            if profiled:
+                profiler.request_finished()
             # Limpiar contexto del logger y trace_id
             clear_log_context()
             clear_trace_id()
-
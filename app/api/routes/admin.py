@@ -0,0 +1,189 @@
+"""
+Endpoints admin para inspección de cachés internas y del proceso
+
+Todos requieren el header X-Admin-Token. Estos endpoints permiten:
+- Ver estadísticas y entradas de la caché de clasificaciones
+- Vaciar la caché de clasificaciones
+- Ver el lag del event loop y los callbacks que lo bloquearon
+- Perfilar el proceso en vivo con un profiler de muestreo
+- Ver la evolución de memoria y comparar snapshots de tracemalloc
+"""
+from typing import Optional
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.database import Database
+from app.api.dependencies import get_database, require_admin_token
+from app.core.loop_monitor import loop_monitor
+from app.core.memory_monitor import memory_monitor
+from app.core.profiler import profiler
+from app.services.classification_cache import classification_cache
+
+# Todo el router exige X-Admin-Token: estos endpoints exponen internals del proceso
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/classification-cache")
+async def get_classification_cache(
+    limit: int = Query(50, le=1000, ge=0),
+):
+    """
+    Obtener estado de la caché de clasificaciones
+
+    Query Parameters:
+    - limit: Número de entradas a listar (las más usadas recientemente)
+
+    Returns:
+        Estadísticas (hits, misses, tamaño) y entradas cacheadas (clave
+        hasheada, sin el texto del mensaje)
+    """
+    return {
+        "stats": classification_cache.get_stats(),
+        "entries": classification_cache.entries(limit),
+    }
+
+
+@router.delete("/classification-cache")
+async def flush_classification_cache(
+    database: Database = Depends(get_database),
+):
+    """
+    Vaciar la caché de clasificaciones (memoria y tabla persistente)
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    removed = await classification_cache.flush(database)
+    return {"success": True, "removed": removed}
+
+
+@router.get("/event-loop")
+async def get_event_loop_report(
+    limit: int = Query(20, le=200, ge=0),
+):
+    """
+    Obtener lag del event loop y callbacks lentos
+
+    Query Parameters:
+    - limit: Número de entradas por lista
+
+    Returns:
+        Estadísticas de lag, peores callbacks y más recientes (con trace_id y pila)
+    """
+    return {
+        "stats": loop_monitor.get_stats(),
+        **loop_monitor.slow_callbacks(limit),
+    }
+
+
+@router.delete("/event-loop")
+async def reset_event_loop_report():
+    """
+    Vaciar los callbacks lentos registrados y el lag máximo
+
+    Returns:
+        Número de callbacks descartados
+    """
+    return {"success": True, "removed": loop_monitor.reset()}
+
+
+@router.post("/profiler")
+async def run_profiler(
+    seconds: float = Query(10.0, gt=0),
+    requests: Optional[int] = Query(None, ge=1),
+    route: Optional[str] = Query(None, min_length=1),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+):
+    """
+    Perfilar el proceso en vivo con un profiler de muestreo
+
+    La respuesta llega al terminar la captura.
+
+    Query Parameters:
+    - seconds: Duración máxima (acotada por PROFILER_MAX_SECONDS)
+    - requests: Terminar al completar N requests que coinciden con route
+    - route: Solo muestrear mientras hay requests con esta subcadena en el path
+    - interval_ms: Intervalo de muestreo
+    - format: json (resumen + pilas) o collapsed (archivo para flamegraph)
+
+    Returns:
+        Top de tiempo propio, top de puntos de espera y pilas colapsadas
+    """
+    if profiler.active:
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+
+    result = await profiler.profile(
+        seconds=seconds, requests=requests, route=route, interval_ms=interval_ms
+    )
+    if format == "collapsed":
+        return PlainTextResponse(
+            result["collapsed"],
+            headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+        )
+    return result
+
+
+@router.get("/memory")
+async def get_memory_report(
+    history: int = Query(50, le=1000, ge=0),
+):
+    """
+    Obtener evolución de memoria del proceso
+
+    Query Parameters:
+    - history: Número de muestras del historial
+
+    Returns:
+        Estado del monitor, tamaño actual de las estructuras vigiladas,
+        última muestra completa (tipos, crecimiento, asignaciones) e historial
+    """
+    return {
+        "stats": memory_monitor.get_stats(),
+        "containers": memory_monitor.container_sizes(),
+        "latest": memory_monitor.latest(),
+        "history": memory_monitor.history(history),
+    }
+
+
+@router.post("/memory/snapshot")
+async def take_memory_snapshot():
+    """
+    Guardar un snapshot de referencia de tracemalloc (lo arranca si hace falta)
+
+    Returns:
+        Memoria trazada y top de sitios de asignación
+    """
+    return await asyncio.to_thread(memory_monitor.take_baseline)
+
+
+@router.get("/memory/diff")
+async def get_memory_diff(
+    limit: int = Query(20, le=200, ge=1),
+):
+    """
+    Comparar el heap actual contra el snapshot de referencia
+
+    Query Parameters:
+    - limit: Número de sitios de asignación
+
+    Returns:
+        Sitios de asignación que más crecieron desde la referencia
+    """
+    diff = await asyncio.to_thread(memory_monitor.diff, limit)
+    if diff is None:
+        raise HTTPException(status_code=409, detail="No baseline snapshot; POST /admin/memory/snapshot first")
+    return diff
+
+
+@router.delete("/memory/snapshot")
+async def stop_memory_tracing():
+    """
+    Detener tracemalloc y descartar el snapshot de referencia
+
+    Returns:
+        Si tracemalloc estaba activo
+    """
+    return {"success": True, "was_tracing": memory_monitor.stop_tracing()}
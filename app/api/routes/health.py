@@ -9,6 +9,12 @@ from typing import Dict, Any
 from app.config import settings
 from app.core.database import db
 from app.core.resilience import get_all_circuit_states
+from app.core.active_trips import active_trips
+from app.integrations.http_pool import get_all_http_pool_stats
+from app.container import container
+from app.services.intent_classifier import intent_classifier
+from app.services.classification_cache import classification_cache
+from app.integrations.wialon.capture import webhook_capture
 from app.core.logging import get_logger
 
 router = APIRouter(tags=["Health"])
@@ -34,8 +40,15 @@ async def detailed_health_check():
     - Servicio principal
     - Base de datos MySQL
     - Estado de circuit breakers
+    - Pools HTTP (reutilización de conexiones y latencia)
+    - Gemini (concurrencia, espera en cola, latencia y timeouts)
+    - Fast-path de intenciones (tasa de acierto y latencia ahorrada)
+    - Caché de clasificaciones
+    - Proyección de viajes activos (aciertos y deriva corregida)
     - Configuración
     """
+    gemini_stats = container.gemini_client.get_stats() if container.gemini_client else None
+
     health_status = {
         "service": {
             "name": settings.app_name,
@@ -46,6 +59,14 @@ async def detailed_health_check():
         },
         "dependencies": {},
         "circuit_breakers": {},
+        "http_pools": get_all_http_pool_stats(),
+        "gemini": gemini_stats,
+        "intent_fast_path": intent_classifier.get_stats(
+            avg_llm_latency_ms=gemini_stats["avg_latency_ms"] if gemini_stats else None
+        ),
+        "classification_cache": classification_cache.get_stats(),
+        "active_trips": active_trips.get_stats(),
+        "wialon_capture": webhook_capture.get_stats(),
         "overall_status": "healthy"
     }
     
@@ -0,0 +1,90 @@
+"""
+Router para la exposición de métricas en formato Prometheus
+"""
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.container import container
+from app.core.database import db
+from app.core.logging import get_logger
+from app.core.metrics import (
+    CIRCUIT_BREAKER_FAILURES,
+    CIRCUIT_BREAKER_STATE,
+    DB_POOL_CONNECTIONS,
+    GEMINI_CONCURRENCY,
+    WEBHOOK_DLQ_SIZE,
+    metrics,
+)
+from app.core.resilience import get_all_circuit_states
+
+router = APIRouter(tags=["Metrics"])
+logger = get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Último conteo de la DLQ (se recalcula cada metrics_dlq_refresh_seconds)
+_dlq_refreshed_at = 0.0
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Métricas del proceso en formato de exposición de Prometheus
+
+    Los histogramas y contadores se acumulan en cada request, query,
+    webhook y llamada externa; los gauges de estado se leen aquí.
+    """
+    _collect_pool_metrics()
+    _collect_circuit_breakers()
+    _collect_gemini()
+    await _collect_dlq_size()
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+def _collect_pool_metrics() -> None:
+    """Conexiones del pool aiomysql"""
+    pool = db.get_pool_stats()
+    DB_POOL_CONNECTIONS.labels("open").set(pool["size"])
+    DB_POOL_CONNECTIONS.labels("free").set(pool["free"])
+    DB_POOL_CONNECTIONS.labels("in_use").set(pool["size"] - pool["free"])
+    DB_POOL_CONNECTIONS.labels("max").set(pool["max"])
+
+
+def _collect_circuit_breakers() -> None:
+    """Breakers de app.core.resilience y el propio de WebhookService"""
+    states = {name: (state["state"], state["failure_count"]) for name, state in get_all_circuit_states().items()}
+    if container.webhook_service:
+        breaker = container.webhook_service._circuit_breaker
+        states["flowtify_webhooks"] = (breaker.state, breaker.failure_count)
+
+    for name, (state, failures) in states.items():
+        CIRCUIT_BREAKER_STATE.labels(name).set(CIRCUIT_STATE_VALUES.get(str(getattr(state, "value", state)), 0))
+        CIRCUIT_BREAKER_FAILURES.labels(name).set(failures)
+
+
+def _collect_gemini() -> None:
+    """Llamadas a Gemini en curso y en cola del semáforo"""
+    if container.gemini_client:
+        GEMINI_CONCURRENCY.labels("in_flight").set(container.gemini_client.in_flight)
+        GEMINI_CONCURRENCY.labels("waiting").set(container.gemini_client.waiting)
+
+
+async def _collect_dlq_size() -> None:
+    """Webhooks sin resolver en la DLQ, con caché para no consultar en cada scrape"""
+    global _dlq_refreshed_at
+
+    if not settings.webhooks_enabled or not container.started:
+        return
+    if time.monotonic() - _dlq_refreshed_at < settings.metrics_dlq_refresh_seconds:
+        return
+
+    _dlq_refreshed_at = time.monotonic()
+    try:
+        size = await db.fetchval("SELECT COUNT(*) FROM webhook_dead_letter_queue WHERE resolved = FALSE")
+        WEBHOOK_DLQ_SIZE.labels().set(size or 0)
+    except Exception as e:
+        logger.warning("metrics_dlq_count_failed", error=str(e))
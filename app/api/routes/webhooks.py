@@ -12,7 +12,7 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from pydantic import BaseModel
 
 from app.core.database import Database
-from app.api.dependencies import get_database, get_webhook_service
+from app.api.dependencies import get_database, get_webhook_service, get_webhook_dispatcher
 from app.services.webhook_service import WebhookService
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
@@ -176,18 +176,22 @@ async def retry_webhook(
     if not webhook:
         raise HTTPException(status_code=404, detail="Webhook delivery log not found")
     
-    # TODO: Implementar lógica de reenvío
-    # Por ahora solo marcamos como pending para que el retry automático lo tome
-    
-    await database.execute(
+    # Marcar como pending. Con el outbox habilitado además se marca vencido
+    # para que WebhookDispatcher lo reclame en su siguiente ciclo; sin outbox
+    # la columna next_attempt_at (migración 003) puede no existir
+    if webhook_service.outbox_enabled:
+        query = """
+            UPDATE webhook_delivery_log
+            SET status = %s, retry_count = 0, next_attempt_at = NOW()
+            WHERE id = %s
         """
-        UPDATE webhook_delivery_log
-        SET status = %s, retry_count = 0
-        WHERE id = %s
-        """,
-        "pending",
-        delivery_log_id,
-    )
+    else:
+        query = """
+            UPDATE webhook_delivery_log
+            SET status = %s, retry_count = 0
+            WHERE id = %s
+        """
+    await database.execute(query, "pending", delivery_log_id)
     
     return {
         "success": True,
@@ -238,7 +242,7 @@ async def get_webhook_stats(
     pending_query = """
         SELECT COUNT(*) as count
         FROM webhook_delivery_log
-        WHERE status IN ('pending', 'retrying')
+        WHERE status IN ('pending', 'retrying', 'in_flight')
     """
     pending_result = await database.fetchrow(pending_query)
     pending_retries = pending_result["count"] if pending_result else 0
@@ -264,6 +268,7 @@ async def get_webhook_stats(
 @router.get("/health")
 async def webhook_health_check(
     webhook_service: WebhookService = Depends(get_webhook_service),
+    dispatcher = Depends(get_webhook_dispatcher),
 ):
     """
     Health check del servicio de webhooks
@@ -296,6 +301,11 @@ async def webhook_health_check(
         "has_target_url": has_url,
         "has_secret": has_secret,
         "circuit_breaker_state": webhook_service._circuit_breaker.state,
+        "outbox_enabled": webhook_service.outbox_enabled,
+        "dispatcher": dispatcher.get_stats() if dispatcher else None,
+        "delivery_log_writer": (
+            webhook_service.log_writer.get_stats() if webhook_service.log_writer else None
+        ),
         "webhook_service_is_none": False,
     }
 
@@ -2,99 +2,20 @@
 Router para webhooks de Wialon
 """
 from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import JSONResponse
 from app.core.logging import get_logger
 from app.core.errors import BaseServiceError
 from app.services.event_service import EventService
-from app.api.dependencies import get_event_service
+from app.api.dependencies import get_event_service, get_ingestion_service
 from app.integrations.wialon.parser import parse_wialon_event, normalize_wialon_event
+from app.integrations.wialon.capture import webhook_capture
 from app.models.event import WialonEvent
 from app.models.responses import EventProcessedResponse
-from datetime import datetime
 from pydantic import ValidationError
-import json
-import os
 
 router = APIRouter(prefix="/wialon", tags=["Wialon"])
 logger = get_logger(__name__)
 
-# Configuración del archivo de log de webhooks
-import pathlib
-# Usar ruta absoluta basada en la raíz del proyecto
-PROJECT_ROOT = pathlib.Path(__file__).parent.parent.parent
-WIALON_WEBHOOK_LOG = PROJECT_ROOT / "wialon_webhooks.log"
-
-
-def log_webhook_to_file(
-    content_type: str,
-    headers: dict,
-    body: bytes,
-    parsed_data: dict = None,
-    success: bool = True,
-    error_message: str = None
-):
-    """
-    Registra todos los webhooks de Wialon en un archivo de texto plano
-    
-    Args:
-        content_type: Content-Type del request
-        headers: Headers del request
-        body: Body raw del request
-        parsed_data: Datos parseados (opcional)
-        success: Si el procesamiento fue exitoso
-        error_message: Mensaje de error si falló
-    """
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        separator = "=" * 100
-        
-        # Determinar status visual
-        if success is True:
-            status_text = "✓ PROCESADO EXITOSAMENTE"
-        elif success is False:
-            status_text = f"✗ ERROR: {error_message}"
-        else:
-            status_text = "⏳ RECIBIDO - En procesamiento..."
-        
-        log_entry = f"""
-{separator}
-WIALON WEBHOOK RECIBIDO
-{separator}
-Timestamp: {timestamp}
-Success: {success}
-Content-Type: {content_type}
-
---- HEADERS ---
-{json.dumps(dict(headers), indent=2, ensure_ascii=False)}
-
---- BODY RAW ({len(body)} bytes) ---
-{body.decode('utf-8', errors='replace')}
-
---- PARSED DATA ---
-{json.dumps(parsed_data, indent=2, ensure_ascii=False) if parsed_data else 'N/A'}
-
---- STATUS ---
-{status_text}
-{separator}
-
-"""
-        
-        # 🔥 ESCRIBIR AL ARCHIVO (append mode) con flush inmediato
-        log_path = str(WIALON_WEBHOOK_LOG)
-        with open(log_path, 'a', encoding='utf-8', buffering=1) as f:
-            f.write(log_entry)
-            f.flush()  # Forzar escritura inmediata al disco
-        
-        # Confirmar que se escribió con ruta completa
-        print(f"📝 Webhook logged to: {log_path}", flush=True)
-            
-    except Exception as e:
-        # Si falla el logging a archivo, al menos intentar loguear al sistema
-        logger.error("webhook_logging_failed", error=str(e))
-        # Intentar escribir directamente con print para debugging
-        print(f"❌ ERROR AL LOGUEAR WEBHOOK: {e}", flush=True)
-        print(f"Body: {body.decode('utf-8', errors='replace')[:200]}", flush=True)
-
-
 @router.get("/debug/trip/{wialon_unit_id}")
 async def debug_find_trip(
     wialon_unit_id: str,
@@ -125,10 +46,24 @@ async def debug_find_trip(
     }
 
 
+@router.get("/queue/stats")
+async def get_ingestion_queue_stats(
+    ingestion_service = Depends(get_ingestion_service),
+):
+    """
+    Métricas de la cola de ingesta asíncrona (profundidad por shard, lag, contadores)
+    """
+    if ingestion_service is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **ingestion_service.get_stats()}
+
+
 @router.post("/events", response_model=EventProcessedResponse)
 async def receive_wialon_event(
     request: Request,
     event_service: EventService = Depends(get_event_service),
+    ingestion_service = Depends(get_ingestion_service),
 ):
     """
     Recibir eventos de Wialon
@@ -139,8 +74,12 @@ async def receive_wialon_event(
     - text/plain
 
     Este endpoint los procesa todos y los normaliza.
+
+    Con WIALON_ASYNC_INGESTION habilitado el evento validado se persiste en
+    wialon_event_queue y se responde 202; los workers lo procesan después.
     
-    TODOS los webhooks recibidos se registran en: wialon_webhooks.log
+    Cada webhook recibido se captura (body crudo + resultado) en segmentos
+    NDJSON comprimidos bajo WIALON_CAPTURE_DIR; ver app/integrations/wialon/capture.py
     """
     raw_data = None
     normalized_data = None
@@ -158,24 +97,13 @@ async def receive_wialon_event(
                    body_size=len(body),
                    body_preview=body.decode('utf-8', errors='replace')[:200])
         
-        # 🔥 REGISTRAR EN ARCHIVO INMEDIATAMENTE (ANTES de parsear)
-        # Esto garantiza que SIEMPRE quede registro, incluso si falla después
-        log_webhook_to_file(
-            content_type=content_type,
-            headers=headers,
-            body=body,
-            parsed_data={"status": "RECIBIDO - En procesamiento..."},
-            success=None,  # Aún no sabemos
-            error_message=None
-        )
-        
         # Parsear evento según el content type
         raw_data = parse_wialon_event(body, content_type)
 
         if not raw_data:
             logger.warning("wialon_empty_payload")
-            # Registrar en archivo incluso si está vacío
-            log_webhook_to_file(
+            # Capturar incluso si está vacío
+            webhook_capture.capture(
                 content_type=content_type,
                 headers=headers,
                 body=body,
@@ -205,8 +133,8 @@ async def receive_wialon_event(
                 normalized_data=normalized_data
             )
             
-            # Registrar en archivo con detalles del error
-            log_webhook_to_file(
+            # Capturar con detalles del error
+            webhook_capture.capture(
                 content_type=content_type,
                 headers=headers,
                 body=body,
@@ -226,11 +154,53 @@ async def receive_wialon_event(
                 "errors": validation_error.errors()
             }
 
+        # Unidad marcada sin viaje activo: responder sin tocar la BD ni encolar
+        dropped = event_service.drop_if_no_active_trip(event)
+        if dropped:
+            webhook_capture.capture(
+                content_type=content_type,
+                headers=headers,
+                body=body,
+                parsed_data={
+                    "raw_data": raw_data,
+                    "normalized_data": normalized_data,
+                    "processing_result": {"message": dropped["message"]},
+                },
+                success=True,
+            )
+            return EventProcessedResponse(success=True, message=dropped["message"])
+
+        # Ingesta asíncrona: persistir, encolar y responder sin esperar el procesamiento
+        if ingestion_service is not None:
+            queue_id = await ingestion_service.enqueue(event)
+
+            webhook_capture.capture(
+                content_type=content_type,
+                headers=headers,
+                body=body,
+                parsed_data={
+                    "raw_data": raw_data,
+                    "normalized_data": normalized_data,
+                    "queue_id": queue_id,
+                },
+                success=None,
+            )
+
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "success": True,
+                    "queued": True,
+                    "queue_id": queue_id,
+                    "message": "Event queued for processing",
+                },
+            )
+
         # Procesar evento (incluye envío de notificación WhatsApp si es necesario)
         result = await event_service.process_wialon_event(event)
         
-        # ✅ REGISTRAR WEBHOOK EXITOSO EN ARCHIVO
-        log_webhook_to_file(
+        # ✅ CAPTURAR WEBHOOK EXITOSO
+        webhook_capture.capture(
             content_type=content_type,
             headers=headers,
             body=body,
@@ -256,11 +226,11 @@ async def receive_wialon_event(
     except BaseServiceError as e:
         logger.error("wialon_event_processing_error", error=str(e), code=e.code)
         
-        # ✗ REGISTRAR ERROR EN ARCHIVO
-        log_webhook_to_file(
+        # ✗ CAPTURAR ERROR
+        webhook_capture.capture(
             content_type=request.headers.get("content-type", ""),
             headers=request.headers,
-            body=await request.body() if hasattr(request, 'body') else b"",
+            body=body,
             parsed_data={"raw_data": raw_data, "normalized_data": normalized_data} if raw_data else None,
             success=False,
             error_message=f"{e.code}: {e.message}"
@@ -279,9 +249,9 @@ async def receive_wialon_event(
     except Exception as e:
         logger.error("wialon_unexpected_error", error=str(e))
         
-        # ✗ REGISTRAR ERROR INESPERADO EN ARCHIVO
+        # ✗ CAPTURAR ERROR INESPERADO
         try:
-            log_webhook_to_file(
+            webhook_capture.capture(
                 content_type=request.headers.get("content-type", ""),
                 headers=request.headers,
                 body=body if 'body' in locals() else b"",
@@ -1,7 +1,7 @@
 """
 Configuración centralizada del sistema usando Pydantic Settings
 """
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -47,6 +47,10 @@ class Settings(BaseSettings):
     db_pool_max_size: int = 20
     db_pool_timeout: float = 10.0
 
+    # Presupuesto de queries por request (headers X-DB-* y log request_completed)
+    db_query_stats_enabled: bool = True
+    db_query_budget_warn: int = 25  # Advertir si un request supera N queries (0 = desactivado)
+
     # Evolution API (WhatsApp)
     evolution_api_url: str = ""  # Opcional para testing
     evolution_api_key: str = ""  # Opcional para testing
@@ -55,6 +59,18 @@ class Settings(BaseSettings):
     # Gemini AI
     gemini_api_key: str = ""  # Opcional para testing
     gemini_model: str = "gemini-2.5-flash"
+    gemini_max_concurrency: int = 4  # Llamadas simultáneas; el resto espera en cola
+    gemini_api_endpoint: Optional[str] = None  # Endpoint REST alternativo (stub local de pruebas)
+    # Fast-path por reglas antes de Gemini para frases formulaicas
+    intent_fast_path_enabled: bool = True
+    intent_fast_path_threshold: float = 0.85
+    # Validar también el subestado propuesto por Gemini contra la fase del viaje
+    gemini_substatus_validation: bool = False
+    # Caché de clasificaciones (texto normalizado + status/substatus del viaje)
+    classification_cache_enabled: bool = True
+    classification_cache_max_size: int = 5000
+    classification_cache_ttl: int = 86400  # 24 horas
+    classification_cache_persist: bool = False  # Tabla ai_classification_cache
 
     # Floatify
     floatify_api_url: Optional[str] = None
@@ -62,6 +78,34 @@ class Settings(BaseSettings):
 
     # Wialon
     wialon_token: Optional[str] = None
+    # Ingesta asíncrona: persistir evento, responder 202 y procesar en workers
+    wialon_async_ingestion: bool = False
+    wialon_ingestion_workers: int = 8  # Shards por wialon_unit_id
+    wialon_ingestion_recovery_batch: int = 500  # Filas reclamadas por lote en cada barrido
+    wialon_ingestion_queue_size: int = 1000  # Capacidad en memoria por shard (lo demás espera en la BD)
+    wialon_ingestion_sweep_interval: float = 5.0  # Segundos entre barridos de filas pendientes
+    wialon_ingestion_lease_seconds: int = 300  # Filas 'processing' más viejas se reclaman de nuevo
+    wialon_ingestion_max_attempts: int = 5
+    wialon_ingestion_backoff_base: float = 2.0  # Segundos; se duplica por intento
+    wialon_ingestion_backoff_max: float = 300.0
+    wialon_ingestion_drain_timeout: float = 10.0
+    # Caché LRU de geocercas por viaje (número de viajes en memoria)
+    geofence_cache_max_trips: int = 1000
+    # Proyección en memoria de viajes activos por wialon_unit_id (sin queries en el hot path)
+    active_trips_enabled: bool = True
+    active_trips_reconcile_interval: float = 60.0  # Segundos entre barridos de reconciliación contra MySQL
+    # Caché negativa de unidades sin viaje activo: sus eventos se descartan sin tocar la BD
+    wialon_no_trip_cache_ttl: float = 30.0  # Segundos (0 = desactivada)
+    wialon_no_trip_cache_max_size: int = 10000
+    # Captura de webhooks crudos (NDJSON comprimido, rotación por tamaño/tiempo)
+    wialon_capture_enabled: bool = True
+    wialon_capture_dir: str = "logs/wialon_capture"
+    wialon_capture_sample_rate: float = 1.0
+    wialon_capture_queue_size: int = 10000
+    wialon_capture_segment_max_bytes: int = 64 * 1024 * 1024
+    wialon_capture_segment_max_seconds: float = 3600.0
+    wialon_capture_max_segments: int = 168
+    wialon_capture_compression: str = "gzip"  # gzip | zstd | none
 
     # Security
     webhook_secret: Optional[str] = None
@@ -70,8 +114,14 @@ class Settings(BaseSettings):
 
     # Timeouts (en segundos)
     http_timeout: int = 30
+    http_connect_timeout: float = 10.0
     gemini_timeout: int = 60
 
+    # Pools HTTP compartidos (Evolution API, Floatify)
+    http_pool_max_connections: int = 20
+    http_pool_max_keepalive: int = 10
+    http_pool_keepalive_expiry: float = 30.0
+
     # Retry configuration
     max_retries: int = 3
     retry_initial_delay: float = 1.0
@@ -85,9 +135,57 @@ class Settings(BaseSettings):
     webhook_circuit_breaker_timeout: int = 60
     webhooks_enabled: bool = True
     webhooks_enabled_tenants: str = "24"  # Comma-separated tenant IDs
+    # Outbox transaccional: webhooks en webhook_delivery_log + WebhookDispatcher
+    webhook_outbox_enabled: bool = False
+    webhook_dispatcher_batch_size: int = 50
+    webhook_dispatcher_poll_interval: float = 1.0
+    webhook_dispatcher_lease_seconds: int = 120
+    webhook_retry_backoff_base: float = 2.0
+    webhook_retry_backoff_max: float = 600.0
+    # Write-behind de webhook_delivery_log en envío directo (sin outbox)
+    webhook_log_write_behind: bool = False
+    webhook_log_batch_size: int = 200
+    webhook_log_flush_interval: float = 0.5  # segundos
+    webhook_log_spill_path: str = "logs/webhook_delivery_log_spill.jsonl"
 
     # Período de gracia para notificaciones de desviación de ruta (en segundos)
     route_deviation_grace_period: int = 300  # 5 minutos por defecto
+    route_deviation_tracking_max_trips: int = 10000  # Viajes con período de gracia en memoria
+    route_deviation_tracking_ttl: int = 3600  # Segundos que se recuerda la última notificación
+
+    # Métricas en proceso (GET /metrics, formato Prometheus)
+    metrics_enabled: bool = True
+    metrics_dlq_refresh_seconds: float = 30.0  # Cada cuánto recontar la DLQ al hacer scrape
+
+    # Tiempos por etapa de los pipelines (spans, histograma y header Server-Timing)
+    stage_timing_enabled: bool = True
+    server_timing_header: bool = True  # Publicar Server-Timing en las respuestas HTTP
+
+    # Serialización de respuestas JSON (ORJSONResponse si orjson está instalado)
+    fast_json_responses: bool = True
+
+    # Monitor del event loop (lag y callbacks lentos, GET /admin/event-loop)
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval: float = 0.25  # Segundos entre muestras de lag
+    loop_slow_callback_ms: float = 100.0  # Callbacks que retienen el loop más que esto se registran
+    loop_monitor_max_entries: int = 50  # Tamaño del ring buffer y del top de peores callbacks
+
+    # Profiler de muestreo bajo demanda (POST /admin/profiler)
+    admin_api_token: Optional[str] = None  # Header X-Admin-Token; sin token el profiler queda deshabilitado
+    profiler_interval_ms: float = 10.0  # Intervalo de muestreo por defecto
+    profiler_max_seconds: float = 60.0  # Duración máxima de una captura
+
+    # Monitor de memoria (GET /admin/memory, snapshots de tracemalloc)
+    memory_monitor_enabled: bool = True
+    memory_monitor_interval: float = 300.0  # Segundos entre muestras
+    memory_history_size: int = 288  # Muestras conservadas (24 h con el intervalo por defecto)
+    memory_top_limit: int = 20  # Tipos de objeto y sitios de asignación por muestra
+    memory_rss_alert_mb: float = 1024.0  # Alerta si el RSS supera este valor (0 = sin alerta)
+    memory_container_alert_size: int = 10000  # Alerta si una estructura vigilada supera estos elementos
+    # Umbral por estructura (JSON, p.ej. {"active_trips": 50000}); 0 desactiva la alerta de esa estructura
+    memory_container_alert_sizes: Dict[str, int] = {}
+    memory_tracemalloc_on_startup: bool = False  # Arrancar tracemalloc al iniciar (tiene costo en CPU y memoria)
+    memory_tracemalloc_frames: int = 10  # Frames guardados por asignación
 
     # Sentry (opcional)
     sentry_dsn: Optional[str] = None
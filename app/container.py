@@ -0,0 +1,319 @@
+"""
+Contenedor de servicios de la aplicación
+
+Crea en el startup (lifespan) los servicios, clientes HTTP y clientes de IA
+como singletons de larga vida y los cierra ordenadamente en el shutdown.
+Las dependencias de FastAPI (app/api/dependencies.py) solo los exponen, de
+modo que el estado en memoria (cachés, período de gracia de desviaciones,
+pools de conexiones) sobrevive entre requests.
+"""
+from typing import Optional, Dict, Any
+import asyncio
+
+from app.core.database import Database
+from app.core.errors import ConfigurationError
+from app.core.logging import get_logger
+from app.integrations.http_pool import close_all_http_pools, get_all_http_pool_stats
+from app.config import settings
+
+logger = get_logger(__name__)
+
+
+class ServiceContainer:
+    """Singletons de servicios e integraciones gestionados por el lifespan"""
+
+    def __init__(self) -> None:
+        self.db: Optional[Database] = None
+        self.evolution_client = None
+        self.gemini_client = None
+        self.webhook_service = None
+        self.delivery_log_writer = None
+        self.trip_service = None
+        self.event_service = None
+        self.message_service = None
+        self.notification_service = None
+        self.webhook_dispatcher = None
+        self.ingestion_service = None
+        self._started = False
+
+    @property
+    def started(self) -> bool:
+        """Indica si el contenedor ya fue inicializado"""
+        return self._started
+
+    async def startup(self, db: Database) -> None:
+        """
+        Crear servicios y arrancar workers en segundo plano
+
+        Args:
+            db: Base de datos ya conectada
+        """
+        if self._started:
+            return
+
+        # Importar aquí para evitar circular imports
+        from app.integrations.evolution.client import EvolutionClient
+        from app.integrations.gemini.client import GeminiClient
+        from app.services.trip_service import TripService
+        from app.services.event_service import EventService
+        from app.services.message_service import MessageService
+        from app.services.notification_service import NotificationService
+
+        self.db = db
+
+        # Integraciones
+        if settings.evolution_api_url and settings.evolution_api_key:
+            self.evolution_client = EvolutionClient(
+                api_url=settings.evolution_api_url,
+                api_key=settings.evolution_api_key,
+                instance=settings.evolution_instance_name,
+                timeout=settings.http_timeout,
+            )
+
+        self.gemini_client = GeminiClient(
+            api_key=settings.gemini_api_key,
+            model=settings.gemini_model,
+            timeout=settings.gemini_timeout,
+            max_concurrency=settings.gemini_max_concurrency,
+            api_endpoint=settings.gemini_api_endpoint,
+        )
+
+        if settings.webhooks_enabled:
+            try:
+                from app.services.webhook_service import WebhookService
+
+                # El outbox ya escribe en la transacción del llamador
+                if settings.webhook_log_write_behind and not settings.webhook_outbox_enabled:
+                    from app.services.delivery_log_writer import DeliveryLogWriter
+
+                    self.delivery_log_writer = DeliveryLogWriter(
+                        db=db,
+                        max_retries=settings.webhook_retry_max,
+                        batch_size=settings.webhook_log_batch_size,
+                        flush_interval=settings.webhook_log_flush_interval,
+                        spill_path=settings.webhook_log_spill_path,
+                    )
+                    await self.delivery_log_writer.start()
+
+                self.webhook_service = WebhookService(
+                    db=db,
+                    target_url=settings.flowtify_webhook_url,
+                    secret_key=settings.webhook_secret,
+                    timeout=settings.webhook_timeout,
+                    outbox_enabled=settings.webhook_outbox_enabled,
+                    log_writer=self.delivery_log_writer,
+                )
+            except Exception as e:
+                # El sistema funciona sin webhooks
+                logger.error("webhook_service_creation_failed", error=str(e))
+
+        # Servicios
+        self.trip_service = TripService(
+            db=db,
+            evolution_client=self.evolution_client,
+            webhook_service=self.webhook_service,
+        )
+        self.event_service = EventService(
+            db=db,
+            evolution_client=self.evolution_client,
+            webhook_service=self.webhook_service,
+        )
+        self.message_service = MessageService(
+            db=db,
+            gemini_client=self.gemini_client,
+            evolution_client=self.evolution_client,
+        )
+        self.notification_service = NotificationService(
+            db=db,
+            evolution_client=self.evolution_client,
+            webhook_service=self.webhook_service,
+        )
+
+        # Proyección de viajes activos (warm + reconciliación periódica)
+        from app.core.active_trips import active_trips
+
+        await active_trips.start(db)
+
+        # Cachés persistentes
+        if settings.classification_cache_enabled and settings.classification_cache_persist:
+            from app.services.classification_cache import classification_cache
+
+            await classification_cache.load(db)
+
+        # Workers en segundo plano
+        from app.integrations.wialon.capture import webhook_capture
+
+        webhook_capture.start()
+
+        if self.webhook_service and settings.webhook_outbox_enabled:
+            from app.services.webhook_dispatcher import WebhookDispatcher
+
+            self.webhook_dispatcher = WebhookDispatcher(
+                db=db,
+                webhook_service=self.webhook_service,
+                batch_size=settings.webhook_dispatcher_batch_size,
+                poll_interval=settings.webhook_dispatcher_poll_interval,
+                lease_seconds=settings.webhook_dispatcher_lease_seconds,
+                max_attempts=settings.webhook_retry_max,
+                backoff_base=settings.webhook_retry_backoff_base,
+                backoff_max=settings.webhook_retry_backoff_max,
+            )
+            await self.webhook_dispatcher.start()
+
+        if settings.wialon_async_ingestion:
+            from app.services.ingestion_service import WialonIngestionService
+
+            self.ingestion_service = WialonIngestionService(
+                db=db,
+                event_service=self.event_service,
+                num_workers=settings.wialon_ingestion_workers,
+                recovery_batch_size=settings.wialon_ingestion_recovery_batch,
+                queue_size=settings.wialon_ingestion_queue_size,
+                sweep_interval=settings.wialon_ingestion_sweep_interval,
+                lease_seconds=settings.wialon_ingestion_lease_seconds,
+                max_attempts=settings.wialon_ingestion_max_attempts,
+                backoff_base=settings.wialon_ingestion_backoff_base,
+                backoff_max=settings.wialon_ingestion_backoff_max,
+            )
+            await self.ingestion_service.start()
+
+        # Monitor de memoria sobre las estructuras que viven todo el proceso
+        from app.core.memory_monitor import memory_monitor
+
+        self._register_memory_watches(memory_monitor)
+        if settings.memory_tracemalloc_on_startup:
+            memory_monitor.take_baseline()
+        await memory_monitor.start()
+
+        self._started = True
+        logger.info(
+            "service_container_started",
+            has_evolution_client=self.evolution_client is not None,
+            has_webhook_service=self.webhook_service is not None,
+            webhook_dispatcher=self.webhook_dispatcher is not None,
+            async_ingestion=self.ingestion_service is not None,
+        )
+
+    async def shutdown(self) -> None:
+        """Detener workers y cerrar clientes en orden inverso al startup"""
+        if not self._started:
+            return
+
+        from app.core.memory_monitor import memory_monitor
+        from app.core.active_trips import active_trips
+
+        await memory_monitor.stop()
+        await active_trips.stop()
+
+        # Drenar la cola de ingesta antes de cerrar webhooks
+        if self.ingestion_service:
+            try:
+                await self.ingestion_service.stop(drain_timeout=settings.wialon_ingestion_drain_timeout)
+                logger.info("wialon_ingestion_service_closed")
+            except Exception as e:
+                logger.error("wialon_ingestion_shutdown_failed", error=str(e))
+
+        if self.webhook_dispatcher:
+            try:
+                await self.webhook_dispatcher.stop()
+            except Exception as e:
+                logger.error("webhook_dispatcher_shutdown_failed", error=str(e))
+
+        if self.webhook_service:
+            try:
+                await self.webhook_service.close()
+                logger.info("webhook_service_closed")
+            except Exception as e:
+                logger.error("webhook_service_close_failed", error=str(e))
+
+        # Volcar transiciones pendientes de webhook_delivery_log
+        if self.delivery_log_writer:
+            try:
+                await self.delivery_log_writer.stop()
+            except Exception as e:
+                logger.error("delivery_log_writer_shutdown_failed", error=str(e))
+
+        # Pools HTTP compartidos (Evolution)
+        await close_all_http_pools()
+
+        # Escribir los webhooks capturados pendientes y cerrar el segmento
+        from app.integrations.wialon.capture import webhook_capture
+
+        try:
+            await asyncio.to_thread(webhook_capture.stop)
+        except Exception as e:
+            logger.error("wialon_capture_shutdown_failed", error=str(e))
+
+        self.__init__()
+        logger.info("service_container_stopped")
+
+    def _register_memory_watches(self, monitor) -> None:
+        """Registrar en el monitor de memoria las estructuras que crecen con el uptime"""
+        from app.integrations.http_pool import http_pools
+        from app.core.active_trips import active_trips
+        from app.services.classification_cache import classification_cache
+        from app.services.geofence_cache import geofence_cache
+
+        # Las estructuras acotadas alertan si superan su propio tamaño máximo
+        monitor.watch(
+            "route_deviation_notifications",
+            lambda: self.event_service.tracked_deviation_trips if self.event_service else 0,
+            alert_size=settings.route_deviation_tracking_max_trips,
+        )
+        monitor.watch(
+            "classification_cache",
+            lambda: classification_cache.get_stats()["size"],
+            alert_size=settings.classification_cache_max_size,
+        )
+        monitor.watch(
+            "geofence_cache",
+            lambda: geofence_cache.get_stats()["size"],
+            alert_size=settings.geofence_cache_max_trips,
+        )
+        monitor.watch("active_trips", lambda: len(active_trips))
+        monitor.watch("http_pools", lambda: len(http_pools))
+
+        def delivery_log_pending() -> int:
+            if not self.delivery_log_writer:
+                return 0
+            stats = self.delivery_log_writer.get_stats()
+            return stats["buffered"] + stats["open_deliveries"]
+
+        monitor.watch("delivery_log_buffer", delivery_log_pending)
+
+    def require(self, name: str) -> Any:
+        """
+        Obtener un servicio obligatorio
+
+        Args:
+            name: Nombre del atributo del servicio
+
+        Returns:
+            Instancia del servicio
+
+        Raises:
+            ConfigurationError: Si el contenedor no fue inicializado
+        """
+        if not self._started:
+            raise ConfigurationError("Service container not started (lifespan not running)")
+        return getattr(self, name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado de los componentes gestionados por el contenedor"""
+        from app.core.active_trips import active_trips
+
+        return {
+            "started": self._started,
+            "evolution_client": self.evolution_client is not None,
+            "http_pools": get_all_http_pool_stats(),
+            "gemini": self.gemini_client.get_stats() if self.gemini_client else None,
+            "webhook_service": self.webhook_service is not None,
+            "delivery_log_writer": self.delivery_log_writer.get_stats() if self.delivery_log_writer else None,
+            "webhook_dispatcher": self.webhook_dispatcher.get_stats() if self.webhook_dispatcher else None,
+            "ingestion": self.ingestion_service.get_stats() if self.ingestion_service else None,
+            "active_trips": active_trips.get_stats(),
+        }
+
+
+# Instancia global del contenedor de servicios
+container = ServiceContainer()
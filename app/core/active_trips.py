@@ -0,0 +1,493 @@
+"""
+Proyección en memoria de viajes activos por unidad
+
+Cada evento de Wialon empezaba con TripRepository.find_active_by_wialon_id
+(JOIN trips/units con NOT IN y ORDER BY) seguido de
+UnitRepository.find_by_wialon_id, y el fallback de WhatsApp repetía la
+búsqueda por grupo. Este registro mantiene por proceso el mapa
+
+    wialon_unit_id -> ActiveTrip(unit, trip, group_id, tenant_id)
+
+con índices por unit_id y por whatsapp_group_id, para resolver el contexto
+del evento sin queries:
+
+- Se carga al arrancar (warm) con dos consultas.
+- TripRepository y UnitRepository lo actualizan al escribir (write-through).
+  Las escrituras dentro de una transacción del llamador (modo outbox) no lo
+  tocan: el servicio aplica el viaje releído con trip_written() después del
+  commit, así una transacción revertida nunca llega al registro.
+- Un barrido periódico recarga desde MySQL y registra la deriva (cambios de
+  otros procesos o SQL fuera de los repositorios).
+
+Solo se guardan unidades con viaje activo: una ausencia no significa "sin
+viaje", el llamador consulta MySQL y registra el resultado con put(). Antes
+del warm (scripts, tests) el registro es inerte.
+
+Aparte se mantiene una caché negativa con TTL de wialon_unit_id que MySQL
+confirmó sin viaje activo (mark_no_trip): sus eventos se descartan en la
+entrada sin consultas. Se invalida al crear un viaje para la unidad y una
+unidad indexada nunca se considera marcada (la consulta que la marcó pudo
+cruzarse con la creación del viaje); los viajes creados por otro proceso se
+ven al vencer el TTL.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+import asyncio
+
+from app.config import settings
+from app.core.cache import LRUCache
+from app.core.constants import ACTIVE_TRIP_EXCLUDED_STATUSES
+from app.core.database import Database
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class ActiveTrip:
+    """Contexto de una unidad con viaje activo"""
+
+    unit: Dict[str, Any]
+    trip: Dict[str, Any]
+    group_id: Optional[str]
+    tenant_id: Optional[Any]
+
+    @classmethod
+    def build(cls, unit: Dict[str, Any], trip: Dict[str, Any]) -> "ActiveTrip":
+        """
+        Crear la entrada a partir de las filas de units y trips
+
+        Args:
+            unit: Fila de units
+            trip: Fila de trips (metadata ya deserializada)
+
+        Returns:
+            ActiveTrip con grupo de WhatsApp y tenant resueltos
+        """
+        metadata = trip.get("metadata")
+        return cls(
+            unit=dict(unit),
+            trip=dict(trip),
+            group_id=unit.get("whatsapp_group_id"),
+            tenant_id=metadata.get("tenant_id") if isinstance(metadata, dict) else None,
+        )
+
+
+def _is_active(trip: Dict[str, Any]) -> bool:
+    return trip.get("status") not in ACTIVE_TRIP_EXCLUDED_STATUSES
+
+
+class ActiveTripRegistry:
+    """Mapa de viajes activos por wialon_unit_id con write-through y reconciliación"""
+
+    def __init__(
+        self,
+        reconcile_interval: float = 60.0,
+        enabled: bool = True,
+        no_trip_ttl: float = 30.0,
+        no_trip_max_size: int = 10000,
+    ):
+        """
+        Inicializar registro
+
+        Args:
+            reconcile_interval: Segundos entre barridos de reconciliación
+            enabled: Si es False el registro nunca se carga y todas las búsquedas fallan
+            no_trip_ttl: Segundos que una unidad queda marcada sin viaje (0 = sin caché negativa)
+            no_trip_max_size: Unidades máximas en la caché negativa
+        """
+        self.reconcile_interval = reconcile_interval
+        self.enabled = enabled
+        self.no_trip_ttl = no_trip_ttl
+
+        self._by_wialon: Dict[str, ActiveTrip] = {}
+        self._wialon_by_unit: Dict[Any, str] = {}
+        self._wialon_by_group: Dict[str, str] = {}
+        # Claves escritas mientras una reconciliación lee de MySQL
+        self._touched: Optional[Set[str]] = None
+        # Caché negativa: wialon_unit_id sin viaje activo
+        self._no_trip: LRUCache[bool] = LRUCache(max_size=no_trip_max_size, ttl=no_trip_ttl or None)
+
+        self._warm = False
+        self._task: Optional[asyncio.Task] = None
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.reconciles = 0
+        self.drift_total = 0
+        self.last_drift: Dict[str, int] = {}
+        self.last_reconciled_at: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        """Indica si el registro está cargado y responde búsquedas"""
+        return self.enabled and self._warm
+
+    def __len__(self) -> int:
+        return len(self._by_wialon)
+
+    # ------------------------------------------------------------------
+    # Búsquedas (hot path)
+    # ------------------------------------------------------------------
+
+    def lookup(self, wialon_unit_id: Any) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Resolver unidad y viaje activo por wialon_unit_id
+
+        Args:
+            wialon_unit_id: ID de Wialon de la unidad
+
+        Returns:
+            Tupla (unit, trip) con copias de las filas, o None si no está en memoria
+        """
+        if not self.active or wialon_unit_id is None:
+            return None
+        return self._resolve(self._by_wialon.get(str(wialon_unit_id)))
+
+    def lookup_by_group(self, group_id: Optional[str]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Resolver unidad y viaje activo por grupo de WhatsApp
+
+        Args:
+            group_id: whatsapp_group_id de la unidad
+
+        Returns:
+            Tupla (unit, trip) con copias de las filas, o None si no está en memoria
+        """
+        if not self.active or not group_id:
+            return None
+        wialon_id = self._wialon_by_group.get(group_id)
+        return self._resolve(self._by_wialon.get(wialon_id) if wialon_id else None)
+
+    def _resolve(self, entry: Optional[ActiveTrip]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Copias: los servicios pueden modificar las filas que reciben
+        return dict(entry.unit), dict(entry.trip)
+
+    # ------------------------------------------------------------------
+    # Caché negativa (unidades sin viaje activo)
+    # ------------------------------------------------------------------
+
+    def has_no_trip(self, wialon_unit_id: Any) -> bool:
+        """
+        Indicar si la unidad está marcada sin viaje activo
+
+        Args:
+            wialon_unit_id: ID de Wialon de la unidad
+
+        Returns:
+            True si MySQL confirmó hace menos de no_trip_ttl que no tiene viaje
+            y la unidad no tiene un viaje registrado en memoria
+        """
+        if not self.active or not self.no_trip_ttl or wialon_unit_id is None:
+            return False
+        wialon_id = str(wialon_unit_id)
+        if wialon_id in self._by_wialon:
+            # Un viaje indexado después de la marca gana sobre ella
+            self._no_trip.delete(wialon_id)
+            return False
+        return self._no_trip.get(wialon_id) is not None
+
+    def mark_no_trip(self, wialon_unit_id: Any) -> None:
+        """
+        Marcar una unidad sin viaje activo (tras confirmarlo en MySQL)
+
+        No hace nada si la unidad ya tiene viaje en memoria: la consulta que
+        no lo encontró pudo cruzarse con la creación del viaje.
+
+        Args:
+            wialon_unit_id: ID de Wialon de la unidad
+        """
+        if not self.active or not self.no_trip_ttl or wialon_unit_id is None:
+            return
+        wialon_id = str(wialon_unit_id)
+        if wialon_id in self._by_wialon:
+            logger.debug("no_trip_mark_skipped", wialon_unit_id=wialon_id)
+            return
+        self._no_trip.set(wialon_id, True)
+
+    def clear_no_trip(self, wialon_unit_id: Any) -> bool:
+        """
+        Quitar la marca de una unidad (p.ej. al asignarle un viaje)
+
+        Args:
+            wialon_unit_id: ID de Wialon de la unidad
+
+        Returns:
+            True si la unidad estaba marcada
+        """
+        if wialon_unit_id is None:
+            return False
+        removed = self._no_trip.delete(str(wialon_unit_id))
+        if removed:
+            logger.info("no_trip_mark_cleared", wialon_unit_id=str(wialon_unit_id))
+        return removed
+
+    # ------------------------------------------------------------------
+    # Escrituras (write-through desde los repositorios)
+    # ------------------------------------------------------------------
+
+    def put(self, unit: Dict[str, Any], trip: Dict[str, Any]) -> None:
+        """
+        Registrar el viaje activo de una unidad (p.ej. tras consultarlo en MySQL)
+
+        Args:
+            unit: Fila de units
+            trip: Fila de trips
+        """
+        if not self.active:
+            return
+        wialon_id = unit.get("wialon_unit_id")
+        if not wialon_id or not _is_active(trip):
+            self.invalidate_unit(unit.get("id"))
+            return
+        self._index(str(wialon_id), ActiveTrip.build(unit, trip))
+
+    def trip_written(self, trip: Optional[Dict[str, Any]]) -> None:
+        """
+        Aplicar un viaje recién actualizado y ya releído de MySQL
+
+        Args:
+            trip: Fila de trips después del UPDATE
+        """
+        if not self.active or not trip:
+            return
+        wialon_id = self._wialon_by_unit.get(trip.get("unit_id"))
+        if wialon_id is None:
+            return
+        entry = self._by_wialon[wialon_id]
+        if entry.trip.get("id") != trip.get("id") or not _is_active(trip):
+            # Otro viaje de la unidad o el viaje dejó de estar activo: MySQL decide
+            self._drop(wialon_id)
+            return
+        self._index(wialon_id, ActiveTrip.build(entry.unit, trip))
+
+    def trip_created(self, unit: Optional[Dict[str, Any]], trip: Optional[Dict[str, Any]]) -> None:
+        """
+        Registrar un viaje recién creado (pasa a ser el más reciente de la unidad)
+
+        Args:
+            unit: Fila de units de la unidad del viaje
+            trip: Fila de trips insertada
+        """
+        if not self.active or not trip:
+            return
+        if unit:
+            self.clear_no_trip(unit.get("wialon_unit_id"))
+            self.put(unit, trip)
+        else:
+            self.invalidate_unit(trip.get("unit_id"))
+
+    def unit_written(self, unit: Optional[Dict[str, Any]]) -> None:
+        """
+        Aplicar una unidad recién actualizada (grupo de WhatsApp, wialon_unit_id)
+
+        Args:
+            unit: Fila de units después del UPDATE
+        """
+        if not self.active or not unit:
+            return
+        wialon_id = self._wialon_by_unit.get(unit.get("id"))
+        if wialon_id is None:
+            return
+        entry = self._drop(wialon_id)
+        if entry and unit.get("wialon_unit_id"):
+            self._index(str(unit["wialon_unit_id"]), ActiveTrip.build(unit, entry.trip))
+
+    def invalidate_unit(self, unit_id: Any) -> bool:
+        """
+        Descartar la entrada de una unidad (la próxima búsqueda consulta MySQL)
+
+        Args:
+            unit_id: ID de la unidad
+
+        Returns:
+            True si había entrada
+        """
+        wialon_id = self._wialon_by_unit.get(unit_id)
+        return wialon_id is not None and self._drop(wialon_id) is not None
+
+    def _index(self, wialon_id: str, entry: ActiveTrip) -> None:
+        self._no_trip.delete(wialon_id)
+        self._drop(wialon_id)
+        self.invalidate_unit(entry.unit.get("id"))
+        self._by_wialon[wialon_id] = entry
+        self._wialon_by_unit[entry.unit.get("id")] = wialon_id
+        if entry.group_id:
+            self._wialon_by_group[entry.group_id] = wialon_id
+        if self._touched is not None:
+            self._touched.add(wialon_id)
+
+    def _drop(self, wialon_id: str) -> Optional[ActiveTrip]:
+        entry = self._by_wialon.pop(wialon_id, None)
+        if entry is not None:
+            if self._wialon_by_unit.get(entry.unit.get("id")) == wialon_id:
+                del self._wialon_by_unit[entry.unit.get("id")]
+            if entry.group_id and self._wialon_by_group.get(entry.group_id) == wialon_id:
+                del self._wialon_by_group[entry.group_id]
+        if self._touched is not None:
+            self._touched.add(wialon_id)
+        return entry
+
+    # ------------------------------------------------------------------
+    # Carga y reconciliación
+    # ------------------------------------------------------------------
+
+    async def _load(self, db: Database) -> Dict[str, ActiveTrip]:
+        """Leer de MySQL los viajes activos y sus unidades"""
+        placeholders = ", ".join(["%s"] * len(ACTIVE_TRIP_EXCLUDED_STATUSES))
+        trips = await db.fetch(
+            f"SELECT * FROM trips WHERE status NOT IN ({placeholders}) ORDER BY created_at ASC",
+            *ACTIVE_TRIP_EXCLUDED_STATUSES,
+        ) or []
+        unit_ids = list({trip["unit_id"] for trip in trips if trip.get("unit_id")})
+        units: Dict[Any, Dict[str, Any]] = {}
+        if unit_ids:
+            rows = await db.fetch(
+                f"SELECT * FROM units WHERE id IN ({', '.join(['%s'] * len(unit_ids))})",
+                *unit_ids,
+            ) or []
+            units = {row["id"]: row for row in rows}
+
+        # Orden ascendente: ante varios viajes activos gana el más reciente,
+        # igual que find_active_by_wialon_id
+        entries: Dict[str, ActiveTrip] = {}
+        for trip in trips:
+            unit = units.get(trip.get("unit_id"))
+            if unit and unit.get("wialon_unit_id"):
+                entries[str(unit["wialon_unit_id"])] = ActiveTrip.build(unit, trip)
+        return entries
+
+    async def warm(self, db: Database) -> int:
+        """
+        Cargar el registro desde MySQL
+
+        Args:
+            db: Instancia de base de datos
+
+        Returns:
+            Número de unidades con viaje activo cargadas
+        """
+        if not self.enabled:
+            return 0
+        entries = await self._load(db)
+        self._by_wialon, self._wialon_by_unit, self._wialon_by_group = {}, {}, {}
+        self._warm = True
+        for wialon_id, entry in entries.items():
+            self._index(wialon_id, entry)
+        self.last_reconciled_at = datetime.now(timezone.utc).isoformat()
+        logger.info("active_trips_warmed", units=len(self._by_wialon))
+        return len(self._by_wialon)
+
+    async def reconcile(self, db: Database) -> Dict[str, int]:
+        """
+        Recargar desde MySQL y corregir la deriva
+
+        Las entradas escritas por write-through mientras se leía MySQL se
+        conservan: son más recientes que la lectura.
+
+        Args:
+            db: Instancia de base de datos
+
+        Returns:
+            Conteo de entradas agregadas, eliminadas y modificadas
+        """
+        if not self.active:
+            return {}
+        self._touched = set()
+        try:
+            fresh = await self._load(db)
+            touched = self._touched
+        finally:
+            self._touched = None
+
+        drift = {"added": 0, "removed": 0, "changed": 0}
+        for wialon_id in list(self._by_wialon):
+            if wialon_id not in fresh and wialon_id not in touched:
+                self._drop(wialon_id)
+                drift["removed"] += 1
+        for wialon_id, entry in fresh.items():
+            if wialon_id in touched:
+                continue
+            current = self._by_wialon.get(wialon_id)
+            if current is None:
+                drift["added"] += 1
+            elif current.trip != entry.trip or current.unit != entry.unit:
+                drift["changed"] += 1
+            else:
+                continue
+            self._index(wialon_id, entry)
+
+        self.reconciles += 1
+        self.last_drift = drift
+        self.drift_total += sum(drift.values())
+        self.last_reconciled_at = datetime.now(timezone.utc).isoformat()
+        if any(drift.values()):
+            logger.warning("active_trips_drift_corrected", units=len(self._by_wialon), **drift)
+        else:
+            logger.debug("active_trips_reconciled", units=len(self._by_wialon))
+        return drift
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self, db: Database) -> None:
+        """Cargar el registro y arrancar el barrido de reconciliación"""
+        if not self.enabled or self._task:
+            return
+        await self.warm(db)
+        self._task = asyncio.create_task(self._run(db), name="active-trips-reconcile")
+
+    async def stop(self) -> None:
+        """Detener la reconciliación y vaciar el registro"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._warm = False
+        self._by_wialon, self._wialon_by_unit, self._wialon_by_group = {}, {}, {}
+        self._no_trip.clear()
+
+    async def _run(self, db: Database) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile(db)
+            except Exception as e:
+                logger.error("active_trips_reconcile_failed", error=str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener métricas del registro"""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "warm": self._warm,
+            "size": len(self._by_wialon),
+            "groups": len(self._wialon_by_group),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "reconciles": self.reconciles,
+            "drift_total": self.drift_total,
+            "last_drift": self.last_drift,
+            "last_reconciled_at": self.last_reconciled_at,
+            "no_trip": self._no_trip.get_stats(),
+        }
+
+
+# Instancia global del registro de viajes activos
+active_trips = ActiveTripRegistry(
+    reconcile_interval=settings.active_trips_reconcile_interval,
+    enabled=settings.active_trips_enabled,
+    no_trip_ttl=settings.wialon_no_trip_cache_ttl,
+    no_trip_max_size=settings.wialon_no_trip_cache_max_size,
+)
@@ -0,0 +1,144 @@
+"""
+Caché en memoria LRU con TTL opcional
+
+Pensada para estado por proceso dentro del event loop (sin locks): todas las
+operaciones son síncronas y O(1) salvo items().
+"""
+from typing import Any, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+from collections import OrderedDict
+import time
+
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[V]):
+    """Caché acotada con expulsión LRU y expiración opcional por TTL"""
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = None):
+        """
+        Inicializar caché
+
+        Args:
+            max_size: Número máximo de entradas
+            ttl: Segundos de vida de cada entrada (None = sin expiración)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[V, float]]" = OrderedDict()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Obtener un valor y marcarlo como usado recientemente
+
+        Args:
+            key: Clave
+            default: Valor si no existe o expiró
+
+        Returns:
+            Valor cacheado o default
+        """
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at and expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """
+        Guardar un valor expulsando la entrada menos usada si se excede el tamaño
+
+        Args:
+            key: Clave
+            value: Valor
+            ttl: TTL específico para esta entrada (default: TTL de la caché)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """
+        Eliminar una entrada
+
+        Returns:
+            True si la entrada existía
+        """
+        return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self) -> int:
+        """
+        Vaciar la caché
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        count = len(self._data)
+        self._data.clear()
+        return count
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        expires_at = entry[1]
+        return not (expires_at and expires_at <= time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self) -> List[Tuple[Hashable, V]]:
+        """
+        Listar entradas vigentes sin alterar el orden LRU
+
+        Returns:
+            Lista de (clave, valor) de la menos a la más usada recientemente
+        """
+        now = time.monotonic()
+        return [
+            (key, value)
+            for key, (value, expires_at) in self._data.items()
+            if not (expires_at and expires_at <= now)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener métricas de la caché
+
+        Returns:
+            Diccionario con tamaño, hits, misses y expulsiones
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
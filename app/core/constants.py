@@ -14,6 +14,17 @@ TRIP_STATUS = {
     "CANCELLED": "cancelado",
 }
 
+# Estados en los que un viaje ya no recibe eventos
+TERMINAL_TRIP_STATUSES = frozenset({
+    TRIP_STATUS["COMPLETED"],
+    TRIP_STATUS["CANCELLED"],
+    "completed",
+    "cancelled",
+})
+
+# Estados que excluyen las consultas de viaje activo (TripRepository.find_active_*)
+ACTIVE_TRIP_EXCLUDED_STATUSES = ("completed", "cancelled")
+
 # Subestados de viajes
 TRIP_SUBSTATUS = {
     "TO_START": "por_iniciar",
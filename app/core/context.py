@@ -1,7 +1,7 @@
 """
 Contexto global de request para propagación de trace_id
 """
-from contextvars import ContextVar
+from contextvars import Context, ContextVar
 from typing import Optional
 import uuid
 
@@ -33,6 +33,22 @@ def get_trace_id() -> str:
     return trace_id
 
 
+def get_context_trace_id(context: Context) -> Optional[str]:
+    """
+    Leer el trace_id de un contexto dado sin entrar en él
+
+    Sirve para inspeccionar el contexto de un callback de asyncio desde
+    fuera (incluso desde otro hilo).
+
+    Args:
+        context: Contexto a inspeccionar
+
+    Returns:
+        trace_id guardado en el contexto o None
+    """
+    return context.get(_trace_id_var)
+
+
 def clear_trace_id() -> None:
     """Limpiar trace_id del contexto"""
     _trace_id_var.set(None)
@@ -5,9 +5,12 @@ import aiomysql
 from typing import Optional, Any, Tuple, Dict
 from contextlib import asynccontextmanager
 import json
+import time
 
 from app.core.logging import get_logger
 from app.core.errors import DatabaseError
+from app.core.metrics import DB_POOL_ACQUIRE_DURATION, metrics
+from app.core.query_stats import InstrumentedCursor, get_query_stats
 
 logger = get_logger(__name__)
 
@@ -100,9 +103,10 @@ class Database:
         if not self._pool:
             raise DatabaseError("Pool de base de datos no inicializado")
 
+        started = time.perf_counter()
         async with self._pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                yield cursor, conn
+                yield self._instrument(cursor, started), conn
 
     async def execute(self, query: str, *args, timeout: Optional[float] = None):
         """
@@ -186,8 +190,10 @@ class Database:
         if not self._pool:
             raise DatabaseError("Pool de base de datos no inicializado")
 
+        started = time.perf_counter()
         async with self._pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
+            async with conn.cursor(aiomysql.DictCursor) as raw_cursor:
+                cursor = self._instrument(raw_cursor, started)
                 try:
                     await conn.begin()
                     yield cursor, conn
@@ -197,6 +203,37 @@ class Database:
                     logger.error("transaction_rollback", error=str(e))
                     raise
 
+    def _instrument(self, cursor: Any, acquire_started: float) -> Any:
+        """
+        Envolver el cursor para estadísticas por request y métricas
+
+        Args:
+            cursor: Cursor de aiomysql recién abierto
+            acquire_started: perf_counter() antes de pedir la conexión al pool
+
+        Returns:
+            InstrumentedCursor, o el cursor original si no hay nada que medir
+        """
+        stats = get_query_stats()
+        if stats is None and not metrics.enabled:
+            return cursor
+        if stats is not None:
+            stats.record_connection()
+        if metrics.enabled:
+            DB_POOL_ACQUIRE_DURATION.labels().observe(time.perf_counter() - acquire_started)
+        return InstrumentedCursor(cursor, stats)
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """
+        Estado del pool de conexiones
+
+        Returns:
+            Conexiones abiertas, libres y máximo configurado (ceros sin pool)
+        """
+        if not self._pool:
+            return {"size": 0, "free": 0, "max": 0}
+        return {"size": self._pool.size, "free": self._pool.freesize, "max": self._pool.maxsize}
+
     def _deserialize_json_fields(self, row: Optional[Dict]) -> Optional[Dict]:
         """
         Deserializar campos JSON que vienen como strings desde MySQL
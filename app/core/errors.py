@@ -107,6 +107,16 @@ class GeminiAPIError(ExternalAPIError):
         super().__init__(service="Gemini API", message=message, context=context)
 
 
+class GeminiTimeoutError(GeminiAPIError):
+    """Llamada a Gemini cancelada por exceder el timeout"""
+
+    def __init__(self, timeout: float, context: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            message=f"Timeout de {timeout}s excedido",
+            context={"timeout": timeout, **(context or {})},
+        )
+
+
 class FloatifyAPIError(ExternalAPIError):
     """Error en Floatify API"""
 
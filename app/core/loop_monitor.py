@@ -0,0 +1,396 @@
+"""
+Monitor del event loop: lag de planificación y callbacks lentos
+
+Dos mediciones complementarias:
+
+- Lag: una tarea duerme LOOP_MONITOR_INTERVAL segundos y mide cuánto tarda
+  de más en despertar. Alimenta el histograma event_loop_lag_seconds.
+- Callbacks lentos: en el loop de asyncio, asyncio.events.Handle._run
+  (por donde pasa cada callback y cada paso de tarea) se envuelve para medir
+  su duración. Si un callback retiene el loop más de LOOP_SLOW_CALLBACK_MS,
+  se registra con el trace_id de su contexto y la pila en la que estaba
+  bloqueado. La pila la captura un hilo vigía con sys._current_frames()
+  mientras el loop sigue retenido; si el callback termina antes de que el
+  vigía lo vea, se usa el punto donde quedó suspendida la tarea.
+- Otros loops (uvloop) nunca llaman a Handle._run. Ahí el loop programa un
+  latido cada slow_callback_ms / 2; el vigía detecta el latido atrasado,
+  captura la pila del hilo del loop y la tarea en curso, y el siguiente
+  latido registra la duración del bloqueo. La duración es aproximada (a la
+  resolución del latido) y el trace_id solo se conoce si la tarea expone su
+  contexto (Python 3.12+).
+
+get_stats() informa el modo activo en slow_callback_detection
+("handle_timer" o "heartbeat").
+
+Los peores callbacks y los más recientes se consultan en GET /admin/event-loop.
+"""
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import sys
+import threading
+import time
+import traceback
+
+from app.config import settings
+from app.core.context import get_context_trace_id
+from app.core.logging import get_logger
+from app.core.metrics import EVENT_LOOP_LAG, EVENT_LOOP_SLOW_CALLBACKS, metrics
+
+logger = get_logger(__name__)
+
+# Frames de pila que se guardan por callback lento
+STACK_LIMIT = 20
+
+
+def _describe_callback(handle: asyncio.Handle) -> Tuple[str, Optional[asyncio.Task]]:
+    """Nombre legible del callback y la tarea a la que pertenece (si es un paso de tarea)"""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        coro_name = getattr(coro, "__qualname__", type(coro).__name__)
+        return f"Task {owner.get_name()} ({coro_name})", owner
+    return getattr(callback, "__qualname__", repr(callback)), None
+
+
+class LoopMonitor:
+    """Mide el lag del event loop y registra los callbacks que lo retienen"""
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        slow_callback_ms: float = 100.0,
+        max_entries: int = 50,
+        enabled: bool = True,
+    ):
+        """
+        Inicializar monitor
+
+        Args:
+            interval: Segundos entre muestras de lag
+            slow_callback_ms: Umbral para registrar un callback como lento
+            max_entries: Tamaño del ring buffer y del top de peores callbacks
+            enabled: Si es False start() no hace nada
+        """
+        self.interval = interval
+        self.slow_callback_s = slow_callback_ms / 1000
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._original_run = None
+        self._running = False
+        self._mode: Optional[str] = None
+
+        # Latido (loops sin Handle._run): último latido y su handle programado
+        self._beat_interval = max(self.slow_callback_s / 2, 0.005)
+        self._heartbeat = 0.0
+        self._beat_handle: Optional[asyncio.TimerHandle] = None
+        # Pila capturada por el vigía para el latido atrasado: (latido, callback, pila, trace_id)
+        self._stall: Optional[Tuple[float, str, List[str], Optional[str]]] = None
+
+        # Callback en curso (lo escribe el loop, lo lee el vigía)
+        self._current: Optional[Tuple[asyncio.Handle, float]] = None
+        # Pila y trace_id capturados por el vigía para el callback en curso
+        self._captured: Optional[Tuple[asyncio.Handle, List[str], Optional[str]]] = None
+
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=max_entries)
+        self._worst: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+
+        # Métricas
+        self._samples = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._total_lag = 0.0
+        self._slow_callbacks = 0
+
+    @property
+    def running(self) -> bool:
+        """Indica si el monitor está activo"""
+        return self._running
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Arrancar el muestreo de lag, la medición de callbacks y el hilo vigía"""
+        if self._running or not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._running = True
+
+        if isinstance(self._loop, asyncio.BaseEventLoop):
+            self._mode = "handle_timer"
+            self._install_handle_timer()
+        else:
+            # uvloop y otros loops en C no pasan por asyncio.events.Handle._run
+            self._mode = "heartbeat"
+            logger.warning(
+                "loop_monitor_handle_timer_unsupported",
+                loop=type(self._loop).__qualname__,
+                fallback=self._mode,
+            )
+            self._heartbeat = time.perf_counter()
+            self._beat_handle = self._loop.call_later(self._beat_interval, self._beat)
+        self._stop_event.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        self._task = asyncio.create_task(self._sample_lag(), name="loop-monitor")
+
+        logger.info(
+            "loop_monitor_started",
+            interval=self.interval,
+            slow_callback_ms=self.slow_callback_s * 1000,
+            slow_callback_detection=self._mode,
+        )
+
+    async def stop(self) -> None:
+        """Detener el monitor y restaurar Handle._run (o cancelar el latido)"""
+        if not self._running:
+            return
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        self._stop_event.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+        self._uninstall_handle_timer()
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+            self._beat_handle = None
+        self._stall = None
+        logger.info("loop_monitor_stopped", **self.get_stats())
+
+    def _install_handle_timer(self) -> None:
+        """Envolver Handle._run para medir cada callback del loop monitoreado"""
+        original = asyncio.events.Handle._run
+        monitor = self
+
+        def _timed_run(handle: asyncio.Handle) -> None:
+            if handle._loop is not monitor._loop:
+                return original(handle)
+            started = time.perf_counter()
+            monitor._current = (handle, started)
+            try:
+                return original(handle)
+            finally:
+                monitor._current = None
+                elapsed = time.perf_counter() - started
+                if elapsed >= monitor.slow_callback_s:
+                    monitor._record_slow(handle, elapsed)
+
+        self._original_run = original
+        asyncio.events.Handle._run = _timed_run
+
+    def _uninstall_handle_timer(self) -> None:
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    # ------------------------------------------------------------------
+    # Mediciones
+    # ------------------------------------------------------------------
+
+    async def _sample_lag(self) -> None:
+        """Dormir interval segundos y medir cuánto se retrasa el despertar"""
+        loop = asyncio.get_running_loop()
+        while self._running:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+
+            self._samples += 1
+            self._last_lag = lag
+            self._max_lag = max(self._max_lag, lag)
+            self._total_lag += lag
+            if metrics.enabled:
+                EVENT_LOOP_LAG.labels().observe(lag)
+
+    def _beat(self) -> None:
+        """Latido en el loop: si llegó tarde, el loop estuvo retenido"""
+        now = time.perf_counter()
+        blocked = now - self._heartbeat - self._beat_interval
+        previous, self._heartbeat = self._heartbeat, now
+        if blocked >= self.slow_callback_s:
+            self._record_stall(previous, blocked)
+        if self._running:
+            self._beat_handle = self._loop.call_later(self._beat_interval, self._beat)
+
+    def _watch(self) -> None:
+        """Hilo vigía: capturar la pila del loop mientras un callback lo retiene"""
+        poll = max(self.slow_callback_s / 2, 0.005)
+        while not self._stop_event.wait(poll):
+            if self._mode == "heartbeat":
+                self._watch_heartbeat()
+                continue
+            current = self._current
+            if current is None:
+                continue
+            handle, started = current
+            if time.perf_counter() - started < self.slow_callback_s:
+                continue
+            if self._captured is not None and self._captured[0] is handle:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                trace_id = get_context_trace_id(handle._context) if handle._context is not None else None
+                self._captured = (handle, traceback.format_stack(frame, limit=STACK_LIMIT), trace_id)
+
+    def _watch_heartbeat(self) -> None:
+        """Capturar la pila y la tarea en curso si el latido está atrasado"""
+        heartbeat = self._heartbeat
+        if time.perf_counter() - heartbeat - self._beat_interval < self.slow_callback_s:
+            return
+        if self._stall is not None and self._stall[0] == heartbeat:
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        callback, trace_id = "unknown", None
+        task = asyncio.current_task(self._loop)
+        if task is not None:
+            coro = task.get_coro()
+            callback = f"Task {task.get_name()} ({getattr(coro, '__qualname__', type(coro).__name__)})"
+            if hasattr(task, "get_context"):
+                trace_id = get_context_trace_id(task.get_context())
+        self._stall = (heartbeat, callback, traceback.format_stack(frame, limit=STACK_LIMIT), trace_id)
+
+    def _record_stall(self, heartbeat: float, elapsed: float) -> None:
+        """Registrar un bloqueo detectado por el latido"""
+        stall = self._stall
+        self._stall = None
+        if stall is not None and stall[0] == heartbeat:
+            _, callback, stack, trace_id = stall
+            self._store(elapsed, callback, trace_id, "blocked", stack)
+        else:
+            self._store(elapsed, "unknown", None, None, [])
+
+    def _record_slow(self, handle: asyncio.Handle, elapsed: float) -> None:
+        """Registrar un callback que retuvo el loop sobre el umbral"""
+        callback, task = _describe_callback(handle)
+
+        context = handle._context
+        trace_id = get_context_trace_id(context) if context is not None else None
+
+        stack: List[str] = []
+        stack_source = None
+        captured = self._captured
+        if captured is not None and captured[0] is handle:
+            stack, stack_source = captured[1], "blocked"
+            # El trace_id visto mientras bloqueaba (el callback pudo limpiarlo al terminar)
+            trace_id = captured[2] or trace_id
+        elif task is not None and not task.done():
+            stack = [line for frame in task.get_stack(limit=STACK_LIMIT)
+                     for line in traceback.format_stack(frame, limit=1)]
+            stack_source = "suspended"
+        self._captured = None
+        self._store(elapsed, callback, trace_id, stack_source, stack)
+
+    def _store(
+        self,
+        elapsed: float,
+        callback: str,
+        trace_id: Optional[str],
+        stack_source: Optional[str],
+        stack: List[str],
+    ) -> None:
+        """Guardar un callback lento en el ring buffer y el top"""
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "callback": callback,
+            "trace_id": trace_id,
+            "stack_source": stack_source,
+            "stack": [line.rstrip() for line in stack],
+        }
+
+        self._slow_callbacks += 1
+        self._recent.append(entry)
+        item = (elapsed, next(self._seq), entry)
+        if len(self._worst) < self.max_entries:
+            heapq.heappush(self._worst, item)
+        elif elapsed > self._worst[0][0]:
+            heapq.heapreplace(self._worst, item)
+
+        if metrics.enabled:
+            EVENT_LOOP_SLOW_CALLBACKS.labels().observe(elapsed)
+        logger.warning(
+            "event_loop_slow_callback",
+            duration_ms=entry["duration_ms"],
+            callback=callback,
+            blocked_trace_id=trace_id,
+            location=entry["stack"][-1].strip() if entry["stack"] else None,
+        )
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def slow_callbacks(self, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Peores callbacks registrados y los más recientes
+
+        Args:
+            limit: Máximo de entradas por lista
+
+        Returns:
+            {"worst": [...] (de mayor a menor duración), "recent": [...] (más reciente primero)}
+        """
+        worst = [entry for _, _, entry in sorted(self._worst, reverse=True)]
+        recent = list(reversed(self._recent))
+        return {"worst": worst[:limit], "recent": recent[:limit]}
+
+    def reset(self) -> int:
+        """
+        Vaciar los callbacks registrados y los máximos de lag
+
+        Returns:
+            Número de callbacks lentos descartados
+        """
+        removed = self._slow_callbacks
+        self._recent.clear()
+        self._worst.clear()
+        self._slow_callbacks = 0
+        self._max_lag = 0.0
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas del monitor"""
+        return {
+            "running": self._running,
+            "slow_callback_detection": self._mode,
+            "interval": self.interval,
+            "slow_callback_ms": self.slow_callback_s * 1000,
+            "samples": self._samples,
+            "last_lag_ms": round(self._last_lag * 1000, 2),
+            "max_lag_ms": round(self._max_lag * 1000, 2),
+            "avg_lag_ms": round(self._total_lag / self._samples * 1000, 2) if self._samples else 0.0,
+            "slow_callbacks": self._slow_callbacks,
+        }
+
+
+# Instancia global del monitor del event loop
+loop_monitor = LoopMonitor(
+    interval=settings.loop_monitor_interval,
+    slow_callback_ms=settings.loop_slow_callback_ms,
+    max_entries=settings.loop_monitor_max_entries,
+    enabled=settings.loop_monitor_enabled,
+)
@@ -0,0 +1,388 @@
+"""
+Monitor de memoria para procesos de larga vida
+
+Cada MEMORY_MONITOR_INTERVAL segundos una tarea toma una muestra con:
+
+- RSS del proceso (/proc/self/statm; pico de getrusage fuera de Linux).
+- Conteo de objetos por tipo (gc.get_objects) y su crecimiento respecto
+  de la muestra anterior.
+- Tamaño de las estructuras en memoria registradas con watch() (período
+  de gracia de desviaciones, cachés, pools HTTP, buffers de webhooks).
+- Top de sitios de asignación si tracemalloc está activo.
+
+Las muestras se guardan en un historial acotado y se consultan en
+GET /admin/memory. Si el RSS o una estructura vigilada cruza su umbral se
+emite memory_threshold_exceeded (una vez por cruce). Cada estructura tiene
+su propio umbral: el de MEMORY_CONTAINER_ALERT_SIZES, si no el que se pasó a
+watch() y si no MEMORY_CONTAINER_ALERT_SIZE.
+
+Para buscar fugas: POST /admin/memory/snapshot arranca tracemalloc (si no lo
+estaba) y guarda un snapshot de referencia; GET /admin/memory/diff compara
+el estado actual contra esa referencia por línea de código.
+"""
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+import asyncio
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+
+from app.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import MEMORY_WATCHED_SIZE, PROCESS_RSS, metrics
+
+logger = get_logger(__name__)
+
+
+def read_rss_bytes() -> int:
+    """
+    Memoria residente actual del proceso
+
+    Returns:
+        RSS en bytes (pico de getrusage si /proc no está disponible)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _format_stat(stat: Any) -> Dict[str, Any]:
+    """Sitio de asignación de tracemalloc como diccionario"""
+    frame = stat.traceback[0]
+    entry = {
+        "site": f"{frame.filename}:{frame.lineno}",
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+class MemoryMonitor:
+    """Muestreo periódico de memoria y snapshots de tracemalloc"""
+
+    def __init__(
+        self,
+        interval: float = 300.0,
+        history_size: int = 288,
+        top_limit: int = 20,
+        rss_alert_mb: float = 1024.0,
+        container_alert_size: int = 10000,
+        container_alert_sizes: Optional[Dict[str, int]] = None,
+        tracemalloc_frames: int = 10,
+        enabled: bool = True,
+    ):
+        """
+        Inicializar monitor
+
+        Args:
+            interval: Segundos entre muestras
+            history_size: Muestras conservadas
+            top_limit: Tipos y sitios de asignación por muestra
+            rss_alert_mb: Umbral de RSS para la alerta (0 = sin alerta)
+            container_alert_size: Umbral de elementos por defecto de las estructuras vigiladas
+            container_alert_sizes: Umbrales por estructura que prevalecen sobre watch() (0 = sin alerta)
+            tracemalloc_frames: Frames guardados por asignación al arrancar tracemalloc
+            enabled: Si es False start() no hace nada
+        """
+        self.interval = interval
+        self.top_limit = top_limit
+        self.rss_alert_bytes = int(rss_alert_mb * 1024 * 1024)
+        self.container_alert_size = container_alert_size
+        self.container_alert_sizes = dict(container_alert_sizes or {})
+        self.tracemalloc_frames = tracemalloc_frames
+        self.enabled = enabled
+
+        self._watches: Dict[str, Callable[[], int]] = {}
+        self._alert_sizes: Dict[str, Optional[int]] = {}
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._previous_types: Counter = Counter()
+        self._alerting: set = set()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    # ------------------------------------------------------------------
+    # Estructuras vigiladas
+    # ------------------------------------------------------------------
+
+    def watch(self, name: str, size_fn: Callable[[], int], alert_size: Optional[int] = None) -> None:
+        """
+        Vigilar el tamaño de una estructura en memoria
+
+        Args:
+            name: Nombre de la estructura (etiqueta de métricas y alertas)
+            size_fn: Función sin argumentos que devuelve el número de elementos
+            alert_size: Umbral propio de la estructura (None = container_alert_size, 0 = sin alerta)
+        """
+        self._watches[name] = size_fn
+        self._alert_sizes[name] = alert_size
+
+    def alert_size(self, name: str) -> int:
+        """
+        Umbral de alerta vigente de una estructura vigilada
+
+        Args:
+            name: Nombre de la estructura
+
+        Returns:
+            Elementos a partir de los que se alerta (0 = sin alerta)
+        """
+        if name in self.container_alert_sizes:
+            return self.container_alert_sizes[name]
+        alert_size = self._alert_sizes.get(name)
+        return self.container_alert_size if alert_size is None else alert_size
+
+    def container_sizes(self) -> Dict[str, int]:
+        """
+        Tamaño actual de las estructuras vigiladas
+
+        Returns:
+            Diccionario {nombre: elementos} (-1 si la función falló)
+        """
+        sizes = {}
+        for name, size_fn in self._watches.items():
+            try:
+                sizes[name] = int(size_fn())
+            except Exception as e:
+                logger.warning("memory_watch_failed", container=name, error=str(e))
+                sizes[name] = -1
+        return sizes
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Arrancar el muestreo periódico"""
+        if self._running or not self.enabled:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run(), name="memory-monitor")
+        logger.info("memory_monitor_started", interval=self.interval, watches=list(self._watches))
+
+    async def stop(self) -> None:
+        """Detener el muestreo"""
+        if not self._running:
+            return
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        logger.info("memory_monitor_stopped", samples=len(self._history))
+
+    async def _run(self) -> None:
+        while self._running:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.error("memory_sample_failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    # ------------------------------------------------------------------
+    # Muestras
+    # ------------------------------------------------------------------
+
+    async def sample(self) -> Dict[str, Any]:
+        """
+        Tomar una muestra, guardarla en el historial y evaluar umbrales
+
+        El conteo de objetos y el snapshot de tracemalloc recorren todo el
+        heap; se hacen en un hilo para repartir la pausa del loop.
+
+        Returns:
+            Muestra tomada
+        """
+        containers = self.container_sizes()
+        sample = await asyncio.to_thread(self._collect)
+        sample["containers"] = containers
+        self._history.append(sample)
+
+        if metrics.enabled:
+            PROCESS_RSS.labels().set(sample["rss_bytes"])
+            for name, size in containers.items():
+                MEMORY_WATCHED_SIZE.labels(name).set(size)
+
+        self._check_thresholds(sample)
+        logger.info(
+            "memory_sampled",
+            rss_mb=sample["rss_mb"],
+            gc_objects=sample["gc_objects"],
+            containers=containers,
+            top_growth=sample["type_growth"][:5],
+        )
+        return sample
+
+    def _collect(self) -> Dict[str, Any]:
+        """RSS, conteo de objetos por tipo y top de tracemalloc"""
+        rss = read_rss_bytes()
+        types = Counter(type(obj).__name__ for obj in gc.get_objects())
+        growth = types.copy()
+        growth.subtract(self._previous_types)
+        self._previous_types = types
+
+        sample = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "rss_bytes": rss,
+            "rss_mb": round(rss / (1024 * 1024), 1),
+            "gc_objects": sum(types.values()),
+            "top_types": [{"type": name, "count": count} for name, count in types.most_common(self.top_limit)],
+            "type_growth": [
+                {"type": name, "delta": delta}
+                for name, delta in growth.most_common(self.top_limit)
+                if delta > 0
+            ],
+            "tracemalloc": tracemalloc.is_tracing(),
+        }
+        if tracemalloc.is_tracing():
+            stats = tracemalloc.take_snapshot().statistics("lineno")
+            sample["top_allocations"] = [_format_stat(stat) for stat in stats[: self.top_limit]]
+        return sample
+
+    def _check_thresholds(self, sample: Dict[str, Any]) -> None:
+        """Emitir la alerta al cruzar un umbral (y rearmarla al bajar)"""
+        over: Dict[str, Dict[str, Any]] = {}
+        if self.rss_alert_bytes and sample["rss_bytes"] > self.rss_alert_bytes:
+            over["rss"] = {"value_mb": sample["rss_mb"], "threshold_mb": self.rss_alert_bytes // (1024 * 1024)}
+        for name, size in sample["containers"].items():
+            threshold = self.alert_size(name)
+            if threshold and size > threshold:
+                over[name] = {"value": size, "threshold": threshold}
+
+        for name, details in over.items():
+            if name not in self._alerting:
+                logger.warning(
+                    "memory_threshold_exceeded",
+                    container=name,
+                    top_growth=sample["type_growth"][:5],
+                    **details,
+                )
+        self._alerting = set(over)
+
+    def history(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Evolución de RSS, objetos y estructuras vigiladas
+
+        Args:
+            limit: Muestras más recientes a devolver
+
+        Returns:
+            Lista de muestras resumidas, de la más antigua a la más reciente
+        """
+        samples = list(self._history)[-limit:] if limit else []
+        return [
+            {
+                "at": sample["at"],
+                "rss_mb": sample["rss_mb"],
+                "gc_objects": sample["gc_objects"],
+                "containers": sample["containers"],
+            }
+            for sample in samples
+        ]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Última muestra completa"""
+        return self._history[-1] if self._history else None
+
+    # ------------------------------------------------------------------
+    # tracemalloc
+    # ------------------------------------------------------------------
+
+    def take_baseline(self) -> Dict[str, Any]:
+        """
+        Arrancar tracemalloc si hace falta y guardar el snapshot de referencia
+
+        Returns:
+            Estado de tracemalloc y top de asignaciones de la referencia
+        """
+        started = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            started = True
+        self._baseline = tracemalloc.take_snapshot()
+        self._baseline_at = datetime.now(timezone.utc).isoformat()
+        current, peak = tracemalloc.get_traced_memory()
+        logger.info("memory_baseline_taken", tracemalloc_started=started, traced_kb=current // 1024)
+        return {
+            "baseline_at": self._baseline_at,
+            "tracemalloc_started": started,
+            "traced_kb": current // 1024,
+            "peak_kb": peak // 1024,
+            "top_allocations": [
+                _format_stat(stat) for stat in self._baseline.statistics("lineno")[: self.top_limit]
+            ],
+        }
+
+    def diff(self, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Comparar el heap actual contra el snapshot de referencia
+
+        Args:
+            limit: Sitios de asignación a devolver
+
+        Returns:
+            Sitios que más crecieron desde la referencia, o None sin referencia
+        """
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return None
+        stats = tracemalloc.take_snapshot().compare_to(self._baseline, "lineno")
+        return {
+            "baseline_at": self._baseline_at,
+            "growth_kb": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+            "top_growth": [_format_stat(stat) for stat in stats[:limit]],
+        }
+
+    def stop_tracing(self) -> bool:
+        """
+        Detener tracemalloc y descartar la referencia
+
+        Returns:
+            True si tracemalloc estaba activo
+        """
+        was_tracing = tracemalloc.is_tracing()
+        self._baseline = None
+        self._baseline_at = None
+        if was_tracing:
+            tracemalloc.stop()
+            logger.info("tracemalloc_stopped")
+        return was_tracing
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado del monitor"""
+        return {
+            "running": self._running,
+            "interval": self.interval,
+            "samples": len(self._history),
+            "watches": list(self._watches),
+            "alert_sizes": {name: self.alert_size(name) for name in self._watches},
+            "alerting": sorted(self._alerting),
+            "tracemalloc": tracemalloc.is_tracing(),
+            "baseline_at": self._baseline_at,
+        }
+
+
+# Instancia global del monitor de memoria
+memory_monitor = MemoryMonitor(
+    interval=settings.memory_monitor_interval,
+    history_size=settings.memory_history_size,
+    top_limit=settings.memory_top_limit,
+    rss_alert_mb=settings.memory_rss_alert_mb,
+    container_alert_size=settings.memory_container_alert_size,
+    container_alert_sizes=settings.memory_container_alert_sizes,
+    tracemalloc_frames=settings.memory_tracemalloc_frames,
+    enabled=settings.memory_monitor_enabled,
+)
@@ -0,0 +1,316 @@
+"""
+Métricas en proceso con exposición en formato de texto de Prometheus
+
+Contadores, gauges e histogramas en memoria, sin dependencias externas ni
+servicios adicionales: registrar un valor es una búsqueda en un diccionario
+y unas pocas sumas. GET /metrics (app/api/routes/metrics.py) completa los
+gauges de estado (pool de BD, circuit breakers, DLQ) y renderiza todo en el
+formato de exposición 0.0.4.
+
+Las métricas se declaran al final de este módulo para tener en un solo
+lugar los nombres y etiquetas que emite el servicio.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+LOOP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """Métrica con etiquetas; cada combinación de valores es una serie"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Inicializar métrica
+
+        Args:
+            name: Nombre Prometheus (snake_case, con unidad)
+            documentation: Texto de ayuda (# HELP)
+            labelnames: Nombres de las etiquetas
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: object):
+        """
+        Serie para una combinación de valores de etiquetas
+
+        Args:
+            *values: Valores en el orden de labelnames
+
+        Returns:
+            Serie (inc/set/observe)
+        """
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def clear(self) -> None:
+        """Eliminar todas las series (gauges recalculados en cada scrape)"""
+        self._children.clear()
+
+    def _label_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{self._label_text(key)} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+    def render(self) -> List[str]:
+        """Líneas de exposición de la métrica"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class Counter(Metric):
+    """Contador monótono"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class Gauge(Metric):
+    """Valor que sube y baja"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class Histogram(Metric):
+    """Histograma de buckets acumulados, suma y conteo"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{self._label_text(key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro de métricas del proceso"""
+
+    def __init__(self, enabled: bool = True):
+        """
+        Inicializar registro
+
+        Args:
+            enabled: Si es False los puntos instrumentados no registran nada
+        """
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Exposición en formato de texto de Prometheus
+
+        Returns:
+            Texto con todas las métricas registradas
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Instancia global del registro de métricas
+metrics = MetricsRegistry(enabled=settings.metrics_enabled)
+
+# HTTP entrante
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "Requests HTTP atendidos", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta", ("method", "route")
+)
+
+# Etapas de los pipelines (app.core.tracing)
+PIPELINE_STAGE_DURATION = metrics.histogram(
+    "pipeline_stage_duration_seconds", "Duración de cada etapa de los pipelines de eventos, mensajes y viajes", ("stage",)
+)
+
+# Event loop (app.core.loop_monitor)
+EVENT_LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "Retraso del event loop en despertar una tarea dormida", (), LOOP_BUCKETS
+)
+EVENT_LOOP_SLOW_CALLBACKS = metrics.histogram(
+    "event_loop_slow_callback_seconds", "Callbacks o pasos de tarea que retuvieron el loop sobre el umbral",
+    (), LOOP_BUCKETS,
+)
+
+# Memoria (app.core.memory_monitor)
+PROCESS_RSS = metrics.gauge(
+    "process_resident_memory_bytes", "Memoria residente del proceso"
+)
+MEMORY_WATCHED_SIZE = metrics.gauge(
+    "memory_watched_container_size", "Elementos en estructuras en memoria vigiladas", ("container",)
+)
+
+# Ingesta de Wialon
+WIALON_EVENTS_DROPPED = metrics.counter(
+    "wialon_events_dropped_total", "Eventos de Wialon descartados antes de cualquier trabajo en la BD", ("reason",)
+)
+
+# Base de datos
+DB_QUERY_DURATION = metrics.histogram(
+    "db_query_duration_seconds", "Latencia de queries por método llamador", ("caller",), DB_BUCKETS
+)
+DB_POOL_ACQUIRE_DURATION = metrics.histogram(
+    "db_pool_acquire_seconds", "Espera para obtener una conexión del pool", (), DB_BUCKETS
+)
+DB_POOL_CONNECTIONS = metrics.gauge(
+    "db_pool_connections", "Conexiones del pool aiomysql", ("state",)
+)
+
+# Circuit breakers
+CIRCUIT_BREAKER_STATE = metrics.gauge(
+    "circuit_breaker_state", "Estado del circuit breaker (0=closed, 1=half_open, 2=open)", ("breaker",)
+)
+CIRCUIT_BREAKER_FAILURES = metrics.gauge(
+    "circuit_breaker_failures", "Fallos consecutivos registrados por el circuit breaker", ("breaker",)
+)
+
+# Webhooks salientes (Flowtify)
+WEBHOOK_DELIVERY_DURATION = metrics.histogram(
+    "webhook_delivery_duration_seconds", "Latencia de entrega de webhooks", ("webhook_type",)
+)
+WEBHOOK_DELIVERIES = metrics.counter(
+    "webhook_deliveries_total", "Intentos de entrega de webhooks por resultado", ("webhook_type", "outcome")
+)
+WEBHOOK_DLQ_SIZE = metrics.gauge(
+    "webhook_dlq_size", "Webhooks sin resolver en webhook_dead_letter_queue"
+)
+
+# Clientes HTTP salientes (Evolution API, Floatify)
+HTTP_CLIENT_DURATION = metrics.histogram(
+    "http_client_request_duration_seconds", "Latencia de llamadas a APIs externas", ("client", "outcome")
+)
+
+# Gemini
+GEMINI_DURATION = metrics.histogram(
+    "gemini_request_duration_seconds", "Latencia de llamadas a Gemini (incluye espera de turno)",
+    ("operation", "outcome"), LLM_BUCKETS,
+)
+GEMINI_TOKENS = metrics.counter(
+    "gemini_tokens_total", "Tokens consumidos en Gemini", ("operation", "kind")
+)
+GEMINI_CONCURRENCY = metrics.gauge(
+    "gemini_calls", "Llamadas a Gemini en curso y en espera de turno", ("state",)
+)
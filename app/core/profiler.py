@@ -0,0 +1,309 @@
+"""
+Profiler de muestreo bajo demanda para el proceso en producción
+
+Un hilo muestrea cada PROFILER_INTERVAL_MS dos cosas del event loop:
+
+- La pila que se está ejecutando en el hilo del loop (sys._current_frames()).
+  Si no hay tarea en curso y la pila termina en el propio loop (el selector
+  de asyncio, o Runner.run bajo uvloop, cuyo loop no deja frames de Python)
+  la muestra cuenta como [idle]. De aquí sale el tiempo propio (self-time)
+  por función.
+- La cadena de awaits de cada tarea suspendida (cr_await), para que el tiempo
+  esperando a MySQL, Evolution, Flowtify o Gemini se atribuya a la llamada
+  de EventService/WebhookService que lo originó y no al selector.
+
+El resultado es un archivo de pilas colapsadas ("frame;frame;frame N"),
+compatible con flamegraph.pl, speedscope e inferno, con las raíces [running],
+[awaiting] e [idle], más el top de funciones por tiempo propio y el top de
+puntos de espera dentro de app.
+
+Con un filtro de ruta solo se muestrea mientras hay al menos un request que
+coincide en curso, y la captura termina al completar N requests o al vencer
+el tiempo, lo que ocurra primero.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import asyncio
+import sys
+import threading
+import time
+
+from app.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Módulos de infraestructura que se recortan de la raíz de las pilas
+_ROOT_MODULE_PREFIXES = ("asyncio", "selectors", "threading", "concurrent", "uvloop", "runpy")
+# Frames máximos por pila muestreada
+MAX_DEPTH = 128
+
+
+def _frame_label(frame, cache: Dict[Any, str]) -> str:
+    """module:qualname del frame (cacheado por code object)"""
+    code = frame.f_code
+    label = cache.get(code)
+    if label is None:
+        module = frame.f_globals.get("__name__", "?")
+        label = cache[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+
+def _is_infrastructure(label: str) -> bool:
+    return label.startswith(_ROOT_MODULE_PREFIXES)
+
+
+class SamplingProfiler:
+    """Profiler de muestreo del event loop, una captura a la vez"""
+
+    def __init__(self, interval_ms: float = 10.0, max_seconds: float = 60.0):
+        """
+        Inicializar profiler
+
+        Args:
+            interval_ms: Intervalo de muestreo por defecto
+            max_seconds: Duración máxima de una captura
+        """
+        self.interval_ms = interval_ms
+        self.max_seconds = max_seconds
+
+        self._active = False
+        self._route: Optional[str] = None
+        self._max_requests: Optional[int] = None
+        self._matching_in_flight = 0
+        self._requests_completed = 0
+        self._done: Optional[asyncio.Event] = None
+        self._owner: Optional[asyncio.Task] = None
+
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._labels: Dict[Any, str] = {}
+
+    @property
+    def active(self) -> bool:
+        """Indica si hay una captura en curso"""
+        return self._active
+
+    # ------------------------------------------------------------------
+    # Hooks del middleware
+    # ------------------------------------------------------------------
+
+    def request_started(self, path: str) -> bool:
+        """
+        Marcar el inicio de un request (barato cuando no hay captura)
+
+        Args:
+            path: Path del request
+
+        Returns:
+            True si el request cuenta para la captura en curso
+        """
+        if not self._active or "/admin/profiler" in path:
+            return False
+        if self._route is not None and self._route not in path:
+            return False
+        self._matching_in_flight += 1
+        return True
+
+    def request_finished(self) -> None:
+        """Marcar el fin de un request para el que request_started devolvió True"""
+        self._matching_in_flight = max(0, self._matching_in_flight - 1)
+        if not self._active:
+            return
+        self._requests_completed += 1
+        if self._max_requests and self._requests_completed >= self._max_requests and self._done:
+            self._done.set()
+
+    # ------------------------------------------------------------------
+    # Captura
+    # ------------------------------------------------------------------
+
+    async def profile(
+        self,
+        seconds: float,
+        requests: Optional[int] = None,
+        route: Optional[str] = None,
+        interval_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Muestrear el proceso hasta completar la captura
+
+        Args:
+            seconds: Duración máxima (acotada por max_seconds)
+            requests: Terminar al completar este número de requests que coinciden
+            route: Subcadena del path que deben tener los requests a perfilar
+            interval_ms: Intervalo de muestreo (por defecto el configurado)
+
+        Returns:
+            Pilas colapsadas, top de tiempo propio y top de puntos de espera
+
+        Raises:
+            RuntimeError: Si ya hay una captura en curso
+        """
+        if self._active:
+            raise RuntimeError("profiling session already running")
+
+        seconds = min(seconds, self.max_seconds)
+        interval = (interval_ms or self.interval_ms) / 1000
+        loop = asyncio.get_running_loop()
+
+        self._route = route
+        self._max_requests = requests
+        self._matching_in_flight = 0
+        self._requests_completed = 0
+        self._done = asyncio.Event()
+        self._owner = asyncio.current_task()
+        self._stacks = Counter()
+        self._samples = 0
+        self._labels = {}
+        self._active = True
+
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_loop,
+            args=(loop, threading.get_ident(), interval, stop),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        logger.info("profiler_started", seconds=seconds, requests=requests, route=route,
+                    interval_ms=interval * 1000)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join, 1.0)
+            self._active = False
+            self._done = None
+            self._owner = None
+
+        elapsed = time.perf_counter() - started
+        result = self._build_result(elapsed, interval)
+        logger.info(
+            "profiler_finished",
+            duration_s=result["duration_s"],
+            samples=result["samples"],
+            requests_completed=result["requests_completed"],
+        )
+        return result
+
+    def _sample_loop(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        interval: float,
+        stop: threading.Event,
+    ) -> None:
+        """Hilo de muestreo"""
+        while not stop.wait(interval):
+            if self._route is not None and self._matching_in_flight == 0:
+                continue
+            try:
+                self._take_sample(loop, loop_thread_id)
+            except Exception:
+                # Las estructuras del loop cambian mientras se leen; se descarta la muestra
+                continue
+
+    def _take_sample(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        """Registrar la pila en ejecución y las cadenas de await de las tareas suspendidas"""
+        labels = self._labels
+        frame = sys._current_frames().get(loop_thread_id)
+        running_stack = []
+        while frame is not None and len(running_stack) < MAX_DEPTH:
+            running_stack.append(_frame_label(frame, labels))
+            frame = frame.f_back
+        running_stack.reverse()
+
+        while running_stack and _is_infrastructure(running_stack[0]):
+            running_stack.pop(0)
+        # Idle según el estado del loop: ninguna tarea en curso y la hoja es
+        # el propio loop (no el callback de la app que esté corriendo)
+        current = asyncio.tasks._current_tasks.get(loop)
+        if not running_stack or (current is None and _is_infrastructure(running_stack[-1])):
+            self._stacks["[idle]"] += 1
+        else:
+            self._stacks[";".join(["[running]", *running_stack])] += 1
+
+        for task in asyncio.all_tasks(loop):
+            if task is current or task is self._owner:
+                continue
+            await_stack = self._await_stack(task.get_coro())
+            if await_stack:
+                self._stacks[";".join(["[awaiting]", *await_stack])] += 1
+
+        self._samples += 1
+
+    def _await_stack(self, coro: Any) -> List[str]:
+        """Cadena de awaits de una corrutina suspendida, de la raíz a la hoja"""
+        labels = self._labels
+        stack = []
+        while coro is not None and len(stack) < MAX_DEPTH:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            stack.append(_frame_label(frame, labels))
+            awaited = getattr(coro, "cr_await", None)
+            if awaited is None:
+                awaited = getattr(coro, "gi_yieldfrom", None)
+            if awaited is not None and not hasattr(awaited, "cr_frame") and not hasattr(awaited, "gi_frame"):
+                # Hoja: un Future (I/O, sleep, Queue.get, otra tarea); el
+                # Future en C se ve como su iterador
+                name = type(awaited).__name__
+                stack.append("[Future]" if name == "FutureIter" else f"[{name}]")
+                break
+            coro = awaited
+        return stack
+
+    def _build_result(self, elapsed: float, interval: float) -> Dict[str, Any]:
+        """Armar el resultado de la captura"""
+        running_samples = 0
+        self_time: Counter = Counter()
+        awaiting: Counter = Counter()
+        for stack, count in self._stacks.items():
+            frames = stack.split(";")
+            if frames[0] == "[running]":
+                running_samples += count
+                self_time[frames[-1]] += count
+            elif frames[0] == "[awaiting]":
+                # Punto de espera: el frame más profundo del propio servicio
+                app_frames = [f for f in frames[1:] if f.startswith("app.")]
+                if app_frames:
+                    awaiting[app_frames[-1]] += count
+
+        def top(counter: Counter, total: int) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "function": name,
+                    "samples": count,
+                    "percent": round(count / total * 100, 2) if total else 0.0,
+                    "estimated_ms": round(count * interval * 1000, 1),
+                }
+                for name, count in counter.most_common(25)
+            ]
+
+        collapsed = "\n".join(
+            f"{stack} {count}" for stack, count in self._stacks.most_common()
+        )
+        return {
+            "duration_s": round(elapsed, 3),
+            "interval_ms": interval * 1000,
+            "samples": self._samples,
+            "running_samples": running_samples,
+            "idle_samples": self._stacks.get("[idle]", 0),
+            "route": self._route,
+            "requests_completed": self._requests_completed,
+            "top_self": top(self_time, running_samples),
+            "top_awaiting": top(awaiting, sum(awaiting.values())),
+            "collapsed": collapsed + "\n" if collapsed else "",
+        }
+
+
+# Instancia global del profiler de muestreo
+profiler = SamplingProfiler(
+    interval_ms=settings.profiler_interval_ms,
+    max_seconds=settings.profiler_max_seconds,
+)
@@ -0,0 +1,155 @@
+"""
+Estadísticas de queries a la base de datos por request
+
+Database registra en el QueryStats activo del contexto cada query ejecutada
+(también las que pasan por acquire() y transaction() con cursor directo),
+las filas devueltas o afectadas, el tiempo de ida y vuelta y las conexiones
+tomadas del pool. RequestLoggingMiddleware abre un QueryStats por request y
+lo publica en headers X-DB-* y en el log request_completed; los workers de
+ingesta hacen lo mismo por evento procesado.
+
+El mismo cursor instrumentado alimenta el histograma db_query_duration_seconds
+etiquetado con el método que ejecutó la query (p. ej.
+TripRepository.find_active_by_unit).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+import sys
+import time
+
+from app.core.metrics import DB_QUERY_DURATION, metrics
+
+# Módulos que envuelven queries y no cuentan como llamador
+_WRAPPER_MODULES = frozenset({__name__, "app.core.database", "contextlib"})
+
+
+@dataclass
+class QueryStats:
+    """Contadores de acceso a la base de datos de un request o evento"""
+
+    queries: int = 0
+    rows: int = 0
+    time_ms: float = 0.0
+    connections: int = 0
+    parent: Optional["QueryStats"] = field(default=None, repr=False)
+
+    def record_query(self, rows: int, elapsed_ms: float) -> None:
+        """
+        Registrar una query (y propagarla al QueryStats externo si lo hay)
+
+        Args:
+            rows: Filas devueltas o afectadas
+            elapsed_ms: Tiempo de ida y vuelta
+        """
+        stats: Optional[QueryStats] = self
+        while stats is not None:
+            stats.queries += 1
+            stats.rows += rows
+            stats.time_ms += elapsed_ms
+            stats = stats.parent
+
+    def record_connection(self) -> None:
+        """Registrar una conexión tomada del pool"""
+        stats: Optional[QueryStats] = self
+        while stats is not None:
+            stats.connections += 1
+            stats = stats.parent
+
+    def as_log_fields(self) -> Dict[str, Any]:
+        """Campos para structlog"""
+        return {
+            "db_queries": self.queries,
+            "db_rows": self.rows,
+            "db_time_ms": round(self.time_ms, 2),
+            "db_connections": self.connections,
+        }
+
+    def as_headers(self) -> Dict[str, str]:
+        """Headers de respuesta"""
+        return {
+            "X-DB-Queries": str(self.queries),
+            "X-DB-Rows": str(self.rows),
+            "X-DB-Time-Ms": str(round(self.time_ms, 2)),
+            "X-DB-Connections": str(self.connections),
+        }
+
+
+_query_stats_var: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    """
+    Obtener el QueryStats activo
+
+    Returns:
+        QueryStats del contexto actual o None si no se está midiendo
+    """
+    return _query_stats_var.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Medir las queries ejecutadas dentro del bloque
+
+    Las tareas creadas dentro del bloque heredan el mismo QueryStats. Si ya
+    hay uno activo, las queries se cuentan en ambos.
+
+    Yields:
+        QueryStats que se actualiza en vivo
+    """
+    stats = QueryStats(parent=_query_stats_var.get())
+    token = _query_stats_var.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats_var.reset(token)
+
+
+def query_caller() -> str:
+    """
+    Método que originó la query en curso
+
+    Returns:
+        Nombre calificado de la primera función fuera de los envoltorios de BD
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") in _WRAPPER_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+
+class InstrumentedCursor:
+    """Proxy de cursor de aiomysql que registra cada execute en QueryStats y métricas"""
+
+    def __init__(self, cursor: Any, stats: Optional[QueryStats]):
+        self._cursor = cursor
+        self._stats = stats
+
+    async def execute(self, query: str, args: Any = None) -> int:
+        started = time.perf_counter()
+        try:
+            return await self._cursor.execute(query, args)
+        finally:
+            self._record(time.perf_counter() - started)
+
+    async def executemany(self, query: str, args: Any) -> int:
+        started = time.perf_counter()
+        try:
+            return await self._cursor.executemany(query, args)
+        finally:
+            self._record(time.perf_counter() - started)
+
+    def _record(self, elapsed_s: float) -> None:
+        if self._stats is not None:
+            self._stats.record_query(max(self._cursor.rowcount or 0, 0), elapsed_s * 1000)
+        if metrics.enabled:
+            DB_QUERY_DURATION.labels(query_caller()).observe(elapsed_s)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
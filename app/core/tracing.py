@@ -0,0 +1,129 @@
+"""
+Spans de tiempo por etapa para los pipelines de eventos, mensajes y viajes
+
+span("wialon.trip_lookup") mide un bloque y lo registra en el histograma
+pipeline_stage_duration_seconds y, si hay una traza activa en el contexto,
+en la lista de spans de esa traza. RequestLoggingMiddleware abre una traza
+por request (con el trace_id de app.core.context) y la publica en el header
+Server-Timing; los workers de ingesta la abren por evento y la agregan al
+log del evento procesado.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import time
+
+from app.config import settings
+from app.core.context import get_trace_id
+from app.core.metrics import PIPELINE_STAGE_DURATION, metrics
+
+# Tope de spans por traza (acota el header y la memoria en requests anómalos)
+MAX_SPANS = 64
+
+
+@dataclass
+class Trace:
+    """Spans registrados durante un request o evento"""
+
+    trace_id: str
+    spans: List[Tuple[str, float]] = field(default_factory=list)
+
+    def record(self, name: str, duration_ms: float) -> None:
+        """
+        Registrar un span terminado
+
+        Args:
+            name: Nombre de la etapa
+            duration_ms: Duración en milisegundos
+        """
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((name, duration_ms))
+
+    def stage_totals(self) -> Dict[str, float]:
+        """
+        Tiempo acumulado por etapa, en orden de primera aparición
+
+        Returns:
+            Diccionario {etapa: milisegundos}
+        """
+        totals: Dict[str, float] = {}
+        for name, duration_ms in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration_ms
+        return totals
+
+    def as_log_fields(self) -> Dict[str, Any]:
+        """Campos para structlog"""
+        if not self.spans:
+            return {}
+        return {"stages_ms": {name: round(ms, 2) for name, ms in self.stage_totals().items()}}
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        """
+        Valor del header Server-Timing
+
+        Args:
+            total_ms: Duración total del request (se agrega como "total")
+
+        Returns:
+            Métricas separadas por comas (p. ej. "wialon.trip_lookup;dur=1.2")
+        """
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.stage_totals().items()]
+        if total_ms is not None:
+            entries.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(entries)
+
+
+_trace_var: ContextVar[Optional[Trace]] = ContextVar("stage_trace", default=None)
+
+
+def get_trace() -> Optional[Trace]:
+    """
+    Obtener la traza activa
+
+    Returns:
+        Trace del contexto actual o None si no se está trazando
+    """
+    return _trace_var.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    """
+    Abrir una traza para el bloque, identificada con el trace_id del contexto
+
+    Yields:
+        Trace que acumula los spans del bloque
+    """
+    trace = Trace(trace_id=get_trace_id())
+    token = _trace_var.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace_var.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Medir una etapa del pipeline
+
+    El tiempo se registra aunque el bloque lance una excepción.
+
+    Args:
+        name: Nombre de la etapa ("<pipeline>.<etapa>")
+    """
+    if not settings.stage_timing_enabled:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if metrics.enabled:
+            PIPELINE_STAGE_DURATION.labels(name).observe(elapsed)
+        trace = _trace_var.get()
+        if trace is not None:
+            trace.record(name, elapsed * 1000)
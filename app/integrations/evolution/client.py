@@ -5,6 +5,7 @@ import httpx
 from typing import Dict, Any, List, Optional
 from app.core.logging import get_logger
 from app.core.errors import EvolutionAPIError
+from app.integrations.http_pool import PooledHTTPClient, get_http_pool
 from app.integrations.evolution.schemas import (
     SendTextRequest,
     CreateGroupRequest,
@@ -14,15 +15,18 @@ from app.integrations.evolution.schemas import (
 
 logger = get_logger(__name__)
 
-# Configuración para resolver problemas de DNS en Windows
-HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=5, max_connections=10)
-HTTPX_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
-
 
 class EvolutionClient:
     """Cliente para interactuar con Evolution API"""
 
-    def __init__(self, api_url: str, api_key: str, instance: str, timeout: int = 30):
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        instance: str,
+        timeout: int = 30,
+        http_client: Optional[PooledHTTPClient] = None,
+    ):
         """
         Inicializar cliente de Evolution API
 
@@ -31,6 +35,7 @@ class EvolutionClient:
             api_key: API key para autenticación
             instance: Nombre de la instancia
             timeout: Timeout para las peticiones (segundos)
+            http_client: Cliente HTTP compartido (por defecto el pool "evolution")
         """
         self.api_url = api_url.rstrip("/")
         self.api_key = api_key
@@ -40,6 +45,12 @@ class EvolutionClient:
             "apikey": self.api_key,
             "Content-Type": "application/json",
         }
+        # Pool keep-alive compartido: evita un handshake TCP+TLS por mensaje
+        self.http = http_client or get_http_pool("evolution", timeout=timeout)
+
+    async def close(self) -> None:
+        """Cerrar el pool de conexiones HTTP"""
+        await self.http.aclose()
 
     async def send_text(self, number: str, text: str) -> Dict[str, Any]:
         """
@@ -56,24 +67,17 @@ class EvolutionClient:
             url = f"{self.api_url}/message/sendText/{self.instance}"
             payload = SendTextRequest(number=number, text=text).model_dump()
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-
-                logger.info(
-                    "whatsapp_message_sent",
-                    number=number,
-                    text_length=len(text),
-                    status_code=response.status_code,
-                )
-
-                return response.json()
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
+
+            logger.info(
+                "whatsapp_message_sent",
+                number=number,
+                text_length=len(text),
+                status_code=response.status_code,
+            )
+
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             logger.error(
@@ -105,18 +109,11 @@ class EvolutionClient:
             url = f"{self.api_url}/message/sendWhatsAppAudio/{self.instance}"
             payload = {"number": number, "audioMessage": {"audio": audio_url}}
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
 
-                logger.info("whatsapp_audio_sent", number=number)
-                return response.json()
+            logger.info("whatsapp_audio_sent", number=number)
+            return response.json()
 
         except Exception as e:
             logger.error("evolution_api_error", error=str(e))
@@ -149,30 +146,23 @@ class EvolutionClient:
                 participants_count=len(participants)
             )
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-
-                data = response.json()
-                
-                # Normalizar la respuesta: agregar 'id' si solo existe 'groupId'
-                if "groupId" in data and "id" not in data:
-                    data["id"] = data["groupId"]
-                
-                logger.info(
-                    "whatsapp_group_created",
-                    subject=subject,
-                    participants_count=len(participants),
-                    group_id=data.get("groupId") or data.get("id"),
-                )
-
-                return data
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
+
+            data = response.json()
+
+            # Normalizar la respuesta: agregar 'id' si solo existe 'groupId'
+            if "groupId" in data and "id" not in data:
+                data["id"] = data["groupId"]
+
+            logger.info(
+                "whatsapp_group_created",
+                subject=subject,
+                participants_count=len(participants),
+                group_id=data.get("groupId") or data.get("id"),
+            )
+
+            return data
 
         except Exception as e:
             logger.error("evolution_api_error", error=str(e))
@@ -199,23 +189,16 @@ class EvolutionClient:
                 "participants": participants,
             }
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
 
-                logger.info(
-                    "whatsapp_participants_added",
-                    group_jid=group_jid,
-                    participants_count=len(participants),
-                )
+            logger.info(
+                "whatsapp_participants_added",
+                group_jid=group_jid,
+                participants_count=len(participants),
+            )
 
-                return response.json()
+            return response.json()
 
         except Exception as e:
             logger.error("evolution_api_error", error=str(e))
@@ -234,17 +217,10 @@ class EvolutionClient:
         try:
             url = f"{self.api_url}/group/fetchAllGroups/{self.instance}"
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
+            response = await self.http.get(url, headers=self.headers)
+            response.raise_for_status()
 
-                return response.json()
+            return response.json()
 
         except Exception as e:
             logger.error("evolution_api_error", error=str(e))
@@ -261,18 +237,11 @@ class EvolutionClient:
             Bytes del archivo
         """
         try:
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.get(media_url)
-                response.raise_for_status()
-
-                logger.info("whatsapp_media_downloaded", url=media_url)
-                return response.content
+            response = await self.http.get(media_url)
+            response.raise_for_status()
+
+            logger.info("whatsapp_media_downloaded", url=media_url)
+            return response.content
 
         except Exception as e:
             logger.error("evolution_api_error", error=str(e))
@@ -302,23 +271,16 @@ class EvolutionClient:
                 url=url
             )
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                # Usando DELETE según especificación típica de Evolution API
-                response = await client.delete(url, headers=self.headers, params=params)
-                response.raise_for_status()
-
-                logger.info(
-                    "whatsapp_group_left",
-                    group_jid=group_jid,
-                    status_code=response.status_code,
-                )
-                return response.json()
+            # Usando DELETE según especificación típica de Evolution API
+            response = await self.http.delete(url, headers=self.headers, params=params)
+            response.raise_for_status()
+
+            logger.info(
+                "whatsapp_group_left",
+                group_jid=group_jid,
+                status_code=response.status_code,
+            )
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             logger.error(
@@ -363,21 +325,14 @@ class EvolutionClient:
             # Intentar el primer endpoint
             url = possible_endpoints[0]
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-
-                logger.debug(
-                    "typing_indicator_started",
-                    number=number,
-                    status_code=response.status_code
-                )
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
+
+            logger.debug(
+                "typing_indicator_started",
+                number=number,
+                status_code=response.status_code
+            )
 
         except httpx.HTTPStatusError as e:
             logger.warning(
@@ -422,21 +377,14 @@ class EvolutionClient:
             
             url = possible_endpoints[0]
 
-            async with httpx.AsyncClient(
-                timeout=HTTPX_TIMEOUT,
-                limits=HTTPX_LIMITS,
-                trust_env=False,
-                http2=False,
-                verify=True
-            ) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
-
-                logger.debug(
-                    "typing_indicator_stopped",
-                    number=number,
-                    status_code=response.status_code
-                )
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
+
+            logger.debug(
+                "typing_indicator_stopped",
+                number=number,
+                status_code=response.status_code
+            )
 
         except httpx.HTTPStatusError as e:
             logger.warning(
@@ -5,6 +5,7 @@ import httpx
 from typing import Dict, Any, Optional
 from app.core.logging import get_logger
 from app.core.errors import FloatifyAPIError
+from app.integrations.http_pool import PooledHTTPClient, get_http_pool
 
 logger = get_logger(__name__)
 
@@ -17,6 +18,7 @@ class FloatifyClient:
         api_url: Optional[str] = None,
         api_key: Optional[str] = None,
         timeout: int = 30,
+        http_client: Optional[PooledHTTPClient] = None,
     ):
         """
         Inicializar cliente de Floatify
@@ -25,6 +27,7 @@ class FloatifyClient:
             api_url: URL base de la API de Floatify
             api_key: API key para autenticación
             timeout: Timeout para las peticiones (segundos)
+            http_client: Cliente HTTP compartido (por defecto el pool "floatify")
         """
         self.api_url = api_url.rstrip("/") if api_url else None
         self.api_key = api_key
@@ -34,6 +37,12 @@ class FloatifyClient:
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
 
+        self.http = http_client or get_http_pool("floatify", timeout=timeout)
+
+    async def close(self) -> None:
+        """Cerrar el pool de conexiones HTTP"""
+        await self.http.aclose()
+
     async def notify_trip_completed(
         self, trip_data: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
@@ -53,17 +62,16 @@ class FloatifyClient:
         try:
             url = f"{self.api_url}/webhooks/trip-completed"
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=trip_data, headers=self.headers)
-                response.raise_for_status()
+            response = await self.http.post(url, json=trip_data, headers=self.headers)
+            response.raise_for_status()
 
-                logger.info(
-                    "floatify_notified",
-                    event="trip_completed",
-                    trip_id=trip_data.get("trip_id"),
-                )
+            logger.info(
+                "floatify_notified",
+                event="trip_completed",
+                trip_id=trip_data.get("trip_id"),
+            )
 
-                return response.json()
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             logger.error(
@@ -99,12 +107,11 @@ class FloatifyClient:
             url = f"{self.api_url}/webhooks/events"
             payload = {"event_type": event_type, "data": event_data}
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
+            response = await self.http.post(url, json=payload, headers=self.headers)
+            response.raise_for_status()
 
-                logger.info("floatify_notified", event=event_type)
-                return response.json()
+            logger.info("floatify_notified", event=event_type)
+            return response.json()
 
         except Exception as e:
             logger.error("floatify_api_error", error=str(e), event=event_type)
@@ -1,11 +1,14 @@
 """
 Cliente para Gemini AI
 """
+import asyncio
+import time
 import google.generativeai as genai
 from typing import Dict, Any, Optional
 import json
 from app.core.logging import get_logger
-from app.core.errors import GeminiAPIError
+from app.core.errors import GeminiAPIError, GeminiTimeoutError
+from app.core.metrics import GEMINI_DURATION, GEMINI_TOKENS, metrics
 from app.integrations.gemini.prompts import (
     get_message_classification_prompt,
     SYSTEM_PROMPT,
@@ -13,24 +16,70 @@ from app.integrations.gemini.prompts import (
 
 logger = get_logger(__name__)
 
+# Clasificación por defecto cuando Gemini no responde a tiempo o con JSON inválido
+DEFAULT_CLASSIFICATION: Dict[str, Any] = {
+    "intent": "other",
+    "confidence": 0.5,
+    "entities": {},
+    "response": "Entendido. ¿Puedes darme más detalles?",
+    "action": "no_action",
+    "new_substatus": None,
+}
+
 
 class GeminiClient:
     """Cliente para interactuar con Gemini AI"""
 
-    def __init__(self, api_key: str, model: str = "gemini-flash-latest", timeout: int = 60):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-flash-latest",
+        timeout: int = 60,
+        max_concurrency: int = 4,
+        api_endpoint: Optional[str] = None,
+    ):
         """
         Inicializar cliente de Gemini AI
 
         Args:
             api_key: API key de Google
+            model: Nombre del modelo
+            timeout: Tiempo máximo por llamada, incluyendo la espera en cola (segundos)
+            max_concurrency: Máximo de llamadas simultáneas a Gemini
+            api_endpoint: Endpoint REST alternativo (p. ej. stub local); None = Google
         """
         self.api_key = api_key
         self.model_name = model
         self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.api_endpoint = api_endpoint
 
         # Configurar Gemini
-        genai.configure(api_key=self.api_key)
+        if api_endpoint:
+            genai.configure(
+                api_key=self.api_key,
+                transport="rest",
+                client_options={"api_endpoint": api_endpoint},
+            )
+        else:
+            genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel(model)
+        # Modelo base sin system_instruction para transcripción
+        self.transcription_model = genai.GenerativeModel(model)
+
+        # Limita las llamadas en vuelo; el resto espera en cola
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Métricas
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
 
     async def classify_message(
         self, text: str, context: Dict[str, Any]
@@ -49,7 +98,10 @@ class GeminiClient:
             prompt = get_message_classification_prompt(text, context)
 
             # Generar respuesta
-            response = await self._generate_content(prompt)
+            try:
+                response = await self._generate_content(prompt, operation="classify")
+            except GeminiTimeoutError:
+                return dict(DEFAULT_CLASSIFICATION)
             text_response = response.text.strip()
 
             # Limpiar markdown si existe
@@ -74,14 +126,7 @@ class GeminiClient:
                     response=text_response[:200],
                 )
                 # Retornar respuesta por defecto
-                return {
-                    "intent": "other",
-                    "confidence": 0.5,
-                    "entities": {},
-                    "response": "Entendido. ¿Puedes darme más detalles?",
-                    "action": "no_action",
-                    "new_substatus": None,
-                }
+                return dict(DEFAULT_CLASSIFICATION)
 
         except Exception as e:
             logger.error("gemini_classification_error", error=str(e))
@@ -112,10 +157,6 @@ class GeminiClient:
                 context=context
             )
             
-            # Crear modelo específico para transcripción
-            # Usamos el modelo base sin system_instruction para transcripción
-            transcription_model = genai.GenerativeModel(self.model_name)
-            
             # Preparar el audio como parte del contenido
             # Gemini acepta audio inline con base64
             import base64
@@ -143,14 +184,16 @@ class GeminiClient:
                            prompt=transcription_prompt,
                            prompt_length=len(transcription_prompt),
                            model=self.model_name)
-                response = transcription_model.generate_content(
+                response = await self._generate_content(
                     [transcription_prompt, audio_part],
+                    model=self.transcription_model,
                     generation_config=genai.types.GenerationConfig(
                         temperature=0.1,  # Temperatura muy baja para transcripción más literal
                         max_output_tokens=512,
                         top_p=0.95,
                         top_k=40,
                     ),
+                    operation="transcribe",
                 )
                 
                 transcription = response.text.strip()
@@ -223,39 +266,174 @@ Transcribe el audio en español. Devuelve SOLO el texto exacto que se dice."""
             Respuesta generada
         """
         try:
-            response = await self._generate_content(prompt)
+            response = await self._generate_content(prompt, operation="generate")
             return response.text.strip()
 
         except Exception as e:
             logger.error("gemini_generation_error", error=str(e))
             raise GeminiAPIError(f"Error al generar respuesta: {str(e)}")
 
-    async def _generate_content(self, prompt: str) -> Any:
+    async def _generate_content(
+        self,
+        contents: Any,
+        model: Optional[Any] = None,
+        generation_config: Optional[Any] = None,
+        operation: str = "generate",
+    ) -> Any:
         """
-        Generar contenido usando el modelo
+        Generar contenido usando el modelo sin bloquear el event loop
+
+        Usa la API asíncrona del SDK, limitada por un semáforo de concurrencia.
+        El timeout cubre la espera en cola y la llamada; al excederse la
+        llamada se cancela. Con endpoint REST la llamada corre en un hilo que
+        no se puede interrumpir, así que conserva su cupo hasta terminar.
 
         Args:
-            prompt: Prompt para el modelo
+            contents: Prompt o contenido multimodal para el modelo
+            model: Modelo a usar (por defecto el de clasificación)
+            generation_config: Configuración de generación
+            operation: Nombre de la operación (para logs)
 
         Returns:
             Respuesta del modelo
+
+        Raises:
+            GeminiTimeoutError: Si se excede self.timeout
+            GeminiAPIError: Si la API falla
         """
+        if generation_config is None:
+            generation_config = genai.types.GenerationConfig(
+                temperature=0.7,
+                max_output_tokens=1024,
+            )
+
+        started_at = time.perf_counter()
+        outcome = "error"
         try:
-            # Gemini no tiene async nativo, usamos sync
-            # En producción, considera usar un executor para no bloquear
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.7,
-                    max_output_tokens=1024,
-                ),
+            response = await asyncio.wait_for(
+                self._call_model(model or self.model, contents, generation_config),
+                timeout=self.timeout,
             )
+            outcome = "ok"
+            self._record_tokens(operation, response)
             return response
 
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            outcome = "timeout"
+            logger.warning("gemini_timeout", operation=operation, timeout=self.timeout)
+            raise GeminiTimeoutError(self.timeout, context={"operation": operation})
+
         except Exception as e:
-            logger.error("gemini_api_error", error=str(e))
+            self.errors += 1
+            logger.error("gemini_api_error", error=str(e), operation=operation)
             raise GeminiAPIError(f"Error en API de Gemini: {str(e)}")
 
+        finally:
+            if metrics.enabled:
+                GEMINI_DURATION.labels(operation, outcome).observe(time.perf_counter() - started_at)
+
+    def _record_tokens(self, operation: str, response: Any) -> None:
+        """Sumar los tokens reportados en usage_metadata (si la API los incluye)"""
+        if not metrics.enabled:
+            return
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            # Versiones del SDK sin el atributo: leer el proto subyacente
+            usage = getattr(getattr(response, "_result", None), "usage_metadata", None)
+        if usage is None:
+            return
+        GEMINI_TOKENS.labels(operation, "prompt").inc(getattr(usage, "prompt_token_count", 0) or 0)
+        GEMINI_TOKENS.labels(operation, "output").inc(getattr(usage, "candidates_token_count", 0) or 0)
+
+    async def _call_model(self, model: Any, contents: Any, generation_config: Any) -> Any:
+        """
+        Esperar turno en el semáforo y ejecutar la llamada asíncrona
+
+        Args:
+            model: Modelo de Gemini
+            contents: Contenido para el modelo
+            generation_config: Configuración de generación
+
+        Returns:
+            Respuesta del modelo
+        """
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        wait_ms = (started_at - queued_at) * 1000
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+        self.in_flight += 1
+        release_now = True
+        try:
+            if self.api_endpoint:
+                # El cliente async del SDK solo soporta gRPC; con REST se usa el síncrono en un hilo
+                call = asyncio.ensure_future(asyncio.to_thread(
+                    model.generate_content,
+                    contents,
+                    generation_config=generation_config,
+                ))
+                try:
+                    return await asyncio.shield(call)
+                except asyncio.CancelledError:
+                    if not call.done():
+                        # Un hilo no se puede cancelar: el cupo se libera cuando termine
+                        release_now = False
+                        call.add_done_callback(lambda done: self._finish_call(started_at, done))
+                    raise
+            return await model.generate_content_async(
+                contents,
+                generation_config=generation_config,
+            )
+        finally:
+            if release_now:
+                self._finish_call(started_at)
+
+    def _finish_call(self, started_at: float, call: Optional[asyncio.Future] = None) -> None:
+        """
+        Liberar el cupo del semáforo y registrar la latencia de una llamada
+
+        Args:
+            started_at: Momento (perf_counter) en que la llamada obtuvo el cupo
+            call: Llamada REST que siguió en su hilo tras el timeout
+        """
+        if call is not None and not call.cancelled() and call.exception() is not None:
+            logger.warning("gemini_abandoned_call_failed", error=str(call.exception()))
+        self.in_flight -= 1
+        self._semaphore.release()
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        self.calls += 1
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener métricas de uso de Gemini
+
+        Returns:
+            Llamadas, timeouts, errores, concurrencia y latencias
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_queue_wait_ms": round(self.total_wait_ms / self.calls, 2) if self.calls else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_ms, 2),
+            "avg_latency_ms": round(self.total_latency_ms / self.calls, 2) if self.calls else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
+
     def extract_entities(self, text: str, intent: str) -> Dict[str, Any]:
         """
         Extraer entidades del texto según la intención
@@ -0,0 +1,210 @@
+"""
+Clientes HTTP compartidos con pool de conexiones keep-alive
+
+Cada integración (Evolution API, Floatify) mantiene un único httpx.AsyncClient
+de larga vida en lugar de abrir uno por petición, evitando un handshake
+TCP+TLS por mensaje. El ciclo de vida lo gestiona ServiceContainer.
+"""
+import time
+from typing import Dict, Any, Optional
+
+import httpx
+
+from app.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import HTTP_CLIENT_DURATION, metrics
+
+logger = get_logger(__name__)
+
+
+class PooledHTTPClient:
+    """httpx.AsyncClient compartido con estadísticas de reutilización y latencia"""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Inicializar cliente HTTP compartido
+
+        Args:
+            name: Nombre de la integración (para logs y estadísticas)
+            timeout: Timeout total por petición (segundos)
+            connect_timeout: Timeout de conexión (segundos)
+            max_connections: Máximo de conexiones simultáneas
+            max_keepalive_connections: Conexiones ociosas conservadas en el pool
+            keepalive_expiry: Segundos que una conexión ociosa permanece abierta
+            headers: Headers por defecto de todas las peticiones
+        """
+        self.name = name
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.headers = headers or {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Estadísticas
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente httpx subyacente (se crea de forma perezosa)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                headers=self.headers,
+                trust_env=False,
+                http2=False,
+                verify=True,
+            )
+        return self._client
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        """Hook de httpcore: cuenta las conexiones TCP nuevas"""
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Ejecutar una petición reutilizando el pool
+
+        Args:
+            method: Método HTTP
+            url: URL absoluta
+            **kwargs: Argumentos adicionales para httpx (json, params, headers...)
+
+        Returns:
+            Respuesta HTTP
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.request(
+                method, url, extensions={"trace": self._trace}, **kwargs
+            )
+            outcome = "ok" if response.status_code < 400 else "http_error"
+            return response
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.requests += 1
+            self.total_latency_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            if metrics.enabled:
+                HTTP_CLIENT_DURATION.labels(self.name, outcome).observe(latency_ms / 1000)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """Petición GET"""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """Petición POST"""
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        """Petición DELETE"""
+        return await self.request("DELETE", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """Cerrar el cliente y sus conexiones"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("http_pool_closed", pool=self.name, **self.get_stats())
+        self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener estadísticas del pool
+
+        Returns:
+            Peticiones, conexiones nuevas, tasa de reutilización y latencias
+        """
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+            "avg_latency_ms": round(self.total_latency_ms / self.requests, 2) if self.requests else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+        }
+
+
+# Registro global de pools para exponer estadísticas en /health/detailed
+http_pools: Dict[str, PooledHTTPClient] = {}
+
+
+def get_http_pool(name: str, timeout: Optional[float] = None) -> PooledHTTPClient:
+    """
+    Obtener (o crear) el pool compartido de una integración
+
+    La configuración la fija quien crea el pool; si un pool existente se pide
+    con otro timeout se conserva el original y se registra una advertencia.
+
+    Args:
+        name: Nombre de la integración ("evolution", "floatify")
+        timeout: Timeout total por petición (por defecto settings.http_timeout)
+
+    Returns:
+        Cliente HTTP compartido
+    """
+    timeout = timeout or settings.http_timeout
+    pool = http_pools.get(name)
+    if pool is not None:
+        if pool.timeout.read != timeout:
+            logger.warning(
+                "http_pool_timeout_mismatch",
+                pool=name,
+                requested_timeout=timeout,
+                pool_timeout=pool.timeout.read,
+            )
+    else:
+        pool = PooledHTTPClient(
+            name=name,
+            timeout=timeout,
+            connect_timeout=settings.http_connect_timeout,
+            max_connections=settings.http_pool_max_connections,
+            max_keepalive_connections=settings.http_pool_max_keepalive,
+            keepalive_expiry=settings.http_pool_keepalive_expiry,
+        )
+        http_pools[name] = pool
+    return pool
+
+
+def get_all_http_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Obtener estadísticas de todos los pools HTTP
+
+    Returns:
+        Diccionario con estadísticas de cada pool
+    """
+    return {name: pool.get_stats() for name, pool in http_pools.items()}
+
+
+async def close_all_http_pools() -> None:
+    """Cerrar todos los pools HTTP (shutdown de la aplicación)"""
+    for pool in list(http_pools.values()):
+        try:
+            await pool.aclose()
+        except Exception as e:
+            logger.error("http_pool_close_failed", pool=pool.name, error=str(e))
+    http_pools.clear()
@@ -0,0 +1,453 @@
+"""
+Captura de webhooks crudos de Wialon
+
+Reemplaza a log_webhook_to_file, que escribía de forma síncrona en el event
+loop (open + pretty-print + flush + print) varias veces por request sobre un
+archivo que crecía sin límite.
+
+El handler solo encola un registro (put_nowait sobre una cola acotada); un
+hilo escritor lo serializa como NDJSON en segmentos comprimidos (gzip o zstd)
+que rotan por tamaño o antigüedad. Si la cola está llena el registro se
+descarta y se cuenta como overflow: la captura nunca frena la ingesta.
+
+Cada registro conserva el body crudo y el Content-Type, suficiente para
+reproducir el webhook tal como llegó.
+"""
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timezone
+import base64
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+
+from app.config import settings
+from app.core.context import get_trace_id
+from app.core.logging import get_logger
+from app.services.webhook_envelope import encode_json
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+logger = get_logger(__name__)
+
+SEGMENT_PREFIX = "wialon-"
+SEGMENT_EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst", "none": ".ndjson"}
+
+_STOP = object()
+
+
+def encode_body(body: bytes) -> Dict[str, str]:
+    """
+    Representar el body crudo dentro de un registro JSON
+
+    Args:
+        body: Body del request
+
+    Returns:
+        {"body": texto} si es UTF-8 válido, si no {"body": base64, "body_encoding": "base64"}
+    """
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body": base64.b64encode(body).decode("ascii"), "body_encoding": "base64"}
+
+
+def decode_body(record: Dict[str, Any]) -> bytes:
+    """
+    Recuperar el body crudo de un registro capturado
+
+    Args:
+        record: Registro NDJSON ya decodificado
+
+    Returns:
+        Body exactamente como se recibió
+    """
+    body = record.get("body") or ""
+    if record.get("body_encoding") == "base64":
+        return base64.b64decode(body)
+    return body.encode("utf-8")
+
+
+def list_segments(directory: str) -> List[str]:
+    """
+    Segmentos de captura de un directorio, del más antiguo al más reciente
+
+    Args:
+        directory: Directorio de captura
+
+    Returns:
+        Rutas de los segmentos ordenadas por nombre (timestamp de creación)
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX) and any(name.endswith(ext) for ext in SEGMENT_EXTENSIONS.values())
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+class SegmentReader:
+    """
+    Lector incremental de un segmento de captura
+
+    Soporta segmentos todavía abiertos por el escritor: descomprime solo los
+    bytes nuevos y guarda la última línea incompleta para la siguiente lectura.
+    """
+
+    def __init__(self, path: str):
+        """
+        Inicializar lector
+
+        Args:
+            path: Ruta del segmento (.ndjson.gz, .ndjson.zst o .ndjson)
+        """
+        self.path = path
+        self._offset = 0
+        self._buffer = b""
+        if path.endswith(".gz"):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read .zst capture segments")
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self._decompressor = None
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """
+        Leer los registros completos escritos desde la última llamada
+
+        Returns:
+            Registros decodificados
+        """
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        self._offset += len(chunk)
+        if not chunk:
+            return []
+
+        data = self._decompressor.decompress(chunk) if self._decompressor else chunk
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+def iter_records(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Recorrer los registros de varios segmentos en orden
+
+    Args:
+        paths: Rutas de los segmentos
+
+    Yields:
+        Registros decodificados
+    """
+    for path in paths:
+        yield from SegmentReader(path).read_new()
+
+
+class WebhookCapture:
+    """Cola acotada + hilo escritor de segmentos NDJSON comprimidos"""
+
+    def __init__(
+        self,
+        directory: str,
+        enabled: bool = True,
+        sample_rate: float = 1.0,
+        queue_size: int = 10000,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        segment_max_seconds: float = 3600.0,
+        max_segments: int = 168,
+        compression: str = "gzip",
+    ):
+        """
+        Inicializar captura
+
+        Args:
+            directory: Directorio donde se escriben los segmentos
+            enabled: Si False, capture() no hace nada
+            sample_rate: Fracción de requests capturados (0.0 - 1.0)
+            queue_size: Registros máximos en espera de escritura
+            segment_max_bytes: Bytes NDJSON (sin comprimir) que fuerzan rotación
+            segment_max_seconds: Antigüedad que fuerza rotación
+            max_segments: Segmentos conservados (los más antiguos se borran)
+            compression: "gzip", "zstd" o "none"
+        """
+        if compression == "zstd" and zstandard is None:
+            logger.warning("wialon_capture_zstd_unavailable", fallback="gzip")
+            compression = "gzip"
+        if compression not in SEGMENT_EXTENSIONS:
+            raise ValueError(f"Unsupported capture compression: {compression}")
+
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.max_segments = max_segments
+        self.compression = compression
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Segmento actual (solo lo toca el hilo escritor)
+        self._file = None
+        self._raw_file = None
+        self._segment_path: Optional[str] = None
+        self._segment_bytes = 0
+        self._segment_opened_at = 0.0
+        self._segment_seq = 0
+
+        # Métricas
+        self._captured = 0
+        self._sampled_out = 0
+        self._overflow = 0
+        self._written = 0
+        self._bytes_written = 0
+        self._segments_opened = 0
+        self._write_errors = 0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Arrancar el hilo escritor"""
+        if self._running or not self.enabled:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="wialon-capture", daemon=True)
+        self._thread.start()
+        logger.info(
+            "wialon_capture_started",
+            directory=self.directory,
+            compression=self.compression,
+            sample_rate=self.sample_rate,
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Escribir lo encolado, cerrar el segmento y detener el hilo
+
+        Args:
+            timeout: Segundos máximos de espera al hilo escritor
+        """
+        if not self._running:
+            return
+        self._running = False
+        # La marca de fin debe entrar aunque la cola esté llena
+        while True:
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._thread or not self._thread.is_alive():
+                    break
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.info("wialon_capture_stopped", **self.get_stats())
+
+    # ------------------------------------------------------------------
+    # Productor (event loop)
+    # ------------------------------------------------------------------
+
+    def capture(
+        self,
+        content_type: str,
+        headers: Any,
+        body: bytes,
+        parsed_data: Optional[Dict[str, Any]] = None,
+        success: Optional[bool] = True,
+        error_message: Optional[str] = None,
+    ) -> bool:
+        """
+        Encolar un webhook recibido sin bloquear
+
+        Args:
+            content_type: Content-Type del request
+            headers: Headers del request
+            body: Body raw del request
+            parsed_data: Datos parseados (opcional)
+            success: True/False según el resultado, None si quedó encolado
+            error_message: Mensaje de error si falló
+
+        Returns:
+            True si el registro quedó encolado
+        """
+        if not self._running:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._sampled_out += 1
+            return False
+
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "trace_id": get_trace_id(),
+            "content_type": content_type,
+            "headers": dict(headers),
+            "raw": body,
+            "parsed": parsed_data,
+            "success": success,
+            "error": error_message,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._overflow += 1
+            return False
+
+        self._captured += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        """Drenar la cola en lotes y volcar cada lote al segmento"""
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+
+            batch = [item]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    records.append(item)
+            if records:
+                self._write_batch(records)
+
+        self._close_segment()
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        """Serializar y escribir un lote de registros"""
+        try:
+            self._maybe_rotate()
+            if self._file is None:
+                self._open_segment()
+
+            lines = []
+            for record in records:
+                record.update(encode_body(record.pop("raw")))
+                lines.append(encode_json(record) + b"\n")
+            data = b"".join(lines)
+
+            self._file.write(data)
+            # Sync flush: el segmento abierto se puede leer (tail) hasta aquí
+            self._file.flush()
+
+            self._segment_bytes += len(data)
+            self._bytes_written += len(data)
+            self._written += len(records)
+        except Exception as e:
+            self._write_errors += 1
+            logger.error("wialon_capture_write_failed", error=str(e), records=len(records))
+            self._close_segment()
+
+    def _maybe_rotate(self) -> None:
+        """Cerrar el segmento actual si superó tamaño o antigüedad"""
+        if self._file is None:
+            return
+        too_big = self._segment_bytes >= self.segment_max_bytes
+        too_old = time.monotonic() - self._segment_opened_at >= self.segment_max_seconds
+        if too_big or too_old:
+            self._close_segment()
+
+    def _open_segment(self) -> None:
+        """Abrir un segmento nuevo con el compresor configurado"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_seq += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = f"{SEGMENT_PREFIX}{stamp}-{os.getpid()}-{self._segment_seq:04d}{SEGMENT_EXTENSIONS[self.compression]}"
+        path = os.path.join(self.directory, name)
+
+        if self.compression == "gzip":
+            self._file = gzip.open(path, "wb", compresslevel=6)
+        elif self.compression == "zstd":
+            self._raw_file = open(path, "wb")
+            self._file = zstandard.ZstdCompressor(level=3).stream_writer(self._raw_file)
+        else:
+            self._file = open(path, "wb")
+
+        self._segment_path = path
+        self._segment_bytes = 0
+        self._segment_opened_at = time.monotonic()
+        self._segments_opened += 1
+        self._prune_segments()
+
+    def _close_segment(self) -> None:
+        """Cerrar el segmento actual (escribe el trailer del compresor)"""
+        try:
+            if self._file is not None:
+                self._file.close()
+            if self._raw_file is not None:
+                self._raw_file.close()
+        except Exception as e:
+            logger.error("wialon_capture_close_failed", error=str(e), path=self._segment_path)
+        self._file = None
+        self._raw_file = None
+        self._segment_path = None
+
+    def _prune_segments(self) -> None:
+        """Borrar los segmentos más antiguos por encima de max_segments"""
+        segments = list_segments(self.directory)
+        for path in segments[:max(0, len(segments) - self.max_segments)]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("wialon_capture_prune_failed", path=path, error=str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de la captura"""
+        return {
+            "enabled": self.enabled,
+            "running": self._running,
+            "directory": self.directory,
+            "compression": self.compression,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "captured": self._captured,
+            "sampled_out": self._sampled_out,
+            "overflow": self._overflow,
+            "written": self._written,
+            "bytes_written": self._bytes_written,
+            "segments_opened": self._segments_opened,
+            "current_segment": self._segment_path,
+            "write_errors": self._write_errors,
+        }
+
+
+# Instancia global de la captura de webhooks de Wialon
+webhook_capture = WebhookCapture(
+    directory=settings.wialon_capture_dir,
+    enabled=settings.wialon_capture_enabled,
+    sample_rate=settings.wialon_capture_sample_rate,
+    queue_size=settings.wialon_capture_queue_size,
+    segment_max_bytes=settings.wialon_capture_segment_max_bytes,
+    segment_max_seconds=settings.wialon_capture_segment_max_seconds,
+    max_segments=settings.wialon_capture_max_segments,
+    compression=settings.wialon_capture_compression,
+)
@@ -188,6 +188,7 @@ def normalize_wialon_event(raw_data: Dict[str, Any]) -> Dict[str, Any]:
         "max_speed": float(raw_data.get("max_speed", 0)) if raw_data.get("max_speed") else None,
         "deviation_distance_km": float(raw_data.get("deviation_distance_km", 0)) 
             if raw_data.get("deviation_distance_km") else None,
-        "last_message_time": raw_data.get("last_message_time"),
+        "last_message_time": str(raw_data["last_message_time"])
+            if raw_data.get("last_message_time") is not None else None,
     }
 
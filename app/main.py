@@ -4,14 +4,16 @@ Aplicación FastAPI principal
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from app.config import settings
 from app.core.database import db
+from app.core.loop_monitor import loop_monitor
+from app.container import container
 from app.core.logging import setup_logging, get_logger
 from app.core.errors import BaseServiceError
 from app.api.middleware import RequestLoggingMiddleware
-from app.api.routes import health, trips, wialon, whatsapp
+from app.api.routes import health, trips, wialon, whatsapp, admin, metrics
 
 # Configurar logging
 setup_logging(log_level=settings.log_level, json_logs=settings.json_logs)
@@ -28,6 +30,9 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("application_starting", environment=settings.environment)
 
+    # Medir el event loop desde el arranque (lag y callbacks que lo bloquean)
+    loop_monitor.start()
+
     try:
         # Conectar a la base de datos MySQL
         await db.connect(
@@ -42,6 +47,9 @@ async def lifespan(app: FastAPI):
         )
         logger.info("database_connected", db_type="mysql", database=settings.mysql_database)
 
+        # Crear servicios singleton y arrancar workers en segundo plano
+        await container.startup(db)
+
     except Exception as e:
         logger.error("application_startup_failed", error=str(e))
         raise
@@ -54,26 +62,37 @@ async def lifespan(app: FastAPI):
     logger.info("application_shutting_down")
 
     try:
-        # Cerrar webhook service si está habilitado
-        if settings.webhooks_enabled:
-            from app.api.dependencies import shutdown_webhook_service
-            await shutdown_webhook_service()
-            logger.info("webhook_service_closed")
-        
+        # Detener workers y cerrar servicios antes de la base de datos
+        await container.shutdown()
+
         await db.disconnect()
         logger.info("database_disconnected")
     except Exception as e:
         logger.error("database_disconnect_failed", error=str(e))
 
+    await loop_monitor.stop()
+
     logger.info("application_stopped")
 
 
+def _default_response_class() -> type:
+    """ORJSONResponse si está habilitado y orjson está instalado; si no, JSONResponse"""
+    if settings.fast_json_responses:
+        try:
+            import orjson  # noqa: F401
+            return ORJSONResponse
+        except ImportError:
+            logger.warning("orjson_not_installed", fallback="JSONResponse")
+    return JSONResponse
+
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Microservicio para gestión de flotas logísticas",
     lifespan=lifespan,
+    default_response_class=_default_response_class(),
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
 )
@@ -135,6 +154,11 @@ app.include_router(health.router, prefix=settings.api_prefix)
 app.include_router(trips.router, prefix=settings.api_prefix)
 app.include_router(wialon.router, prefix=settings.api_prefix)
 app.include_router(whatsapp.router, prefix=settings.api_prefix)
+app.include_router(admin.router, prefix=settings.api_prefix)
+
+# Métricas en la raíz (/metrics), donde Prometheus las busca por defecto
+if settings.metrics_enabled:
+    app.include_router(metrics.router)
 
 # Webhook admin endpoints (solo si webhooks están habilitados)
 if settings.webhooks_enabled:
@@ -151,13 +151,17 @@ class EventRepository(BaseRepository):
             logger.error("event_creation_failed", error=str(e))
             raise
 
-    async def mark_as_processed(self, event_id: str) -> bool:
-        """Marcar evento como procesado"""
+    async def mark_as_processed(self, event_id: str, cursor=None) -> bool:
+        """Marcar evento como procesado (dentro de la transacción del llamador si hay cursor)"""
         query = """
             UPDATE events
             SET processed = TRUE
             WHERE id = %s
         """
+        if cursor is not None:
+            await cursor.execute(query, (event_id,))
+            return cursor.rowcount > 0
+
         result = await self.db.execute(query, event_id)
         return result > 0
 
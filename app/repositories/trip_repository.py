@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any, List
 import json
 from app.repositories.base import BaseRepository
 from app.core.database import Database
+from app.core.active_trips import active_trips
 
 
 class TripRepository(BaseRepository):
@@ -66,18 +67,33 @@ class TripRepository(BaseRepository):
         return [dict(row) for row in rows]
 
     async def update_status(
-        self, trip_id: str, status: str, substatus: Optional[str] = None
+        self, trip_id: str, status: str, substatus: Optional[str] = None, cursor=None
     ) -> Optional[Dict[str, Any]]:
-        """Actualizar estado y subestado de un viaje"""
+        """
+        Actualizar estado y subestado de un viaje
+
+        Si se proporciona cursor, el UPDATE y el SELECT se ejecutan dentro de
+        la transacción del llamador (sin commit). El registro de viajes activos
+        no se toca: la transacción aún puede revertirse, así que el llamador
+        aplica el viaje devuelto con active_trips.trip_written() tras el commit.
+        """
         query = """
             UPDATE trips
             SET status = %s, substatus = %s, updated_at = NOW()
             WHERE id = %s
         """
+        if cursor is not None:
+            await cursor.execute(query, (status, substatus, trip_id))
+            await cursor.execute("SELECT * FROM trips WHERE id = %s", (trip_id,))
+            row = await cursor.fetchone()
+            return self.db._deserialize_json_fields(row) if row else None
+
         await self.db.execute(query, status, substatus, trip_id)
         
         # MySQL no soporta RETURNING, así que hacemos un SELECT
-        return await self.find_by_id(trip_id)
+        trip = await self.find_by_id(trip_id)
+        active_trips.trip_written(trip)
+        return trip
 
     async def complete_trip(
         self, trip_id: str, status: str = 'completed', substatus: Optional[str] = None
@@ -91,7 +107,22 @@ class TripRepository(BaseRepository):
         await self.db.execute(query, status, substatus, trip_id)
         
         # MySQL no soporta RETURNING, así que hacemos un SELECT
-        return await self.find_by_id(trip_id)
+        trip = await self.find_by_id(trip_id)
+        active_trips.trip_written(trip)
+        return trip
+
+    async def set_whatsapp_group(
+        self, trip_id: str, whatsapp_group_id: Optional[str], whatsapp_group_name: Optional[str]
+    ) -> None:
+        """Asociar el grupo de WhatsApp (nuevo o reutilizado) a un viaje"""
+        query = """
+            UPDATE trips
+            SET whatsapp_group_id = %s, whatsapp_group_name = %s, updated_at = NOW()
+            WHERE id = %s
+        """
+        await self.db.execute(query, whatsapp_group_id, whatsapp_group_name, trip_id)
+        if active_trips.active:
+            active_trips.trip_written(await self.find_by_id(trip_id))
 
     async def create_full_trip(self, trip_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crear un viaje con todos sus datos"""
@@ -137,5 +168,14 @@ class TripRepository(BaseRepository):
             select_query = "SELECT * FROM trips WHERE floatify_trip_id = %s"
             await cursor.execute(select_query, (floatify_trip_id,))
             row = await cursor.fetchone()
+
+            # El viaje nuevo pasa a ser el activo de su unidad
+            if row and active_trips.active:
+                await cursor.execute("SELECT * FROM units WHERE id = %s", (row.get("unit_id"),))
+                unit = await cursor.fetchone()
+                active_trips.trip_created(
+                    self.db._deserialize_json_fields(dict(unit)) if unit else None,
+                    self.db._deserialize_json_fields(dict(row)),
+                )
             
             return dict(row) if row else None
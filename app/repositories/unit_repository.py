@@ -6,6 +6,7 @@ import json
 from app.repositories.base import BaseRepository
 from app.core.database import Database
 from app.core.logging import get_logger
+from app.core.active_trips import active_trips
 
 logger = get_logger(__name__)
 
@@ -74,6 +75,9 @@ class UnitRepository(BaseRepository):
             select_query = "SELECT * FROM units WHERE floatify_unit_id = %s"
             await cursor.execute(select_query, (floatify_unit_id,))
             row = await cursor.fetchone()
+
+            if row:
+                active_trips.unit_written(self.db._deserialize_json_fields(dict(row)))
             
             return dict(row) if row else None
 
@@ -163,7 +167,9 @@ class UnitRepository(BaseRepository):
             raise
         
         # Devolver el registro actualizado
-        return await self.find_by_id(unit_id)
+        unit = await self.find_by_id(unit_id)
+        active_trips.unit_written(unit)
+        return unit
 
     async def clear_whatsapp_group(self, unit_id: str) -> Dict[str, Any]:
         """
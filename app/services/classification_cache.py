@@ -0,0 +1,235 @@
+"""
+Caché de clasificaciones de mensajes
+
+Las mismas frases llegan una y otra vez desde toda la flota con el mismo
+estado de viaje. La clave es el texto normalizado (acentos, mayúsculas,
+espacios) más status/substatus del viaje; el valor es el resultado de Gemini.
+Opcionalmente se persiste en ai_classification_cache para sobrevivir
+reinicios (write-through y carga al arrancar).
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+from app.core.cache import LRUCache
+from app.core.database import Database
+from app.core.logging import get_logger
+from app.config import settings
+from app.integrations.gemini.client import DEFAULT_CLASSIFICATION
+from app.services.intent_classifier import normalize_text
+
+logger = get_logger(__name__)
+
+CacheKey = Tuple[str, Optional[str], Optional[str]]
+
+
+class ClassificationCache:
+    """Caché TTL+LRU de clasificaciones con persistencia opcional"""
+
+    def __init__(self, max_size: int = 5000, ttl: float = 86400, persist: bool = False):
+        """
+        Inicializar caché
+
+        Args:
+            max_size: Número máximo de entradas en memoria
+            ttl: Segundos de vida de cada clasificación
+            persist: Guardar también en la tabla ai_classification_cache
+        """
+        self.ttl = ttl
+        self.persist = persist
+        self._cache: LRUCache[Dict[str, Any]] = LRUCache(max_size=max_size, ttl=ttl)
+        self.loaded_from_db = 0
+        self.persist_errors = 0
+
+    @staticmethod
+    def make_key(text: str, context: Dict[str, Any]) -> CacheKey:
+        """
+        Construir clave a partir del texto y el estado del viaje
+
+        Args:
+            text: Mensaje del conductor
+            context: Contexto del viaje (status, substatus)
+
+        Returns:
+            Tupla (texto normalizado, status, substatus)
+        """
+        return (normalize_text(text), context.get("status"), context.get("substatus"))
+
+    @staticmethod
+    def _hash_key(key: CacheKey) -> str:
+        """Hash estable de la clave para la tabla persistente"""
+        return hashlib.sha256("|".join(part or "" for part in key).encode("utf-8")).hexdigest()
+
+    def get(self, text: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Buscar una clasificación cacheada
+
+        Args:
+            text: Mensaje del conductor
+            context: Contexto del viaje
+
+        Returns:
+            Copia del resultado cacheado o None
+        """
+        result = self._cache.get(self.make_key(text, context))
+        return dict(result) if result is not None else None
+
+    async def set(
+        self, db: Optional[Database], text: str, context: Dict[str, Any], result: Dict[str, Any]
+    ) -> bool:
+        """
+        Guardar una clasificación
+
+        No se cachean resultados por defecto (timeout o JSON inválido de Gemini).
+
+        Args:
+            db: Base de datos (solo se usa si persist=True)
+            text: Mensaje del conductor
+            context: Contexto del viaje
+            result: Resultado de la clasificación
+
+        Returns:
+            True si se guardó
+        """
+        if not result or result == DEFAULT_CLASSIFICATION:
+            return False
+
+        key = self.make_key(text, context)
+        if not key[0]:
+            return False
+
+        self._cache.set(key, dict(result))
+
+        if self.persist and db is not None:
+            try:
+                await db.execute(
+                    """
+                    INSERT INTO ai_classification_cache (
+                        cache_key, normalized_text, trip_status, trip_substatus,
+                        result, expires_at
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        result = VALUES(result),
+                        expires_at = VALUES(expires_at)
+                    """,
+                    self._hash_key(key),
+                    key[0][:500],
+                    key[1],
+                    key[2],
+                    json.dumps(result, ensure_ascii=False, default=str),
+                    datetime.utcnow() + timedelta(seconds=self.ttl),
+                )
+            except Exception as e:
+                self.persist_errors += 1
+                logger.warning("classification_cache_persist_failed", error=str(e))
+
+        return True
+
+    async def load(self, db: Database) -> int:
+        """
+        Cargar a memoria las entradas persistidas vigentes
+
+        Args:
+            db: Base de datos
+
+        Returns:
+            Número de entradas cargadas
+        """
+        if not self.persist:
+            return 0
+
+        try:
+            rows = await db.fetch(
+                """
+                SELECT normalized_text, trip_status, trip_substatus, result, expires_at
+                FROM ai_classification_cache
+                WHERE expires_at > %s
+                ORDER BY created_at ASC
+                LIMIT %s
+                """,
+                datetime.utcnow(),
+                self._cache.max_size,
+            )
+        except Exception as e:
+            logger.warning("classification_cache_load_failed", error=str(e))
+            return 0
+
+        now = datetime.utcnow()
+        for row in rows:
+            result = row["result"]
+            if isinstance(result, str):
+                result = json.loads(result)
+            remaining = (row["expires_at"] - now).total_seconds()
+            if remaining > 0:
+                key = (row["normalized_text"], row["trip_status"], row["trip_substatus"])
+                self._cache.set(key, result, ttl=remaining)
+
+        self.loaded_from_db = len(rows)
+        logger.info("classification_cache_loaded", entries=len(rows))
+        return len(rows)
+
+    async def flush(self, db: Optional[Database] = None) -> Dict[str, int]:
+        """
+        Vaciar la caché en memoria (y la tabla si persist=True)
+
+        Args:
+            db: Base de datos
+
+        Returns:
+            Entradas eliminadas de memoria y de la tabla
+        """
+        removed = {"memory": self._cache.clear(), "persistent": 0}
+        if self.persist and db is not None:
+            removed["persistent"] = await db.execute("DELETE FROM ai_classification_cache")
+        logger.info("classification_cache_flushed", **removed)
+        return removed
+
+    def entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Listar las entradas más usadas recientemente
+
+        Args:
+            limit: Número máximo de entradas
+
+        Returns:
+            Lista de entradas con su clave hasheada y clasificación; el texto
+            del conductor no se expone (la clave coincide con
+            ai_classification_cache.cache_key)
+        """
+        items = self._cache.items()[-limit:] if limit else []
+        return [
+            {
+                "key": self._hash_key(key),
+                "text_length": len(key[0] or ""),
+                "status": key[1],
+                "substatus": key[2],
+                "intent": value.get("intent"),
+                "confidence": value.get("confidence"),
+                "action": value.get("action"),
+            }
+            for key, value in reversed(items)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener métricas de la caché
+
+        Returns:
+            Hits, misses y tamaño de la caché
+        """
+        return {
+            **self._cache.get_stats(),
+            "persist": self.persist,
+            "loaded_from_db": self.loaded_from_db,
+            "persist_errors": self.persist_errors,
+        }
+
+
+# Instancia global de la caché de clasificaciones
+classification_cache = ClassificationCache(
+    max_size=settings.classification_cache_max_size,
+    ttl=settings.classification_cache_ttl,
+    persist=settings.classification_cache_persist,
+)
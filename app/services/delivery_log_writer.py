@@ -0,0 +1,350 @@
+"""
+Escritor write-behind de webhook_delivery_log
+
+En modo de envío directo cada webhook costaba de tres a cinco round-trips
+secuenciales (INSERT del intento, UPDATE de éxito/fallo, SELECT de
+retry_count y, en DLQ, SELECT + INSERT), cada uno con su propia conexión.
+Este escritor mantiene el estado de cada entrega en memoria, decide
+reintentos/DLQ sin consultar la base de datos y vuelca las transiciones en
+lotes multi-fila INSERT ... ON DUPLICATE KEY UPDATE cada N ms o M filas.
+
+Si un volcado falla las filas vuelven al buffer; en el shutdown, lo que no
+pueda escribirse se guarda en un archivo JSONL que se reprocesa al arrancar.
+"""
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import asyncio
+import json
+import os
+import uuid
+
+from app.core.context import get_trace_id
+from app.core.database import Database
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_DELIVERY_LOG_UPSERT = """
+    INSERT INTO webhook_delivery_log
+    (id, webhook_type, trip_id, payload, target_url, status, retry_count,
+     last_error, created_at, delivered_at, trace_id)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        status = VALUES(status),
+        retry_count = VALUES(retry_count),
+        last_error = VALUES(last_error),
+        delivered_at = VALUES(delivered_at)
+"""
+
+_DLQ_INSERT = """
+    INSERT INTO webhook_dead_letter_queue
+    (id, original_delivery_log_id, webhook_type, trip_id, payload,
+     target_url, failure_reason, retry_count, last_attempt_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+_DELIVERY_LOG_COLUMNS = (
+    "id", "webhook_type", "trip_id", "payload", "target_url", "status",
+    "retry_count", "last_error", "created_at", "delivered_at", "trace_id",
+)
+_DLQ_COLUMNS = (
+    "id", "original_delivery_log_id", "webhook_type", "trip_id", "payload",
+    "target_url", "failure_reason", "retry_count", "last_attempt_at",
+)
+
+
+class DeliveryLogWriter:
+    """Buffer en memoria de transiciones de webhook_delivery_log con volcado por lotes"""
+
+    def __init__(
+        self,
+        db: Database,
+        max_retries: int = 5,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        spill_path: Optional[str] = None,
+    ):
+        """
+        Inicializar escritor
+
+        Args:
+            db: Instancia de base de datos
+            max_retries: Fallos tras los cuales el webhook se mueve a DLQ
+            batch_size: Filas pendientes que disparan un volcado inmediato
+            flush_interval: Segundos máximos entre volcados
+            spill_path: Archivo JSONL para filas no escritas en el shutdown
+        """
+        self.db = db
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+
+        # Filas con transiciones sin volcar (las transiciones se fusionan)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Entregas en curso: el intento puede volcarse antes que su resultado
+        self._open: Dict[str, Dict[str, Any]] = {}
+        self._pending_dlq: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._running = False
+
+        # Métricas
+        self._flushes = 0
+        self._rows_written = 0
+        self._flush_errors = 0
+        self._dead_lettered = 0
+
+    async def start(self) -> None:
+        """Recuperar filas derramadas y arrancar el loop de volcado"""
+        if self._running:
+            return
+        self._load_spill()
+        self._running = True
+        self._task = asyncio.create_task(self._run(), name="delivery-log-writer")
+        logger.info(
+            "delivery_log_writer_started",
+            batch_size=self.batch_size,
+            flush_interval=self.flush_interval,
+            recovered=len(self._pending) + len(self._pending_dlq),
+        )
+
+    async def stop(self) -> None:
+        """Detener el loop y volcar todo lo pendiente"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+        await self.flush()
+        if self._pending or self._pending_dlq:
+            self._write_spill()
+        logger.info("delivery_log_writer_stopped", **self.get_stats())
+
+    # ------------------------------------------------------------------
+    # Transiciones
+    # ------------------------------------------------------------------
+
+    def record_attempt(
+        self,
+        webhook_type: str,
+        trip_id: Optional[str],
+        payload_json: str,
+        target_url: str,
+    ) -> str:
+        """
+        Registrar intento de envío
+
+        Args:
+            webhook_type: Tipo de webhook
+            trip_id: ID del viaje (opcional)
+            payload_json: Payload ya serializado
+            target_url: URL destino
+
+        Returns:
+            ID del registro de delivery log
+        """
+        delivery_log_id = str(uuid.uuid4())
+        self._pending[delivery_log_id] = self._open[delivery_log_id] = {
+            "id": delivery_log_id,
+            "webhook_type": webhook_type,
+            "trip_id": trip_id,
+            "payload": payload_json,
+            "target_url": target_url,
+            "status": "pending",
+            "retry_count": 0,
+            "last_error": None,
+            "created_at": datetime.utcnow(),
+            "delivered_at": None,
+            "trace_id": get_trace_id(),
+        }
+        self._maybe_wakeup()
+        return delivery_log_id
+
+    def _close(self, delivery_log_id: str) -> Optional[Dict[str, Any]]:
+        """Sacar una entrega de las abiertas y marcarla para volcado"""
+        row = self._open.pop(delivery_log_id, None)
+        if row is not None:
+            self._pending[delivery_log_id] = row
+        return row
+
+    def record_success(self, delivery_log_id: str) -> None:
+        """Marcar entrega como enviada"""
+        row = self._close(delivery_log_id)
+        if row is None:
+            return
+        row["status"] = "sent"
+        row["delivered_at"] = datetime.utcnow()
+        self._maybe_wakeup()
+
+    def record_failure(self, delivery_log_id: str, error: str) -> bool:
+        """
+        Marcar entrega como fallida y decidir DLQ en memoria
+
+        Args:
+            delivery_log_id: ID del registro
+            error: Mensaje de error
+
+        Returns:
+            True si el webhook agotó reintentos y se movió a DLQ
+        """
+        row = self._close(delivery_log_id)
+        if row is None:
+            return False
+
+        row["status"] = "failed"
+        row["last_error"] = error
+        row["retry_count"] += 1
+
+        moved = row["retry_count"] >= self.max_retries
+        if moved:
+            self._pending_dlq.append({
+                "id": str(uuid.uuid4()),
+                "original_delivery_log_id": delivery_log_id,
+                "webhook_type": row["webhook_type"],
+                "trip_id": row["trip_id"],
+                "payload": row["payload"],
+                "target_url": row["target_url"],
+                "failure_reason": error or "Unknown error",
+                "retry_count": row["retry_count"],
+                "last_attempt_at": datetime.utcnow(),
+            })
+            self._dead_lettered += 1
+            logger.warning(
+                "webhook_moved_to_dlq",
+                delivery_log_id=delivery_log_id,
+                webhook_type=row["webhook_type"],
+            )
+
+        self._maybe_wakeup()
+        return moved
+
+    # ------------------------------------------------------------------
+    # Volcado
+    # ------------------------------------------------------------------
+
+    def _maybe_wakeup(self) -> None:
+        """Despertar el loop si el buffer alcanzó el tamaño de lote"""
+        if len(self._pending) + len(self._pending_dlq) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Volcar cada flush_interval o al llenarse el lote"""
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Escribir todas las transiciones pendientes en una transacción
+
+        Returns:
+            Número de filas escritas (0 si no había nada o falló)
+        """
+        async with self._flush_lock:
+            if not self._pending and not self._pending_dlq:
+                return 0
+
+            rows, self._pending = self._pending, {}
+            dlq_rows, self._pending_dlq = self._pending_dlq, []
+
+            try:
+                async with self.db.transaction() as (cursor, conn):
+                    if rows:
+                        await cursor.executemany(
+                            _DELIVERY_LOG_UPSERT,
+                            [tuple(r[c] for c in _DELIVERY_LOG_COLUMNS) for r in rows.values()],
+                        )
+                    if dlq_rows:
+                        await cursor.executemany(
+                            _DLQ_INSERT,
+                            [tuple(r[c] for c in _DLQ_COLUMNS) for r in dlq_rows],
+                        )
+            except Exception as e:
+                # Devolver al buffer sin pisar transiciones más recientes
+                for delivery_log_id, row in rows.items():
+                    self._pending.setdefault(delivery_log_id, row)
+                self._pending_dlq[:0] = dlq_rows
+                self._flush_errors += 1
+                logger.error(
+                    "delivery_log_flush_failed",
+                    error=str(e),
+                    rows=len(rows),
+                    dlq_rows=len(dlq_rows),
+                )
+                return 0
+
+            written = len(rows) + len(dlq_rows)
+            self._flushes += 1
+            self._rows_written += written
+            logger.debug("delivery_log_flushed", rows=len(rows), dlq_rows=len(dlq_rows))
+            return written
+
+    # ------------------------------------------------------------------
+    # Derrame a disco (shutdown sin base de datos)
+    # ------------------------------------------------------------------
+
+    def _write_spill(self) -> None:
+        """Guardar filas no escritas en el archivo JSONL de derrame"""
+        if not self.spill_path:
+            logger.error(
+                "delivery_log_rows_lost",
+                rows=len(self._pending),
+                dlq_rows=len(self._pending_dlq),
+            )
+            return
+
+        os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for row in self._pending.values():
+                f.write(json.dumps({"table": "delivery_log", "row": row}, default=str) + "\n")
+            for row in self._pending_dlq:
+                f.write(json.dumps({"table": "dlq", "row": row}, default=str) + "\n")
+
+        logger.warning(
+            "delivery_log_spilled",
+            path=self.spill_path,
+            rows=len(self._pending),
+            dlq_rows=len(self._pending_dlq),
+        )
+        self._pending, self._pending_dlq = {}, []
+
+    def _load_spill(self) -> None:
+        """Cargar al buffer las filas derramadas en un shutdown anterior"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                row = entry["row"]
+                if entry["table"] == "dlq":
+                    self._pending_dlq.append(row)
+                else:
+                    self._pending[row["id"]] = row
+
+        os.remove(self.spill_path)
+        logger.info("delivery_log_spill_loaded", path=self.spill_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas del escritor"""
+        return {
+            "running": self._running,
+            "buffered": len(self._pending),
+            "open_deliveries": len(self._open),
+            "buffered_dlq": len(self._pending_dlq),
+            "flushes": self._flushes,
+            "rows_written": self._rows_written,
+            "flush_errors": self._flush_errors,
+            "dead_lettered": self._dead_lettered,
+        }
@@ -6,13 +6,19 @@ import uuid
 import time
 from datetime import datetime
 from app.core.logging import get_logger, log_context
+from app.core.context import get_trace_id
+from app.core.tracing import span
 from app.core.errors import BusinessLogicError
+from app.core.cache import LRUCache
+from app.core.metrics import WIALON_EVENTS_DROPPED, metrics
 from app.core.database import Database
 from app.core.constants import WIALON_EVENT_TYPES
+from app.core.active_trips import active_trips
 from app.repositories.event_repository import EventRepository
 from app.repositories.trip_repository import TripRepository
 from app.repositories.unit_repository import UnitRepository
 from app.models.event import WialonEvent
+from app.services.geofence_cache import geofence_cache, TripGeofence
 from app.integrations.evolution.client import EvolutionClient
 from app.config import settings
 
@@ -36,16 +42,12 @@ class EventService:
         self.webhook_service = webhook_service
         
         # Tracking de notificaciones de desviación de ruta para período de gracia
-        self._route_deviation_notifications = {}  # {trip_id: {"last_notification_time": timestamp}}
-        
-        # DEBUG - Forzar print a consola
-        import sys
-        sys.stdout.write("=" * 80 + "\n")
-        sys.stdout.write("EventService INITIALIZED\n")
-        sys.stdout.write(f"  webhook_service: {webhook_service}\n")
-        sys.stdout.write(f"  webhook_service is None: {webhook_service is None}\n")
-        sys.stdout.write("=" * 80 + "\n")
-        sys.stdout.flush()
+        # {trip_id: timestamp de la última notificación}; acotado por tamaño y
+        # con expiración, así los viajes terminados no se acumulan
+        self._route_deviation_notifications: LRUCache[float] = LRUCache(
+            max_size=settings.route_deviation_tracking_max_trips,
+            ttl=max(settings.route_deviation_tracking_ttl, settings.route_deviation_grace_period),
+        )
         
         logger.info(
             "event_service_initialized",
@@ -53,6 +55,11 @@ class EventService:
             has_evolution_client=evolution_client is not None,
         )
 
+    @property
+    def tracked_deviation_trips(self) -> int:
+        """Viajes con período de gracia de desviación en memoria"""
+        return len(self._route_deviation_notifications)
+
     def _check_grace_period(self, trip_id: str, grace_period_seconds: int = 300) -> bool:
         """
         Verificar si han pasado suficientes segundos desde la última notificación de desviación
@@ -64,16 +71,12 @@ class EventService:
         Returns:
             True si se puede enviar notificación, False si está en período de gracia
         """
-        # Limpiar entradas antiguas (cada hora)
-        self._cleanup_old_notifications(max_age_seconds=3600)
-        
         current_time = time.time()
-        
-        if trip_id not in self._route_deviation_notifications:
-            # Primera notificación para este viaje
-            self._route_deviation_notifications[trip_id] = {
-                "last_notification_time": current_time
-            }
+        last_notification_time = self._route_deviation_notifications.get(trip_id)
+
+        if last_notification_time is None:
+            # Primera notificación para este viaje (o la anterior ya expiró)
+            self._route_deviation_notifications.set(trip_id, current_time)
             logger.info(
                 "route_deviation_notification_allowed",
                 trip_id=trip_id,
@@ -81,12 +84,11 @@ class EventService:
             )
             return True
         
-        last_notification_time = self._route_deviation_notifications[trip_id]["last_notification_time"]
         time_since_last = current_time - last_notification_time
         
         if time_since_last >= grace_period_seconds:
             # Período de gracia expirado, actualizar timestamp
-            self._route_deviation_notifications[trip_id]["last_notification_time"] = current_time
+            self._route_deviation_notifications.set(trip_id, current_time)
             logger.info(
                 "route_deviation_notification_allowed",
                 trip_id=trip_id,
@@ -105,29 +107,29 @@ class EventService:
             )
             return False
 
-    def _cleanup_old_notifications(self, max_age_seconds: int = 3600):
+    def drop_if_no_active_trip(self, event: WialonEvent) -> Optional[Dict[str, Any]]:
         """
-        Limpiar entradas antiguas del tracking de notificaciones
-        
+        Descartar el evento si la unidad está marcada sin viaje activo
+
+        Se consulta antes de cualquier trabajo en la BD (también antes de
+        encolar en modo de ingesta asíncrona).
+
         Args:
-            max_age_seconds: Edad máxima en segundos (default: 1 hora)
+            event: Evento de Wialon
+
+        Returns:
+            Resultado "sin viaje activo" si se descartó, None si hay que procesarlo
         """
-        current_time = time.time()
-        trips_to_remove = []
-        
-        for trip_id, data in self._route_deviation_notifications.items():
-            age = current_time - data["last_notification_time"]
-            if age > max_age_seconds:
-                trips_to_remove.append(trip_id)
-        
-        for trip_id in trips_to_remove:
-            del self._route_deviation_notifications[trip_id]
-        
-        if trips_to_remove:
-            logger.info(
-                "route_deviation_notifications_cleaned",
-                count=len(trips_to_remove)
-            )
+        if not active_trips.has_no_trip(event.unit_id):
+            return None
+        if metrics.enabled:
+            WIALON_EVENTS_DROPPED.labels("no_active_trip").inc()
+        logger.debug("wialon_event_dropped_no_active_trip", unit_id=event.unit_id)
+        return {
+            "success": True,
+            "message": "No active trip found for unit",
+            "event_saved": False,
+        }
 
     async def process_wialon_event(
         self, event: WialonEvent
@@ -141,7 +143,7 @@ class EventService:
         Returns:
             Resultado del procesamiento
         """
-        trace_id = str(uuid.uuid4())
+        trace_id = get_trace_id()
         log_context(
             trace_id=trace_id,
             event_type=event.notification_type,
@@ -151,8 +153,19 @@ class EventService:
         try:
             logger.info("wialon_event_received", event_data=event.model_dump())
 
-            # 1. Buscar viaje activo por wialon_id de la unidad
-            trip = await self.trip_repo.find_active_by_wialon_id(event.unit_id)
+            dropped = self.drop_if_no_active_trip(event)
+            if dropped:
+                return dropped
+
+            # 1. Buscar viaje activo por wialon_id de la unidad (proyección en
+            #    memoria; MySQL solo si la unidad no está en el registro)
+            unit = None
+            with span("wialon.trip_lookup"):
+                cached = active_trips.lookup(event.unit_id)
+                if cached:
+                    unit, trip = cached
+                else:
+                    trip = await self.trip_repo.find_active_by_wialon_id(event.unit_id)
 
             if not trip:
                 logger.warning(
@@ -160,6 +173,7 @@ class EventService:
                     unit_id=event.unit_id,
                     unit_name=event.unit_name,
                 )
+                active_trips.mark_no_trip(event.unit_id)
                 return {
                     "success": True,
                     "message": "No active trip found for unit",
@@ -167,24 +181,33 @@ class EventService:
                 }
 
             # 2. Obtener unit_id de la base de datos
-            unit = await self.unit_repo.find_by_wialon_id(event.unit_id)
-            if not unit:
-                logger.error("unit_not_found", wialon_id=event.unit_id)
-                raise BusinessLogicError(f"Unit not found: {event.unit_id}")
+            if unit is None:
+                with span("wialon.unit_lookup"):
+                    unit = await self.unit_repo.find_by_wialon_id(event.unit_id)
+                if not unit:
+                    logger.error("unit_not_found", wialon_id=event.unit_id)
+                    raise BusinessLogicError(f"Unit not found: {event.unit_id}")
+                active_trips.put(unit, trip)
 
-            # 3. Buscar geofence_id en BD si viene del evento (para foreign key)
+            # 3. Resolver la geocerca del evento (id de BD, rol y tipo) desde la
+            #    caché por viaje; solo si no pertenece al viaje se busca globalmente
             geofence_db_id = None
-            if event.geofence_id:
-                # Buscar la geocerca por floatify_geofence_id (usando fetchval para obtener valor directo)
-                geofence_db_id = await self.db.fetchval(
-                    "SELECT id FROM geofences WHERE floatify_geofence_id = %s OR wialon_geofence_id = %s",
-                    event.geofence_id,
-                    event.geofence_id
-                )
-                if geofence_db_id:
-                    logger.info("geofence_found_for_event", floatify_id=event.geofence_id, db_id=geofence_db_id)
-                else:
-                    logger.warning("geofence_not_found_for_event", floatify_id=event.geofence_id)
+            with span("wialon.geofence_resolve"):
+                trip_geofence = await geofence_cache.resolve(self.db, trip["id"], event.geofence_id)
+                if trip_geofence:
+                    geofence_db_id = trip_geofence.db_id
+                    logger.info("geofence_found_for_event", floatify_id=event.geofence_id, db_id=geofence_db_id, source="trip_cache")
+                elif event.geofence_id:
+                    # Buscar la geocerca por floatify_geofence_id (usando fetchval para obtener valor directo)
+                    geofence_db_id = await self.db.fetchval(
+                        "SELECT id FROM geofences WHERE floatify_geofence_id = %s OR wialon_geofence_id = %s",
+                        event.geofence_id,
+                        event.geofence_id
+                    )
+                    if geofence_db_id:
+                        logger.info("geofence_found_for_event", floatify_id=event.geofence_id, db_id=geofence_db_id)
+                    else:
+                        logger.warning("geofence_not_found_for_event", floatify_id=event.geofence_id)
             
             # 4. Registrar evento (con idempotencia usando wialon_notification_id)
             event_data = {
@@ -199,16 +222,30 @@ class EventService:
                 "raw_payload": event.model_dump(),
             }
 
-            created_event = await self.event_repo.create_event(event_data)
+            with span("wialon.event_insert"):
+                created_event = await self.event_repo.create_event(event_data)
 
+            outbox = bool(self.webhook_service and self.webhook_service.outbox_enabled)
+            existing_event = None
             if not created_event:
-                # Evento duplicado (idempotencia) - recuperar el evento existente para devolver sus IDs
+                existing_event = await self.event_repo.find_by_wialon_notification_id(event.notification_id)
+                # Modo outbox: efectos y marca de procesado se confirman juntos,
+                # así que un evento sin procesar es un intento revertido y se reprocesa
+                if outbox and existing_event and not existing_event.get("processed"):
+                    logger.info(
+                        "event_reprocessing_after_rollback",
+                        event_id=existing_event["id"],
+                        wialon_notification_id=event.notification_id,
+                    )
+                    created_event = existing_event
+
+            if not created_event:
+                # Evento duplicado (idempotencia) - devolver los IDs del evento existente
                 logger.info(
                     "event_already_processed_idempotency",
                     wialon_notification_id=event.notification_id,
                     event_type=event.notification_type
                 )
-                existing_event = await self.event_repo.find_by_wialon_notification_id(event.notification_id)
                 
                 return {
                     "success": True,
@@ -222,190 +259,296 @@ class EventService:
             logger.info("event_saved", event_id=created_event["id"])
 
             # 5. Determinar acción según tipo de evento
-            action_result = await self._determine_action(event, trip)
+            with span("wialon.action"):
+                action_result = await self._determine_action(event, trip, trip_geofence)
             logger.info("action_determined", action=action_result, event_type=event.notification_type)
 
-            # 6. Actualizar estado del viaje si es necesario
-            if action_result.get("update_status"):
-                await self.trip_repo.update_status(
-                    trip["id"],
-                    action_result["new_status"],
-                    action_result["new_substatus"],
-                )
-                logger.info(
-                    "trip_status_updated_by_event",
-                    trip_id=trip["id"],
-                    new_status=action_result["new_status"],
-                    new_substatus=action_result["new_substatus"],
-                )
-
-            # 7. Enviar notificación WhatsApp si es necesario
-            logger.info(
-                "whatsapp_notification_check",
-                send_notification=action_result.get('send_notification'),
-                has_evolution_client=self.evolution_client is not None,
-                has_message=bool(action_result.get('notification_message')),
-            )
-            
-            if action_result.get("send_notification") and self.evolution_client:
-                whatsapp_group_id = trip.get("whatsapp_group_id")
-                notification_message = action_result.get("notification_message")
-                
-                logger.info(
-                    "sending_whatsapp_notification",
-                    group_id=whatsapp_group_id,
-                    message_preview=notification_message[:50] if notification_message else None,
-                )
-                
-                if whatsapp_group_id and notification_message:
-                    try:
-                        logger.info(
-                            "sending_event_notification",
-                            trip_id=trip["id"],
-                            group_id=whatsapp_group_id,
-                            event_type=event.notification_type
-                        )
-                        await self.evolution_client.send_text(
-                            whatsapp_group_id,
-                            notification_message
-                        )
-                        logger.info(
-                            "event_notification_sent",
-                            trip_id=trip["id"],
-                            group_id=whatsapp_group_id,
-                            event_type=event.notification_type
-                        )
-                    except Exception as e:
-                        logger.error(
-                            "event_notification_failed",
-                            error=str(e),
-                            trip_id=trip["id"],
-                            group_id=whatsapp_group_id
+            # 6-10. Aplicar efectos del evento
+            if outbox:
+                # Modo outbox: cambio de estado, webhooks y marca de procesado
+                # se confirman en una sola transacción; la entrega HTTP la hace
+                # WebhookDispatcher en segundo plano
+                async with self.db.transaction() as (cursor, conn):
+                    with span("wialon.status_update"):
+                        updated_trip = await self._apply_status_update(trip, action_result, cursor=cursor)
+                    with span("wialon.webhooks"):
+                        await self._notify_webhooks(
+                            event, created_event, trip, action_result, trip_geofence, cursor=cursor
                         )
-                        # No fallar el proceso si solo falla el WhatsApp
-                else:
-                    logger.warning(
-                        "event_notification_skipped_no_group",
-                        trip_id=trip["id"],
-                        has_group_id=bool(whatsapp_group_id),
-                        has_message=bool(notification_message)
+                    with span("wialon.mark_processed"):
+                        await self.event_repo.mark_as_processed(created_event["id"], cursor=cursor)
+
+                # Ya confirmado: el viaje releído dentro de la transacción pasa al registro
+                active_trips.trip_written(updated_trip)
+
+                with span("wialon.whatsapp_send"):
+                    await self._send_event_notification(event, trip, action_result)
+                with span("wialon.route_deviation_event"):
+                    route_deviation_event = await self._create_route_deviation_event(
+                        event, created_event, trip, unit, geofence_db_id, action_result
+                    )
+            else:
+                with span("wialon.status_update"):
+                    await self._apply_status_update(trip, action_result)
+                with span("wialon.whatsapp_send"):
+                    await self._send_event_notification(event, trip, action_result)
+                with span("wialon.webhooks"):
+                    await self._notify_webhooks(event, created_event, trip, action_result, trip_geofence)
+                with span("wialon.route_deviation_event"):
+                    route_deviation_event = await self._create_route_deviation_event(
+                        event, created_event, trip, unit, geofence_db_id, action_result
                     )
+                with span("wialon.mark_processed"):
+                    await self.event_repo.mark_as_processed(created_event["id"])
+
+            return {
+                "success": True,
+                "event_id": created_event["id"],
+                "trip_id": trip["id"],
+                "action": action_result,
+                "message": "Event processed successfully",
+                "route_deviation_event_id": route_deviation_event["id"] if route_deviation_event else None,
+            }
+
+        except Exception as e:
+            logger.error("event_processing_failed", error=str(e))
+            raise BusinessLogicError(f"Error procesando evento: {str(e)}")
+
+    async def _apply_status_update(
+        self, trip: Dict[str, Any], action_result: Dict[str, Any], cursor=None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Paso 6: actualizar estado del viaje si la acción lo requiere
+
+        Args:
+            trip: Viaje actual
+            action_result: Acción determinada para el evento
+            cursor: Cursor de una transacción abierta (modo outbox)
 
-            # 8. Enviar webhooks a Flowtify según tipo de evento
+        Returns:
+            Viaje actualizado, o None si la acción no cambia el estado
+        """
+        if not action_result.get("update_status"):
+            return None
+        updated_trip = await self.trip_repo.update_status(
+            trip["id"],
+            action_result["new_status"],
+            action_result["new_substatus"],
+            cursor=cursor,
+        )
+        logger.info(
+            "trip_status_updated_by_event",
+            trip_id=trip["id"],
+            new_status=action_result["new_status"],
+            new_substatus=action_result["new_substatus"],
+        )
+        return updated_trip
+
+    async def _send_event_notification(
+        self, event: WialonEvent, trip: Dict[str, Any], action_result: Dict[str, Any]
+    ) -> None:
+        """
+        Paso 7: enviar notificación WhatsApp si la acción lo requiere
+
+        Args:
+            event: Evento de Wialon
+            trip: Viaje actual
+            action_result: Acción determinada para el evento
+        """
+        logger.info(
+            "whatsapp_notification_check",
+            send_notification=action_result.get('send_notification'),
+            has_evolution_client=self.evolution_client is not None,
+            has_message=bool(action_result.get('notification_message')),
+        )
+        
+        if action_result.get("send_notification") and self.evolution_client:
+            whatsapp_group_id = trip.get("whatsapp_group_id")
+            notification_message = action_result.get("notification_message")
+            
             logger.info(
-                "event_webhook_check",
-                has_webhook_service=self.webhook_service is not None,
-                event_type=event.notification_type,
-                event_id=created_event.get("id"),
+                "sending_whatsapp_notification",
+                group_id=whatsapp_group_id,
+                message_preview=notification_message[:50] if notification_message else None,
             )
             
-            if self.webhook_service:
+            if whatsapp_group_id and notification_message:
                 try:
                     logger.info(
-                        "sending_event_webhook",
-                        event_type=event.notification_type,
-                        event_id=created_event.get("id"),
-                        trip_id=trip.get("id"),
+                        "sending_event_notification",
+                        trip_id=trip["id"],
+                        group_id=whatsapp_group_id,
+                        event_type=event.notification_type
                     )
-                    
-                    await self._send_webhooks_for_event(
-                        event=event,
-                        created_event=created_event,
-                        trip=trip,
-                        action_result=action_result,
+                    await self.evolution_client.send_text(
+                        whatsapp_group_id,
+                        notification_message
                     )
-                    
                     logger.info(
-                        "event_webhook_sent_successfully",
-                        event_type=event.notification_type,
-                        event_id=created_event.get("id"),
+                        "event_notification_sent",
+                        trip_id=trip["id"],
+                        group_id=whatsapp_group_id,
+                        event_type=event.notification_type
                     )
                 except Exception as e:
-                    # Log pero no fallar el procesamiento
                     logger.error(
-                        "webhook_send_failed_for_event",
+                        "event_notification_failed",
                         error=str(e),
-                        event_id=created_event["id"],
-                        event_type=event.notification_type,
+                        trip_id=trip["id"],
+                        group_id=whatsapp_group_id
                     )
-                    import traceback
-                    logger.error("webhook_error_traceback", traceback=traceback.format_exc())
+                    # No fallar el proceso si solo falla el WhatsApp
             else:
                 logger.warning(
-                    "webhook_service_is_none_skipping_event_webhook",
+                    "event_notification_skipped_no_group",
+                    trip_id=trip["id"],
+                    has_group_id=bool(whatsapp_group_id),
+                    has_message=bool(notification_message)
+                )
+
+    async def _notify_webhooks(
+        self,
+        event: WialonEvent,
+        created_event: Dict[str, Any],
+        trip: Dict[str, Any],
+        action_result: Dict[str, Any],
+        trip_geofence: Optional[TripGeofence] = None,
+        cursor=None,
+    ) -> None:
+        """
+        Paso 8: enviar (o encolar en el outbox) webhooks a Flowtify
+
+        Args:
+            event: Evento de Wialon
+            created_event: Evento guardado en BD
+            trip: Viaje actual
+            action_result: Acción determinada para el evento
+            trip_geofence: Geocerca del viaje resuelta desde la caché
+            cursor: Cursor de una transacción abierta (modo outbox)
+        """
+        logger.info(
+            "event_webhook_check",
+            has_webhook_service=self.webhook_service is not None,
+            event_type=event.notification_type,
+            event_id=created_event.get("id"),
+        )
+        
+        if self.webhook_service:
+            try:
+                logger.info(
+                    "sending_event_webhook",
                     event_type=event.notification_type,
                     event_id=created_event.get("id"),
+                    trip_id=trip.get("id"),
                 )
-            
-            # 9. Si es desviación de ruta, crear evento adicional de tipo route_deviation
-            route_deviation_event = None
-            if action_result.get("create_route_deviation_event") and event.notification_type == WIALON_EVENT_TYPES["GEOFENCE_EXIT"]:
-                try:
-                    # Crear evento adicional de tipo route_deviation
-                    route_deviation_notification_id = f"{event.notification_id}_route_deviation" if event.notification_id else f"route_deviation_{event.event_time}_{event.unit_id}_{uuid.uuid4().hex[:8]}"
-                    
-                    route_deviation_event_data = {
-                        "wialon_notification_id": route_deviation_notification_id,
-                        "trip_id": trip["id"],
-                        "unit_id": unit["id"],
-                        "event_type": WIALON_EVENT_TYPES["ROUTE_DEVIATION"],  # Tipo route_deviation
-                        "event_time": event.event_time,
-                        "latitude": event.latitude,
-                        "longitude": event.longitude,
-                        "geofence_id": geofence_db_id,  # Misma geocerca
-                        "raw_payload": {
-                            **event.model_dump(),
-                            "detected_from": "geofence_exit",
-                            "geofence_role": "route",
-                            "route_deviation_source_event_id": created_event["id"],
-                        },
-                    }
-                    
-                    route_deviation_event = await self.event_repo.create_event(route_deviation_event_data)
+                
+                await self._send_webhooks_for_event(
+                    event=event,
+                    created_event=created_event,
+                    trip=trip,
+                    action_result=action_result,
+                    trip_geofence=trip_geofence,
+                    cursor=cursor,
+                )
+                
+                logger.info(
+                    "event_webhook_sent_successfully",
+                    event_type=event.notification_type,
+                    event_id=created_event.get("id"),
+                )
+            except Exception as e:
+                # Envío directo: log pero no fallar el procesamiento
+                logger.error(
+                    "webhook_send_failed_for_event",
+                    error=str(e),
+                    event_id=created_event["id"],
+                    event_type=event.notification_type,
+                )
+                import traceback
+                logger.error("webhook_error_traceback", traceback=traceback.format_exc())
+                # Modo outbox: sin la fila del outbox la transacción no debe
+                # confirmar el cambio de estado ni la marca de procesado
+                if cursor is not None:
+                    raise
+        else:
+            logger.warning(
+                "webhook_service_is_none_skipping_event_webhook",
+                event_type=event.notification_type,
+                event_id=created_event.get("id"),
+            )
+
+    async def _create_route_deviation_event(
+        self,
+        event: WialonEvent,
+        created_event: Dict[str, Any],
+        trip: Dict[str, Any],
+        unit: Dict[str, Any],
+        geofence_db_id: Optional[str],
+        action_result: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Paso 9: si es desviación de ruta, crear evento adicional de tipo route_deviation
+
+        Returns:
+            Evento route_deviation creado o None
+        """
+        route_deviation_event = None
+        if action_result.get("create_route_deviation_event") and event.notification_type == WIALON_EVENT_TYPES["GEOFENCE_EXIT"]:
+            try:
+                # Crear evento adicional de tipo route_deviation
+                route_deviation_notification_id = f"{event.notification_id}_route_deviation" if event.notification_id else f"route_deviation_{event.event_time}_{event.unit_id}_{uuid.uuid4().hex[:8]}"
+                
+                route_deviation_event_data = {
+                    "wialon_notification_id": route_deviation_notification_id,
+                    "trip_id": trip["id"],
+                    "unit_id": unit["id"],
+                    "event_type": WIALON_EVENT_TYPES["ROUTE_DEVIATION"],  # Tipo route_deviation
+                    "event_time": event.event_time,
+                    "latitude": event.latitude,
+                    "longitude": event.longitude,
+                    "geofence_id": geofence_db_id,  # Misma geocerca
+                    "raw_payload": {
+                        **event.model_dump(),
+                        "detected_from": "geofence_exit",
+                        "geofence_role": "route",
+                        "route_deviation_source_event_id": created_event["id"],
+                    },
+                }
+                
+                route_deviation_event = await self.event_repo.create_event(route_deviation_event_data)
+                
+                if route_deviation_event:
+                    logger.info(
+                        "route_deviation_event_created",
+                        event_id=route_deviation_event["id"],
+                        source_event_id=created_event["id"],
+                        trip_id=trip["id"]
+                    )
                     
-                    if route_deviation_event:
-                        logger.info(
-                            "route_deviation_event_created",
-                            event_id=route_deviation_event["id"],
-                            source_event_id=created_event["id"],
-                            trip_id=trip["id"]
-                        )
-                        
-                        # Marcar el evento route_deviation como procesado también (ya se procesó con el geofence_exit)
-                        await self.event_repo.mark_as_processed(route_deviation_event["id"])
-                    else:
-                        logger.warning(
-                            "route_deviation_event_not_created_duplicate",
-                            notification_id=route_deviation_notification_id,
-                            trip_id=trip["id"]
-                        )
-                except Exception as e:
-                    # No fallar el procesamiento si falla la creación del evento adicional
-                    logger.error(
-                        "route_deviation_event_creation_failed",
-                        error=str(e),
-                        trip_id=trip["id"],
-                        source_event_id=created_event["id"]
+                    # Marcar el evento route_deviation como procesado también (ya se procesó con el geofence_exit)
+                    await self.event_repo.mark_as_processed(route_deviation_event["id"])
+                else:
+                    logger.warning(
+                        "route_deviation_event_not_created_duplicate",
+                        notification_id=route_deviation_notification_id,
+                        trip_id=trip["id"]
                     )
-            
-            # 10. Marcar evento como procesado
-            await self.event_repo.mark_as_processed(created_event["id"])
-
-            return {
-                "success": True,
-                "event_id": created_event["id"],
-                "trip_id": trip["id"],
-                "action": action_result,
-                "message": "Event processed successfully",
-                "route_deviation_event_id": route_deviation_event["id"] if route_deviation_event else None,
-            }
+            except Exception as e:
+                # No fallar el procesamiento si falla la creación del evento adicional
+                logger.error(
+                    "route_deviation_event_creation_failed",
+                    error=str(e),
+                    trip_id=trip["id"],
+                    source_event_id=created_event["id"]
+                )
 
-        except Exception as e:
-            logger.error("event_processing_failed", error=str(e))
-            raise BusinessLogicError(f"Error procesando evento: {str(e)}")
+        return route_deviation_event
 
     async def _determine_action(
-        self, event: WialonEvent, trip: Dict[str, Any]
+        self,
+        event: WialonEvent,
+        trip: Dict[str, Any],
+        trip_geofence: Optional[TripGeofence] = None,
     ) -> Dict[str, Any]:
         """
         Determinar acción a tomar según el tipo de evento
@@ -413,6 +556,8 @@ class EventService:
         Args:
             event: Evento de Wialon
             trip: Viaje actual
+            trip_geofence: Geocerca del viaje resuelta desde la caché (None si
+                la geocerca no está asociada al viaje)
 
         Returns:
             Diccionario con la acción a realizar
@@ -430,32 +575,16 @@ class EventService:
 
         # Entrada a geocerca
         if event.notification_type == WIALON_EVENT_TYPES["GEOFENCE_ENTRY"]:
-            # Primero intentar determinar el rol desde la BD (más confiable)
-            geofence_role = None
+            # Primero intentar determinar el rol desde la asociación del viaje (más confiable)
+            geofence_role = trip_geofence.role if trip_geofence else None
             if event.geofence_id:
-                try:
-                    geofence_role = await self.db.fetchval(
-                        """
-                        SELECT tg.visit_type 
-                        FROM trip_geofences tg
-                        JOIN geofences g ON g.id = tg.geofence_id
-                        WHERE tg.trip_id = %s 
-                          AND (g.floatify_geofence_id = %s OR g.wialon_geofence_id = %s)
-                        LIMIT 1
-                        """,
-                        trip["id"],
-                        event.geofence_id,
-                        event.geofence_id
-                    )
-                    logger.info(
-                        "geofence_role_detected",
-                        geofence_id=event.geofence_id,
-                        geofence_name=event.geofence_name,
-                        role=geofence_role,
-                        trip_id=trip["id"]
-                    )
-                except Exception as e:
-                    logger.warning("geofence_role_lookup_failed", error=str(e), geofence_id=event.geofence_id)
+                logger.info(
+                    "geofence_role_detected",
+                    geofence_id=event.geofence_id,
+                    geofence_name=event.geofence_name,
+                    role=geofence_role,
+                    trip_id=trip["id"]
+                )
             
             # Si encontramos el rol en BD, usarlo
             if geofence_role == "loading":
@@ -506,32 +635,16 @@ class EventService:
 
         # Salida de geocerca
         elif event.notification_type == WIALON_EVENT_TYPES["GEOFENCE_EXIT"]:
-            # Primero intentar determinar el rol desde la BD (más confiable)
-            geofence_role = None
+            # Primero intentar determinar el rol desde la asociación del viaje (más confiable)
+            geofence_role = trip_geofence.role if trip_geofence else None
             if event.geofence_id:
-                try:
-                    geofence_role = await self.db.fetchval(
-                        """
-                        SELECT tg.visit_type 
-                        FROM trip_geofences tg
-                        JOIN geofences g ON g.id = tg.geofence_id
-                        WHERE tg.trip_id = %s 
-                          AND (g.floatify_geofence_id = %s OR g.wialon_geofence_id = %s)
-                        LIMIT 1
-                        """,
-                        trip["id"],
-                        event.geofence_id,
-                        event.geofence_id
-                    )
-                    logger.info(
-                        "geofence_role_detected",
-                        geofence_id=event.geofence_id,
-                        geofence_name=event.geofence_name,
-                        role=geofence_role,
-                        trip_id=trip["id"]
-                    )
-                except Exception as e:
-                    logger.warning("geofence_role_lookup_failed", error=str(e), geofence_id=event.geofence_id)
+                logger.info(
+                    "geofence_role_detected",
+                    geofence_id=event.geofence_id,
+                    geofence_name=event.geofence_name,
+                    role=geofence_role,
+                    trip_id=trip["id"]
+                )
             
             # Si encontramos el rol en BD, usarlo
             if geofence_role == "loading":
@@ -646,6 +759,8 @@ class EventService:
         created_event: Dict[str, Any],
         trip: Dict[str, Any],
         action_result: Dict[str, Any],
+        trip_geofence: Optional[TripGeofence] = None,
+        cursor=None,
     ):
         """
         Enviar webhooks a Flowtify según tipo de evento
@@ -655,6 +770,8 @@ class EventService:
             created_event: Evento guardado en BD
             trip: Viaje asociado
             action_result: Resultado de la acción determinada
+            trip_geofence: Geocerca del viaje resuelta desde la caché
+            cursor: Cursor de una transacción abierta (modo outbox)
         """
         event_id = created_event["id"]
         trip_id = trip["id"]
@@ -679,6 +796,7 @@ class EventService:
                 event_id=event_id,
                 trip_id=trip_id,
                 violation_data=violation_data,
+                cursor=cursor,
             )
             logger.info(
                 "speed_violation_webhook_sent",
@@ -697,26 +815,12 @@ class EventService:
                 else "exit"
             )
             
-            # Obtener role y tipo de la geocerca desde BD (MySQL)
+            # Obtener role y tipo de la geocerca desde la asociación del viaje
             geofence_role = "unknown"
             geofence_type = "polygon"  # Default
-            if event.geofence_id:
-                geofence_info = await self.db.fetchrow(
-                    """
-                    SELECT tg.visit_type, g.geofence_type
-                    FROM trip_geofences tg
-                    JOIN geofences g ON g.id = tg.geofence_id
-                    WHERE tg.trip_id = %s 
-                      AND (g.floatify_geofence_id = %s OR g.wialon_geofence_id = %s)
-                    LIMIT 1
-                    """,
-                    trip_id,
-                    event.geofence_id,
-                    event.geofence_id,
-                )
-                if geofence_info:
-                    geofence_role = geofence_info.get("visit_type") or "unknown"
-                    geofence_type = geofence_info.get("geofence_type") or "polygon"
+            if trip_geofence:
+                geofence_role = trip_geofence.role or "unknown"
+                geofence_type = trip_geofence.geofence_type or "polygon"
             
             # Fallback: detección por nombre
             if geofence_role == "unknown":
@@ -750,6 +854,7 @@ class EventService:
                             event_id=event_id,
                             trip_id=trip_id,
                             deviation_data=deviation_data,
+                            cursor=cursor,
                         )
                         logger.info(
                             "route_deviation_webhook_sent",
@@ -764,6 +869,8 @@ class EventService:
                             trip_id=trip_id,
                             error=str(e)
                         )
+                        if cursor is not None:
+                            raise
                 
                 elif transition_type == "entry":
                     # Entrada a geocerca de ruta = Regreso a ruta
@@ -842,6 +949,7 @@ class EventService:
                                 event_id=event_id,
                                 trip_id=trip_id,
                                 return_data=return_data,
+                                cursor=cursor,
                             )
                             logger.info(
                                 "route_return_webhook_sent",
@@ -867,6 +975,8 @@ class EventService:
                             trip_id=trip_id,
                             error=str(e)
                         )
+                        if cursor is not None:
+                            raise
             else:
                 # Para otras geocercas (loading, unloading, etc.), enviar geofence_transition normalmente
                 geofence_data = {
@@ -889,6 +999,7 @@ class EventService:
                     trip_id=trip_id,
                     transition_type=transition_type,
                     geofence_data=geofence_data,
+                    cursor=cursor,
                 )
                 logger.info(
                     "geofence_transition_webhook_sent",
@@ -918,6 +1029,7 @@ class EventService:
                 event_id=event_id,
                 trip_id=trip_id,
                 deviation_data=deviation_data,
+                cursor=cursor,
             )
             logger.info(
                 "route_deviation_webhook_sent",
@@ -0,0 +1,152 @@
+"""
+Caché por viaje de geocercas asociadas
+
+Un evento de geocerca necesitaba hasta tres consultas: el id de BD de la
+geocerca, el visit_type para _determine_action y visit_type + geofence_type
+para los webhooks. Esta caché resuelve las tres con un único mapa por viaje
+{id externo (floatify o wialon) -> TripGeofence}, cargado al crear el viaje
+o con el primer evento, e invalidado cuando el viaje termina.
+"""
+from typing import Dict, Any, Optional, List
+from dataclasses import dataclass
+
+from app.core.cache import LRUCache
+from app.core.database import Database
+from app.core.logging import get_logger
+from app.config import settings
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class TripGeofence:
+    """Geocerca resuelta para un viaje"""
+
+    db_id: Any
+    role: Optional[str]  # visit_type en trip_geofences
+    geofence_type: Optional[str]
+    name: Optional[str]
+
+
+class GeofenceCache:
+    """Mapa de geocercas por viaje con expulsión LRU"""
+
+    def __init__(self, max_trips: int = 1000):
+        """
+        Inicializar caché
+
+        Args:
+            max_trips: Número máximo de viajes en memoria
+        """
+        self._trips: LRUCache[Dict[str, TripGeofence]] = LRUCache(max_size=max_trips)
+
+    @staticmethod
+    def build_map(rows: List[Dict[str, Any]]) -> Dict[str, TripGeofence]:
+        """
+        Construir el mapa a partir de filas trip_geofences JOIN geofences
+
+        Cada geocerca queda indexada por floatify_geofence_id y por
+        wialon_geofence_id; ante ids repetidos gana la de menor sequence_order.
+
+        Args:
+            rows: Filas con id, floatify_geofence_id, wialon_geofence_id, name,
+                geofence_type y visit_type
+
+        Returns:
+            Mapa {id externo -> TripGeofence}
+        """
+        mapping: Dict[str, TripGeofence] = {}
+        for row in rows:
+            geofence = TripGeofence(
+                db_id=row.get("id"),
+                role=row.get("visit_type"),
+                geofence_type=row.get("geofence_type"),
+                name=row.get("name"),
+            )
+            for key in (row.get("floatify_geofence_id"), row.get("wialon_geofence_id")):
+                if key is not None and key != "":
+                    mapping.setdefault(str(key), geofence)
+        return mapping
+
+    async def get_trip_geofences(self, db: Database, trip_id: str) -> Dict[str, TripGeofence]:
+        """
+        Obtener el mapa de geocercas de un viaje (una consulta en el primer acceso)
+
+        Args:
+            db: Instancia de base de datos
+            trip_id: ID del viaje
+
+        Returns:
+            Mapa {id externo -> TripGeofence}
+        """
+        mapping = self._trips.get(trip_id)
+        if mapping is not None:
+            return mapping
+
+        rows = await db.fetch(
+            """
+            SELECT g.id, g.floatify_geofence_id, g.wialon_geofence_id, g.name,
+                   g.geofence_type, tg.visit_type
+            FROM trip_geofences tg
+            JOIN geofences g ON g.id = tg.geofence_id
+            WHERE tg.trip_id = %s
+            ORDER BY tg.sequence_order ASC
+            """,
+            trip_id,
+        )
+        mapping = self.build_map(rows or [])
+        self._trips.set(trip_id, mapping)
+
+        logger.info("trip_geofences_loaded", trip_id=trip_id, geofences=len(rows or []))
+        return mapping
+
+    async def resolve(
+        self, db: Database, trip_id: str, external_geofence_id: Optional[str]
+    ) -> Optional[TripGeofence]:
+        """
+        Resolver una geocerca del viaje por su id externo
+
+        Args:
+            db: Instancia de base de datos
+            trip_id: ID del viaje
+            external_geofence_id: geofence_id recibido de Wialon
+
+        Returns:
+            TripGeofence o None si la geocerca no está asociada al viaje
+        """
+        if not external_geofence_id:
+            return None
+        mapping = await self.get_trip_geofences(db, trip_id)
+        return mapping.get(str(external_geofence_id))
+
+    def prime(self, trip_id: str, mapping: Dict[str, TripGeofence]) -> None:
+        """
+        Cargar el mapa de un viaje recién creado
+
+        Args:
+            trip_id: ID del viaje
+            mapping: Mapa {id externo -> TripGeofence}
+        """
+        self._trips.set(trip_id, mapping)
+
+    def invalidate(self, trip_id: str) -> None:
+        """
+        Descartar el mapa de un viaje (p.ej. al finalizarlo)
+
+        Args:
+            trip_id: ID del viaje
+        """
+        if self._trips.delete(trip_id):
+            logger.info("trip_geofences_invalidated", trip_id=trip_id)
+
+    def clear(self) -> int:
+        """Vaciar la caché"""
+        return self._trips.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obtener métricas de la caché"""
+        return self._trips.get_stats()
+
+
+# Instancia global de la caché de geocercas por viaje
+geofence_cache = GeofenceCache(max_trips=settings.geofence_cache_max_trips)
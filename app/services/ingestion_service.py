@@ -0,0 +1,628 @@
+"""
+Servicio de ingesta asíncrona de eventos de Wialon
+
+El endpoint POST /wialon/events persiste el evento validado en la tabla
+wialon_event_queue y responde 202 de inmediato. Un pool de workers drena
+la cola y ejecuta EventService.process_wialon_event.
+
+Los eventos se reparten en shards por wialon_unit_id: cada shard tiene su
+propia cola acotada y un único worker, por lo que los eventos de una misma
+unidad se procesan en orden de llegada mientras unidades distintas avanzan
+en paralelo.
+
+Cada fila se reclama antes de procesarse (status 'processing', claimed_by,
+claimed_at). Las filas que no caben en memoria quedan 'pending' y un barrido
+periódico las reclama de forma atómica por lotes, junto con las filas
+'processing' cuyo lease venció (p.ej. instancia caída). Cada barrido renueva
+además el lease de todo lo que esta instancia tiene en memoria, aunque las
+colas estén llenas, y el resultado sólo se registra si la fila sigue
+reclamada con el mismo token. Un fallo programa un reintento con backoff
+exponencial y sólo se marca 'failed' al agotar los intentos; un reintento
+puede reordenar los eventos de esa unidad.
+"""
+from typing import Dict, Any, Iterable, List, Optional, Set
+from dataclasses import dataclass
+from datetime import datetime
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import time
+import uuid
+import zlib
+
+from app.core.database import Database
+from app.core.context import set_trace_id, clear_trace_id, get_trace_id
+from app.core.logging import get_logger, log_context, clear_log_context
+from app.core.query_stats import track_queries
+from app.core.tracing import start_trace
+from app.models.event import WialonEvent
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class QueuedEvent:
+    """Evento encolado pendiente de procesar"""
+
+    queue_id: str
+    event: WialonEvent
+    enqueued_at: float  # epoch en segundos
+    trace_id: Optional[str] = None
+    attempts: int = 0  # Intentos previos registrados en la fila
+    claimed_by: Optional[str] = None  # Token con el que se reclamó la fila
+
+
+class WialonIngestionService:
+    """Cola durable con workers particionados por unidad"""
+
+    def __init__(
+        self,
+        db: Database,
+        event_service,
+        num_workers: int = 8,
+        recovery_batch_size: int = 500,
+        queue_size: int = 1000,
+        sweep_interval: float = 5.0,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+    ):
+        """
+        Inicializar servicio de ingesta
+
+        Args:
+            db: Instancia de base de datos
+            event_service: EventService usado por los workers
+            num_workers: Número de shards (un worker por shard)
+            recovery_batch_size: Filas reclamadas por lote en cada barrido
+            queue_size: Capacidad de la cola en memoria de cada shard
+            sweep_interval: Segundos entre barridos de filas pendientes
+            lease_seconds: Segundos tras los que una fila 'processing' se puede reclamar de nuevo
+            max_attempts: Intentos antes de marcar la fila como 'failed'
+            backoff_base: Segundos de espera tras el primer fallo (se duplica por intento)
+            backoff_max: Espera máxima entre intentos en segundos
+        """
+        self.db = db
+        self.event_service = event_service
+        self.num_workers = max(1, num_workers)
+        self.recovery_batch_size = max(1, recovery_batch_size)
+        self.queue_size = max(1, queue_size)
+        self.sweep_interval = sweep_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Identificador de esta instancia; cada barrido usa un token propio
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._claim_seq = itertools.count(1)
+
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._running = False
+        # Filas reclamadas por esta instancia que siguen en memoria (queue_id -> evento)
+        self._claimed: Dict[str, QueuedEvent] = {}
+        # Shards con filas diferidas a la BD: lo nuevo también se difiere para no adelantarlas
+        self._backlogged: Set[int] = set()
+
+        # Métricas
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._retried = 0
+        self._recovered = 0
+        self._deferred = 0
+        self._released = 0
+        self._in_flight = 0
+        self._last_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+
+    def shard_for(self, unit_id: str) -> int:
+        """
+        Obtener el shard asignado a una unidad
+
+        Args:
+            unit_id: ID de la unidad en Wialon
+
+        Returns:
+            Índice de shard (estable entre reinicios)
+        """
+        return zlib.crc32(str(unit_id).encode("utf-8")) % self.num_workers
+
+    async def start(self) -> None:
+        """Crear colas, reclamar eventos pendientes y arrancar workers y barrido"""
+        if self._running:
+            return
+
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.num_workers)]
+        self._running = True
+
+        await self._sweep()
+
+        self._workers = [
+            asyncio.create_task(self._worker(shard), name=f"wialon-ingest-{shard}")
+            for shard in range(self.num_workers)
+        ]
+        self._sweeper = asyncio.create_task(self._sweep_loop(), name="wialon-ingest-sweeper")
+
+        logger.info(
+            "wialon_ingestion_started",
+            workers=self.num_workers,
+            queue_size=self.queue_size,
+            instance_id=self.instance_id,
+            recovered=self._recovered,
+        )
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Detener workers esperando a que las colas se vacíen
+
+        Los eventos que no alcancen a procesarse se devuelven a 'pending'
+        para que los reclame el siguiente barrido (de esta u otra instancia).
+
+        Args:
+            drain_timeout: Segundos máximos de espera para vaciar las colas
+        """
+        if not self._running:
+            return
+
+        self._running = False
+
+        if self._sweeper:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.join() for q in self._queues)),
+                timeout=drain_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("wialon_ingestion_drain_timeout", pending=self.queue_depth)
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._claimed:
+            await self._release(list(self._claimed.values()))
+            self._claimed.clear()
+
+        logger.info(
+            "wialon_ingestion_stopped",
+            processed=self._processed,
+            failed=self._failed,
+            released=self._released,
+        )
+
+    async def enqueue(self, event: WialonEvent) -> str:
+        """
+        Persistir un evento y encolarlo para procesamiento
+
+        Si la cola del shard está llena (o ya tiene filas diferidas) la fila
+        queda 'pending' y la reclama el barrido periódico.
+
+        Args:
+            event: Evento de Wialon validado
+
+        Returns:
+            ID del evento en la cola
+        """
+        queue_id = str(uuid.uuid4())
+        trace_id = get_trace_id()
+        payload = event.model_dump()
+        shard = self.shard_for(event.unit_id)
+        dispatch = shard not in self._backlogged and not self._queues[shard].full()
+
+        await self.db.execute(
+            """
+            INSERT INTO wialon_event_queue
+                (id, wialon_unit_id, notification_type, wialon_notification_id,
+                 payload, status, claimed_by, claimed_at, trace_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, IF(%s IS NULL, NULL, NOW(3)), %s)
+            """,
+            queue_id,
+            event.unit_id,
+            event.notification_type,
+            event.notification_id,
+            json.dumps(payload, default=str),
+            "processing" if dispatch else "pending",
+            self.instance_id if dispatch else None,
+            self.instance_id if dispatch else None,
+            trace_id,
+        )
+
+        item = QueuedEvent(
+            queue_id=queue_id,
+            event=event,
+            enqueued_at=time.time(),
+            trace_id=trace_id,
+            claimed_by=self.instance_id if dispatch else None,
+        )
+        # La cola pudo llenarse (o diferir otra fila del shard) mientras se insertaba
+        if not (dispatch and shard not in self._backlogged and self._dispatch(item, shard)):
+            if dispatch:
+                await self._release([item])
+            self._backlogged.add(shard)
+            self._deferred += 1
+            logger.warning("wialon_ingestion_deferred", queue_id=queue_id, shard=shard)
+
+        return queue_id
+
+    def _dispatch(self, item: QueuedEvent, shard: int) -> bool:
+        """
+        Colocar un evento en la cola de su shard
+
+        Returns:
+            False si la cola del shard está llena
+        """
+        try:
+            self._queues[shard].put_nowait(item)
+        except asyncio.QueueFull:
+            return False
+        self._claimed[item.queue_id] = item
+        self._enqueued += 1
+        return True
+
+    def _next_claim_token(self) -> str:
+        """Token único por lote para leer exactamente las filas reclamadas"""
+        return f"{self.instance_id}:{next(self._claim_seq)}"
+
+    async def _sweep_loop(self) -> None:
+        """Renovar leases propios y barrer periódicamente filas pendientes y leases vencidos"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self._renew_leases()
+            await self._sweep()
+
+    async def _renew_leases(self) -> None:
+        """
+        Renovar el lease de las filas que esta instancia tiene en memoria
+
+        Se ejecuta en cada barrido con independencia de la capacidad de las
+        colas, para que otra instancia no reclame (y duplique) eventos que
+        sólo esperan turno en un shard lento.
+        """
+        tokens = sorted({item.claimed_by for item in self._claimed.values() if item.claimed_by})
+        if not tokens:
+            return
+        placeholders = ", ".join(["%s"] * len(tokens))
+        try:
+            await self.db.execute(
+                f"""
+                UPDATE wialon_event_queue
+                SET claimed_at = NOW(3)
+                WHERE status = 'processing' AND claimed_by IN ({placeholders})
+                """,
+                *tokens,
+            )
+        except Exception as e:
+            logger.error("wialon_ingestion_lease_renew_failed", claimed=len(self._claimed), error=str(e))
+
+    async def _sweep(self) -> int:
+        """
+        Reclamar filas pendientes por lotes hasta vaciar el backlog o llenar las colas
+
+        Returns:
+            Número de eventos encolados en este barrido
+        """
+        recovered = 0
+        full_shards: Set[int] = set()
+        drained = False
+        deferred_before = self._deferred
+
+        try:
+            while self._running:
+                capacity = sum(self.queue_size - q.qsize() for q in self._queues)
+                if capacity <= 0:
+                    break
+                limit = min(self.recovery_batch_size, capacity)
+
+                token = self._next_claim_token()
+                rows = await self._claim_batch(token, limit)
+                release = []
+                for row in rows:
+                    if row["id"] in self._claimed:
+                        # Lease propio vencido mientras seguía en memoria: adoptar el nuevo token
+                        self._claimed[row["id"]].claimed_by = token
+                        continue
+                    item = await self._row_to_item(row, token)
+                    if item is None:
+                        continue
+                    shard = self.shard_for(item.event.unit_id)
+                    if shard in full_shards or not self._dispatch(item, shard):
+                        full_shards.add(shard)
+                        release.append(item)
+                        continue
+                    recovered += 1
+
+                if release:
+                    await self._release(release)
+                if len(rows) < limit:
+                    drained = True
+                    break
+                if len(release) == len(rows):
+                    # Todo el lote cae en shards llenos; esperar al siguiente barrido
+                    break
+        except Exception as e:
+            logger.error("wialon_ingestion_sweep_failed", error=str(e))
+            return recovered
+
+        if drained and self._deferred == deferred_before:
+            # Sin backlog en la BD: los shards con cola libre vuelven a encolar directo
+            self._backlogged &= full_shards
+        self._recovered += recovered
+        if recovered:
+            logger.info("wialon_ingestion_swept", recovered=recovered, backlogged=len(self._backlogged))
+        return recovered
+
+    async def _claim_batch(self, token: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Reclamar atómicamente hasta `limit` filas y leerlas por su token
+
+        Se reclaman filas 'pending' cuyo reintento ya venció y filas
+        'processing' cuyo lease expiró.
+        """
+        await self.db.execute(
+            """
+            UPDATE wialon_event_queue
+            SET status = 'processing', claimed_by = %s, claimed_at = NOW(3)
+            WHERE (status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= NOW(3)))
+               OR (status = 'processing' AND claimed_at < NOW(3) - INTERVAL %s SECOND)
+            ORDER BY received_at ASC
+            LIMIT %s
+            """,
+            token,
+            self.lease_seconds,
+            limit,
+        )
+        return await self.db.fetch(
+            """
+            SELECT id, payload, received_at, trace_id, attempts
+            FROM wialon_event_queue
+            WHERE claimed_by = %s AND status = 'processing'
+            ORDER BY received_at ASC
+            """,
+            token,
+        )
+
+    async def _row_to_item(self, row: Dict[str, Any], token: str) -> Optional[QueuedEvent]:
+        """Convertir una fila reclamada en QueuedEvent; un payload inválido se marca 'failed'"""
+        try:
+            payload = row["payload"]
+            if isinstance(payload, (str, bytes)):
+                payload = json.loads(payload)
+            event = WialonEvent(**payload)
+        except Exception as e:
+            logger.error("wialon_ingestion_recovery_invalid", queue_id=row["id"], error=str(e))
+            self._failed += 1
+            await self._mark_failed(row["id"], token, f"Invalid payload: {e}")
+            return None
+
+        received_at = row.get("received_at")
+        return QueuedEvent(
+            queue_id=row["id"],
+            event=event,
+            enqueued_at=received_at.timestamp() if isinstance(received_at, datetime) else time.time(),
+            trace_id=row.get("trace_id"),
+            attempts=row.get("attempts") or 0,
+            claimed_by=token,
+        )
+
+    async def _worker(self, shard: int) -> None:
+        """
+        Worker de un shard: procesa sus eventos en orden
+
+        Args:
+            shard: Índice del shard
+        """
+        queue = self._queues[shard]
+        while True:
+            item = await queue.get()
+            try:
+                await self._process(item, shard)
+            finally:
+                queue.task_done()
+
+    async def _process(self, item: QueuedEvent, shard: int) -> None:
+        """Procesar un evento encolado y registrar su resultado"""
+        lag_ms = max(0.0, (time.time() - item.enqueued_at) * 1000)
+        self._last_lag_ms = lag_ms
+        self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+        self._total_lag_ms += lag_ms
+        self._in_flight += 1
+
+        set_trace_id(item.trace_id or str(uuid.uuid4()))
+        log_context(queue_id=item.queue_id, unit_id=item.event.unit_id, shard=shard)
+
+        settled = True
+        try:
+            with track_queries() as query_stats, start_trace() as trace:
+                result = await self.event_service.process_wialon_event(item.event)
+            await self._mark_done(item.queue_id, item.claimed_by)
+            self._processed += 1
+            logger.info(
+                "wialon_queued_event_processed",
+                lag_ms=round(lag_ms, 2),
+                event_id=result.get("event_id") if result else None,
+                trip_id=result.get("trip_id") if result else None,
+                **query_stats.as_log_fields(),
+                **trace.as_log_fields(),
+            )
+        except asyncio.CancelledError:
+            # Worker detenido a mitad del evento: stop() devuelve la fila a 'pending'
+            settled = False
+            raise
+        except Exception as e:
+            attempt = item.attempts + 1
+            if attempt < self.max_attempts:
+                delay = self._backoff_seconds(attempt)
+                self._retried += 1
+                logger.warning(
+                    "wialon_queued_event_retry_scheduled",
+                    error=str(e),
+                    attempt=attempt,
+                    delay=delay,
+                    lag_ms=round(lag_ms, 2),
+                )
+                await self._mark_retry(item.queue_id, item.claimed_by, str(e), delay)
+            else:
+                self._failed += 1
+                logger.error(
+                    "wialon_queued_event_failed",
+                    error=str(e),
+                    attempt=attempt,
+                    lag_ms=round(lag_ms, 2),
+                )
+                await self._mark_failed(item.queue_id, item.claimed_by, str(e))
+        finally:
+            if settled:
+                self._claimed.pop(item.queue_id, None)
+            self._in_flight -= 1
+            clear_log_context()
+            clear_trace_id()
+
+    def _backoff_seconds(self, attempt: int) -> int:
+        """
+        Calcular espera antes del siguiente intento
+
+        Args:
+            attempt: Número de intento que acaba de fallar (1-based)
+
+        Returns:
+            Segundos hasta el siguiente intento (con jitter)
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return int(delay + random.uniform(0, delay * 0.1))
+
+    async def _mark_done(self, queue_id: str, claimed_by: Optional[str]) -> None:
+        """Marcar un evento como procesado"""
+        try:
+            updated = await self.db.execute(
+                """
+                UPDATE wialon_event_queue
+                SET status = 'done', attempts = attempts + 1, processed_at = NOW(3)
+                WHERE id = %s AND claimed_by = %s
+                """,
+                queue_id,
+                claimed_by,
+            )
+            self._check_claim(updated, queue_id, claimed_by, "done")
+        except Exception as e:
+            logger.error("wialon_ingestion_mark_done_failed", queue_id=queue_id, error=str(e))
+
+    async def _mark_retry(self, queue_id: str, claimed_by: Optional[str], error: str, delay: int) -> None:
+        """Devolver un evento a 'pending' con el siguiente intento programado"""
+        try:
+            updated = await self.db.execute(
+                """
+                UPDATE wialon_event_queue
+                SET status = 'pending', attempts = attempts + 1, last_error = %s,
+                    claimed_by = NULL, claimed_at = NULL,
+                    next_attempt_at = NOW(3) + INTERVAL %s SECOND
+                WHERE id = %s AND claimed_by = %s
+                """,
+                error[:2000],
+                delay,
+                queue_id,
+                claimed_by,
+            )
+            self._check_claim(updated, queue_id, claimed_by, "retry")
+        except Exception as e:
+            logger.error("wialon_ingestion_mark_retry_failed", queue_id=queue_id, error=str(e))
+
+    async def _mark_failed(self, queue_id: str, claimed_by: Optional[str], error: str) -> None:
+        """Marcar un evento como fallido"""
+        try:
+            updated = await self.db.execute(
+                """
+                UPDATE wialon_event_queue
+                SET status = 'failed', attempts = attempts + 1,
+                    last_error = %s, processed_at = NOW(3)
+                WHERE id = %s AND claimed_by = %s
+                """,
+                error[:2000],
+                queue_id,
+                claimed_by,
+            )
+            self._check_claim(updated, queue_id, claimed_by, "failed")
+        except Exception as e:
+            logger.error("wialon_ingestion_mark_failed_failed", queue_id=queue_id, error=str(e))
+
+    def _check_claim(self, updated: Any, queue_id: str, claimed_by: Optional[str], outcome: str) -> None:
+        """Avisar si la fila ya no estaba reclamada con nuestro token (otra instancia la tomó)"""
+        if updated == 0:
+            logger.warning(
+                "wialon_ingestion_claim_lost",
+                queue_id=queue_id,
+                claimed_by=claimed_by,
+                outcome=outcome,
+            )
+
+    async def _release(self, items: Iterable[QueuedEvent]) -> None:
+        """Devolver filas reclamadas a 'pending' sin consumir un intento"""
+        items = list(items)
+        queue_ids = [item.queue_id for item in items]
+        tokens = sorted({item.claimed_by for item in items if item.claimed_by})
+        if not tokens:
+            return
+        id_placeholders = ", ".join(["%s"] * len(queue_ids))
+        token_placeholders = ", ".join(["%s"] * len(tokens))
+        try:
+            await self.db.execute(
+                f"""
+                UPDATE wialon_event_queue
+                SET status = 'pending', claimed_by = NULL, claimed_at = NULL
+                WHERE status = 'processing' AND id IN ({id_placeholders})
+                  AND claimed_by IN ({token_placeholders})
+                """,
+                *queue_ids,
+                *tokens,
+            )
+            self._released += len(queue_ids)
+        except Exception as e:
+            logger.error("wialon_ingestion_release_failed", count=len(queue_ids), error=str(e))
+
+    @property
+    def queue_depth(self) -> int:
+        """Eventos encolados en memoria pendientes de procesar"""
+        return sum(q.qsize() for q in self._queues)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener métricas de la cola
+
+        Returns:
+            Diccionario con profundidad por shard, lag y contadores
+        """
+        completed = self._processed + self._failed + self._retried
+        return {
+            "running": self._running,
+            "instance_id": self.instance_id,
+            "workers": self.num_workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_shard": [q.qsize() for q in self._queues],
+            "backlogged_shards": sorted(self._backlogged),
+            "in_flight": self._in_flight,
+            "enqueued": self._enqueued,
+            "processed": self._processed,
+            "failed": self._failed,
+            "retried": self._retried,
+            "recovered": self._recovered,
+            "deferred": self._deferred,
+            "released": self._released,
+            "lag_ms": {
+                "last": round(self._last_lag_ms, 2),
+                "max": round(self._max_lag_ms, 2),
+                "avg": round(self._total_lag_ms / completed, 2) if completed else 0.0,
+            },
+        }
@@ -0,0 +1,351 @@
+"""
+Clasificador de intenciones basado en reglas (fast-path antes de Gemini)
+
+La mayoría de los mensajes de los conductores son frases cortas y formulaicas
+("ya llegué", "ya empecé a cargar", "listo ya quedó", "ok"). Este clasificador
+las resuelve localmente con un léxico ponderado por intención y solo deja
+pasar a Gemini los mensajes ambiguos o de baja confianza.
+"""
+import re
+import time
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import settings
+from app.core.constants import MESSAGE_INTENTS, TRIP_STATUS, TRIP_SUBSTATUS
+from app.core.logging import get_logger
+from app.models.message import GeminiResponse
+
+logger = get_logger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+_REPEATED_CHAR_RE = re.compile(r"(\w)\1{2,}")
+
+# Mensajes más largos se consideran matizados y se envían a Gemini
+MAX_FAST_PATH_WORDS = 12
+
+# Léxico ponderado por intención: (patrón sobre texto normalizado, peso).
+# El puntaje de una intención es la suma de pesos de sus patrones (máx. 1.0).
+INTENT_LEXICON: Dict[str, List[Tuple[str, float]]] = {
+    MESSAGE_INTENTS["WAITING_TURN"]: [
+        (r"\besperando\b", 0.6),
+        (r"\b(turno|anden|formado|fila)\b", 0.4),
+        (r"\bque me asignen\b", 0.3),
+    ],
+    MESSAGE_INTENTS["LOADING_STARTED"]: [
+        (r"\b(empece|empezamos|comence|inicie|iniciando|empezando)\b.*\bcarga(r|ndo)?\b", 0.9),
+        (r"\b(ya )?(estoy|estamos) cargando\b", 0.9),
+        (r"\binicio de carga\b", 0.9),
+    ],
+    MESSAGE_INTENTS["LOADING_COMPLETE"]: [
+        (r"\b(termine|terminamos|acabe|acabamos)\b.*\bcarga(r)?\b", 0.9),
+        (r"\bcarga (completa|lista|terminada)\b", 0.9),
+        (r"\b(ya )?(esta|quedo) lista la carga\b", 0.9),
+        (r"\blisto ya quedo\b", 0.5),
+    ],
+    MESSAGE_INTENTS["UNLOADING_STARTED"]: [
+        (r"\b(empece|empezamos|comence|inicie|iniciando|empezando)\b.*\bdescarga(r|ndo)?\b", 0.95),
+        (r"\b(ya )?(estoy|estamos) descargando\b", 0.95),
+    ],
+    MESSAGE_INTENTS["UNLOADING_COMPLETE"]: [
+        (r"\b(termine|terminamos|acabe|acabamos)\b.*\bdescarga(r)?\b", 0.6),
+        (r"\bdescarga (completa|lista|terminada)\b", 0.6),
+        (r"\b(me voy|me retiro|ya me voy|salgo)\b", 0.4),
+        (r"\b(termine|acabe|terminamos)\b.*\b(me voy|me retiro)\b", 0.5),
+    ],
+    MESSAGE_INTENTS["ROUTE_UPDATE"]: [
+        (r"\b(voy|vamos) en camino\b", 0.9),
+        (r"\b(estoy|vamos|voy) llegando\b", 0.9),
+        (r"\bme dirijo\b", 0.9),
+        (r"\bvoy para alla\b", 0.9),
+    ],
+    MESSAGE_INTENTS["ISSUE_REPORT"]: [
+        (r"\b(problema|falla|descompuso|ponchadura|ponche|accidente)\b", 0.9),
+        (r"\bno puedo avanzar\b", 0.9),
+    ],
+    MESSAGE_INTENTS["OTHER"]: [
+        (r"^(ok|okey|okay|va|sale|enterado|entendido|gracias|muchas gracias)$", 0.95),
+        (r"^(buenos dias|buenas tardes|buenas noches|buen dia|hola)$", 0.95),
+    ],
+}
+
+# Respuestas predefinidas por intención
+INTENT_RESPONSES: Dict[str, str] = {
+    MESSAGE_INTENTS["WAITING_TURN"]: "Enterado, quedamos atentos a que te asignen turno.",
+    MESSAGE_INTENTS["LOADING_STARTED"]: "Perfecto, registramos el inicio de carga.",
+    MESSAGE_INTENTS["LOADING_COMPLETE"]: "Excelente, carga completada. ¡Buen viaje!",
+    MESSAGE_INTENTS["UNLOADING_STARTED"]: "Perfecto, registramos el inicio de descarga.",
+    MESSAGE_INTENTS["UNLOADING_COMPLETE"]: "Excelente trabajo, descarga completada. El viaje queda finalizado. ¡Buen regreso!",
+    MESSAGE_INTENTS["ROUTE_UPDATE"]: "Gracias por la actualización, buen camino.",
+    MESSAGE_INTENTS["ISSUE_REPORT"]: "Recibido. ¿Puedes darnos más detalles del problema para apoyarte?",
+    MESSAGE_INTENTS["OTHER"]: "Entendido, gracias.",
+}
+
+# Subestado resultante por intención (None = sin cambio)
+INTENT_SUBSTATUS: Dict[str, Optional[str]] = {
+    MESSAGE_INTENTS["LOADING_STARTED"]: TRIP_SUBSTATUS["LOADING"],
+    MESSAGE_INTENTS["LOADING_COMPLETE"]: TRIP_SUBSTATUS["LOADING_COMPLETE"],
+    MESSAGE_INTENTS["UNLOADING_STARTED"]: TRIP_SUBSTATUS["UNLOADING"],
+    MESSAGE_INTENTS["UNLOADING_COMPLETE"]: TRIP_SUBSTATUS["UNLOADING_COMPLETE"],
+}
+
+# Fase (status del viaje) en la que un mensaje puede fijar cada subestado
+SUBSTATUS_PHASE: Dict[str, str] = {
+    TRIP_SUBSTATUS["WAITING_LOADING"]: TRIP_STATUS["IN_LOADING_ZONE"],
+    TRIP_SUBSTATUS["LOADING"]: TRIP_STATUS["IN_LOADING_ZONE"],
+    TRIP_SUBSTATUS["LOADING_COMPLETE"]: TRIP_STATUS["IN_LOADING_ZONE"],
+    TRIP_SUBSTATUS["WAITING_UNLOADING"]: TRIP_STATUS["IN_UNLOADING_ZONE"],
+    TRIP_SUBSTATUS["UNLOADING"]: TRIP_STATUS["IN_UNLOADING_ZONE"],
+    TRIP_SUBSTATUS["UNLOADING_COMPLETE"]: TRIP_STATUS["IN_UNLOADING_ZONE"],
+}
+
+_UNLOADING_SUBSTATUSES = frozenset({
+    TRIP_SUBSTATUS["WAITING_UNLOADING"],
+    TRIP_SUBSTATUS["UNLOADING"],
+    TRIP_SUBSTATUS["UNLOADING_COMPLETE"],
+})
+
+# Transiciones de subestado permitidas por mensaje: solo hacia adelante.
+# Un subestado actual desconocido o vacío solo se valida contra la fase.
+ALLOWED_SUBSTATUS_TRANSITIONS: Dict[str, frozenset] = {
+    TRIP_SUBSTATUS["TO_START"]: frozenset({
+        TRIP_SUBSTATUS["WAITING_LOADING"],
+        TRIP_SUBSTATUS["LOADING"],
+        TRIP_SUBSTATUS["LOADING_COMPLETE"],
+    }),
+    TRIP_SUBSTATUS["WAITING_LOADING"]: frozenset({
+        TRIP_SUBSTATUS["LOADING"],
+        TRIP_SUBSTATUS["LOADING_COMPLETE"],
+    }),
+    TRIP_SUBSTATUS["LOADING"]: frozenset({TRIP_SUBSTATUS["LOADING_COMPLETE"]}),
+    TRIP_SUBSTATUS["LOADING_COMPLETE"]: _UNLOADING_SUBSTATUSES,
+    TRIP_SUBSTATUS["HEADING_TO_UNLOAD"]: _UNLOADING_SUBSTATUSES,
+    TRIP_SUBSTATUS["WAITING_UNLOADING"]: frozenset({
+        TRIP_SUBSTATUS["UNLOADING"],
+        TRIP_SUBSTATUS["UNLOADING_COMPLETE"],
+    }),
+    TRIP_SUBSTATUS["UNLOADING"]: frozenset({TRIP_SUBSTATUS["UNLOADING_COMPLETE"]}),
+    TRIP_SUBSTATUS["UNLOADING_COMPLETE"]: frozenset(),
+    TRIP_SUBSTATUS["DELIVERED"]: frozenset(),
+}
+
+# Refuerzo por subestado actual: desambigua frases como "listo ya quedó"
+SUBSTATUS_BOOST: Dict[str, Tuple[str, float]] = {
+    TRIP_SUBSTATUS["LOADING"]: (MESSAGE_INTENTS["LOADING_COMPLETE"], 0.4),
+    TRIP_SUBSTATUS["UNLOADING"]: (MESSAGE_INTENTS["UNLOADING_COMPLETE"], 0.4),
+}
+
+_COMPILED_LEXICON = {
+    intent: [(re.compile(pattern), weight) for pattern, weight in rules]
+    for intent, rules in INTENT_LEXICON.items()
+}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizar texto para comparación (minúsculas, sin acentos ni puntuación)
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto normalizado con espacios colapsados
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _REPEATED_CHAR_RE.sub(r"\1", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def is_substatus_transition_allowed(
+    status: Optional[str], current: Optional[str], new: Optional[str]
+) -> bool:
+    """
+    Validar un cambio de subestado pedido por un mensaje del conductor
+
+    Args:
+        status: Estado actual del viaje (fase)
+        current: Subestado actual del viaje
+        new: Subestado propuesto
+
+    Returns:
+        True si el subestado corresponde a la fase y la transición es hacia adelante
+    """
+    if not new or new == current:
+        return False
+    if SUBSTATUS_PHASE.get(new) != status:
+        return False
+    allowed = ALLOWED_SUBSTATUS_TRANSITIONS.get(current)
+    return allowed is None or new in allowed
+
+
+class FastIntentClassifier:
+    """Clasificador local por léxico ponderado con umbral de confianza"""
+
+    def __init__(self, threshold: float = 0.85, margin: float = 0.3):
+        """
+        Inicializar clasificador
+
+        Args:
+            threshold: Confianza mínima para responder sin Gemini
+            margin: Diferencia mínima entre la mejor y la segunda intención
+        """
+        self.threshold = threshold
+        self.margin = margin
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent: Dict[str, int] = {}
+        self.total_eval_ms = 0.0
+
+    def score(self, normalized: str, substatus: Optional[str] = None) -> Dict[str, float]:
+        """
+        Calcular puntaje por intención
+
+        Args:
+            normalized: Texto normalizado
+            substatus: Subestado actual del viaje
+
+        Returns:
+            Puntajes (0.0-1.0) de las intenciones con al menos un patrón
+        """
+        scores = {}
+        for intent, rules in _COMPILED_LEXICON.items():
+            total = sum(weight for pattern, weight in rules if pattern.search(normalized))
+            if total > 0:
+                scores[intent] = total
+
+        boost = SUBSTATUS_BOOST.get(substatus)
+        if boost and boost[0] in scores:
+            scores[boost[0]] += boost[1]
+
+        return {intent: min(total, 1.0) for intent, total in scores.items()}
+
+    def classify(self, text: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Clasificar un mensaje sin LLM
+
+        Args:
+            text: Mensaje del conductor
+            context: Contexto del viaje (status, substatus)
+
+        Returns:
+            Resultado con la forma de GeminiResponse, o None si debe ir a Gemini
+        """
+        start = time.perf_counter()
+        try:
+            normalized = normalize_text(text)
+            if not normalized or len(normalized.split()) > MAX_FAST_PATH_WORDS:
+                self.misses += 1
+                return None
+
+            scores = self.score(normalized, context.get("substatus"))
+            if not scores:
+                self.misses += 1
+                return None
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            intent, confidence = ranked[0]
+            runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+            if confidence < self.threshold or confidence - runner_up < self.margin:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.hits_by_intent[intent] = self.hits_by_intent.get(intent, 0) + 1
+
+            result = self._build_result(intent, confidence, context)
+            logger.info(
+                "intent_fast_path_hit",
+                intent=intent,
+                confidence=confidence,
+            )
+            return result
+        finally:
+            self.total_eval_ms += (time.perf_counter() - start) * 1000
+
+    def _build_result(
+        self, intent: str, confidence: float, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Construir respuesta con la misma forma que la de Gemini
+
+        Args:
+            intent: Intención detectada
+            confidence: Confianza de la clasificación
+            context: Contexto del viaje
+
+        Returns:
+            Diccionario compatible con GeminiResponse
+        """
+        new_substatus = INTENT_SUBSTATUS.get(intent)
+        if intent == MESSAGE_INTENTS["WAITING_TURN"]:
+            in_unloading = context.get("status") == TRIP_STATUS["IN_UNLOADING_ZONE"]
+            new_substatus = (
+                TRIP_SUBSTATUS["WAITING_UNLOADING"] if in_unloading else TRIP_SUBSTATUS["WAITING_LOADING"]
+            )
+
+        if new_substatus and not is_substatus_transition_allowed(
+            context.get("status"), context.get("substatus"), new_substatus
+        ):
+            if new_substatus != context.get("substatus"):
+                logger.info(
+                    "intent_substatus_transition_ignored",
+                    intent=intent,
+                    status=context.get("status"),
+                    substatus=context.get("substatus"),
+                    new_substatus=new_substatus,
+                )
+            new_substatus = None
+
+        if new_substatus:
+            action = "update_substatus"
+        elif intent == MESSAGE_INTENTS["ISSUE_REPORT"]:
+            action = "send_alert"
+        else:
+            action = "no_action"
+
+        result = GeminiResponse(
+            intent=intent,
+            confidence=round(confidence, 2),
+            entities={},
+            response=INTENT_RESPONSES[intent],
+            action=action,
+            new_substatus=new_substatus,
+        ).model_dump()
+        result["source"] = "fast_path"
+        return result
+
+    def get_stats(self, avg_llm_latency_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Obtener estadísticas del fast-path
+
+        Args:
+            avg_llm_latency_ms: Latencia media de Gemini para estimar el ahorro
+
+        Returns:
+            Aciertos, tasa de acierto y latencia ahorrada estimada
+        """
+        total = self.hits + self.misses
+        avg_eval_ms = self.total_eval_ms / total if total else 0.0
+        stats = {
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "hits_by_intent": dict(self.hits_by_intent),
+            "avg_eval_ms": round(avg_eval_ms, 3),
+        }
+        if avg_llm_latency_ms:
+            stats["estimated_latency_saved_ms"] = round(
+                self.hits * max(avg_llm_latency_ms - avg_eval_ms, 0.0), 1
+            )
+        return stats
+
+
+# Instancia global del clasificador
+intent_classifier = FastIntentClassifier(threshold=settings.intent_fast_path_threshold)
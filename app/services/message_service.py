@@ -2,11 +2,13 @@
 Servicio para procesamiento de mensajes de WhatsApp
 """
 from typing import Dict, Any, Optional
-import uuid
 from app.core.logging import get_logger, log_context
+from app.core.context import get_trace_id
+from app.core.tracing import span
 from app.core.errors import BusinessLogicError
 from app.core.database import Database
 from app.core.constants import MESSAGE_INTENTS, MESSAGE_DIRECTIONS, SENDER_TYPES
+from app.core.active_trips import active_trips
 from app.repositories.message_repository import (
     MessageRepository,
     ConversationRepository,
@@ -17,6 +19,10 @@ from app.repositories.unit_repository import UnitRepository
 from app.integrations.gemini.client import GeminiClient
 from app.integrations.evolution.client import EvolutionClient
 from app.models.message import WhatsAppMessage
+from app.services.geofence_cache import geofence_cache
+from app.services.intent_classifier import intent_classifier, is_substatus_transition_allowed
+from app.services.classification_cache import classification_cache
+from app.config import settings
 
 logger = get_logger(__name__)
 
@@ -34,6 +40,27 @@ class MessageService:
         self.trip_repo = TripRepository(db)
         self.unit_repo = UnitRepository(db)
 
+    def _substatus_update_allowed(self, trip: Dict[str, Any], ai_result: Dict[str, Any]) -> bool:
+        """
+        Decidir si se aplica el new_substatus de una clasificación
+
+        El fast path ya descarta transiciones inválidas al clasificar. El
+        resultado de Gemini (directo o desde la caché) solo se valida contra
+        ALLOWED_SUBSTATUS_TRANSITIONS con GEMINI_SUBSTATUS_VALIDATION activo.
+
+        Args:
+            trip: Viaje actual
+            ai_result: Resultado de la clasificación
+
+        Returns:
+            True si el subestado se debe aplicar
+        """
+        if ai_result.get("source") == "fast_path" or not settings.gemini_substatus_validation:
+            return True
+        return is_substatus_transition_allowed(
+            trip.get("status"), trip.get("substatus"), ai_result.get("new_substatus")
+        )
+
     async def process_whatsapp_message(
         self, message: WhatsAppMessage
     ) -> Dict[str, Any]:
@@ -46,7 +73,7 @@ class MessageService:
         Returns:
             Resultado del procesamiento con respuesta de IA
         """
-        trace_id = str(uuid.uuid4())
+        trace_id = get_trace_id()
         log_context(trace_id=trace_id, instance=message.instance)
 
         try:
@@ -92,7 +119,8 @@ class MessageService:
                 if audio_url:
                     try:
                         # Descargar audio desde Evolution API
-                        audio_bytes = await self.evolution_client.download_media(audio_url)
+                        with span("whatsapp.audio_download"):
+                            audio_bytes = await self.evolution_client.download_media(audio_url)
                         
                         logger.info(
                             "audio_downloaded",
@@ -119,11 +147,12 @@ class MessageService:
                             audio_size=len(audio_bytes)
                         )
                         
-                        transcription = await self.gemini_client.transcribe_audio(
-                            audio_bytes,
-                            mime_type=mime_type,
-                            context=trip_context
-                        )
+                        with span("whatsapp.audio_transcribe"):
+                            transcription = await self.gemini_client.transcribe_audio(
+                                audio_bytes,
+                                mime_type=mime_type,
+                                context=trip_context
+                            )
                         
                         text = transcription
                         logger.info(
@@ -159,7 +188,8 @@ class MessageService:
 
             # Buscar conversación y viaje con lógica de fallback
             logger.info("looking_for_conversation", group_id=group_id)
-            conversation = await self.conversation_repo.find_by_group_id(group_id)
+            with span("whatsapp.conversation_lookup"):
+                conversation = await self.conversation_repo.find_by_group_id(group_id)
             
             # LOG ADICIONAL CRÍTICO
             logger.info("conversation_lookup_result", conversation_found=bool(conversation), conversation_id=conversation.get("id") if conversation else None)
@@ -177,8 +207,11 @@ class MessageService:
                     fallback_strategy="search_unit_by_group_id"
                 )
                 
-                # 1. Buscar la unidad por su grupo de WhatsApp
-                unit = await self.unit_repo.find_by_whatsapp_group_id(group_id)
+                # 1. Buscar la unidad por su grupo de WhatsApp (proyección de
+                #    viajes activos primero, MySQL si no está en memoria)
+                cached = active_trips.lookup_by_group(group_id)
+                with span("whatsapp.unit_lookup"):
+                    unit = cached[0] if cached else await self.unit_repo.find_by_whatsapp_group_id(group_id)
                 
                 if unit:
                     logger.info(
@@ -189,7 +222,13 @@ class MessageService:
                     )
                     
                     # 2. Buscar viaje activo de esa unidad
-                    trip = await self.trip_repo.find_active_by_unit(unit["id"])
+                    with span("whatsapp.trip_lookup"):
+                        if cached:
+                            trip = cached[1]
+                        else:
+                            trip = await self.trip_repo.find_active_by_unit(unit["id"])
+                            if trip:
+                                active_trips.put(unit, trip)
                     
                     if trip:
                         logger.info(
@@ -214,7 +253,8 @@ class MessageService:
                                     "reason": "conversation_missing_after_data_cleanup"
                                 }
                             }
-                            conversation = await self.conversation_repo.create_conversation(conversation_data)
+                            with span("whatsapp.conversation_create"):
+                                conversation = await self.conversation_repo.create_conversation(conversation_data)
                             conversation_auto_created = True
                             
                             logger.info(
@@ -260,7 +300,8 @@ class MessageService:
                     }
             else:
                 # Conversación encontrada, obtener el trip normalmente
-                trip = await self.trip_repo.find_by_id(conversation["trip_id"])
+                with span("whatsapp.trip_lookup"):
+                    trip = await self.trip_repo.find_by_id(conversation["trip_id"])
 
             # Verificar que tenemos un trip válido
             if not trip:
@@ -292,7 +333,8 @@ class MessageService:
                     "transcription": transcription,  # Guardar transcripción si hay
                     "ai_result": None,
                 }
-                saved_message = await self.message_repo.create_message(message_data)
+                with span("whatsapp.message_insert"):
+                    saved_message = await self.message_repo.create_message(message_data)
                 logger.info(
                     "message_saved",
                     message_id=saved_message["id"],
@@ -306,30 +348,52 @@ class MessageService:
                     reason="Conversation could not be created during fallback"
                 )
 
+            classification_context = {
+                "status": trip["status"],
+                "substatus": trip["substatus"],
+                "location": None,
+            }
+
+            # Fast-path: frases formulaicas se clasifican sin llamar a Gemini
+            ai_result = None
+            if settings.intent_fast_path_enabled:
+                with span("whatsapp.fast_path"):
+                    ai_result = intent_classifier.classify(text, classification_context)
+
+            # Caché: misma frase con el mismo estado de viaje ya clasificada
+            if ai_result is None and settings.classification_cache_enabled:
+                ai_result = classification_cache.get(text, classification_context)
+                if ai_result is not None:
+                    logger.info("classification_cache_hit", intent=ai_result.get("intent"))
+
             # Procesar con IA - ENVUELTO CON INDICADORES DE PRESENCIA
-            try:
-                # 1. Enviar indicador "escribiendo..." antes de la operación larga
-                logger.debug("sending_typing_indicator", group_id=group_id)
-                await self.evolution_client.start_typing(group_id)
-                
-                # 2. Operación larga: Llamada a Gemini
-                logger.info("calling_gemini_for_classification", text_length=len(text))
-                ai_result = await self.gemini_client.classify_message(
-                    text,
-                    {
-                        "status": trip["status"],
-                        "substatus": trip["substatus"],
-                        "location": None,
-                    },
-                )
-                
-                # LOG ADICIONAL
-                logger.info("gemini_ai_result", intent=ai_result.get("intent"), confidence=ai_result.get("confidence"), has_response=bool(ai_result.get("response")))
-            
-            finally:
-                # 3. SIEMPRE limpiar el indicador "escribiendo...", incluso si Gemini falló
-                logger.debug("stopping_typing_indicator", group_id=group_id)
-                await self.evolution_client.stop_typing(group_id)
+            if ai_result is None:
+                try:
+                    # 1. Enviar indicador "escribiendo..." antes de la operación larga
+                    logger.debug("sending_typing_indicator", group_id=group_id)
+                    with span("whatsapp.typing"):
+                        await self.evolution_client.start_typing(group_id)
+
+                    # 2. Operación larga: Llamada a Gemini
+                    logger.info("calling_gemini_for_classification", text_length=len(text))
+                    with span("whatsapp.classify"):
+                        ai_result = await self.gemini_client.classify_message(
+                            text, classification_context
+                        )
+
+                    # LOG ADICIONAL
+                    logger.info("gemini_ai_result", intent=ai_result.get("intent"), confidence=ai_result.get("confidence"), has_response=bool(ai_result.get("response")))
+
+                    if settings.classification_cache_enabled:
+                        await classification_cache.set(
+                            self.db, text, classification_context, ai_result
+                        )
+
+                finally:
+                    # 3. SIEMPRE limpiar el indicador "escribiendo...", incluso si Gemini falló
+                    logger.debug("stopping_typing_indicator", group_id=group_id)
+                    with span("whatsapp.typing"):
+                        await self.evolution_client.stop_typing(group_id)
 
             # Guardar interacción de IA (solo si guardamos el mensaje)
             if saved_message:
@@ -346,7 +410,8 @@ class MessageService:
                 
                 # LOG ADICIONAL
                 logger.info("saving_ai_interaction", message_id=saved_message["id"], trip_id=trip["id"])
-                await self.ai_interaction_repo.create_interaction(interaction_data)
+                with span("whatsapp.ai_interaction_insert"):
+                    await self.ai_interaction_repo.create_interaction(interaction_data)
                 logger.info("ai_interaction_saved", message_id=saved_message["id"])
             else:
                 logger.warning(
@@ -356,19 +421,28 @@ class MessageService:
                 )
 
             # Actualizar estado si es necesario
-            if ai_result.get("action") == "update_substatus" and ai_result.get(
-                "new_substatus"
-            ):
-                new_substatus = ai_result.get("new_substatus")
-                await self.trip_repo.update_status(
-                    trip["id"], trip["status"], new_substatus
-                )
-                logger.info(
-                    "trip_substatus_updated_by_message",
-                    trip_id=trip["id"],
-                    new_substatus=new_substatus,
-                    intent=ai_result.get("intent"),
-                )
+            new_substatus = ai_result.get("new_substatus")
+            if ai_result.get("action") == "update_substatus" and new_substatus:
+                if not self._substatus_update_allowed(trip, ai_result):
+                    logger.info(
+                        "trip_substatus_transition_ignored",
+                        trip_id=trip["id"],
+                        status=trip.get("status"),
+                        substatus=trip.get("substatus"),
+                        new_substatus=new_substatus,
+                        intent=ai_result.get("intent"),
+                    )
+                else:
+                    with span("whatsapp.status_update"):
+                        await self.trip_repo.update_status(
+                            trip["id"], trip["status"], new_substatus
+                        )
+                    logger.info(
+                        "trip_substatus_updated_by_message",
+                        trip_id=trip["id"],
+                        new_substatus=new_substatus,
+                        intent=ai_result.get("intent"),
+                    )
             
             # Finalizar viaje si se completó la descarga
             intent = ai_result.get("intent")
@@ -380,11 +454,13 @@ class MessageService:
                     message=text
                 )
                 # Actualizar a estado finalizado
-                await self.trip_repo.update_status(
-                    trip["id"], 
-                    "finalizado", 
-                    "descarga_completada"
-                )
+                with span("whatsapp.status_update"):
+                    await self.trip_repo.update_status(
+                        trip["id"],
+                        "finalizado",
+                        "descarga_completada"
+                    )
+                geofence_cache.invalidate(trip["id"])
                 logger.info(
                     "trip_completed_by_message",
                     trip_id=trip["id"],
@@ -2,9 +2,10 @@
 Servicio para gestión de viajes
 """
 from typing import Dict, Any, Optional
-import uuid
 import json
 from app.core.logging import get_logger, log_context
+from app.core.context import get_trace_id
+from app.core.tracing import span
 from app.core.errors import TripNotFoundError, BusinessLogicError
 from app.core.database import Database
 from app.repositories.trip_repository import TripRepository
@@ -14,6 +15,9 @@ from app.repositories.message_repository import ConversationRepository
 from app.integrations.evolution.client import EvolutionClient
 from app.models.trip import TripCreate
 from app.utils.helpers import format_whatsapp_jid
+from app.core.constants import TERMINAL_TRIP_STATUSES
+from app.core.active_trips import active_trips
+from app.services.geofence_cache import geofence_cache
 
 logger = get_logger(__name__)
 
@@ -56,7 +60,7 @@ class TripService:
         Returns:
             Diccionario con información del viaje creado
         """
-        trace_id = str(uuid.uuid4())
+        trace_id = get_trace_id()
         log_context(trace_id=trace_id, trip_code=payload.trip.get("code"))
 
         try:
@@ -70,7 +74,8 @@ class TripService:
                 "plate": payload.unit.get("plate"),
                 "metadata": payload.unit,
             }
-            unit = await self.unit_repo.upsert(unit_data)
+            with span("trip.unit_upsert"):
+                unit = await self.unit_repo.upsert(unit_data)
             logger.info("unit_upserted", unit_id=unit["id"], name=unit.get("name"))
 
             # 2. Crear/actualizar conductor
@@ -80,7 +85,8 @@ class TripService:
                 "wialon_driver_code": str(payload.driver.get("id")) if payload.driver.get("id") else payload.driver.get("wialon_code"),
                 "metadata": payload.driver,
             }
-            driver = await self.driver_repo.upsert(driver_data)
+            with span("trip.driver_upsert"):
+                driver = await self.driver_repo.upsert(driver_data)
             if not driver:
                 raise BusinessLogicError("Failed to create/update driver")
             logger.info("driver_upserted", driver_id=driver["id"], phone=driver["phone"])
@@ -99,12 +105,16 @@ class TripService:
                 "planned_end": payload.trip.get("planned_end"),
                 "metadata": payload.metadata or {},
             }
-            trip = await self.trip_repo.create_full_trip(trip_data)
+            with span("trip.trip_insert"):
+                trip = await self.trip_repo.create_full_trip(trip_data)
+            # La unidad ya tiene viaje: sus eventos dejan de descartarse
+            active_trips.clear_no_trip(unit.get("wialon_unit_id"))
             logger.info("trip_created", trip_id=trip["id"], floatify_trip_id=trip.get("floatify_trip_id"))
 
             # 4. Crear geocercas y asociaciones
             if payload.geofences:
-                await self._create_trip_geofences(trip["id"], payload.geofences)
+                with span("trip.geofences_insert"):
+                    await self._create_trip_geofences(trip["id"], payload.geofences)
 
             # 5. Obtener o crear grupo de WhatsApp para la UNIDAD
             whatsapp_group_id = None
@@ -146,10 +156,11 @@ class TripService:
                         )
 
                         # Crear el grupo
-                        group_result = await self.evolution_client.create_group(
-                            subject=group_name, 
-                            participants=participants
-                        )
+                        with span("trip.whatsapp_group_create"):
+                            group_result = await self.evolution_client.create_group(
+                                subject=group_name,
+                                participants=participants
+                            )
                         whatsapp_group_id = group_result.get("id")
                         group_was_created = True
                         
@@ -161,13 +172,14 @@ class TripService:
 
                         # Guardar el grupo en la UNIDAD (no solo en el trip)
                         try:
-                            await self.unit_repo.update(
-                                unit["id"],
-                                {
-                                    "whatsapp_group_id": whatsapp_group_id,
-                                    "whatsapp_group_name": group_name
-                                }
-                            )
+                            with span("trip.unit_update"):
+                                await self.unit_repo.update(
+                                    unit["id"],
+                                    {
+                                        "whatsapp_group_id": whatsapp_group_id,
+                                        "whatsapp_group_name": group_name
+                                    }
+                                )
                             logger.info(
                                 "unit_updated_with_whatsapp_group",
                                 unit_id=unit["id"],
@@ -210,10 +222,11 @@ class TripService:
                                 )
                                 
                                 # Evolution API manejará la deduplicación automáticamente
-                                await self.evolution_client.add_participants(
-                                    whatsapp_group_id,
-                                    participants_to_add
-                                )
+                                with span("trip.whatsapp_add_participants"):
+                                    await self.evolution_client.add_participants(
+                                        whatsapp_group_id,
+                                        participants_to_add
+                                    )
                                 
                                 logger.info(
                                     "participants_added_successfully",
@@ -229,12 +242,8 @@ class TripService:
                     
                     # Actualizar el TRIP con el grupo (nuevo o reutilizado)
                     # Esto mantiene compatibilidad con event_service y notification_service
-                    update_query = """
-                        UPDATE trips
-                        SET whatsapp_group_id = %s, whatsapp_group_name = %s, updated_at = NOW()
-                        WHERE id = %s
-                    """
-                    await self.db.execute(update_query, whatsapp_group_id, group_name, trip["id"])
+                    with span("trip.trip_group_update"):
+                        await self.trip_repo.set_whatsapp_group(trip["id"], whatsapp_group_id, group_name)
                     
                     logger.info(
                         "trip_updated_with_whatsapp_group_reference",
@@ -252,7 +261,8 @@ class TripService:
                             "group_name": group_name,
                             "participants": payload.whatsapp_participants,
                         }
-                        conversation = await self.conversation_repo.create_conversation(conversation_data)
+                        with span("trip.conversation_insert"):
+                            conversation = await self.conversation_repo.create_conversation(conversation_data)
                         logger.info("conversation_created", conversation_id=conversation.get("id") if conversation else None)
                     except Exception as conv_error:
                         logger.error("conversation_creation_failed", error=str(conv_error), trip_id=trip["id"])
@@ -262,9 +272,10 @@ class TripService:
                     try:
                         logger.info("sending_trip_start_message", group_id=whatsapp_group_id)
                         trip_start_message = self._generate_trip_start_message(payload, unit, group_was_created)
-                        await self.evolution_client.send_text(
-                            whatsapp_group_id, trip_start_message
-                        )
+                        with span("trip.whatsapp_send"):
+                            await self.evolution_client.send_text(
+                                whatsapp_group_id, trip_start_message
+                            )
                         welcome_message_sent = True
                         logger.info("trip_start_message_sent", group_id=whatsapp_group_id, trip_id=trip["id"])
                     except Exception as msg_error:
@@ -298,7 +309,8 @@ class TripService:
     async def _create_trip_geofences(
         self, trip_id: str, geofences: list
     ) -> None:
-        """Crear geocercas y asociarlas al viaje"""
+        """Crear geocercas, asociarlas al viaje y cargar la caché de geocercas del viaje"""
+        rows = []
         for idx, gf in enumerate(geofences, 1):
             # Usar la misma conexión para todas las operaciones de esta geocerca
             async with self.db.acquire() as (cursor, conn):
@@ -338,8 +350,23 @@ class TripService:
                     assoc_query, (trip_id, gf_id, gf.order, gf.role)
                 )
                 await conn.commit()
+
                 logger.info("geofence_associated", trip_id=trip_id, geofence_id=gf_id, role=gf.role)
 
+                rows.append({
+                    "id": gf_id,
+                    "floatify_geofence_id": floatify_geofence_id,
+                    "wialon_geofence_id": gf.geofence_id,
+                    "name": gf.geofence_name,
+                    "geofence_type": gf.geofence_type or gf.role,
+                    "visit_type": gf.role,
+                    "sequence_order": gf.order,
+                })
+
+        # Mismo orden que la carga desde BD (ORDER BY sequence_order)
+        rows.sort(key=lambda row: row["sequence_order"] if row["sequence_order"] is not None else 0)
+        geofence_cache.prime(trip_id, geofence_cache.build_map(rows))
+
     def _generate_trip_start_message(self, payload: TripCreate, unit: Dict[str, Any], is_new_group: bool) -> str:
         """
         Generar mensaje de inicio de viaje para el grupo
@@ -402,11 +429,43 @@ class TripService:
         self, trip_id: str, status: str, substatus: str
     ) -> Dict[str, Any]:
         """Actualizar estado del viaje"""
+        if status in TERMINAL_TRIP_STATUSES:
+            geofence_cache.invalidate(trip_id)
+
         # Obtener estado anterior para webhook
         old_trip = await self.trip_repo.find_by_id(trip_id)
         old_status = old_trip["status"] if old_trip else "unknown"
         old_substatus = old_trip["substatus"] if old_trip else "unknown"
         
+        # Modo outbox: UPDATE del viaje y webhook en la misma transacción,
+        # la entrega HTTP la hace WebhookDispatcher en segundo plano
+        if self.webhook_service and self.webhook_service.outbox_enabled:
+            async with self.db.transaction() as (cursor, conn):
+                trip = await self.trip_repo.update_status(trip_id, status, substatus, cursor=cursor)
+                if not trip:
+                    raise TripNotFoundError(trip_id)
+
+                await self.webhook_service.send_status_update(
+                    trip_id=trip_id,
+                    old_status=old_status,
+                    old_substatus=old_substatus,
+                    new_status=status,
+                    new_substatus=substatus,
+                    change_reason="api_call",
+                    cursor=cursor,
+                )
+
+            # Ya confirmado: aplicar el viaje al registro de viajes activos
+            active_trips.trip_written(trip)
+            logger.info(
+                "trip_status_updated",
+                trip_id=trip_id,
+                status=status,
+                substatus=substatus,
+                webhook_enqueued=True,
+            )
+            return trip
+
         # Actualizar estado (lógica existente)
         trip = await self.trip_repo.update_status(trip_id, status, substatus)
         if not trip:
@@ -463,6 +522,8 @@ class TripService:
         if not trip:
             raise TripNotFoundError(trip_id)
 
+        geofence_cache.invalidate(trip_id)
+
         logger.info(
             "trip_completed",
             trip_id=trip_id,
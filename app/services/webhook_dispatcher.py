@@ -0,0 +1,288 @@
+"""
+Dispatcher del outbox de webhooks
+
+Entrega en segundo plano los webhooks que WebhookService escribe en
+webhook_delivery_log cuando el modo outbox está habilitado:
+
+- Reclama filas vencidas en lotes con SELECT ... FOR UPDATE SKIP LOCKED,
+  por lo que varias instancias pueden ejecutar el dispatcher a la vez
+- Entrega cada lote de forma concurrente (un intento por fila)
+- Reprograma los fallos con backoff exponencial usando next_attempt_at
+- Mueve a webhook_dead_letter_queue las filas que agotan sus reintentos
+"""
+from typing import Dict, Any, List, Optional
+import asyncio
+import random
+
+from app.core.context import set_trace_id, clear_trace_id
+from app.core.database import Database
+from app.core.logging import get_logger
+from app.config import settings
+
+logger = get_logger(__name__)
+
+
+class WebhookDispatcher:
+    """Worker que drena el outbox de webhooks"""
+
+    def __init__(
+        self,
+        db: Database,
+        webhook_service,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 120,
+        max_attempts: Optional[int] = None,
+        backoff_base: float = 2.0,
+        backoff_max: float = 600.0,
+    ):
+        """
+        Inicializar dispatcher
+
+        Args:
+            db: Instancia de base de datos
+            webhook_service: WebhookService usado para cada intento de entrega
+            batch_size: Filas reclamadas por ciclo (también es la concurrencia)
+            poll_interval: Segundos de espera cuando no hay filas vencidas
+            lease_seconds: Tiempo tras el cual una fila 'in_flight' puede reclamarse de nuevo
+            max_attempts: Intentos antes de mover a DLQ (default: settings.webhook_retry_max)
+            backoff_base: Segundos base del backoff exponencial
+            backoff_max: Tope del backoff en segundos
+        """
+        self.db = db
+        self.webhook_service = webhook_service
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts or settings.webhook_retry_max
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+        # Métricas
+        self._claimed = 0
+        self._delivered = 0
+        self._rescheduled = 0
+        self._dead_lettered = 0
+        self._in_flight = 0
+
+    async def start(self) -> None:
+        """Arrancar el loop de entrega en segundo plano"""
+        if self._running:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run(), name="webhook-dispatcher")
+        logger.info(
+            "webhook_dispatcher_started",
+            batch_size=self.batch_size,
+            max_attempts=self.max_attempts,
+        )
+
+    async def stop(self) -> None:
+        """Detener el loop; las filas en curso se reclaman al vencer su lease"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.webhook_service.timeout + 5)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("webhook_dispatcher_stopped", delivered=self._delivered)
+
+    async def _run(self) -> None:
+        """Loop principal: reclamar, entregar y esperar si no hay trabajo"""
+        while self._running:
+            try:
+                claimed = await self.dispatch_once()
+            except Exception as e:
+                logger.error("webhook_dispatcher_cycle_failed", error=str(e))
+                claimed = 0
+
+            # Lote completo: probablemente hay más filas vencidas
+            if claimed >= self.batch_size:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_once(self) -> int:
+        """
+        Ejecutar un ciclo: reclamar un lote y entregarlo concurrentemente
+
+        Returns:
+            Número de filas reclamadas
+        """
+        rows = await self._claim_batch()
+        if not rows:
+            return 0
+
+        await asyncio.gather(*(self._deliver(row) for row in rows))
+        return len(rows)
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        """
+        Reclamar filas vencidas y marcarlas 'in_flight' con un lease
+
+        Returns:
+            Filas reclamadas
+        """
+        async with self.db.transaction() as (cursor, conn):
+            await cursor.execute(
+                """
+                SELECT id, webhook_type, trip_id, payload, target_url, retry_count, trace_id
+                FROM webhook_delivery_log
+                WHERE status IN ('pending', 'retrying', 'in_flight')
+                  AND next_attempt_at <= NOW()
+                ORDER BY next_attempt_at ASC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (self.batch_size,),
+            )
+            rows = await cursor.fetchall()
+
+            if rows:
+                placeholders = ", ".join(["%s"] * len(rows))
+                await cursor.execute(
+                    f"""
+                    UPDATE webhook_delivery_log
+                    SET status = 'in_flight',
+                        next_attempt_at = DATE_ADD(NOW(), INTERVAL %s SECOND)
+                    WHERE id IN ({placeholders})
+                    """,
+                    (self.lease_seconds, *[row["id"] for row in rows]),
+                )
+
+        self._claimed += len(rows)
+        return list(rows)
+
+    def _backoff_seconds(self, attempt: int) -> int:
+        """
+        Calcular espera antes del siguiente intento
+
+        Args:
+            attempt: Número de intento que acaba de fallar (1-based)
+
+        Returns:
+            Segundos hasta el siguiente intento (con jitter)
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return int(delay + random.uniform(0, delay * 0.1))
+
+    async def _deliver(self, row: Dict[str, Any]) -> None:
+        """
+        Intentar entregar una fila y registrar el resultado
+
+        Args:
+            row: Fila reclamada de webhook_delivery_log
+        """
+        delivery_log_id = row["id"]
+        self._in_flight += 1
+        if row.get("trace_id"):
+            set_trace_id(row["trace_id"])
+
+        try:
+            result = await self.webhook_service.deliver_once(row)
+
+            if result["success"]:
+                await self.webhook_service._log_webhook_success(delivery_log_id)
+                self._delivered += 1
+                logger.info(
+                    "webhook_sent_successfully",
+                    webhook_type=row["webhook_type"],
+                    trip_id=row["trip_id"],
+                    status_code=result.get("status_code"),
+                    delivery_log_id=delivery_log_id,
+                )
+                return
+
+            if result.get("circuit_open"):
+                # No consumir intentos mientras el circuit breaker está abierto
+                await self._reschedule(
+                    delivery_log_id,
+                    delay=settings.webhook_circuit_breaker_timeout,
+                    error=result["error"],
+                    count_attempt=False,
+                )
+                return
+
+            attempt = (row.get("retry_count") or 0) + 1
+            if attempt >= self.max_attempts:
+                await self._fail(delivery_log_id, result["error"])
+            else:
+                await self._reschedule(
+                    delivery_log_id,
+                    delay=self._backoff_seconds(attempt),
+                    error=result["error"],
+                )
+
+            logger.error(
+                "webhook_send_failed",
+                webhook_type=row["webhook_type"],
+                trip_id=row["trip_id"],
+                error=result["error"],
+                attempt=attempt,
+                delivery_log_id=delivery_log_id,
+            )
+
+        except Exception as e:
+            # La fila conserva su lease y se reclamará al vencer
+            logger.error("webhook_dispatch_failed", delivery_log_id=delivery_log_id, error=str(e))
+
+        finally:
+            self._in_flight -= 1
+            clear_trace_id()
+
+    async def _reschedule(
+        self, delivery_log_id: str, delay: int, error: str, count_attempt: bool = True
+    ) -> None:
+        """Programar un nuevo intento"""
+        await self.db.execute(
+            """
+            UPDATE webhook_delivery_log
+            SET status = 'retrying',
+                last_error = %s,
+                retry_count = retry_count + %s,
+                next_attempt_at = DATE_ADD(NOW(), INTERVAL %s SECOND)
+            WHERE id = %s
+            """,
+            error,
+            1 if count_attempt else 0,
+            delay,
+            delivery_log_id,
+        )
+        self._rescheduled += 1
+
+    async def _fail(self, delivery_log_id: str, error: str) -> None:
+        """Marcar como fallido definitivo y mover a DLQ"""
+        await self.webhook_service._log_webhook_failure(delivery_log_id, error)
+        await self.webhook_service._move_to_dead_letter_queue(delivery_log_id)
+        self._dead_lettered += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener métricas del dispatcher
+
+        Returns:
+            Diccionario con contadores de entrega
+        """
+        return {
+            "running": self._running,
+            "batch_size": self.batch_size,
+            "max_attempts": self.max_attempts,
+            "in_flight": self._in_flight,
+            "claimed": self._claimed,
+            "delivered": self._delivered,
+            "rescheduled": self._rescheduled,
+            "dead_lettered": self._dead_lettered,
+        }
@@ -0,0 +1,102 @@
+"""
+Sobre de webhook serializado una sola vez
+
+El payload de un webhook se serializaba hasta tres veces (cuerpo HMAC/HTTP,
+columna payload de webhook_delivery_log y copia en DLQ). WebhookEnvelope
+serializa una vez a bytes y ese mismo buffer alimenta la firma, el cuerpo
+HTTP y el registro de auditoría.
+
+Usa orjson si está instalado (datetimes nativos en ISO 8601); si no, cae a
+json de la librería estándar con la misma semántica de default=str.
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, Union
+import hashlib
+import hmac
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+def _default(obj: Any) -> str:
+    """Tipos no soportados por el encoder (Decimal, UUID, ...) como string"""
+    return str(obj)
+
+
+def encode_json(obj: Any) -> bytes:
+    """
+    Serializar a JSON en bytes (UTF-8)
+
+    Args:
+        obj: Objeto a serializar
+
+    Returns:
+        JSON compacto en bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass(frozen=True)
+class WebhookEnvelope:
+    """Payload de webhook serializado una única vez"""
+
+    webhook_type: str
+    body: bytes
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], webhook_type: str) -> "WebhookEnvelope":
+        """
+        Crear sobre a partir del payload
+
+        Args:
+            payload: Payload del webhook
+            webhook_type: Tipo de webhook
+
+        Returns:
+            Sobre con el cuerpo serializado
+        """
+        return cls(webhook_type=webhook_type, body=encode_json(payload))
+
+    @classmethod
+    def from_stored(cls, payload: Union[str, bytes, Dict[str, Any]], webhook_type: str) -> "WebhookEnvelope":
+        """
+        Crear sobre desde la columna payload de webhook_delivery_log
+
+        El texto almacenado se envía tal cual (sin re-serializar) para que la
+        firma corresponda exactamente a lo auditado.
+
+        Args:
+            payload: JSON almacenado (texto, bytes o ya decodificado)
+            webhook_type: Tipo de webhook
+
+        Returns:
+            Sobre con el cuerpo almacenado
+        """
+        if isinstance(payload, str):
+            return cls(webhook_type=webhook_type, body=payload.encode("utf-8"))
+        if isinstance(payload, bytes):
+            return cls(webhook_type=webhook_type, body=payload)
+        return cls.from_payload(payload, webhook_type)
+
+    @cached_property
+    def text(self) -> str:
+        """Cuerpo como texto para la columna JSON de auditoría"""
+        return self.body.decode("utf-8")
+
+    def signature(self, secret_key: str) -> str:
+        """
+        Firma HMAC SHA256 del cuerpo
+
+        Args:
+            secret_key: Secret compartido
+
+        Returns:
+            Firma hexadecimal
+        """
+        return hmac.new(secret_key.encode("utf-8"), self.body, hashlib.sha256).hexdigest()
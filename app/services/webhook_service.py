@@ -5,6 +5,7 @@ Este servicio maneja:
 - Generación de payloads según especificación
 - Firma HMAC de webhooks
 - Envío con retry y circuit breaker
+- Outbox transaccional (entrega diferida por WebhookDispatcher)
 - Logging de entregas
 - Dead letter queue para fallos
 """
@@ -12,7 +13,8 @@ import uuid
 import hmac
 import hashlib
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Union
 from datetime import datetime, timezone
 import httpx
 from tenacity import (
@@ -23,9 +25,12 @@ from tenacity import (
 )
 
 from app.core.logging import get_logger
+from app.core.context import get_trace_id
 from app.core.database import Database
 from app.core.errors import BusinessLogicError
+from app.core.metrics import WEBHOOK_DELIVERIES, WEBHOOK_DELIVERY_DURATION, metrics
 from app.config import settings
+from app.services.webhook_envelope import WebhookEnvelope, encode_json
 
 logger = get_logger(__name__)
 
@@ -116,20 +121,28 @@ class WebhookService:
         target_url: Optional[str] = None,
         secret_key: Optional[str] = None,
         timeout: int = 30,
+        outbox_enabled: bool = False,
+        log_writer=None,
     ):
         """
         Inicializar servicio de webhooks
-        
+
         Args:
             db: Conexión a base de datos
             target_url: URL base de webhooks Flowtify
             secret_key: Secret compartido para HMAC
             timeout: Timeout HTTP en segundos
+            outbox_enabled: Si es True, los webhooks se escriben en el outbox
+                (webhook_delivery_log) y los entrega WebhookDispatcher
+            log_writer: DeliveryLogWriter opcional; en envío directo registra
+                intentos y resultados por lotes en lugar de una query por transición
         """
         self.db = db
         self.target_url = target_url or settings.flowtify_webhook_url
         self.secret_key = secret_key or settings.webhook_secret
         self.timeout = timeout
+        self.outbox_enabled = outbox_enabled
+        self.log_writer = log_writer
         self.client = httpx.AsyncClient(
             timeout=timeout,
             limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
@@ -146,12 +159,12 @@ class WebhookService:
         """Cerrar cliente HTTP"""
         await self.client.aclose()
     
-    def _generate_signature(self, payload: str) -> str:
+    def _generate_signature(self, payload: Union[str, bytes]) -> str:
         """
         Generar firma HMAC SHA256 para el payload
         
         Args:
-            payload: Payload JSON como string
+            payload: Payload JSON como string o bytes
             
         Returns:
             Firma hexadecimal
@@ -160,14 +173,78 @@ class WebhookService:
             logger.warning("webhook_secret_not_configured")
             return ""
         
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+
         signature = hmac.new(
             self.secret_key.encode("utf-8"),
-            payload.encode("utf-8"),
+            payload,
             hashlib.sha256,
         ).hexdigest()
         
         return signature
-    
+
+    def _build_headers(self, payload_json: Union[str, bytes], webhook_type: str) -> Dict[str, str]:
+        """
+        Construir headers firmados para un webhook
+
+        Args:
+            payload_json: Payload serializado exactamente como se enviará
+            webhook_type: Tipo de webhook
+
+        Returns:
+            Diccionario de headers HTTP
+        """
+        return {
+            "Content-Type": "application/json",
+            "X-Webhook-Signature": self._generate_signature(payload_json),
+            "X-Webhook-Type": webhook_type,
+            "X-Webhook-Timestamp": str(int(datetime.now(timezone.utc).timestamp())),
+        }
+
+    def _record_delivery(self, webhook_type: str, started: float, error: Optional[Exception] = None) -> None:
+        """
+        Registrar latencia y resultado de un intento de entrega
+
+        Args:
+            webhook_type: Tipo de webhook
+            started: perf_counter() al iniciar el intento
+            error: Excepción del intento (None si fue exitoso)
+        """
+        if not metrics.enabled:
+            return
+        if error is None:
+            outcome = "success"
+        elif isinstance(error, BusinessLogicError):
+            # Circuit breaker abierto: no hubo llamada HTTP
+            WEBHOOK_DELIVERIES.labels(webhook_type, "circuit_open").inc()
+            return
+        elif isinstance(error, httpx.HTTPStatusError):
+            outcome = "http_error"
+        else:
+            outcome = "transport_error"
+        WEBHOOK_DELIVERIES.labels(webhook_type, outcome).inc()
+        WEBHOOK_DELIVERY_DURATION.labels(webhook_type).observe(time.perf_counter() - started)
+
+    async def _fetchrow(self, query: str, *args, cursor=None) -> Optional[Dict[str, Any]]:
+        """
+        Ejecutar fetchrow en la transacción del llamador si se proporciona cursor
+
+        Args:
+            query: Query SQL
+            *args: Parámetros de la query
+            cursor: Cursor de una transacción abierta (opcional)
+
+        Returns:
+            Fila como diccionario o None
+        """
+        if cursor is None:
+            return await self.db.fetchrow(query, *args)
+
+        await cursor.execute(query, args or None)
+        row = await cursor.fetchone()
+        return self.db._deserialize_json_fields(row) if row else None
+
     def _is_enabled_for_tenant(self, tenant_id: int) -> bool:
         """
         Verificar si webhooks están habilitados para un tenant
@@ -184,7 +261,7 @@ class WebhookService:
         self,
         webhook_type: str,
         trip_id: Optional[str],
-        payload: Dict[str, Any],
+        payload: Union[Dict[str, Any], str],
         target_url: str,
     ) -> str:
         """
@@ -193,7 +270,7 @@ class WebhookService:
         Args:
             webhook_type: Tipo de webhook
             trip_id: ID del viaje (opcional)
-            payload: Payload completo
+            payload: Payload completo o JSON ya serializado (WebhookEnvelope.text)
             target_url: URL destino
             
         Returns:
@@ -212,7 +289,7 @@ class WebhookService:
             delivery_log_id,
             webhook_type,
             trip_id,
-            json.dumps(payload, default=str),
+            payload if isinstance(payload, str) else encode_json(payload).decode("utf-8"),
             target_url,
             "pending",
         )
@@ -251,42 +328,28 @@ class WebhookService:
         Args:
             delivery_log_id: ID del webhook que falló
         """
-        # Obtener webhook original
-        webhook = await self.db.fetchrow(
-            "SELECT * FROM webhook_delivery_log WHERE id = %s",
-            delivery_log_id,
-        )
-        
-        if not webhook:
-            logger.error("webhook_not_found_for_dlq", delivery_log_id=delivery_log_id)
-            return
-        
-        # Insertar en DLQ
+        # Copiar la fila en el servidor: el payload no se relee ni se re-serializa
         dlq_id = str(uuid.uuid4())
         query = """
             INSERT INTO webhook_dead_letter_queue
             (id, original_delivery_log_id, webhook_type, trip_id, payload, 
              target_url, failure_reason, retry_count, last_attempt_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            SELECT %s, id, webhook_type, trip_id, payload, target_url,
+                   COALESCE(last_error, 'Unknown error'), retry_count, NOW()
+            FROM webhook_delivery_log
+            WHERE id = %s
         """
         
-        await self.db.execute(
-            query,
-            dlq_id,
-            delivery_log_id,
-            webhook["webhook_type"],
-            webhook["trip_id"],
-            webhook["payload"],
-            webhook["target_url"],
-            webhook["last_error"] or "Unknown error",
-            webhook["retry_count"],
-        )
+        inserted = await self.db.execute(query, dlq_id, delivery_log_id)
+        
+        if not inserted:
+            logger.error("webhook_not_found_for_dlq", delivery_log_id=delivery_log_id)
+            return
         
         logger.warning(
             "webhook_moved_to_dlq",
             delivery_log_id=delivery_log_id,
             dlq_id=dlq_id,
-            webhook_type=webhook["webhook_type"],
         )
     
     @retry(
@@ -319,37 +382,41 @@ class WebhookService:
             return {"success": False, "error": "Target URL not configured"}
         
         url = f"{self.target_url}{endpoint}"
-        payload_json = json.dumps(payload, default=str)
-        signature = self._generate_signature(payload_json)
-        
-        headers = {
-            "Content-Type": "application/json",
-            "X-Webhook-Signature": signature,
-            "X-Webhook-Type": webhook_type,
-            "X-Webhook-Timestamp": str(int(datetime.now(timezone.utc).timestamp())),
-        }
-        
+        # Una sola serialización para firma, cuerpo HTTP y delivery log
+        envelope = WebhookEnvelope.from_payload(payload, webhook_type)
+        headers = self._build_headers(envelope.body, webhook_type)
+
         # Log attempt
-        delivery_log_id = await self._log_webhook_attempt(
-            webhook_type=webhook_type,
-            trip_id=trip_id,
-            payload=payload,
-            target_url=url,
-        )
+        if self.log_writer:
+            delivery_log_id = self.log_writer.record_attempt(
+                webhook_type, trip_id, envelope.text, url
+            )
+        else:
+            delivery_log_id = await self._log_webhook_attempt(
+                webhook_type=webhook_type,
+                trip_id=trip_id,
+                payload=envelope.text,
+                target_url=url,
+            )
         
+        started = time.perf_counter()
         try:
             # Usar circuit breaker
             response = await self._circuit_breaker.call(
                 self.client.post,
                 url,
-                content=payload_json,
+                content=envelope.body,
                 headers=headers,
             )
             
             response.raise_for_status()
+            self._record_delivery(webhook_type, started)
             
             # Log success
-            await self._log_webhook_success(delivery_log_id)
+            if self.log_writer:
+                self.log_writer.record_success(delivery_log_id)
+            else:
+                await self._log_webhook_success(delivery_log_id)
             
             logger.info(
                 "webhook_sent_successfully",
@@ -366,9 +433,7 @@ class WebhookService:
             }
         
         except Exception as e:
-            # Log failure
-            await self._log_webhook_failure(delivery_log_id, str(e))
-            
+            self._record_delivery(webhook_type, started, e)
             logger.error(
                 "webhook_send_failed",
                 webhook_type=webhook_type,
@@ -376,15 +441,22 @@ class WebhookService:
                 error=str(e),
                 delivery_log_id=delivery_log_id,
             )
-            
-            # Si agotó retries, mover a DLQ
-            webhook = await self.db.fetchrow(
-                "SELECT retry_count FROM webhook_delivery_log WHERE id = %s",
-                delivery_log_id,
-            )
-            
-            if webhook and webhook["retry_count"] >= settings.webhook_retry_max:
-                await self._move_to_dead_letter_queue(delivery_log_id)
+
+            if self.log_writer:
+                # retry_count y decisión de DLQ en memoria
+                self.log_writer.record_failure(delivery_log_id, str(e))
+            else:
+                # Log failure
+                await self._log_webhook_failure(delivery_log_id, str(e))
+
+                # Si agotó retries, mover a DLQ
+                webhook = await self.db.fetchrow(
+                    "SELECT retry_count FROM webhook_delivery_log WHERE id = %s",
+                    delivery_log_id,
+                )
+
+                if webhook and webhook["retry_count"] >= settings.webhook_retry_max:
+                    await self._move_to_dead_letter_queue(delivery_log_id)
             
             return {
                 "success": False,
@@ -392,12 +464,151 @@ class WebhookService:
                 "delivery_log_id": delivery_log_id,
             }
     
-    async def _fetch_trip_complete_data(self, trip_id: str) -> Dict[str, Any]:
+    async def _enqueue_webhook(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        webhook_type: str,
+        trip_id: Optional[str] = None,
+        cursor=None,
+    ) -> Dict[str, Any]:
+        """
+        Escribir webhook en el outbox para entrega diferida
+
+        Si se proporciona cursor, el INSERT forma parte de la transacción del
+        llamador y el webhook solo existe si esa transacción hace commit.
+
+        Args:
+            endpoint: Endpoint del webhook (ej: /status-update)
+            payload: Payload del webhook
+            webhook_type: Tipo de webhook
+            trip_id: ID del viaje (opcional)
+            cursor: Cursor de una transacción abierta (opcional)
+
+        Returns:
+            Diccionario con resultado del encolado
+        """
+        if not self.target_url:
+            logger.error("webhook_target_url_not_configured", webhook_type=webhook_type)
+            return {"success": False, "error": "Target URL not configured"}
+
+        delivery_log_id = str(uuid.uuid4())
+        query = """
+            INSERT INTO webhook_delivery_log
+            (id, webhook_type, trip_id, payload, target_url, status,
+             next_attempt_at, trace_id, created_at)
+            VALUES (%s, %s, %s, %s, %s, 'pending', NOW(), %s, NOW())
+        """
+        params = (
+            delivery_log_id,
+            webhook_type,
+            trip_id,
+            WebhookEnvelope.from_payload(payload, webhook_type).text,
+            f"{self.target_url}{endpoint}",
+            get_trace_id(),
+        )
+
+        if cursor is not None:
+            await cursor.execute(query, params)
+        else:
+            await self.db.execute(query, *params)
+
+        logger.info(
+            "webhook_enqueued",
+            delivery_log_id=delivery_log_id,
+            webhook_type=webhook_type,
+            trip_id=trip_id,
+            transactional=cursor is not None,
+        )
+
+        return {
+            "success": True,
+            "queued": True,
+            "delivery_log_id": delivery_log_id,
+        }
+
+    async def _dispatch_webhook(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        webhook_type: str,
+        trip_id: Optional[str] = None,
+        cursor=None,
+    ) -> Dict[str, Any]:
+        """
+        Encolar en el outbox o enviar directamente según configuración
+
+        Args:
+            endpoint: Endpoint del webhook
+            payload: Payload del webhook
+            webhook_type: Tipo de webhook
+            trip_id: ID del viaje (opcional)
+            cursor: Cursor de una transacción abierta (solo modo outbox)
+
+        Returns:
+            Resultado del encolado o del envío
+        """
+        if self.outbox_enabled:
+            return await self._enqueue_webhook(
+                endpoint=endpoint,
+                payload=payload,
+                webhook_type=webhook_type,
+                trip_id=trip_id,
+                cursor=cursor,
+            )
+
+        return await self._send_webhook_with_retry(
+            endpoint=endpoint,
+            payload=payload,
+            webhook_type=webhook_type,
+            trip_id=trip_id,
+        )
+
+    async def deliver_once(self, delivery: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Realizar un único intento de entrega de una fila del outbox
+
+        No actualiza webhook_delivery_log: el reintento, backoff y DLQ los
+        decide WebhookDispatcher.
+
+        Args:
+            delivery: Fila de webhook_delivery_log (id, webhook_type, payload, target_url)
+
+        Returns:
+            Diccionario con success, status_code y error
+        """
+        envelope = WebhookEnvelope.from_stored(delivery["payload"], delivery["webhook_type"])
+        headers = self._build_headers(envelope.body, delivery["webhook_type"])
+
+        started = time.perf_counter()
+        try:
+            response = await self._circuit_breaker.call(
+                self.client.post,
+                delivery["target_url"],
+                content=envelope.body,
+                headers=headers,
+            )
+            response.raise_for_status()
+            self._record_delivery(delivery["webhook_type"], started)
+            return {"success": True, "status_code": response.status_code}
+
+        except BusinessLogicError as e:
+            # Circuit breaker abierto: no cuenta como intento
+            self._record_delivery(delivery["webhook_type"], started, e)
+            return {"success": False, "error": str(e), "circuit_open": True}
+
+        except Exception as e:
+            self._record_delivery(delivery["webhook_type"], started, e)
+            status_code = getattr(getattr(e, "response", None), "status_code", None)
+            return {"success": False, "error": str(e) or type(e).__name__, "status_code": status_code}
+
+    async def _fetch_trip_complete_data(self, trip_id: str, cursor=None) -> Dict[str, Any]:
         """
         Obtener datos completos del viaje con joins
-        
+
         Args:
             trip_id: UUID del viaje
+            cursor: Cursor de una transacción abierta (opcional)
             
         Returns:
             Diccionario con datos completos del viaje
@@ -415,8 +626,8 @@ class WebhookService:
             WHERE t.id = %s
         """
         
-        result = await self.db.fetchrow(query, trip_id)
-        
+        result = await self._fetchrow(query, trip_id, cursor=cursor)
+
         if not result:
             raise ValueError(f"Trip not found: {trip_id}")
         
@@ -498,12 +709,13 @@ class WebhookService:
             "destination": trip_data.get("destination"),
         }
     
-    async def _get_current_location(self, wialon_id: str) -> Dict[str, Any]:
+    async def _get_current_location(self, wialon_id: str, cursor=None) -> Dict[str, Any]:
         """
         Obtener ubicación actual desde último evento
-        
+
         Args:
             wialon_id: ID de la unidad en Wialon
+            cursor: Cursor de una transacción abierta (opcional)
             
         Returns:
             Diccionario con datos de ubicación
@@ -516,7 +728,7 @@ class WebhookService:
             LIMIT 1
         """
         
-        location = await self.db.fetchrow(query, wialon_id)
+        location = await self._fetchrow(query, wialon_id, cursor=cursor)
         
         if location:
             return {
@@ -544,6 +756,7 @@ class WebhookService:
         new_substatus: str,
         change_reason: str,
         metadata: Optional[Dict[str, Any]] = None,
+        cursor=None,
     ) -> Dict[str, Any]:
         """
         Enviar webhook de actualización de estado
@@ -556,13 +769,14 @@ class WebhookService:
             new_substatus: Nuevo subestado
             change_reason: Razón del cambio
             metadata: Metadatos adicionales
-            
+            cursor: Cursor de una transacción abierta (modo outbox)
+
         Returns:
             Resultado del envío
         """
         # Obtener datos completos del viaje
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
         # Verificar si webhooks están habilitados para este tenant
         if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
             logger.info(
@@ -603,7 +817,7 @@ class WebhookService:
             "driver": self._format_driver_data(trip_data.get("driver")),
             "unit": self._format_unit_data(trip_data.get("unit")),
             "location": await self._get_current_location(
-                trip_data["unit"]["wialon_id"]
+                trip_data["unit"]["wialon_id"], cursor=cursor
             )
             if trip_data.get("unit", {}).get("wialon_id")
             else {},
@@ -611,35 +825,31 @@ class WebhookService:
             "metadata": metadata or {},
         }
         
-        return await self._send_webhook_with_retry(
+        return await self._dispatch_webhook(
             endpoint="/status-update",
             payload=payload,
             webhook_type="status_update",
             trip_id=trip_id,
+            cursor=cursor,
         )
     
-    async def send_speed_violation(
+    def _build_speed_violation_payload(
         self,
         event_id: str,
-        trip_id: str,
+        trip_data: Dict[str, Any],
         violation_data: Dict[str, Any],
     ) -> Dict[str, Any]:
         """
-        Enviar webhook de violación de velocidad
-        
+        Construir el payload del webhook de violación de velocidad
+
         Args:
             event_id: UUID del evento
-            trip_id: UUID del viaje
+            trip_data: Datos completos del viaje
             violation_data: Datos de la violación
-            
+
         Returns:
-            Resultado del envío
+            Payload listo para enviar
         """
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
-        if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
-            return {"success": False, "error": "Webhooks disabled for tenant"}
-        
         # Calcular métricas
         detected_speed = violation_data.get("speed", 0)
         max_speed = violation_data.get("max_speed", 80)
@@ -654,7 +864,7 @@ class WebhookService:
         else:
             severity = "low"
         
-        payload = {
+        return {
             "event": "speed_violation",
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "tenant_id": trip_data.get("tenant_id"),
@@ -682,12 +892,39 @@ class WebhookService:
                 "external_id": violation_data.get("external_id"),
             },
         }
+
+    async def send_speed_violation(
+        self,
+        event_id: str,
+        trip_id: str,
+        violation_data: Dict[str, Any],
+        cursor=None,
+    ) -> Dict[str, Any]:
+        """
+        Enviar webhook de violación de velocidad
         
-        return await self._send_webhook_with_retry(
+        Args:
+            event_id: UUID del evento
+            trip_id: UUID del viaje
+            violation_data: Datos de la violación
+            cursor: Cursor de una transacción abierta (modo outbox)
+            
+        Returns:
+            Resultado del envío
+        """
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
+        if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
+            return {"success": False, "error": "Webhooks disabled for tenant"}
+        
+        payload = self._build_speed_violation_payload(event_id, trip_data, violation_data)
+
+        return await self._dispatch_webhook(
             endpoint="/speed-violation",
             payload=payload,
             webhook_type="speed_violation",
             trip_id=trip_id,
+            cursor=cursor,
         )
     
     async def send_geofence_transition(
@@ -696,6 +933,7 @@ class WebhookService:
         trip_id: str,
         transition_type: str,
         geofence_data: Dict[str, Any],
+        cursor=None,
     ) -> Dict[str, Any]:
         """
         Enviar webhook de transición de geocerca
@@ -705,12 +943,13 @@ class WebhookService:
             trip_id: UUID del viaje
             transition_type: "entry" o "exit"
             geofence_data: Datos de la geocerca
+            cursor: Cursor de una transacción abierta (modo outbox)
             
         Returns:
             Resultado del envío
         """
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
         if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
             return {"success": False, "error": "Webhooks disabled for tenant"}
         
@@ -752,11 +991,12 @@ class WebhookService:
             },
         }
         
-        return await self._send_webhook_with_retry(
+        return await self._dispatch_webhook(
             endpoint="/geofence-transition",
             payload=payload,
             webhook_type="geofence_transition",
             trip_id=trip_id,
+            cursor=cursor,
         )
     
     async def send_route_deviation(
@@ -764,6 +1004,7 @@ class WebhookService:
         event_id: str,
         trip_id: str,
         deviation_data: Dict[str, Any],
+        cursor=None,
     ) -> Dict[str, Any]:
         """
         Enviar webhook de desviación de ruta
@@ -772,12 +1013,13 @@ class WebhookService:
             event_id: UUID del evento
             trip_id: UUID del viaje
             deviation_data: Datos de la desviación
+            cursor: Cursor de una transacción abierta (modo outbox)
             
         Returns:
             Resultado del envío
         """
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
         if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
             return {"success": False, "error": "Webhooks disabled for tenant"}
         
@@ -817,11 +1059,12 @@ class WebhookService:
             },
         }
         
-        return await self._send_webhook_with_retry(
+        return await self._dispatch_webhook(
             endpoint="/route-deviation",
             payload=payload,
             webhook_type="route_deviation",
             trip_id=trip_id,
+            cursor=cursor,
         )
     
     async def send_route_return(
@@ -829,6 +1072,7 @@ class WebhookService:
         event_id: str,
         trip_id: str,
         return_data: Dict[str, Any],
+        cursor=None,
     ) -> Dict[str, Any]:
         """
         Enviar webhook de regreso a ruta después de una desviación
@@ -837,12 +1081,13 @@ class WebhookService:
             event_id: UUID del evento
             trip_id: UUID del viaje
             return_data: Datos del regreso a ruta
+            cursor: Cursor de una transacción abierta (modo outbox)
             
         Returns:
             Resultado del envío
         """
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
         if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
             return {"success": False, "error": "Webhooks disabled for tenant"}
         
@@ -879,11 +1124,12 @@ class WebhookService:
             },
         }
         
-        return await self._send_webhook_with_retry(
+        return await self._dispatch_webhook(
             endpoint="/route-return",  # Endpoint diferente para regreso
             payload=payload,
             webhook_type="route_return",  # Tipo de webhook: route_return
             trip_id=trip_id,
+            cursor=cursor,
         )
     
     async def send_communication_response(
@@ -891,6 +1137,7 @@ class WebhookService:
         trip_id: str,
         message_id: str,
         response_data: Dict[str, Any],
+        cursor=None,
     ) -> Dict[str, Any]:
         """
         Enviar webhook de respuesta de comunicación
@@ -899,12 +1146,13 @@ class WebhookService:
             trip_id: UUID del viaje
             message_id: UUID del mensaje
             response_data: Datos de la respuesta
+            cursor: Cursor de una transacción abierta (modo outbox)
             
         Returns:
             Resultado del envío
         """
-        trip_data = await self._fetch_trip_complete_data(trip_id)
-        
+        trip_data = await self._fetch_trip_complete_data(trip_id, cursor=cursor)
+
         if not self._is_enabled_for_tenant(trip_data.get("tenant_id", 0)):
             return {"success": False, "error": "Webhooks disabled for tenant"}
         
@@ -939,10 +1187,11 @@ class WebhookService:
             "metadata": response_data.get("metadata", {}),
         }
         
-        return await self._send_webhook_with_retry(
+        return await self._dispatch_webhook(
             endpoint="/communication-response",
             payload=payload,
             webhook_type="communication_response",
             trip_id=trip_id,
+            cursor=cursor,
         )
 
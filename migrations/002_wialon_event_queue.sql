@@ -0,0 +1,37 @@
+-- ============================================================================
+-- Migration: 002_wialon_event_queue
+-- Description: Staging table for asynchronous ingestion of Wialon events
+-- ============================================================================
+
+-- POST /wialon/events persiste aquí el evento validado y responde 202.
+-- Un pool de workers (particionado por wialon_unit_id para preservar el orden
+-- por unidad) drena la tabla y ejecuta EventService.process_wialon_event.
+-- Las filas en estado 'pending' se recuperan al reiniciar el servicio.
+
+START TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS wialon_event_queue (
+    id CHAR(36) PRIMARY KEY COMMENT 'UUID of the queued event',
+    wialon_unit_id VARCHAR(64) NOT NULL COMMENT 'Wialon unit id (sharding key)',
+    notification_type VARCHAR(100) COMMENT 'Wialon notification type',
+    wialon_notification_id VARCHAR(255) COMMENT 'Wialon notification id (idempotency)',
+    payload JSON NOT NULL COMMENT 'Normalized WialonEvent payload',
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' COMMENT 'Status: pending, done, failed',
+    attempts INT NOT NULL DEFAULT 0 COMMENT 'Processing attempts',
+    last_error TEXT COMMENT 'Error message from last failed attempt',
+    received_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT 'When the event was received',
+    processed_at DATETIME(3) COMMENT 'When the event finished processing',
+    trace_id VARCHAR(36) COMMENT 'Trace ID of the ingress request',
+
+    INDEX idx_event_queue_status_received (status, received_at),
+    INDEX idx_event_queue_unit (wialon_unit_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='Staging queue for asynchronous Wialon event ingestion';
+
+COMMIT;
+
+-- Rollback:
+-- DROP TABLE IF EXISTS wialon_event_queue;
+
+-- Mantenimiento recomendado: purgar filas 'done' con más de 7 días
+-- DELETE FROM wialon_event_queue WHERE status = 'done' AND processed_at < NOW() - INTERVAL 7 DAY;
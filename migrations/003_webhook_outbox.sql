@@ -0,0 +1,34 @@
+-- ============================================================================
+-- Migration: 003_webhook_outbox
+-- Description: Turn webhook_delivery_log into a transactional outbox
+-- ============================================================================
+
+-- Con WEBHOOK_OUTBOX_ENABLED los webhooks se insertan en webhook_delivery_log
+-- dentro de la misma transacción que el evento o cambio de estado que los
+-- origina. WebhookDispatcher reclama las filas vencidas con
+-- SELECT ... FOR UPDATE SKIP LOCKED (requiere MySQL 8.0+), las entrega en
+-- paralelo y reprograma los fallos con backoff exponencial.
+--
+-- Estados: pending -> in_flight -> sent
+--                              \-> retrying -> in_flight ...
+--                              \-> failed (movido a webhook_dead_letter_queue)
+--
+-- Mientras una fila está 'in_flight', next_attempt_at actúa como lease: si el
+-- proceso muere durante la entrega la fila vuelve a reclamarse al vencer.
+
+START TRANSACTION;
+
+ALTER TABLE webhook_delivery_log
+    ADD COLUMN next_attempt_at DATETIME NULL
+        COMMENT 'When the dispatcher should (re)attempt delivery; lease expiry while in_flight'
+        AFTER retry_count,
+    MODIFY COLUMN status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        COMMENT 'Status: pending, in_flight, retrying, sent, failed',
+    ADD INDEX idx_webhook_outbox_due (status, next_attempt_at);
+
+COMMIT;
+
+-- Rollback:
+-- ALTER TABLE webhook_delivery_log
+--     DROP INDEX idx_webhook_outbox_due,
+--     DROP COLUMN next_attempt_at;
@@ -0,0 +1,32 @@
+-- ============================================================================
+-- Migration: 004_ai_classification_cache
+-- Description: Persistent cache of message classifications (next to ai_interactions)
+-- ============================================================================
+
+-- ClassificationCache (app/services/classification_cache.py) guarda aquí los
+-- resultados de Gemini cuando classification_cache_persist=True. La clave es
+-- el SHA-256 de texto normalizado + status + substatus del viaje. Al arrancar
+-- el servicio se cargan las entradas vigentes a memoria.
+
+START TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS ai_classification_cache (
+    cache_key CHAR(64) PRIMARY KEY COMMENT 'SHA-256 of normalized text + trip status + substatus',
+    normalized_text VARCHAR(500) NOT NULL COMMENT 'Accent/case/whitespace-normalized message',
+    trip_status VARCHAR(50) COMMENT 'Trip status at classification time',
+    trip_substatus VARCHAR(50) COMMENT 'Trip substatus at classification time',
+    result JSON NOT NULL COMMENT 'GeminiResponse-shaped classification',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL COMMENT 'Entry is ignored after this time',
+
+    INDEX idx_classification_cache_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='Persistent cache of AI message classifications';
+
+COMMIT;
+
+-- Rollback:
+-- DROP TABLE IF EXISTS ai_classification_cache;
+
+-- Mantenimiento recomendado: purgar entradas expiradas
+-- DELETE FROM ai_classification_cache WHERE expires_at < NOW();
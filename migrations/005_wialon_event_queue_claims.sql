@@ -0,0 +1,47 @@
+-- ============================================================================
+-- Migration: 005_wialon_event_queue_claims
+-- Description: Claims, leases and retries for wialon_event_queue
+-- ============================================================================
+
+-- WialonIngestionService reclama filas de forma atómica antes de procesarlas
+-- (UPDATE ... SET status = 'processing', claimed_by = <token> ... LIMIT n y
+-- luego SELECT por claimed_by), de modo que varias instancias pueden drenar
+-- la misma tabla sin procesar dos veces una fila. Un barrido periódico:
+--
+-- - Reclama filas 'pending' vencidas (next_attempt_at) por lotes hasta vaciar
+--   el backlog o llenar las colas en memoria.
+-- - Reclama de nuevo filas 'processing' cuyo lease (claimed_at) venció, p.ej.
+--   porque la instancia que las tenía murió.
+--
+-- Estados: pending -> processing -> done
+--                              \-> pending (reintento con backoff, attempts + 1)
+--                              \-> failed (al agotar los intentos)
+--
+-- Requiere la migración 002_wialon_event_queue.
+
+START TRANSACTION;
+
+ALTER TABLE wialon_event_queue
+    MODIFY COLUMN status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        COMMENT 'Status: pending, processing, done, failed',
+    ADD COLUMN claimed_by VARCHAR(100) NULL
+        COMMENT 'Claim token of the instance processing the row'
+        AFTER attempts,
+    ADD COLUMN claimed_at DATETIME(3) NULL
+        COMMENT 'When the row was claimed; lease start while processing'
+        AFTER claimed_by,
+    ADD COLUMN next_attempt_at DATETIME(3) NULL
+        COMMENT 'Earliest time a pending row can be claimed (retry backoff)'
+        AFTER claimed_at,
+    ADD INDEX idx_event_queue_claimed_by (claimed_by),
+    ADD INDEX idx_event_queue_status_claimed (status, claimed_at);
+
+COMMIT;
+
+-- Rollback:
+-- ALTER TABLE wialon_event_queue
+--     DROP INDEX idx_event_queue_status_claimed,
+--     DROP INDEX idx_event_queue_claimed_by,
+--     DROP COLUMN next_attempt_at,
+--     DROP COLUMN claimed_at,
+--     DROP COLUMN claimed_by;
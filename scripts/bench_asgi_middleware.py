@@ -0,0 +1,183 @@
+"""
+Benchmark de requests/seg de la capa HTTP: middleware y clase de respuesta JSON
+===============================================================================
+
+Levanta en proceso una app FastAPI con los routers reales de /health y
+/wialon/events y la golpea con httpx.ASGITransport (sin sockets ni
+servidor), para aislar el costo de la capa HTTP:
+
+    middleware   asgi   RequestLoggingMiddleware (ASGI puro)
+                 base   el mismo middleware detrás de un BaseHTTPMiddleware
+                        vacío: reproduce la tarea extra y el stream de
+                        respuesta que agregaba la versión anterior
+                 none   sin middleware
+    json         fast   ORJSONResponse como clase de respuesta por defecto
+                 std    JSONResponse de Starlette
+
+/wialon/events corre el parseo, la normalización y la validación reales;
+EventService se reemplaza por uno que responde sin tocar la base de datos
+para que la medición no dependa de MySQL.
+
+Uso:
+    python scripts/bench_asgi_middleware.py
+    python scripts/bench_asgi_middleware.py --requests 5000 --concurrency 50
+    python scripts/bench_asgi_middleware.py --middleware asgi,base --json fast
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+from urllib.parse import urlencode
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Sin captura de webhooks ni logs por request durante la medición
+os.environ.setdefault("WIALON_CAPTURE_ENABLED", "false")
+
+WIALON_BODY = urlencode({
+    "unit_name": "Torton 309 41BB3T",
+    "unit_id": "27538728",
+    "imei": "863719067169228",
+    "latitude": "21.0505",
+    "longitude": "-101.7995",
+    "altitude": "1796",
+    "speed": "6.2",
+    "course": "270",
+    "address": "ZONA DE CARGA - PLANTA ACME, León, Gto., México",
+    "pos_time": "2024-10-07 01:28:20",
+    "driver_name": "PRUEBA FLOWTIFY",
+    "geofence_name": "PLANTA ACME - ZONA CARGA",
+    "geofence_id": "9001",
+    "notification_type": "geofence_entry",
+})
+
+
+class NullEventService:
+    """EventService que responde sin base de datos"""
+
+    def drop_if_no_active_trip(self, event) -> None:
+        return None
+
+    async def process_wialon_event(self, event) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "event_id": "bench-event",
+            "trip_id": "bench-trip",
+            "action": {"type": "none"},
+            "message": "Event processed successfully",
+        }
+
+
+def build_app(middleware: str, json_mode: str):
+    """Crear la app con la variante de middleware y clase de respuesta pedida"""
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    from app.api.dependencies import get_event_service, get_ingestion_service
+    from app.api.middleware import RequestLoggingMiddleware
+    from app.api.routes import health, wialon
+    from app.config import settings
+
+    app = FastAPI(default_response_class=ORJSONResponse if json_mode == "fast" else JSONResponse)
+    if middleware in ("asgi", "base"):
+        app.add_middleware(RequestLoggingMiddleware)
+    if middleware == "base":
+        async def passthrough(request, call_next):
+            return await call_next(request)
+
+        app.add_middleware(BaseHTTPMiddleware, dispatch=passthrough)
+
+    app.include_router(health.router, prefix=settings.api_prefix)
+    app.include_router(wialon.router, prefix=settings.api_prefix)
+    app.dependency_overrides[get_event_service] = NullEventService
+    app.dependency_overrides[get_ingestion_service] = lambda: None
+    return app
+
+
+async def measure(app, endpoint: str, requests: int, concurrency: int, warmup: int) -> Dict[str, float]:
+    """
+    Requests/seg de un endpoint
+
+    Todo corre en un solo loop sin I/O real, así que el tiempo por request es
+    costo de CPU de la capa HTTP; las latencias individuales dependen de
+    cuánto cede cada variante al loop y no se comparan.
+    """
+    import httpx
+
+    from app.config import settings
+
+    if endpoint == "health":
+        method, url, kwargs = "GET", f"{settings.api_prefix}/health", {}
+    else:
+        method, url, kwargs = "POST", f"{settings.api_prefix}/wialon/events", {
+            "content": WIALON_BODY,
+            "headers": {"content-type": "application/x-www-form-urlencoded"},
+        }
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(warmup):
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+
+        remaining = requests
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                await client.request(method, url, **kwargs)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"rps": requests / elapsed, "us_per_request": elapsed / requests * 1_000_000}
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.core.logging import setup_logging
+
+    setup_logging(log_level=args.log_level, json_logs=True)
+
+    results = []
+    for endpoint in args.endpoints.split(","):
+        for middleware in args.middleware.split(","):
+            for json_mode in args.json.split(","):
+                app = build_app(middleware, json_mode)
+                # Mejor de --rounds corridas: la menos afectada por ruido del host
+                best = max(
+                    [await measure(app, endpoint, args.requests, args.concurrency, args.warmup)
+                     for _ in range(args.rounds)],
+                    key=lambda stats: stats["rps"],
+                )
+                results.append((endpoint, middleware, json_mode, best))
+
+    print(f"{'endpoint':<10} {'middleware':<10} {'json':<6} {'req/s':>10} {'µs/req':>9}")
+    for endpoint, middleware, json_mode, stats in results:
+        print(
+            f"{endpoint:<10} {middleware:<10} {json_mode:<6} {stats['rps']:>10.0f} "
+            f"{stats['us_per_request']:>9.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de la capa HTTP (middleware y JSON)")
+    parser.add_argument("--requests", type=int, default=3000, help="Requests medidos por variante")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests simultáneos")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests de calentamiento por variante")
+    parser.add_argument("--rounds", type=int, default=3, help="Corridas por variante (se reporta la mejor)")
+    parser.add_argument("--endpoints", default="health,wialon", help="health,wialon")
+    parser.add_argument("--middleware", default="base,asgi,none", help="base,asgi,none")
+    parser.add_argument("--json", default="std,fast", help="std,fast")
+    parser.add_argument("--log-level", default="WARNING", help="Nivel de log durante la medición")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
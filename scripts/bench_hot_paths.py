@@ -0,0 +1,436 @@
+"""
+Microbenchmarks de los caminos calientes por evento
+====================================================
+
+Mide el costo por llamada de lo que se ejecuta en cada webhook de Wialon,
+cada mensaje de WhatsApp y cada webhook saliente:
+
+    parse_wialon_event (JSON, form-urlencoded, text/plain), _convert_types,
+    normalize_wialon_event, validación de WialonEvent, payloads de
+    WebhookService (_format_trip_summary, cuerpo de speed_violation), firma
+    HMAC, get_message_classification_prompt y
+    Database._deserialize_json_fields
+
+Cada benchmark se calibra con timeit (autorange hasta --min-time) y se
+repite --repeat veces; se reporta la mediana y el mínimo en µs por llamada.
+La comparación usa el mínimo, el valor menos afectado por ruido del host.
+
+Cada repetición mide además un bucle de calibración de Python puro (enteros,
+strings, dicts y listas) justo antes del benchmark y guarda la razón
+benchmark / calibración (relative). compare usa esa razón, así un host o un
+runner de CI más lento (o más rápido), o uno cuya velocidad cambia durante la
+ejecución, no se reporta como regresión de todo el conjunto.
+
+Comandos:
+    run       Ejecutar y mostrar resultados (--save guarda una línea base)
+    compare   Ejecutar y comparar contra la línea base escalada; sale con
+              código 1 si algún benchmark regresa más de --max-regression
+              (default 25%) también en una segunda medición
+    list      Listar benchmarks
+
+La normalización compensa la velocidad general del host, no diferencias de
+versión de Python, arquitectura o librerías: ante la advertencia de host
+distinto, regenerar la línea base con run --save en el host donde se compara.
+En hosts compartidos con mucho ruido (VMs pequeñas, runners de CI) subir
+--max-regression en lugar de regenerar la línea base en cada corrida.
+
+Uso:
+    python scripts/bench_hot_paths.py run --save scripts/baselines/hot_paths.json
+    python scripts/bench_hot_paths.py compare --max-regression 0.2
+    python scripts/bench_hot_paths.py run --filter parse_wialon_event
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import Database  # noqa: E402
+from app.integrations.gemini.prompts import get_message_classification_prompt  # noqa: E402
+from app.integrations.wialon.parser import (  # noqa: E402
+    _convert_types,
+    normalize_wialon_event,
+    parse_wialon_event,
+)
+from app.models.event import WialonEvent  # noqa: E402
+from app.services.webhook_envelope import WebhookEnvelope, encode_json  # noqa: E402
+from app.services.webhook_service import WebhookService  # noqa: E402
+from perf_stats import compare_metrics, format_comparison  # noqa: E402
+
+DEFAULT_BASELINE = str(Path(__file__).parent / "baselines" / "hot_paths.json")
+SECRET = "bench_secret_key_123456789"
+
+# Diferencia absoluta mínima (µs) para considerar regresión; evita fallar por
+# ruido en benchmarks de pocos cientos de nanosegundos
+MIN_DELTA_US = 0.2
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    """Registrar una función de preparación que devuelve el callable a medir"""
+    def register(setup: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# ----------------------------------------------------------------------
+# Datos de ejemplo
+# ----------------------------------------------------------------------
+
+WIALON_FIELDS = {
+    "unit_name": "Torton 309 41BB3T",
+    "unit_id": "27538728",
+    "imei": "863719067169228",
+    "notification_type": "geofence_entry",
+    "notification_id": "NOTIF_1762896339_27538728",
+    "event_time": "1762896339",
+    "latitude": "21.1398",
+    "longitude": "-101.6847",
+    "altitude": "1815",
+    "speed": "42 km/h",
+    "course": "187",
+    "address": "Blvd. Adolfo López Mateos 2010, León, Gto.",
+    "pos_time": "2025-11-11 15:25:39",
+    "driver_name": "PRUEBA_FLOWTIFY",
+    "driver_code": "3308",
+    "geofence_name": "CEDIS COPPEL LEON",
+    "geofence_id": "9001",
+}
+
+WIALON_JSON = json.dumps({
+    **WIALON_FIELDS,
+    "event_time": 1762896339,
+    "latitude": 21.1398,
+    "longitude": -101.6847,
+    "altitude": 1815,
+    "speed": 42,
+    "course": 187,
+}, ensure_ascii=False).encode("utf-8")
+WIALON_FORM = urlencode(WIALON_FIELDS).encode("utf-8")
+
+TRIP_DATA = {
+    "id": "5b0b6c52-7f7e-4d9e-9d7a-2f2b1f5d9a11",
+    "floatify_trip_id": "TEST_FLOW_20241006123456",
+    "tenant_id": 24,
+    "status": "en_ruta_destino",
+    "substatus": "rumbo_a_descarga",
+    "origin": "León",
+    "destination": "Jalisco",
+    "driver": {"id": "drv-1", "name": "Juan Pérez", "phone": "+5214771234567", "wialon_driver_code": "3308"},
+    "unit": {"id": "unit-1", "code": "18", "plate": "41BB3T", "wialon_id": "27538728",
+             "imei": "863719067169228", "name": "Torton 309 41BB3T"},
+}
+
+VIOLATION_DATA = {
+    "speed": 112.0,
+    "max_speed": 80,
+    "duration_seconds": 0,
+    "location": {"latitude": 21.1398, "longitude": -101.6847, "address": WIALON_FIELDS["address"]},
+    "notification_id": WIALON_FIELDS["notification_id"],
+    "external_id": "wialon_speed_27538728_1762896339",
+}
+
+DB_ROW = {
+    "id": "9a4f7c2e-1b2d-4c5e-8f9a-0b1c2d3e4f5a",
+    "trip_id": TRIP_DATA["id"],
+    "event_type": "geofence_entry",
+    "metadata": json.dumps({"geofence_role": "loading", "source": "wialon", "speed": 42}),
+    "raw_payload": WIALON_JSON.decode("utf-8"),
+    "created_at": "2025-11-11 15:25:40",
+}
+
+
+def _webhook_service() -> WebhookService:
+    return WebhookService(db=None, target_url="http://localhost", secret_key=SECRET)
+
+
+# ----------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------
+
+@benchmark("parse_wialon_event.json")
+def bench_parse_json():
+    return lambda: parse_wialon_event(WIALON_JSON, "application/json")
+
+
+@benchmark("parse_wialon_event.form")
+def bench_parse_form():
+    return lambda: parse_wialon_event(WIALON_FORM, "application/x-www-form-urlencoded")
+
+
+@benchmark("parse_wialon_event.text")
+def bench_parse_text():
+    return lambda: parse_wialon_event(WIALON_FORM, "text/plain")
+
+
+@benchmark("_convert_types")
+def bench_convert_types():
+    return lambda: _convert_types(WIALON_FIELDS)
+
+
+@benchmark("normalize_wialon_event")
+def bench_normalize():
+    raw = parse_wialon_event(WIALON_FORM, "application/x-www-form-urlencoded")
+    return lambda: normalize_wialon_event(raw)
+
+
+@benchmark("WialonEvent.validate")
+def bench_validate():
+    normalized = normalize_wialon_event(parse_wialon_event(WIALON_JSON, "application/json"))
+    return lambda: WialonEvent(**normalized)
+
+
+@benchmark("webhook._format_trip_summary")
+def bench_trip_summary():
+    service = _webhook_service()
+    return lambda: service._format_trip_summary(TRIP_DATA)
+
+
+@benchmark("webhook.speed_violation_payload")
+def bench_speed_violation_payload():
+    service = _webhook_service()
+    return lambda: service._build_speed_violation_payload("evt-1", TRIP_DATA, VIOLATION_DATA)
+
+
+@benchmark("webhook.speed_violation_body")
+def bench_speed_violation_body():
+    service = _webhook_service()
+    return lambda: encode_json(service._build_speed_violation_payload("evt-1", TRIP_DATA, VIOLATION_DATA))
+
+
+@benchmark("hmac._generate_signature")
+def bench_generate_signature():
+    service = _webhook_service()
+    body = encode_json(service._build_speed_violation_payload("evt-1", TRIP_DATA, VIOLATION_DATA))
+    return lambda: service._generate_signature(body)
+
+
+@benchmark("hmac.envelope_signature")
+def bench_envelope_signature():
+    envelope = WebhookEnvelope.from_payload(
+        _webhook_service()._build_speed_violation_payload("evt-1", TRIP_DATA, VIOLATION_DATA), "speed_violation"
+    )
+    return lambda: envelope.signature(SECRET)
+
+
+@benchmark("get_message_classification_prompt")
+def bench_classification_prompt():
+    context = {"status": "en_ruta_destino", "substatus": "rumbo_a_descarga", "location": "León, Gto."}
+    return lambda: get_message_classification_prompt("ya llegué a la descarga, me van a recibir?", context)
+
+
+@benchmark("Database._deserialize_json_fields")
+def bench_deserialize_json_fields():
+    db = Database()
+    # Incluye la copia de la fila: el método deserializa en sitio
+    return lambda: db._deserialize_json_fields(dict(DB_ROW))
+
+
+# ----------------------------------------------------------------------
+# Calibración
+# ----------------------------------------------------------------------
+
+def calibration_loop() -> int:
+    """Trabajo fijo de Python puro que refleja la velocidad del intérprete en el host"""
+    row: Dict[str, Any] = {}
+    total = 0
+    for i in range(200):
+        key = f"field_{i % 16}"
+        row[key] = str(i)
+        total += len(row[key]) + i * 3
+    return total + len(sorted(row.values()))
+
+
+def expected_timings(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    Tiempos actuales y de la línea base en µs de este host
+
+    Con calibración ambos lados son relative (benchmark / calibración)
+    multiplicado por la calibración actual de cada benchmark; con una línea
+    base sin calibración se comparan los mínimos absolutos.
+
+    Args:
+        results: Resultados de esta ejecución
+        baseline: Línea base cargada
+
+    Returns:
+        (actuales, esperados) como {benchmark: µs}
+    """
+    saved = baseline["results"]
+    if not all("relative" in r for r in saved.values()):
+        print("warning: baseline has no calibration; comparing absolute timings "
+              "(regenerate it with run --save)")
+        return (
+            {name: r["min_us"] for name, r in results.items()},
+            {name: r["min_us"] for name, r in saved.items()},
+        )
+
+    current = {name: r["relative"] * r["calibration_us"] for name, r in results.items()}
+    expected = {
+        name: saved[name]["relative"] * r["calibration_us"]
+        for name, r in results.items()
+        if name in saved
+    }
+    factors = [r["calibration_us"] / saved[name]["calibration_us"] for name, r in results.items() if name in saved]
+    if factors:
+        print(f"\nHost speed factor vs baseline: {statistics.median(factors):.3f} "
+              f"(range {min(factors):.3f}-{max(factors):.3f})")
+    return current, expected
+
+
+# ----------------------------------------------------------------------
+# Ejecución
+# ----------------------------------------------------------------------
+
+def _loops_for(timer: timeit.Timer, min_time: float) -> int:
+    """Número de iteraciones para que una repetición dure al menos min_time"""
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(loops, int(loops * min_time / max(elapsed, 1e-9)))
+    return loops
+
+
+def measure(func: Callable[[], Any], min_time: float, repeat: int) -> Dict[str, Any]:
+    """
+    Medir un callable intercalando el bucle de calibración
+
+    Cada repetición mide primero calibration_loop y luego el benchmark, así
+    ambos ven la misma velocidad del host aunque varíe durante la ejecución.
+
+    Args:
+        func: Callable sin argumentos
+        min_time: Duración mínima de cada repetición en segundos
+        repeat: Número de repeticiones
+
+    Returns:
+        {"median_us", "min_us", "loops", "calibration_us", "relative"}
+    """
+    calibration = timeit.Timer(calibration_loop)
+    timer = timeit.Timer(func)
+    calibration_loops = _loops_for(calibration, min_time / 2)
+    loops = _loops_for(timer, min_time)
+
+    per_call, calibration_us, relative = [], [], []
+    for _ in range(repeat):
+        base = calibration.timeit(calibration_loops) / calibration_loops * 1e6
+        value = timer.timeit(loops) / loops * 1e6
+        per_call.append(value)
+        calibration_us.append(base)
+        relative.append(value / base)
+    return {
+        "median_us": round(statistics.median(per_call), 4),
+        "min_us": round(min(per_call), 4),
+        "loops": loops,
+        "calibration_us": round(min(calibration_us), 4),
+        "relative": round(min(relative), 6),
+    }
+
+
+def run_benchmarks(names: List[str], min_time: float, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Ejecutar los benchmarks indicados e imprimir cada resultado"""
+    results = {}
+    width = max(len(name) for name in names)
+    for name in names:
+        result = measure(BENCHMARKS[name](), min_time, repeat)
+        results[name] = result
+        print(f"{name:<{width}}  {result['median_us']:>10.3f} µs  (min {result['min_us']:.3f}, loops {result['loops']}, "
+              f"relative {result['relative']:.4f})")
+    return results
+
+
+def host_info() -> Dict[str, str]:
+    """Datos del host para saber si una línea base es comparable"""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def select(filter_text: Optional[str]) -> List[str]:
+    names = [name for name in BENCHMARKS if not filter_text or filter_text in name]
+    if not names:
+        raise SystemExit(f"No benchmarks match {filter_text!r}")
+    return names
+
+
+def main() -> None:
+    """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="Microbenchmarks de los caminos calientes por evento")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--filter", help="Ejecutar solo benchmarks cuyo nombre contenga este texto")
+    common.add_argument("--repeat", type=int, default=7, help="Repeticiones por benchmark (default: 7)")
+    common.add_argument("--min-time", type=float, default=0.2, help="Segundos mínimos por repetición (default: 0.2)")
+
+    run_parser = sub.add_parser("run", parents=[common], help="Ejecutar benchmarks")
+    run_parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="Guardar como línea base")
+
+    compare_parser = sub.add_parser("compare", parents=[common], help="Comparar contra una línea base")
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"Línea base (default: {DEFAULT_BASELINE})")
+    compare_parser.add_argument("--max-regression", type=float, default=0.25,
+                                help="Empeoramiento relativo tolerado (default: 0.25)")
+
+    sub.add_parser("list", help="Listar benchmarks")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print("\n".join(BENCHMARKS))
+        return
+
+    baseline = None
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("host") != host_info():
+            print(f"warning: baseline recorded on a different host: {baseline.get('host')}")
+
+    results = run_benchmarks(select(args.filter), args.min_time, args.repeat)
+
+    if args.command == "run":
+        if args.save:
+            Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump({
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "host": host_info(),
+                    "results": results,
+                }, f, indent=2)
+                f.write("\n")
+            print(f"Baseline written to {args.save}")
+        return
+
+    # Un pico de ruido afecta a un solo benchmark: confirmar cada regresión
+    # con una segunda medición antes de fallar
+    rows = compare_metrics(*expected_timings(results, baseline), args.max_regression, min_delta=MIN_DELTA_US)
+    failed = [row["metric"] for row in rows if not row["passed"]]
+    if failed:
+        print(f"\nRe-measuring {len(failed)} regressed benchmark(s)")
+        for name, result in run_benchmarks(failed, args.min_time, args.repeat).items():
+            if result["relative"] < results[name]["relative"]:
+                results[name] = result
+        rows = compare_metrics(*expected_timings(results, baseline), args.max_regression, min_delta=MIN_DELTA_US)
+    print()
+    print(format_comparison(rows))
+    if not all(row["passed"] for row in rows):
+        print("\nFAIL: regression above threshold")
+        sys.exit(1)
+    print("\nPASS")
+
+
+if __name__ == "__main__":
+    main()
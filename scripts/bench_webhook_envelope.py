@@ -0,0 +1,92 @@
+"""
+Microbenchmark: serialización de webhooks antes/después de WebhookEnvelope
+
+Compara el camino anterior (json.dumps para el cuerpo HMAC + json.dumps para
+el delivery log + re-serialización para DLQ) con una única serialización
+compartida por firma, cuerpo y auditoría.
+
+Ejecutar: python scripts/bench_webhook_envelope.py [--iterations 20000]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import sys
+import timeit
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.webhook_envelope import WebhookEnvelope, orjson  # noqa: E402
+
+SECRET = "bench_secret_key_123456789"
+
+
+def sample_payload() -> dict:
+    """Payload representativo de un status_update con ubicación"""
+    return {
+        "event": "status_update",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "tenant_id": 24,
+        "trip": {
+            "id": "5b0b6c52-7f7e-4d9e-9d7a-2f2b1f5d9a11",
+            "code": "TRIP-2025-0001",
+            "status": "en_ruta_destino",
+            "substatus": "rumbo_a_descarga",
+            "previous_status": "en_zona_carga",
+            "previous_substatus": "carga_completada",
+            "updated_at": datetime.now(timezone.utc),
+        },
+        "driver": {"id": "drv-1", "name": "Juan Pérez", "phone": "+5214771234567"},
+        "unit": {"id": "unit-1", "code": "TRUCK-001", "plate": "ABC123", "wialon_id": "27538728"},
+        "location": {
+            "latitude": Decimal("19.4326077"),
+            "longitude": Decimal("-99.1332080"),
+            "speed": Decimal("72.5"),
+            "address": "Av. Insurgentes Sur 1234, Ciudad de México",
+        },
+        "metadata": {"change_reason": "geofence_exit", "source": "wialon"},
+    }
+
+
+def before(payload: dict) -> None:
+    """Camino anterior: cuerpo + log + DLQ serializados por separado"""
+    body = json.dumps(payload, default=str)
+    hmac.new(SECRET.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+    json.dumps(payload, default=str)  # _log_webhook_attempt
+    json.dumps(json.loads(body), default=str)  # copia releída para DLQ
+
+
+def after(payload: dict) -> None:
+    """Camino nuevo: una sola serialización compartida"""
+    envelope = WebhookEnvelope.from_payload(payload, "status_update")
+    envelope.signature(SECRET)
+    envelope.text  # columna payload del delivery log
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    payload = sample_payload()
+    n = args.iterations
+
+    before_s = min(timeit.repeat(lambda: before(payload), number=n, repeat=5))
+    after_s = min(timeit.repeat(lambda: after(payload), number=n, repeat=5))
+
+    before_us = before_s / n * 1e6
+    after_us = after_s / n * 1e6
+
+    print(f"encoder: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"iterations: {n}")
+    print(f"before: {before_us:8.2f} µs/webhook")
+    print(f"after:  {after_us:8.2f} µs/webhook")
+    print(f"saved:  {before_us - after_us:8.2f} µs/webhook ({before_us / after_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
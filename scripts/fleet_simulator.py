@@ -0,0 +1,651 @@
+"""
+Simulador sintético de flota para Wialon
+=========================================
+
+Genera flujos realistas de notificaciones de Wialon para dimensionar la
+capacidad con miles de unidades, en lugar de los pocos payloads armados a
+mano (payload.json, test_group.json).
+
+Cada unidad virtual tiene un viaje con geocercas de carga, descarga y ruta
+(corredor alrededor de la polilínea) y recorre la polilínea en tiempo
+simulado: origen -> carga (espera) -> descarga (espera) -> salida. Al cruzar
+geocercas emite geofence_entry/geofence_exit; además genera episodios de
+speed_violation, desvíos que sacan a la unidad del corredor de ruta y
+pérdidas de conexión (connection_lost).
+
+Comportamiento de entrega configurable:
+    --duplicate-rate    Reenvíos de la misma notificación (mismo notification_id)
+    --reorder-rate      Notificaciones retrasadas que llegan después de otras más nuevas
+    --bursts-per-hour   Pérdidas de conexión por hora de manejo; lo generado
+                        mientras la unidad no tiene conexión llega de golpe al
+                        reconectar (ráfaga)
+    --formats           Mezcla de JSON, form-urlencoded y text/plain
+
+Salida:
+    --url               Envía los eventos a una instancia en ejecución
+                        (con --create-trips crea antes los viajes en /trips/create)
+    --out               Escribe los eventos en formato de captura NDJSON
+                        (.ndjson o .ndjson.gz) para replay_wialon_webhooks.py
+
+Uso:
+    python scripts/fleet_simulator.py --units 200 --url http://localhost:8000 --create-trips --speed 120
+    python scripts/fleet_simulator.py --units 5000 --hours 6 --out sim-5k.ndjson.gz
+    python scripts/replay_wialon_webhooks.py sim-5k.ndjson.gz --url http://localhost:8000 --speed 60
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.integrations.wialon.capture import encode_body  # noqa: E402
+from perf_stats import format_summary  # noqa: E402
+from replay_wialon_webhooks import replay  # noqa: E402
+
+TRIPS_PATH = "/api/v1/trips/create"
+
+# Centro de la región simulada (León, Gto.) y metros por grado de latitud
+REGION_CENTER = (21.1219, -101.6824)
+REGION_RADIUS_M = 120_000.0
+METERS_PER_DEGREE = 111_320.0
+
+SITE_GEOFENCE_BASE = 9100
+ROUTE_GEOFENCE_BASE = 700_000
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "form": "application/x-www-form-urlencoded",
+    "text": "text/plain",
+}
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class SimConfig:
+    """Parámetros de la simulación"""
+
+    tick_s: float = 10.0
+    speed_limit_kmh: float = 80.0
+    violations_per_hour: float = 0.3
+    deviation_rate: float = 0.1
+    dwell_min_s: float = 1200.0
+    dwell_max_s: float = 3600.0
+    departure_spread_s: float = 1800.0
+    duplicate_rate: float = 0.02
+    reorder_rate: float = 0.02
+    reorder_window_s: float = 120.0
+    bursts_per_hour: float = 0.1
+    burst_gap_s: float = 900.0
+    connection_lost_after_s: float = 300.0
+    site_radius_m: float = 400.0
+    corridor_m: float = 1500.0
+
+
+@dataclass
+class Geofence:
+    """Geocerca circular en coordenadas locales (metros)"""
+
+    geofence_id: str
+    name: str
+    role: str
+    x: float
+    y: float
+    radius_m: float
+
+    def contains(self, x: float, y: float) -> bool:
+        return math.hypot(x - self.x, y - self.y) <= self.radius_m
+
+
+def to_lat_lon(x: float, y: float) -> Point:
+    """Proyección local equirectangular (metros -> grados)"""
+    lat0, lon0 = REGION_CENTER
+    return (
+        lat0 + y / METERS_PER_DEGREE,
+        lon0 + x / (METERS_PER_DEGREE * math.cos(math.radians(lat0))),
+    )
+
+
+def _polar(rng: random.Random, center: Point, min_m: float, max_m: float) -> Point:
+    """Punto aleatorio a una distancia entre min_m y max_m de center"""
+    angle = rng.uniform(0, 2 * math.pi)
+    distance = rng.uniform(min_m, max_m)
+    return center[0] + distance * math.cos(angle), center[1] + distance * math.sin(angle)
+
+
+def _waypoints(rng: random.Random, a: Point, b: Point, count: int = 2) -> List[Point]:
+    """Puntos intermedios con desplazamiento lateral para que la ruta no sea recta"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = math.hypot(dx, dy) or 1.0
+    nx, ny = -dy / length, dx / length
+    points = []
+    for i in range(1, count + 1):
+        f = i / (count + 1)
+        lateral = rng.uniform(-0.08, 0.08) * length
+        points.append((a[0] + dx * f + nx * lateral, a[1] + dy * f + ny * lateral))
+    return points
+
+
+class VirtualUnit:
+    """Unidad virtual que recorre la polilínea de su viaje en tiempo simulado"""
+
+    def __init__(
+        self,
+        index: int,
+        unit_id: str,
+        run_id: str,
+        loading: Geofence,
+        unloading: Geofence,
+        config: SimConfig,
+        rng: random.Random,
+        epoch0: float,
+    ):
+        """
+        Inicializar unidad y construir su viaje
+
+        Args:
+            index: Índice de la unidad en la flota
+            unit_id: ID de Wialon de la unidad
+            run_id: Identificador de la corrida (para códigos únicos)
+            loading: Geocerca de carga
+            unloading: Geocerca de descarga
+            config: Parámetros de la simulación
+            rng: Generador aleatorio compartido (determinista con --seed)
+            epoch0: Epoch del instante 0 de la simulación
+        """
+        self.index = index
+        self.unit_id = unit_id
+        self.run_id = run_id
+        self.config = config
+        self.rng = rng
+        self.epoch0 = epoch0
+
+        self.trip_code = f"SIM_{run_id}_{index:05d}"
+        self.unit_name = f"Unidad SIM {index:05d}"
+        self.imei = f"86{int(unit_id):013d}"
+        self.loading = loading
+        self.unloading = unloading
+        self.route = Geofence(
+            str(ROUTE_GEOFENCE_BASE + index), f"RUTA {self.trip_code}", "route", 0.0, 0.0, config.corridor_m
+        )
+
+        origin = _polar(rng, (loading.x, loading.y), 5_000, 20_000)
+        site_a, site_b = (loading.x, loading.y), (unloading.x, unloading.y)
+        exit_point = _polar(rng, site_b, 8_000, 15_000)
+        self.points: List[Point] = [
+            origin, *_waypoints(rng, origin, site_a, 1),
+            site_a, *_waypoints(rng, site_a, site_b, 3),
+            site_b, exit_point,
+        ]
+        self.cumulative = [0.0]
+        for a, b in zip(self.points, self.points[1:]):
+            self.cumulative.append(self.cumulative[-1] + math.hypot(b[0] - a[0], b[1] - a[1]))
+        self.length = self.cumulative[-1]
+        self.stops = [self.cumulative[2], self.cumulative[-2]]
+
+        # Desvío: rampa lateral fuera del corredor a mitad del tramo carga -> descarga
+        self.deviation: Optional[Tuple[float, float]] = None
+        if rng.random() < config.deviation_rate:
+            leg = self.stops[1] - self.stops[0]
+            start = self.stops[0] + leg * rng.uniform(0.3, 0.5)
+            self.deviation = (start, start + leg * rng.uniform(0.1, 0.2))
+        self.deviation_peak_m = config.corridor_m * rng.uniform(2.0, 4.0)
+
+        self.cruise_ms = rng.uniform(55, 75) / 3.6
+        self.departure_s = rng.uniform(0, config.departure_spread_s)
+        self.distance = 0.0
+        self.next_stop = 0
+        self.dwell_until: Optional[float] = None
+        self.violation_until = -1.0
+        self.violation_ms = 0.0
+        self.offline_since = -1.0
+        self.offline_until = -1.0
+        self.done = False
+        self.seq = 0
+        self.geofences = (self.loading, self.unloading, self.route)
+        x, y, _ = self.position()
+        self.inside = {g.geofence_id for g in self.geofences if self._contains(g, x, y)}
+
+    # ------------------------------------------------------------------
+    # Geometría
+    # ------------------------------------------------------------------
+
+    def _lateral_offset(self) -> float:
+        """Desplazamiento respecto a la polilínea planeada (trapecio durante el desvío)"""
+        if not self.deviation:
+            return 0.0
+        start, end = self.deviation
+        if not start <= self.distance <= end:
+            return 0.0
+        ramp = (end - start) * 0.25
+        edge = min(self.distance - start, end - self.distance)
+        return self.deviation_peak_m * min(1.0, edge / ramp)
+
+    def position(self) -> Tuple[float, float, float]:
+        """
+        Posición actual
+
+        Returns:
+            (x, y, rumbo en grados) en coordenadas locales
+        """
+        i = 1
+        while i < len(self.cumulative) - 1 and self.cumulative[i] < self.distance:
+            i += 1
+        (ax, ay), (bx, by) = self.points[i - 1], self.points[i]
+        segment = self.cumulative[i] - self.cumulative[i - 1] or 1.0
+        f = min(1.0, max(0.0, (self.distance - self.cumulative[i - 1]) / segment))
+        dx, dy = bx - ax, by - ay
+        offset = self._lateral_offset()
+        x = ax + dx * f - dy / segment * offset
+        y = ay + dy * f + dx / segment * offset
+        heading = math.degrees(math.atan2(dx, dy)) % 360
+        return x, y, heading
+
+    def _contains(self, geofence: Geofence, x: float, y: float) -> bool:
+        if geofence.role == "route":
+            return abs(self._lateral_offset()) <= geofence.radius_m
+        return geofence.contains(x, y)
+
+    # ------------------------------------------------------------------
+    # Viaje
+    # ------------------------------------------------------------------
+
+    def trip_payload(self) -> Dict[str, Any]:
+        """Payload de /trips/create para el viaje de la unidad"""
+        phone = f"+52147799{self.index:05d}"
+        return {
+            "event": "whatsapp.group.create",
+            "action": "create_group",
+            "tenant_id": 24,
+            "trip": {
+                "id": f"{self.run_id}-{self.index}",
+                "code": self.trip_code,
+                "status": "asignado",
+                "origin": "León",
+                "destination": self.unloading.name,
+            },
+            "driver": {"id": f"{self.run_id}-d{self.index}", "name": f"Conductor SIM {self.index}", "phone": phone},
+            "unit": {
+                "id": f"{self.run_id}-u{self.index}",
+                "floatify_unit_id": f"SIM{self.unit_id}",
+                "name": self.unit_name,
+                "plate": f"SIM{self.index:05d}",
+                "wialon_id": self.unit_id,
+                "imei": self.imei,
+            },
+            "geofences": [
+                {"role": g.role, "geofence_id": g.geofence_id, "geofence_name": g.name,
+                 "geofence_type": "line" if g.role == "route" else "circle", "order": order}
+                for order, g in enumerate((self.loading, self.route, self.unloading), start=1)
+            ],
+            "whatsapp_participants": [phone],
+        }
+
+    def _event(self, t: float, notification_type: str, speed: float, **extra: Any) -> Dict[str, Any]:
+        """Campos de una notificación como las envía la plantilla de Wialon"""
+        x, y, heading = self.position()
+        lat, lon = to_lat_lon(x, y)
+        epoch = self.epoch0 + t
+        self.seq += 1
+        fields = {
+            "unit_name": self.unit_name,
+            "unit_id": self.unit_id,
+            "imei": self.imei,
+            "notification_type": notification_type,
+            "notification_id": f"SIM{self.run_id}_{self.unit_id}_{self.seq}",
+            "event_time": int(epoch),
+            "latitude": round(lat, 6),
+            "longitude": round(lon, 6),
+            "speed": round(speed * 3.6, 1),
+            "course": int(heading),
+            "address": f"{self.trip_code} km {self.distance / 1000:.1f}",
+            "pos_time": datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            "driver_name": f"Conductor SIM {self.index}",
+        }
+        fields.update(extra)
+        return fields
+
+    def step(self, t: float, dt: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Avanzar la unidad un tick
+
+        Args:
+            t: Tiempo simulado al final del tick (segundos desde el inicio)
+            dt: Duración del tick
+
+        Returns:
+            Lista de (instante de liberación, campos); los eventos generados
+            sin conexión se liberan al reconectar
+        """
+        if self.done or t < self.departure_s:
+            return []
+
+        config, rng = self.config, self.rng
+        events: List[Tuple[float, Dict[str, Any]]] = []
+
+        # Pérdida de conexión: Wialon avisa tras connection_lost_after_s sin datos
+        if t >= self.offline_until and rng.random() < config.bursts_per_hour * dt / 3600:
+            gap = config.burst_gap_s * rng.uniform(0.5, 1.5)
+            self.offline_since, self.offline_until = t, t + gap
+            if gap > config.connection_lost_after_s:
+                lost_at = t + config.connection_lost_after_s
+                events.append((lost_at, self._event(
+                    t, "connection_lost", 0.0,
+                    event_time=int(self.epoch0 + lost_at),
+                    last_message_time=int(self.epoch0 + t),
+                )))
+        release = self.offline_until if self.offline_since <= t < self.offline_until else t
+
+        if self.dwell_until is not None:
+            speed = 0.0
+            if t >= self.dwell_until:
+                self.dwell_until = None
+        else:
+            if t >= self.violation_until and rng.random() < config.violations_per_hour * dt / 3600:
+                self.violation_until = t + rng.uniform(60, 300)
+                self.violation_ms = (config.speed_limit_kmh + rng.uniform(5, 35)) / 3.6
+                events.append((release, self._event(
+                    t, "speed_violation", self.violation_ms, max_speed=config.speed_limit_kmh
+                )))
+            speed = self.violation_ms if t < self.violation_until else self.cruise_ms * rng.uniform(0.9, 1.1)
+            self.distance += speed * dt
+            if self.next_stop < len(self.stops) and self.distance >= self.stops[self.next_stop]:
+                self.distance = self.stops[self.next_stop]
+                self.next_stop += 1
+                self.dwell_until = t + rng.uniform(config.dwell_min_s, config.dwell_max_s)
+                self.violation_until = -1.0
+                speed = 0.0
+            if self.distance >= self.length:
+                self.distance = self.length
+                self.done = True
+
+        x, y, _ = self.position()
+        for geofence in self.geofences:
+            inside = self._contains(geofence, x, y)
+            if inside == (geofence.geofence_id in self.inside):
+                continue
+            if inside:
+                self.inside.add(geofence.geofence_id)
+            else:
+                self.inside.discard(geofence.geofence_id)
+            events.append((release, self._event(
+                t, "geofence_entry" if inside else "geofence_exit", speed,
+                geofence_id=geofence.geofence_id, geofence_name=geofence.name,
+            )))
+        return events
+
+
+# ----------------------------------------------------------------------
+# Flota y entrega
+# ----------------------------------------------------------------------
+
+def build_fleet(
+    units: int, sites: int, run_id: str, unit_id_base: int, config: SimConfig, rng: random.Random, epoch0: float
+) -> List[VirtualUnit]:
+    """
+    Crear sitios compartidos (CEDIS/bodegas) y las unidades con sus viajes
+
+    Args:
+        units: Número de unidades
+        sites: Número de sitios de carga/descarga compartidos
+        run_id: Identificador de la corrida
+        unit_id_base: Primer ID de Wialon
+        config: Parámetros de la simulación
+        rng: Generador aleatorio
+        epoch0: Epoch del instante 0
+
+    Returns:
+        Lista de unidades virtuales
+    """
+    site_list = [
+        Geofence(
+            str(SITE_GEOFENCE_BASE + i), f"SITIO SIM {i:03d}", "",
+            *_polar(rng, (0.0, 0.0), 0, REGION_RADIUS_M), config.site_radius_m,
+        )
+        for i in range(max(2, sites))
+    ]
+    fleet = []
+    for index in range(units):
+        a, b = rng.sample(site_list, 2)
+        loading = Geofence(a.geofence_id, a.name, "loading", a.x, a.y, a.radius_m)
+        unloading = Geofence(b.geofence_id, b.name, "unloading", b.x, b.y, b.radius_m)
+        fleet.append(VirtualUnit(index, str(unit_id_base + index), run_id, loading, unloading, config, rng, epoch0))
+    return fleet
+
+
+def encode_event(fields: Dict[str, Any], fmt: str) -> Tuple[str, bytes]:
+    """
+    Serializar una notificación como la enviaría Wialon
+
+    Args:
+        fields: Campos de la notificación
+        fmt: "json", "form" o "text" (form-urlencoded con Content-Type text/plain)
+
+    Returns:
+        (Content-Type, body)
+    """
+    if fmt == "json":
+        return CONTENT_TYPES[fmt], json.dumps(fields, ensure_ascii=False).encode("utf-8")
+    return CONTENT_TYPES[fmt], urlencode({k: str(v) for k, v in fields.items()}).encode("utf-8")
+
+
+def simulate(
+    fleet: List[VirtualUnit],
+    config: SimConfig,
+    rng: random.Random,
+    hours: float,
+    formats: Dict[str, float],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Correr la simulación y aplicar el comportamiento de entrega
+
+    Args:
+        fleet: Unidades virtuales
+        config: Parámetros de la simulación
+        rng: Generador aleatorio
+        hours: Duración máxima en horas simuladas
+        formats: Pesos de formato {"json": 0.3, "form": 0.7}
+
+    Returns:
+        (registros {"ts", "content_type", "body"} en orden de llegada, estadísticas)
+    """
+    epoch0 = fleet[0].epoch0 if fleet else time.time()
+    names, weights = list(formats), list(formats.values())
+    deliveries: List[Tuple[float, int, Dict[str, Any]]] = []
+    stats: Dict[str, Counter] = {"types": Counter(), "formats": Counter(), "delivery": Counter()}
+
+    def deliver(at: float, fields: Dict[str, Any], kind: str) -> None:
+        deliveries.append((at, len(deliveries), fields))
+        stats["delivery"][kind] += 1
+
+    t, end = 0.0, hours * 3600
+    while t < end and not all(unit.done for unit in fleet):
+        t += config.tick_s
+        for unit in fleet:
+            for release, fields in unit.step(t, config.tick_s):
+                stats["types"][fields["notification_type"]] += 1
+                # Latencia de salida de Wialon
+                at = release + rng.uniform(0.2, 2.0)
+                kind = "held" if release > t else "normal"
+                if rng.random() < config.reorder_rate:
+                    at += rng.uniform(config.tick_s, config.reorder_window_s)
+                    kind = "delayed"
+                deliver(at, fields, kind)
+                if rng.random() < config.duplicate_rate:
+                    deliver(at + rng.uniform(0.5, 30.0), fields, "duplicate")
+
+    deliveries.sort(key=lambda d: (d[0], d[1]))
+    records = []
+    latest: Dict[str, int] = {}
+    for at, _, fields in deliveries:
+        fmt = rng.choices(names, weights)[0]
+        content_type, body = encode_event(fields, fmt)
+        stats["formats"][fmt] += 1
+        unit_id = fields["unit_id"]
+        if fields["event_time"] < latest.get(unit_id, 0):
+            stats["delivery"]["out_of_order"] += 1
+        latest[unit_id] = max(latest.get(unit_id, 0), fields["event_time"])
+        records.append({"ts": epoch0 + at, "content_type": content_type, "body": body})
+
+    summary = {
+        "units": len(fleet),
+        "finished_trips": sum(unit.done for unit in fleet),
+        "simulated_s": round(t, 1),
+        "events": len(records),
+        "types": dict(stats["types"]),
+        "formats": dict(stats["formats"]),
+        "delivery": dict(stats["delivery"]),
+    }
+    return records, summary
+
+
+def write_records(path: str, records: List[Dict[str, Any]]) -> None:
+    """
+    Escribir registros en formato de captura NDJSON (gzip si termina en .gz)
+
+    Args:
+        path: Archivo de salida
+        records: Registros en orden de llegada
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps({
+                "ts": datetime.fromtimestamp(record["ts"], timezone.utc).isoformat(),
+                "content_type": record["content_type"],
+                "headers": {"content-type": record["content_type"], "user-agent": "fleet-simulator"},
+                **encode_body(record["body"]),
+            }, ensure_ascii=False))
+            f.write("\n")
+
+
+async def create_trips(client: httpx.AsyncClient, fleet: List[VirtualUnit], concurrency: int) -> int:
+    """Crear los viajes de la flota en /trips/create; devuelve cuántos se crearon"""
+    semaphore = asyncio.Semaphore(concurrency)
+    created = 0
+
+    async def create(unit: VirtualUnit) -> None:
+        nonlocal created
+        async with semaphore:
+            try:
+                response = await client.post(TRIPS_PATH, json=unit.trip_payload())
+            except httpx.HTTPError:
+                return
+        if response.status_code == 200:
+            created += 1
+
+    await asyncio.gather(*(create(unit) for unit in fleet))
+    return created
+
+
+def parse_formats(spec: str) -> Dict[str, float]:
+    """ "json=0.3,form=0.7" -> pesos por formato"""
+    weights = {}
+    for pair in filter(None, spec.split(",")):
+        name, _, weight = pair.partition("=")
+        if name not in CONTENT_TYPES:
+            raise ValueError(f"Unknown format: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Simular la flota y enviar o guardar los eventos"""
+    config = SimConfig(
+        tick_s=args.tick,
+        speed_limit_kmh=args.speed_limit,
+        violations_per_hour=args.violations_per_hour,
+        deviation_rate=args.deviation_rate,
+        departure_spread_s=args.departure_spread,
+        duplicate_rate=args.duplicate_rate,
+        reorder_rate=args.reorder_rate,
+        reorder_window_s=args.reorder_window,
+        bursts_per_hour=args.bursts_per_hour,
+        burst_gap_s=args.burst_gap,
+    )
+    rng = random.Random(args.seed)
+    run_id = args.run_id or uuid.UUID(int=rng.getrandbits(128)).hex[:6].upper()
+    epoch0 = args.start.timestamp() if args.start else float(int(time.time()))
+
+    fleet = build_fleet(args.units, args.sites, run_id, args.unit_id_base, config, rng, epoch0)
+    started = time.perf_counter()
+    records, summary = simulate(fleet, config, rng, args.hours, args.formats)
+    print(f"Simulated {summary['units']} units ({summary['finished_trips']} finished trips, "
+          f"{summary['simulated_s'] / 3600:.2f} h) in {time.perf_counter() - started:.1f} s")
+    print(f"events:      {summary['events']}")
+    for key in ("types", "formats", "delivery"):
+        print(f"{key + ':':<12} " + "  ".join(f"{k}={v}" for k, v in sorted(summary[key].items())))
+
+    if args.out:
+        write_records(args.out, records)
+        print(f"Events written to {args.out} (run id {run_id})")
+        if args.trips_out:
+            with open(args.trips_out, "w", encoding="utf-8") as f:
+                json.dump([unit.trip_payload() for unit in fleet], f, ensure_ascii=False, indent=2)
+            print(f"Trip payloads written to {args.trips_out}")
+        return
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        if args.create_trips:
+            created = await create_trips(client, fleet, min(args.concurrency, 20))
+            print(f"Created {created}/{len(fleet)} trips")
+        speed = 0.0 if args.max_speed else args.speed
+        result = await replay(client, records, speed, args.concurrency)
+    print(format_summary("Fleet simulation", result))
+
+
+def main() -> None:
+    """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="Simulador sintético de flota para eventos de Wialon")
+    parser.add_argument("--units", type=int, default=100, help="Unidades virtuales (default: 100)")
+    parser.add_argument("--sites", type=int, default=40, help="Sitios de carga/descarga compartidos (default: 40)")
+    parser.add_argument("--hours", type=float, default=8.0, help="Duración máxima simulada en horas (default: 8)")
+    parser.add_argument("--tick", type=float, default=10.0, help="Paso de simulación en segundos (default: 10)")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla para resultados reproducibles")
+    parser.add_argument("--run-id", help="Sufijo de códigos de viaje (default: derivado de la semilla)")
+    parser.add_argument("--unit-id-base", type=int, default=90_000_000, help="Primer ID de unidad de Wialon")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Instante inicial ISO 8601 (default: ahora)")
+    parser.add_argument("--speed-limit", type=float, default=80.0, help="Límite de velocidad km/h (default: 80)")
+    parser.add_argument("--violations-per-hour", type=float, default=0.3, help="Excesos de velocidad por hora de manejo")
+    parser.add_argument("--deviation-rate", type=float, default=0.1, help="Fracción de viajes con desvío de ruta")
+    parser.add_argument("--departure-spread", type=float, default=1800.0, help="Ventana de salidas en segundos")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="Probabilidad de reenvío duplicado")
+    parser.add_argument("--reorder-rate", type=float, default=0.02, help="Probabilidad de entrega retrasada")
+    parser.add_argument("--reorder-window", type=float, default=120.0, help="Retraso máximo en segundos")
+    parser.add_argument("--bursts-per-hour", type=float, default=0.1, help="Pérdidas de conexión por hora de manejo")
+    parser.add_argument("--burst-gap", type=float, default=900.0, help="Duración media sin conexión en segundos")
+    parser.add_argument("--formats", type=parse_formats, default=parse_formats("json=0.3,form=0.6,text=0.1"),
+                        help="Mezcla de formatos (default: json=0.3,form=0.6,text=0.1)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--url", help="Instancia destino, p. ej. http://localhost:8000")
+    output.add_argument("--out", help="Archivo NDJSON (.ndjson / .ndjson.gz) para replay_wialon_webhooks.py")
+    parser.add_argument("--trips-out", help="Con --out: guardar los payloads de /trips/create en JSON")
+    parser.add_argument("--create-trips", action="store_true", help="Con --url: crear los viajes antes de enviar eventos")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=60.0, help="Aceleración del tiempo simulado (default: 60x)")
+    pace.add_argument("--max-speed", action="store_true", help="Enviar sin esperas")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests simultáneas máximas (default: 50)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request en segundos")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
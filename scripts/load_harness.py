@@ -0,0 +1,548 @@
+"""
+Harness de carga end-to-end con reporte de SLO
+===============================================
+
+Levanta en un solo proceso la app (uvicorn, en su propio hilo y event loop)
+y los stubs de Evolution/Flowtify/Gemini (scripts/stub_servers.py) y dispara
+tráfico de llegada abierta (Poisson) contra:
+
+    /api/v1/wialon/events      eventos de geocerca/velocidad (form-urlencoded)
+    /api/v1/whatsapp/messages  mensajes de conductores en los grupos creados
+    /api/v1/trips/create       alta de viajes nuevos
+
+La base de datos es una MySQL desechable (docker-compose.perf.yml levanta
+una con el esquema y las migraciones aplicadas en el puerto 3307). Antes de
+medir se crean --trips viajes para que los eventos tengan unidad y grupo.
+
+El reporte incluye p50/p95/p99 por endpoint, throughput, queries a la BD por
+request, llamadas salientes por request (contadas por los stubs) y lag del
+event loop de la app. Con --baseline se compara contra un reporte guardado
+y el proceso sale con código 1 si alguna métrica regresa más de
+--max-regression o si no se cumple algún --slo.
+
+Uso:
+    docker compose -f docker-compose.perf.yml up -d
+    python scripts/load_harness.py --rate 50 --duration 60 --save-baseline scripts/baselines/load.json
+    python scripts/load_harness.py --rate 50 --duration 60 --baseline scripts/baselines/load.json
+    python scripts/load_harness.py --mix wialon=0.7,whatsapp=0.3 --slo wialon.p99_ms=500 --slo error_rate=0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from perf_stats import LatencyRecorder, compare_metrics, format_comparison, format_summary, percentile  # noqa: E402
+from stub_servers import DEFAULT_PORTS, StubProfile, create_stub_apps  # noqa: E402
+
+# Ni perf_stats ni stub_servers importan app.*: settings se instancia después
+# de configure_environment()
+
+ENDPOINTS = {
+    "wialon": "/api/v1/wialon/events",
+    "whatsapp": "/api/v1/whatsapp/messages",
+    "trips": "/api/v1/trips/create",
+}
+DRIVER_MESSAGES = (
+    "ya llegué",
+    "ya terminé de cargar",
+    "ya descargué",
+    "estoy en la caseta, hay mucho tráfico",
+    "voy a cargar diesel",
+    "ok",
+    "a qué hora me reciben en el cedis?",
+)
+WEBHOOK_SECRET = "load-harness-secret"
+
+# Métricas donde un valor mayor es mejor
+HIGHER_IS_BETTER = ("throughput_rps",)
+# Diferencia absoluta mínima para marcar regresión (ruido de latencias pequeñas)
+MIN_DELTA = {"error_rate": 0.005, "db_queries_per_request": 0.5, "outbound_calls_per_request": 0.2}
+LATENCY_MIN_DELTA_MS = 2.0
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Apuntar la configuración de la app a los stubs y a la BD desechable"""
+    host = "127.0.0.1"
+    os.environ.update({
+        "EVOLUTION_API_URL": f"http://{host}:{DEFAULT_PORTS['evolution']}",
+        "EVOLUTION_API_KEY": "stub",
+        "FLOWTIFY_WEBHOOK_URL": f"http://{host}:{DEFAULT_PORTS['flowtify']}",
+        "FLOATIFY_API_URL": f"http://{host}:{DEFAULT_PORTS['flowtify']}",
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": f"http://{host}:{DEFAULT_PORTS['gemini']}",
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "WIALON_CAPTURE_ENABLED": "false",
+        "LOG_LEVEL": args.log_level,
+        "MYSQL_HOST": args.db_host,
+        "MYSQL_PORT": str(args.db_port),
+        "MYSQL_DATABASE": args.db_name,
+        "MYSQL_USER": args.db_user,
+        "MYSQL_PASSWORD": args.db_password,
+    })
+
+
+class QueryCounter:
+    """
+    Cuenta las llamadas a la BD envolviendo los métodos de la instancia global
+
+    Cuenta round-trips de nivel Database: una transacción cuenta como una.
+    """
+
+    METHODS = ("execute", "fetch", "fetchrow", "fetchval", "transaction")
+
+    def __init__(self, database: Any):
+        self.count = 0
+        for name in self.METHODS:
+            setattr(database, name, self._wrap(getattr(database, name)))
+
+    def _wrap(self, method):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+class LoopLagSampler:
+    """Mide el retraso del event loop de la app durmiendo intervalos fijos"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._running = True
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._running:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, loop.time() - expected) * 1000)
+
+    def stop(self) -> None:
+        self._running = False
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.samples_ms)
+        return {
+            "p50_ms": round(percentile(values, 50), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2) if values else 0.0,
+        }
+
+
+class ServerThread:
+    """Servidores uvicorn en un hilo con su propio event loop"""
+
+    def __init__(self, name: str, apps: Dict[int, Any]):
+        import uvicorn
+
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self.servers = [
+            uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+            for port, app in apps.items()
+        ]
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(asyncio.gather(*(s.serve() for s in self.servers)))
+
+    def start(self, timeout: float = 60.0) -> None:
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not all(s.started for s in self.servers):
+            if not self.thread.is_alive():
+                raise RuntimeError(f"{self.name} failed to start")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{self.name} did not start in {timeout}s")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.should_exit = True
+        self.thread.join(30)
+
+
+# ----------------------------------------------------------------------
+# Payloads
+# ----------------------------------------------------------------------
+
+def trip_payload(index: int, run_id: str) -> Dict[str, Any]:
+    """Payload de /trips/create con geocercas de carga y descarga"""
+    unit_id = f"LH{run_id}{index:05d}"
+    return {
+        "event": "whatsapp.group.create",
+        "action": "create_group",
+        "tenant_id": 24,
+        "trip": {
+            "id": f"{run_id}-{index}",
+            "code": f"LOAD_{run_id}_{index:05d}",
+            "status": "asignado",
+            "origin": "León",
+            "destination": "Jalisco",
+        },
+        "driver": {"id": f"{run_id}-d{index}", "name": f"Conductor {index}", "phone": f"+52147700{index:05d}"},
+        "unit": {
+            "id": f"{run_id}-u{index}",
+            "floatify_unit_id": unit_id,
+            "name": f"Unidad {index}",
+            "plate": f"LH{index:05d}",
+            "wialon_id": unit_id,
+            "imei": f"86{index:013d}",
+        },
+        "geofences": [
+            {"role": "loading", "geofence_id": "9001", "geofence_name": "CEDIS LEON", "geofence_type": "polygon", "order": 1},
+            {"role": "unloading", "geofence_id": "9002", "geofence_name": "BODEGA JALISCO", "geofence_type": "polygon", "order": 2},
+        ],
+        "whatsapp_participants": [f"+52147700{index:05d}"],
+    }
+
+
+def wialon_body(unit_id: str, rng: random.Random) -> bytes:
+    """Notificación de Wialon en form-urlencoded"""
+    now = int(time.time())
+    notification_type, geofence = rng.choice((
+        ("geofence_entry", ("9001", "CEDIS LEON")),
+        ("geofence_exit", ("9001", "CEDIS LEON")),
+        ("geofence_entry", ("9002", "BODEGA JALISCO")),
+        ("geofence_exit", ("9002", "BODEGA JALISCO")),
+        ("speed_violation", (None, None)),
+    ))
+    fields = {
+        "unit_name": f"Unidad {unit_id}",
+        "unit_id": unit_id,
+        "latitude": f"{21.05 + rng.uniform(-0.05, 0.05):.5f}",
+        "longitude": f"{-101.79 + rng.uniform(-0.05, 0.05):.5f}",
+        "speed": f"{rng.uniform(0, 110):.1f}",
+        "course": str(rng.randint(0, 359)),
+        "pos_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "notification_type": notification_type,
+        "notification_id": f"LH_{now}_{rng.randint(0, 10**9)}",
+        "event_time": str(now),
+    }
+    if geofence[0]:
+        fields["geofence_id"], fields["geofence_name"] = geofence
+    return urlencode(fields).encode("utf-8")
+
+
+def whatsapp_payload(group_id: str, phone: str, rng: random.Random) -> Dict[str, Any]:
+    """Webhook messages.upsert de Evolution API"""
+    return {
+        "event": "messages.upsert",
+        "instance": "SATECH",
+        "sender": f"{phone.lstrip('+')}@s.whatsapp.net",
+        "data": {
+            "key": {
+                "remoteJid": group_id,
+                "fromMe": False,
+                "id": uuid.uuid4().hex[:20].upper(),
+                "participant": f"{phone.lstrip('+')}@s.whatsapp.net",
+            },
+            "pushName": "Conductor",
+            "message": {"conversation": rng.choice(DRIVER_MESSAGES)},
+            "messageType": "conversation",
+            "messageTimestamp": int(time.time()),
+        },
+    }
+
+
+# ----------------------------------------------------------------------
+# Carga
+# ----------------------------------------------------------------------
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """ "wialon=0.8,whatsapp=0.2" -> pesos normalizados"""
+    weights = {}
+    for pair in filter(None, spec.split(",")):
+        name, _, weight = pair.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight)
+    total = sum(weights.values())
+    return {name: w / total for name, w in weights.items()}
+
+
+async def seed_trips(client: httpx.AsyncClient, count: int, run_id: str, concurrency: int = 10) -> List[Dict[str, Any]]:
+    """Crear viajes iniciales y devolver unidad/grupo/teléfono de cada uno"""
+    semaphore = asyncio.Semaphore(concurrency)
+    fleet: List[Dict[str, Any]] = []
+
+    async def create(index: int) -> None:
+        payload = trip_payload(index, run_id)
+        async with semaphore:
+            response = await client.post(ENDPOINTS["trips"], json=payload)
+        if response.status_code == 200 and response.json().get("whatsapp_group_id"):
+            fleet.append({
+                "unit_id": payload["unit"]["wialon_id"],
+                "group_id": response.json()["whatsapp_group_id"],
+                "phone": payload["driver"]["phone"],
+            })
+
+    await asyncio.gather(*(create(i) for i in range(count)))
+    return fleet
+
+
+async def drive_load(
+    client: httpx.AsyncClient,
+    fleet: List[Dict[str, Any]],
+    mix: Dict[str, float],
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+    run_id: str,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    Llegadas Poisson a `rate` req/s durante `duration` segundos (lazo abierto)
+
+    Las requests no esperan a las anteriores; si hay más de max_in_flight en
+    vuelo la llegada se descarta y se cuenta como "dropped".
+    """
+    rng = random.Random(seed)
+    recorders = {name: LatencyRecorder() for name in mix}
+    names, weights = list(mix), list(mix.values())
+    in_flight = 0
+    dropped = 0
+    trip_index = 10**6
+
+    async def send(name: str) -> None:
+        nonlocal in_flight, trip_index
+        if name == "wialon":
+            kwargs = {
+                "content": wialon_body(rng.choice(fleet)["unit_id"], rng),
+                "headers": {"content-type": "application/x-www-form-urlencoded"},
+            }
+        elif name == "whatsapp":
+            member = rng.choice(fleet)
+            kwargs = {"json": whatsapp_payload(member["group_id"], member["phone"], rng)}
+        else:
+            trip_index += 1
+            kwargs = {"json": trip_payload(trip_index, run_id)}
+
+        started = time.perf_counter()
+        try:
+            response = await client.post(ENDPOINTS[name], **kwargs)
+            recorders[name].record((time.perf_counter() - started) * 1000, response.status_code)
+        except httpx.HTTPError as e:
+            recorders[name].record_error(type(e).__name__)
+        finally:
+            in_flight -= 1
+
+    loop = asyncio.get_running_loop()
+    tasks = []
+    t0 = loop.time()
+    next_at = t0
+    while True:
+        next_at += rng.expovariate(rate)
+        if next_at - t0 >= duration:
+            break
+        delay = next_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= max_in_flight:
+            dropped += 1
+            continue
+        in_flight += 1
+        tasks.append(asyncio.create_task(send(rng.choices(names, weights)[0])))
+
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - t0
+    return {
+        "elapsed_s": elapsed,
+        "dropped": dropped,
+        "endpoints": {name: rec.summary(elapsed) for name, rec in recorders.items()},
+    }
+
+
+def flatten_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    """Métricas planas comparables entre corridas"""
+    metrics: Dict[str, float] = {
+        "throughput_rps": report["throughput_rps"],
+        "error_rate": report["error_rate"],
+        "db_queries_per_request": report["db_queries_per_request"],
+        "outbound_calls_per_request": report["outbound_calls_per_request"],
+        "loop_lag.p99_ms": report["loop_lag"]["p99_ms"],
+    }
+    for name, summary in report["endpoints"].items():
+        for p in ("p50", "p95", "p99"):
+            metrics[f"{name}.{p}_ms"] = summary["latency_ms"][p]
+    return metrics
+
+
+def check_slos(metrics: Dict[str, float], slos: List[str]) -> List[Dict[str, Any]]:
+    """Verificar umbrales absolutos "métrica=máximo" (throughput_rps es mínimo)"""
+    results = []
+    for slo in slos:
+        name, _, limit = slo.partition("=")
+        value = metrics.get(name)
+        if value is None:
+            results.append({"slo": slo, "value": None, "passed": False})
+            continue
+        passed = value >= float(limit) if name in HIGHER_IS_BETTER else value <= float(limit)
+        results.append({"slo": slo, "value": value, "passed": passed})
+    return results
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Arrancar stubs y app, sembrar viajes, medir y armar el reporte"""
+    configure_environment(args)
+
+    profiles = {}
+    for item in args.stub_profile:
+        name, _, spec = item.partition(":")
+        profiles[name] = StubProfile.parse(spec)
+    stub_apps = create_stub_apps(profiles, secret=WEBHOOK_SECRET, seed=args.seed)
+    stubs = ServerThread("stubs", {DEFAULT_PORTS[name]: app for name, app in stub_apps.items()})
+    stubs.start()
+
+    server: Optional[ServerThread] = None
+    sampler = LoopLagSampler()
+    try:
+        # Importar la app después de configurar el entorno
+        from app.core.database import db
+        from app.main import app
+
+        queries = QueryCounter(db)
+        server = ServerThread("app", {args.port: app})
+        server.start()
+        asyncio.run_coroutine_threadsafe(sampler.run(), server.loop)
+
+        run_id = uuid.uuid4().hex[:6].upper()
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=args.timeout
+        ) as client:
+            print(f"Seeding {args.trips} trips...")
+            fleet = await seed_trips(client, args.trips, run_id)
+            if not fleet:
+                raise SystemExit("No trips could be seeded; is the perf database up? (docker-compose.perf.yml)")
+
+            if args.warmup:
+                print(f"Warm-up {args.warmup}s...")
+                await drive_load(client, fleet, args.mix, args.rate, args.warmup, args.max_in_flight, run_id, args.seed + 1)
+
+            queries_before = queries.count
+            outbound_before = {name: sum(a.state.stub.requests.values()) for name, a in stub_apps.items()}
+            sampler.samples_ms.clear()
+
+            print(f"Measuring {args.duration}s at {args.rate} req/s (open loop)...")
+            load = await drive_load(client, fleet, args.mix, args.rate, args.duration, args.max_in_flight, run_id, args.seed)
+    finally:
+        sampler.stop()
+        if server is not None:
+            server.stop()
+        stubs.stop()
+
+    responses = sum(s["responses"] for s in load["endpoints"].values())
+    requests = sum(s["requests"] for s in load["endpoints"].values())
+    errors = sum(s["errors"] for s in load["endpoints"].values())
+    outbound = {
+        name: sum(a.state.stub.requests.values()) - outbound_before[name] for name, a in stub_apps.items()
+    }
+    return {
+        "config": {
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "trips": args.trips,
+            "stub_profiles": args.stub_profile,
+            "seed": args.seed,
+        },
+        "requests": requests,
+        "dropped": load["dropped"],
+        "throughput_rps": round(responses / load["elapsed_s"], 1),
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "db_queries_per_request": round((queries.count - queries_before) / max(requests, 1), 2),
+        "outbound_calls_per_request": round(sum(outbound.values()) / max(requests, 1), 2),
+        "outbound_calls": outbound,
+        "loop_lag": sampler.summary(),
+        "endpoints": load["endpoints"],
+    }
+
+
+def main() -> None:
+    """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="Harness de carga end-to-end con reporte de SLO")
+    parser.add_argument("--rate", type=float, default=20.0, help="Llegadas por segundo (default: 20)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de medición (default: 30)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Segundos de calentamiento (default: 5)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("wialon=0.85,whatsapp=0.1,trips=0.05"),
+                        help="Pesos por endpoint (default: wialon=0.85,whatsapp=0.1,trips=0.05)")
+    parser.add_argument("--trips", type=int, default=50, help="Viajes sembrados antes de medir (default: 50)")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="Requests en vuelo máximas")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request")
+    parser.add_argument("--port", type=int, default=8077, help="Puerto de la app (default: 8077)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stub-profile", action="append", default=[], metavar="STUB:SPEC",
+                        help="Perfil de stub, p. ej. gemini:latency=lognormal,latency_ms=600")
+    parser.add_argument("--db-host", default=os.getenv("MYSQL_HOST", "127.0.0.1"))
+    parser.add_argument("--db-port", type=int, default=int(os.getenv("MYSQL_PORT", "3307")))
+    parser.add_argument("--db-name", default=os.getenv("MYSQL_DATABASE", "logistics_db"))
+    parser.add_argument("--db-user", default=os.getenv("MYSQL_USER", "root"))
+    parser.add_argument("--db-password", default=os.getenv("MYSQL_PASSWORD", "perf"))
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--report", help="Guardar el reporte completo en JSON")
+    parser.add_argument("--baseline", help="Reporte de referencia para comparar")
+    parser.add_argument("--save-baseline", help="Guardar este reporte como línea base")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Empeoramiento relativo tolerado vs línea base (default: 0.15)")
+    parser.add_argument("--slo", action="append", default=[], metavar="METRIC=LIMIT",
+                        help="Umbral absoluto, p. ej. wialon.p99_ms=500 o throughput_rps=40")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    metrics = flatten_metrics(report)
+    report["metrics"] = metrics
+
+    for name, summary in report["endpoints"].items():
+        print(format_summary(ENDPOINTS[name], summary))
+    print(f"\nthroughput: {report['throughput_rps']} req/s   dropped: {report['dropped']}   "
+          f"error rate: {report['error_rate']:.2%}")
+    print(f"db queries/request: {report['db_queries_per_request']}   "
+          f"outbound calls/request: {report['outbound_calls_per_request']} {report['outbound_calls']}")
+    print(f"event loop lag ms: {report['loop_lag']}")
+
+    passed = True
+    if args.slo:
+        report["slos"] = check_slos(metrics, args.slo)
+        print("\nSLOs:")
+        for result in report["slos"]:
+            print(f"  {result['slo']:<30} value={result['value']}  {'PASS' if result['passed'] else 'FAIL'}")
+        passed &= all(r["passed"] for r in report["slos"])
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["metrics"]
+        min_delta = {name: MIN_DELTA.get(name, LATENCY_MIN_DELTA_MS) for name in metrics}
+        rows = compare_metrics(metrics, baseline, args.max_regression, HIGHER_IS_BETTER, min_delta)
+        report["comparison"] = rows
+        print(f"\nBaseline {args.baseline} (max regression {args.max_regression:.0%}):")
+        print(format_comparison(rows))
+        passed &= all(r["passed"] for r in rows)
+
+    for path in filter(None, (args.report, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    print(f"\nRESULT: {'PASS' if passed else 'FAIL'}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,36 @@
 Monitor de Webhooks de Wialon en Tiempo Real
 =============================================
 
-Este script monitorea el archivo wialon_webhooks.log y muestra
-los nuevos webhooks en tiempo real con formato coloreado.
+Este script sigue los segmentos de captura NDJSON comprimidos
+(logs/wialon_capture/wialon-*.ndjson.gz) y muestra los nuevos
+webhooks en tiempo real con formato coloreado. Cuando el servicio
+rota de segmento, el monitor pasa automáticamente al nuevo.
 
 Uso:
     python scripts/monitor_wialon_webhooks.py
 
 O para ver los últimos N registros:
     python scripts/monitor_wialon_webhooks.py --tail 10
+
+Con un directorio de captura distinto:
+    python scripts/monitor_wialon_webhooks.py --dir /var/log/flowtify/wialon_capture
 """
 
+import json
 import os
-import time
 import sys
-from datetime import datetime
+import time
+from pathlib import Path
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.integrations.wialon.capture import (  # noqa: E402
+    SegmentReader,
+    decode_body,
+    iter_records,
+    list_segments,
+)
 
 # Colores ANSI
 class Colors:
@@ -27,96 +43,92 @@ class Colors:
     ENDC = '\033[0m'
 
 
-def tail_file(filename, n_lines=20):
-    """Muestra las últimas N líneas del archivo"""
-    if not os.path.exists(filename):
-        print(f"{Colors.YELLOW}⚠ Archivo {filename} no existe aún. Esperando...{Colors.ENDC}")
-        return []
-    
-    with open(filename, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        return lines[-n_lines:] if len(lines) > n_lines else lines
-
-
-def format_webhook_entry(lines):
-    """Formatea una entrada de webhook con colores"""
-    output = []
-    is_error = any('✗ ERROR' in line for line in lines)
-    
-    for line in lines:
-        if '=' * 50 in line:
-            output.append(f"{Colors.CYAN}{line}{Colors.ENDC}")
-        elif 'WIALON WEBHOOK RECIBIDO' in line:
-            output.append(f"{Colors.BOLD}{Colors.CYAN}{line}{Colors.ENDC}")
-        elif 'Timestamp:' in line:
-            output.append(f"{Colors.YELLOW}{line}{Colors.ENDC}")
-        elif '✓ PROCESADO EXITOSAMENTE' in line:
-            output.append(f"{Colors.GREEN}{Colors.BOLD}{line}{Colors.ENDC}")
-        elif '✗ ERROR' in line:
-            output.append(f"{Colors.RED}{Colors.BOLD}{line}{Colors.ENDC}")
-        elif 'Success: False' in line:
-            output.append(f"{Colors.RED}{line}{Colors.ENDC}")
-        elif 'Success: True' in line:
-            output.append(f"{Colors.GREEN}{line}{Colors.ENDC}")
-        else:
-            output.append(line)
-    
-    return ''.join(output)
-
-
-def monitor_file(filename):
-    """Monitorea el archivo en tiempo real (modo tail -f)"""
+def format_webhook_entry(record, verbose=False):
+    """Formatea un registro capturado con colores"""
+    separator = "=" * 100
+    success = record.get("success")
+    if success is True:
+        status = f"{Colors.GREEN}{Colors.BOLD}✓ PROCESADO EXITOSAMENTE{Colors.ENDC}"
+    elif success is False:
+        status = f"{Colors.RED}{Colors.BOLD}✗ ERROR: {record.get('error')}{Colors.ENDC}"
+    else:
+        status = f"{Colors.YELLOW}⏳ ENCOLADO{Colors.ENDC}"
+
+    body = decode_body(record)
+    output = [
+        f"{Colors.CYAN}{separator}{Colors.ENDC}",
+        f"{Colors.BOLD}{Colors.CYAN}WIALON WEBHOOK RECIBIDO{Colors.ENDC}",
+        f"{Colors.YELLOW}Timestamp: {record.get('ts')}{Colors.ENDC}",
+        f"Trace ID: {record.get('trace_id')}",
+        f"Content-Type: {record.get('content_type')}",
+        f"--- BODY RAW ({len(body)} bytes) ---",
+        body.decode('utf-8', errors='replace'),
+    ]
+    if verbose:
+        output += [
+            "--- HEADERS ---",
+            json.dumps(record.get("headers"), indent=2, ensure_ascii=False),
+            "--- PARSED DATA ---",
+            json.dumps(record.get("parsed"), indent=2, ensure_ascii=False) if record.get("parsed") else "N/A",
+        ]
+    output += ["--- STATUS ---", status]
+    return "\n".join(output)
+
+
+def tail_records(directory, n_records=20, verbose=False):
+    """Muestra los últimos N registros capturados"""
+    segments = list_segments(directory)
+    if not segments:
+        print(f"{Colors.YELLOW}⚠ No hay segmentos en {directory} aún.{Colors.ENDC}")
+        return
+
+    # Leer desde los segmentos más recientes hasta juntar N registros
+    records = []
+    for i in range(len(segments) - 1, -1, -1):
+        records = list(iter_records(segments[i:]))
+        if len(records) >= n_records:
+            break
+    for record in records[-n_records:]:
+        print(format_webhook_entry(record, verbose))
+
+
+def monitor_directory(directory, verbose=False):
+    """Sigue el segmento más reciente en tiempo real (modo tail -f)"""
     print(f"{Colors.BOLD}{Colors.CYAN}{'='*80}")
     print(f"MONITOR DE WEBHOOKS DE WIALON")
     print(f"{'='*80}{Colors.ENDC}\n")
-    print(f"Monitoreando: {Colors.YELLOW}{filename}{Colors.ENDC}")
+    print(f"Monitoreando: {Colors.YELLOW}{directory}{Colors.ENDC}")
     print(f"Presiona Ctrl+C para salir\n")
-    
-    # Mostrar últimas 20 líneas existentes
-    if os.path.exists(filename):
-        print(f"{Colors.CYAN}--- Últimos registros ---{Colors.ENDC}")
-        last_lines = tail_file(filename, 100)
-        print(''.join(last_lines[-100:]))
-    
-    # Crear archivo si no existe
-    if not os.path.exists(filename):
-        open(filename, 'a').close()
-    
-    # Seguir archivo en tiempo real
-    with open(filename, 'r', encoding='utf-8') as f:
-        # Ir al final del archivo
-        f.seek(0, 2)
-        
-        print(f"\n{Colors.GREEN}✓ Esperando nuevos webhooks...{Colors.ENDC}\n")
-        
-        while True:
-            line = f.readline()
-            if line:
-                # Colorear y mostrar
-                if '=' * 50 in line:
-                    print(f"{Colors.CYAN}{line.rstrip()}{Colors.ENDC}")
-                elif 'WIALON WEBHOOK RECIBIDO' in line:
-                    print(f"{Colors.BOLD}{Colors.CYAN}{line.rstrip()}{Colors.ENDC}")
-                elif 'Timestamp:' in line:
-                    print(f"{Colors.YELLOW}{line.rstrip()}{Colors.ENDC}")
-                elif '✓ PROCESADO EXITOSAMENTE' in line:
-                    print(f"{Colors.GREEN}{Colors.BOLD}{line.rstrip()}{Colors.ENDC}")
-                elif '✗ ERROR' in line:
-                    print(f"{Colors.RED}{Colors.BOLD}{line.rstrip()}{Colors.ENDC}")
-                elif 'Success: False' in line:
-                    print(f"{Colors.RED}{line.rstrip()}{Colors.ENDC}")
-                elif 'Success: True' in line:
-                    print(f"{Colors.GREEN}{line.rstrip()}{Colors.ENDC}")
-                else:
-                    print(line.rstrip())
-            else:
-                time.sleep(0.1)
+
+    reader = None
+    segments = list_segments(directory)
+    if segments:
+        # Saltar lo ya escrito en el segmento actual
+        reader = SegmentReader(segments[-1])
+        reader.read_new()
+
+    print(f"\n{Colors.GREEN}✓ Esperando nuevos webhooks...{Colors.ENDC}\n")
+
+    while True:
+        segments = list_segments(directory)
+        if segments and (reader is None or reader.path != segments[-1]):
+            # Rotación: terminar el segmento anterior y pasar al nuevo
+            if reader is not None and os.path.exists(reader.path):
+                for record in reader.read_new():
+                    print(format_webhook_entry(record, verbose))
+            reader = SegmentReader(segments[-1])
+
+        records = reader.read_new() if reader is not None else []
+        for record in records:
+            print(format_webhook_entry(record, verbose), flush=True)
+        if not records:
+            time.sleep(0.5)
 
 
 def main():
     """Punto de entrada principal"""
     import argparse
-    
+
     parser = argparse.ArgumentParser(
         description="Monitor de webhooks de Wialon en tiempo real"
     )
@@ -124,25 +136,29 @@ def main():
         '--tail',
         type=int,
         metavar='N',
-        help='Mostrar solo las últimas N líneas y salir'
+        help='Mostrar solo los últimos N webhooks y salir'
     )
     parser.add_argument(
-        '--file',
+        '--dir',
         type=str,
-        default='wialon_webhooks.log',
-        help='Archivo de log a monitorear (default: wialon_webhooks.log)'
+        default=os.getenv('WIALON_CAPTURE_DIR', 'logs/wialon_capture'),
+        help='Directorio de captura (default: WIALON_CAPTURE_DIR o logs/wialon_capture)'
     )
-    
+    parser.add_argument(
+        '--verbose', '-v',
+        action='store_true',
+        help='Incluir headers y datos parseados'
+    )
+
     args = parser.parse_args()
-    
+
     try:
         if args.tail:
-            # Modo tail: mostrar últimas N líneas y salir
-            lines = tail_file(args.file, args.tail)
-            print(''.join(lines))
+            # Modo tail: mostrar últimos N registros y salir
+            tail_records(args.dir, args.tail, args.verbose)
         else:
-            # Modo monitor: seguir archivo en tiempo real
-            monitor_file(args.file)
+            # Modo monitor: seguir segmentos en tiempo real
+            monitor_directory(args.dir, args.verbose)
     except KeyboardInterrupt:
         print(f"\n\n{Colors.YELLOW}Monitor detenido por el usuario{Colors.ENDC}")
         sys.exit(0)
@@ -153,4 +169,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,175 @@
+"""
+Utilidades compartidas por las herramientas de rendimiento de scripts/
+
+Percentiles de latencia, desglose por status, formato de reportes y
+comparación contra líneas base para replay_wialon_webhooks.py,
+load_harness.py y el resto de herramientas de carga.
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+import math
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """
+    Percentil por rango más cercano
+
+    Args:
+        sorted_values: Valores ya ordenados
+        pct: Percentil (0-100)
+
+    Returns:
+        Valor del percentil (0.0 si no hay valores)
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LatencyRecorder:
+    """Acumula latencias y resultados de una corrida de carga"""
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self) -> None:
+        self.latencies_ms: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.outcomes: Counter = Counter()
+
+    def record(self, latency_ms: float, status: Optional[int] = None, outcome: Optional[str] = None) -> None:
+        """
+        Registrar una respuesta
+
+        Args:
+            latency_ms: Latencia de la request
+            status: Código HTTP
+            outcome: Resultado de aplicación (p. ej. "success", "failed", "queued")
+        """
+        self.latencies_ms.append(latency_ms)
+        if status is not None:
+            self.statuses[status] += 1
+        if outcome is not None:
+            self.outcomes[outcome] += 1
+
+    def record_error(self, error: str) -> None:
+        """Registrar una request sin respuesta (timeout, conexión rechazada, ...)"""
+        self.errors[error] += 1
+
+    @property
+    def total(self) -> int:
+        """Requests emitidas (con y sin respuesta)"""
+        return len(self.latencies_ms) + sum(self.errors.values())
+
+    def summary(self, duration_s: float) -> Dict[str, Any]:
+        """
+        Resumen de la corrida
+
+        Args:
+            duration_s: Duración total en segundos
+
+        Returns:
+            Diccionario serializable a JSON
+        """
+        values = sorted(self.latencies_ms)
+        http_errors = sum(n for status, n in self.statuses.items() if status >= 400)
+        return {
+            "requests": self.total,
+            "responses": len(values),
+            "duration_s": round(duration_s, 3),
+            "throughput_rps": round(len(values) / duration_s, 1) if duration_s > 0 else 0.0,
+            "latency_ms": {
+                **{f"p{p}": round(percentile(values, p), 2) for p in self.PERCENTILES},
+                "mean": round(sum(values) / len(values), 2) if values else 0.0,
+                "max": round(values[-1], 2) if values else 0.0,
+            },
+            "errors": sum(self.errors.values()) + http_errors,
+            "transport_errors": dict(self.errors),
+            "status": {str(k): v for k, v in sorted(self.statuses.items())},
+            "outcomes": dict(self.outcomes),
+        }
+
+
+def format_summary(title: str, summary: Dict[str, Any]) -> str:
+    """
+    Formatear un resumen para consola
+
+    Args:
+        title: Título del reporte
+        summary: Resultado de LatencyRecorder.summary()
+
+    Returns:
+        Texto multilínea
+    """
+    latency = summary["latency_ms"]
+    lines = [
+        f"=== {title} ===",
+        f"requests:    {summary['requests']} ({summary['responses']} responses) in {summary['duration_s']} s",
+        f"throughput:  {summary['throughput_rps']} req/s",
+        "latency ms:  " + "  ".join(f"{k}={v}" for k, v in latency.items()),
+        f"errors:      {summary['errors']}",
+    ]
+    for error, count in summary["transport_errors"].items():
+        lines.append(f"  {error}: {count}")
+    lines.append("status:      " + "  ".join(f"{k}={v}" for k, v in summary["status"].items()))
+    if summary["outcomes"]:
+        lines.append("outcomes:    " + "  ".join(f"{k}={v}" for k, v in summary["outcomes"].items()))
+    return "\n".join(lines)
+
+
+def compare_metrics(
+    current: Dict[str, float],
+    baseline: Dict[str, float],
+    max_regression: float,
+    higher_is_better: Sequence[str] = (),
+    min_delta: Union[float, Dict[str, float]] = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    Comparar métricas planas contra una línea base
+
+    Una métrica regresa si empeora más de max_regression (fracción) respecto
+    a la línea base y además por más de min_delta en valor absoluto (para no
+    fallar por ruido en valores muy pequeños).
+
+    Args:
+        current: Métricas de la corrida actual
+        baseline: Métricas guardadas
+        max_regression: Empeoramiento relativo tolerado (0.15 = 15%)
+        higher_is_better: Métricas donde un valor mayor es mejor (throughput)
+        min_delta: Diferencia absoluta mínima para considerar regresión
+            (un valor para todas o un diccionario por métrica)
+
+    Returns:
+        Una fila por métrica común con baseline, actual, cambio y si pasa
+    """
+    rows = []
+    for name in sorted(set(current) & set(baseline)):
+        base, value = baseline[name], current[name]
+        if name in higher_is_better:
+            worse_by = base - value
+        else:
+            worse_by = value - base
+        change = (value - base) / base if base else 0.0
+        slack = min_delta.get(name, 0.0) if isinstance(min_delta, dict) else min_delta
+        regressed = worse_by > slack and (base == 0 or worse_by / abs(base) > max_regression)
+        rows.append({
+            "metric": name,
+            "baseline": base,
+            "current": value,
+            "change_pct": round(change * 100, 1),
+            "passed": not regressed,
+        })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    """Tabla de comparación contra línea base para consola"""
+    width = max([len(r["metric"]) for r in rows] + [6])
+    lines = [f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}  result"]
+    for r in rows:
+        lines.append(
+            f"{r['metric']:<{width}}  {r['baseline']:>12.3f}  {r['current']:>12.3f}  "
+            f"{r['change_pct']:>+7.1f}%  {'PASS' if r['passed'] else 'FAIL'}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,265 @@
+"""
+Replay determinista de webhooks de Wialon capturados
+=====================================================
+
+Reenvía los bodies crudos capturados (con su Content-Type original) contra
+una instancia en ejecución o contra la app ASGI en el mismo proceso, para
+medir regresiones de /wialon/events con la forma real del tráfico.
+
+Fuentes aceptadas (se ordenan por timestamp de captura):
+    - Directorio de captura (logs/wialon_capture) o segmentos sueltos
+      wialon-*.ndjson.gz / .ndjson.zst / .ndjson
+    - Archivos .jsonl con registros {"ts", "content_type", "body"}
+    - El log de texto anterior wialon_webhooks.log
+
+Modos:
+    --speed N       Respeta los tiempos entre llegadas divididos por N
+                    (1 = tiempo real, 10 = diez veces más rápido)
+    --max-speed     Sin esperas; solo limitado por --concurrency
+
+Uso:
+    python scripts/replay_wialon_webhooks.py logs/wialon_capture --url http://localhost:8000 --speed 5
+    python scripts/replay_wialon_webhooks.py wialon_webhooks.log --in-process --max-speed --concurrency 20
+    python scripts/replay_wialon_webhooks.py logs/wialon_capture --max-speed --json-out replay.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Agregar path del proyecto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.integrations.wialon.capture import decode_body, iter_records, list_segments  # noqa: E402
+from perf_stats import LatencyRecorder, format_summary  # noqa: E402
+
+EVENTS_PATH = "/api/v1/wialon/events"
+
+_LEGACY_BLOCK = re.compile(
+    r"Timestamp: (?P<ts>[^\n]+)\n"
+    r"Success: (?P<success>[^\n]+)\n"
+    r"Content-Type: (?P<content_type>[^\n]*)\n"
+    r".*?--- BODY RAW \(\d+ bytes\) ---\n(?P<body>.*?)\n\n--- PARSED DATA ---\n(?P<parsed>.*?)\n\n--- STATUS ---",
+    re.DOTALL,
+)
+
+
+def _parse_ts(value: Any, fallback: float) -> float:
+    """Timestamp de captura como epoch (o el índice si no hay)"""
+    if not value:
+        return fallback
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return fallback
+
+
+def load_legacy_log(path: str) -> List[Dict[str, Any]]:
+    """
+    Leer el formato de texto de wialon_webhooks.log
+
+    El log anterior escribía un bloque al recibir y otro al terminar cada
+    request; si hay bloques de recepción solo se usan esos (uno por request).
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+
+    blocks = list(_LEGACY_BLOCK.finditer(text))
+    received = [b for b in blocks if b["success"] == "None" and "RECIBIDO" in b["parsed"]]
+    records = []
+    for block in received or blocks:
+        ts = datetime.strptime(block["ts"].strip(), "%Y-%m-%d %H:%M:%S.%f").timestamp()
+        records.append({
+            "ts": ts,
+            "content_type": block["content_type"].strip(),
+            "body": block["body"].encode("utf-8"),
+        })
+    return records
+
+
+def load_records(sources: List[str]) -> List[Dict[str, Any]]:
+    """
+    Cargar registros de todas las fuentes ordenados por timestamp
+
+    Args:
+        sources: Directorios de captura o archivos
+
+    Returns:
+        Lista de {"ts", "content_type", "body"} en orden de llegada
+    """
+    records: List[Dict[str, Any]] = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths = list_segments(source)
+        elif source.endswith(".log"):
+            records.extend(load_legacy_log(source))
+            continue
+        else:
+            paths = [source]
+
+        for record in iter_records(paths):
+            records.append({
+                "ts": _parse_ts(record.get("ts"), float(len(records))),
+                "content_type": record.get("content_type") or "application/json",
+                "body": decode_body(record),
+            })
+
+    # sort es estable: registros con el mismo ts conservan su orden de captura
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def _outcome(response: httpx.Response) -> Optional[str]:
+    """Resultado de aplicación según el JSON de respuesta"""
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "success" not in data:
+        return None
+    if data.get("queued"):
+        return "queued"
+    return "success" if data["success"] else "failed"
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: List[Dict[str, Any]],
+    speed: float,
+    concurrency: int,
+    path: str = EVENTS_PATH,
+) -> Dict[str, Any]:
+    """
+    Reenviar registros respetando (o no) los tiempos originales
+
+    Args:
+        client: Cliente HTTP (remoto o ASGI)
+        records: Registros ordenados
+        speed: Factor de escala de tiempos; 0 = máxima velocidad
+        concurrency: Requests simultáneas máximas
+        path: Ruta del endpoint
+
+    Returns:
+        Resumen con latencias, errores, status y retraso de agenda
+    """
+    recorder = LatencyRecorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    schedule_lag_ms: List[float] = []
+    loop = asyncio.get_running_loop()
+
+    async def send(seq: int, record: Dict[str, Any]) -> None:
+        try:
+            started = time.perf_counter()
+            response = await client.post(
+                path,
+                content=record["body"],
+                headers={"content-type": record["content_type"], "x-replay-seq": str(seq)},
+            )
+            recorder.record((time.perf_counter() - started) * 1000, response.status_code, _outcome(response))
+        except httpx.HTTPError as e:
+            recorder.record_error(type(e).__name__)
+        finally:
+            semaphore.release()
+
+    tasks = []
+    t0 = loop.time()
+    base_ts = records[0]["ts"] if records else 0.0
+    for seq, record in enumerate(records):
+        if speed > 0:
+            target = t0 + (record["ts"] - base_ts) / speed
+            delay = target - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        if speed > 0:
+            schedule_lag_ms.append(max(0.0, loop.time() - target) * 1000)
+        tasks.append(asyncio.create_task(send(seq, record)))
+
+    await asyncio.gather(*tasks)
+    summary = recorder.summary(loop.time() - t0)
+
+    if schedule_lag_ms:
+        summary["schedule_lag_ms"] = {
+            "mean": round(sum(schedule_lag_ms) / len(schedule_lag_ms), 2),
+            "max": round(max(schedule_lag_ms), 2),
+        }
+    if len(records) > 1:
+        summary["original_span_s"] = round(records[-1]["ts"] - base_ts, 3)
+    return summary
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Cargar registros, preparar el cliente y reenviar"""
+    records = load_records(args.sources)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("No captured webhooks found in the given sources")
+
+    speed = 0.0 if args.max_speed else args.speed
+    print(f"Replaying {len(records)} webhooks "
+          f"({'max speed' if speed == 0 else f'{speed}x'}, concurrency {args.concurrency})")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            return await replay(client, records, speed, args.concurrency, args.path)
+
+    # En proceso: la app ASGI con su lifespan (conecta a la BD configurada)
+    from app.main import app
+    from app.integrations.wialon.capture import webhook_capture
+
+    if not args.capture:
+        # No volver a capturar lo que se está reproduciendo
+        webhook_capture.enabled = False
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://replay", limits=limits, timeout=timeout
+        ) as client:
+            return await replay(client, records, speed, args.concurrency, args.path)
+
+
+def main() -> None:
+    """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="Replay determinista de webhooks de Wialon capturados")
+    parser.add_argument("sources", nargs="+", help="Directorio de captura, segmentos, .jsonl o wialon_webhooks.log")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:8000", help="Instancia destino (default: http://localhost:8000)")
+    target.add_argument("--in-process", action="store_true", help="Usar la app ASGI en este proceso")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="Factor sobre los tiempos originales (default: 1.0)")
+    pace.add_argument("--max-speed", action="store_true", help="Ignorar tiempos originales")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests simultáneas máximas (default: 50)")
+    parser.add_argument("--limit", type=int, help="Reenviar solo los primeros N webhooks")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request en segundos")
+    parser.add_argument("--path", default=EVENTS_PATH, help=f"Ruta del endpoint (default: {EVENTS_PATH})")
+    parser.add_argument("--capture", action="store_true", help="En proceso: mantener la captura de webhooks activa")
+    parser.add_argument("--json-out", help="Guardar el resumen en un archivo JSON")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(format_summary("Wialon replay", summary))
+    if "schedule_lag_ms" in summary:
+        lag = summary["schedule_lag_ms"]
+        print(f"schedule lag ms: mean={lag['mean']}  max={lag['max']}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
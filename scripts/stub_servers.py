@@ -0,0 +1,505 @@
+"""
+Servidores stub locales para pruebas de rendimiento sin red
+============================================================
+
+Levanta en un solo proceso tres servicios que imitan las rutas exactas que
+llaman nuestros clientes:
+
+    evolution  (default :8091)  Evolution API: message/sendText, message/sendWhatsAppAudio,
+                                group/create, group/updateParticipant, group/fetchAllGroups,
+                                group/leaveGroup, chat/presence, chat/setPresence, chat/sendPresence
+    flowtify   (default :8092)  Receptor de webhooks Flowtify (/status-update, /speed-violation,
+                                /geofence-transition, /route-deviation, /route-return,
+                                /communication-response) con verificación HMAC, más las rutas
+                                de Floatify (/webhooks/trip-completed, /webhooks/events)
+    gemini     (default :8093)  Respondedor compatible con la API REST de Gemini
+                                (POST /v1beta/models/{model}:generateContent)
+
+Cada stub tiene un perfil configurable: distribución de latencia, tasa de
+errores 5xx y límite de requests por segundo (429 al excederlo). Las rutas
+de control /_stub/stats, /_stub/receipts y POST /_stub/reset exponen lo
+recibido para que los tests de throughput verifiquen el resultado.
+
+Apuntar el servicio a los stubs:
+    EVOLUTION_API_URL=http://127.0.0.1:8091
+    FLOWTIFY_WEBHOOK_URL=http://127.0.0.1:8092
+    FLOATIFY_API_URL=http://127.0.0.1:8092
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8093
+
+Uso:
+    python scripts/stub_servers.py
+    python scripts/stub_servers.py --profile evolution:latency=lognormal,latency_ms=120,error_rate=0.01
+    python scripts/stub_servers.py --profile gemini:latency_ms=800,rate_limit=10 --secret $WEBHOOK_SECRET
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import random
+import re
+import signal
+import sys
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Agregar path del proyecto (los módulos de app se importan al crear el stub de
+# Gemini para no instanciar settings antes de que el harness configure el entorno)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DEFAULT_PORTS = {"evolution": 8091, "flowtify": 8092, "gemini": 8093}
+
+FLOWTIFY_ENDPOINTS = (
+    "/status-update",
+    "/speed-violation",
+    "/geofence-transition",
+    "/route-deviation",
+    "/route-return",
+    "/communication-response",
+)
+FLOATIFY_ENDPOINTS = ("/webhooks/trip-completed", "/webhooks/events")
+
+
+@dataclass
+class StubProfile:
+    """Comportamiento de un stub"""
+
+    latency: str = "fixed"  # fixed | uniform | lognormal
+    latency_ms: float = 20.0  # fijo / media (uniform) / mediana (lognormal)
+    latency_p99_ms: float = 0.0  # cola para lognormal (0 = 4x la mediana)
+    error_rate: float = 0.0  # fracción de respuestas 500
+    rate_limit: float = 0.0  # requests/s antes de responder 429 (0 = sin límite)
+
+    @classmethod
+    def parse(cls, spec: str) -> "StubProfile":
+        """
+        Construir perfil desde "latency=lognormal,latency_ms=80,error_rate=0.01"
+
+        Args:
+            spec: Pares clave=valor separados por coma
+
+        Returns:
+            Perfil
+        """
+        types = {f.name: f.type for f in fields(cls)}
+        values: Dict[str, Any] = {}
+        for pair in filter(None, spec.split(",")):
+            key, _, value = pair.partition("=")
+            key = key.strip()
+            if key not in types:
+                raise ValueError(f"Unknown stub profile field: {key}")
+            values[key] = value if types[key] in (str, "str") else float(value)
+        return cls(**values)
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Latencia a simular en segundos"""
+        if self.latency == "uniform":
+            return rng.uniform(0, 2 * self.latency_ms) / 1000
+        if self.latency == "lognormal":
+            p99 = self.latency_p99_ms or self.latency_ms * 4
+            # p99 = mediana * e^(2.326 sigma)
+            sigma = math.log(max(p99, self.latency_ms) / self.latency_ms) / 2.326 if self.latency_ms > 0 else 0
+            return rng.lognormvariate(math.log(max(self.latency_ms, 0.001)), sigma) / 1000
+        return self.latency_ms / 1000
+
+
+class StubState:
+    """Perfil, límite de tasa, contadores y recibos de un stub"""
+
+    def __init__(self, name: str, profile: StubProfile, seed: Optional[int] = None, max_receipts: int = 10000):
+        self.name = name
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.responses: Counter = Counter()
+        self.receipts: Deque[Dict[str, Any]] = deque(maxlen=max_receipts)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def _rate_limited(self) -> bool:
+        """Ventana fija de un segundo"""
+        if self.profile.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.profile.rate_limit
+
+    async def gate(self, route: str) -> Optional[JSONResponse]:
+        """
+        Aplicar límite de tasa, latencia y errores simulados
+
+        Args:
+            route: Ruta lógica (para contadores)
+
+        Returns:
+            Respuesta de error a devolver, o None para continuar
+        """
+        self.requests[route] += 1
+        if self._rate_limited():
+            self.responses[429] += 1
+            return JSONResponse(status_code=429, content={"error": "rate limited"})
+
+        await asyncio.sleep(self.profile.sample_latency(self.rng))
+
+        if self.profile.error_rate and self.rng.random() < self.profile.error_rate:
+            self.responses[500] += 1
+            return JSONResponse(status_code=500, content={"error": "simulated failure"})
+
+        self.responses[200] += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del stub"""
+        return {
+            "stub": self.name,
+            "profile": self.profile.__dict__,
+            "requests": dict(self.requests),
+            "responses": {str(k): v for k, v in self.responses.items()},
+            "receipts": len(self.receipts),
+        }
+
+    def reset(self) -> None:
+        """Vaciar contadores y recibos"""
+        self.requests.clear()
+        self.responses.clear()
+        self.receipts.clear()
+
+
+def _add_control_routes(app: FastAPI, state: StubState) -> None:
+    """Rutas /_stub/* comunes a todos los stubs"""
+
+    @app.get("/_stub/stats")
+    async def stub_stats():
+        return state.stats()
+
+    @app.get("/_stub/receipts")
+    async def stub_receipts(limit: int = 100):
+        return list(state.receipts)[-limit:]
+
+    @app.post("/_stub/reset")
+    async def stub_reset():
+        state.reset()
+        return {"success": True}
+
+
+# ----------------------------------------------------------------------
+# Evolution API
+# ----------------------------------------------------------------------
+
+def create_evolution_app(profile: StubProfile, seed: Optional[int] = None) -> FastAPI:
+    """
+    Stub de Evolution API
+
+    Args:
+        profile: Comportamiento simulado
+        seed: Semilla para latencias/errores reproducibles
+
+    Returns:
+        App ASGI
+    """
+    app = FastAPI(title="Evolution API stub")
+    state = app.state.stub = StubState("evolution", profile, seed)
+    groups: Dict[str, Dict[str, Any]] = {}
+
+    def message_key() -> Dict[str, Any]:
+        return {"remoteJid": "", "fromMe": True, "id": uuid.uuid4().hex[:20].upper()}
+
+    @app.post("/message/sendText/{instance}")
+    async def send_text(instance: str, request: Request):
+        if (error := await state.gate("message/sendText")) is not None:
+            return error
+        body = await request.json()
+        key = {**message_key(), "remoteJid": body.get("number")}
+        state.receipts.append({"route": "message/sendText", "instance": instance, "number": body.get("number")})
+        return JSONResponse(status_code=201, content={"key": key, "status": "PENDING"})
+
+    @app.post("/message/sendWhatsAppAudio/{instance}")
+    async def send_audio(instance: str, request: Request):
+        if (error := await state.gate("message/sendWhatsAppAudio")) is not None:
+            return error
+        body = await request.json()
+        return JSONResponse(status_code=201, content={"key": {**message_key(), "remoteJid": body.get("number")}})
+
+    @app.post("/group/create/{instance}")
+    async def create_group(instance: str, request: Request):
+        if (error := await state.gate("group/create")) is not None:
+            return error
+        body = await request.json()
+        group_id = f"{state.rng.randint(10**17, 10**18 - 1)}@g.us"
+        groups[group_id] = {"id": group_id, "subject": body.get("subject"), "participants": body.get("participants", [])}
+        state.receipts.append({"route": "group/create", "instance": instance, "group_id": group_id})
+        return JSONResponse(status_code=201, content=groups[group_id])
+
+    @app.post("/group/updateParticipant/{instance}")
+    async def update_participant(instance: str, request: Request):
+        if (error := await state.gate("group/updateParticipant")) is not None:
+            return error
+        body = await request.json()
+        return {"updateParticipants": [{"status": "200", "jid": p} for p in body.get("participants", [])]}
+
+    @app.get("/group/fetchAllGroups/{instance}")
+    async def fetch_all_groups(instance: str):
+        if (error := await state.gate("group/fetchAllGroups")) is not None:
+            return error
+        return list(groups.values())
+
+    @app.delete("/group/leaveGroup/{instance}")
+    async def leave_group(instance: str, groupJid: str = ""):
+        if (error := await state.gate("group/leaveGroup")) is not None:
+            return error
+        groups.pop(groupJid, None)
+        return {"groupJid": groupJid, "leave": True}
+
+    for route in ("chat/presence", "chat/setPresence", "chat/sendPresence"):
+        async def presence(instance: str, _route: str = route):
+            if (error := await state.gate(_route)) is not None:
+                return error
+            return JSONResponse(status_code=201, content={"presence": "composing"})
+
+        app.add_api_route(f"/{route}/{{instance}}", presence, methods=["POST"])
+
+    _add_control_routes(app, state)
+    return app
+
+
+# ----------------------------------------------------------------------
+# Receptor Flowtify / Floatify
+# ----------------------------------------------------------------------
+
+def create_flowtify_app(profile: StubProfile, secret: Optional[str] = None, seed: Optional[int] = None) -> FastAPI:
+    """
+    Stub del receptor de webhooks Flowtify (y rutas de Floatify)
+
+    Cada recibo registra si la firma X-Webhook-Signature coincide con el
+    HMAC SHA256 del body crudo calculado con el secret compartido.
+
+    Args:
+        profile: Comportamiento simulado
+        secret: Secret compartido (WEBHOOK_SECRET); sin él no se verifica
+        seed: Semilla para latencias/errores reproducibles
+
+    Returns:
+        App ASGI
+    """
+    app = FastAPI(title="Flowtify receiver stub")
+    state = app.state.stub = StubState("flowtify", profile, seed)
+    signatures: Counter = Counter()
+
+    async def receive(request: Request, route: str):
+        if (error := await state.gate(route)) is not None:
+            return error
+
+        body = await request.body()
+        signature = request.headers.get("x-webhook-signature")
+        if secret is None:
+            verified = None
+        else:
+            expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            verified = signature is not None and hmac.compare_digest(expected, signature)
+        signatures[{True: "valid", False: "invalid", None: "unchecked"}[verified]] += 1
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        state.receipts.append({
+            "route": route,
+            "webhook_type": request.headers.get("x-webhook-type"),
+            "signature_valid": verified,
+            "trip_id": (payload.get("trip") or {}).get("id") if isinstance(payload, dict) else None,
+            "bytes": len(body),
+            "received_at": time.time(),
+        })
+        return {"success": True, "received": True}
+
+    for endpoint in FLOWTIFY_ENDPOINTS + FLOATIFY_ENDPOINTS:
+        async def handler(request: Request, _route: str = endpoint):
+            return await receive(request, _route)
+
+        app.add_api_route(endpoint, handler, methods=["POST"])
+
+    _add_control_routes(app, state)
+
+    @app.get("/_stub/signatures")
+    async def stub_signatures():
+        return dict(signatures)
+
+    return app
+
+
+# ----------------------------------------------------------------------
+# Gemini
+# ----------------------------------------------------------------------
+
+_PROMPT_MESSAGE = re.compile(r'Mensaje: "(?P<text>.*?)"', re.DOTALL)
+_PROMPT_SUBSTATUS = re.compile(r"Subestado: (?P<substatus>\S+)")
+
+
+def classify_prompt(prompt: str, classifier: Any) -> Dict[str, Any]:
+    """
+    Clasificación determinista para el prompt de get_message_classification_prompt
+
+    Args:
+        prompt: Texto del prompt recibido
+        classifier: FastIntentClassifier sin umbral
+
+    Returns:
+        JSON con la forma que espera GeminiClient.classify_message
+    """
+    from app.integrations.gemini.client import DEFAULT_CLASSIFICATION
+
+    message = _PROMPT_MESSAGE.search(prompt)
+    substatus = _PROMPT_SUBSTATUS.search(prompt)
+    result = None
+    if message:
+        result = classifier.classify(
+            message["text"],
+            {"substatus": substatus["substatus"] if substatus else None},
+        )
+    if result is None:
+        return dict(DEFAULT_CLASSIFICATION)
+    result.pop("source", None)
+    return result
+
+
+def create_gemini_app(profile: StubProfile, seed: Optional[int] = None) -> FastAPI:
+    """
+    Stub compatible con generateContent de la API REST de Gemini
+
+    Los prompts de clasificación reciben una clasificación por reglas; los
+    contenidos con audio (inline_data) reciben una transcripción fija.
+
+    Args:
+        profile: Comportamiento simulado
+        seed: Semilla para latencias/errores reproducibles
+
+    Returns:
+        App ASGI
+    """
+    from app.services.intent_classifier import FastIntentClassifier
+
+    app = FastAPI(title="Gemini stub")
+    state = app.state.stub = StubState("gemini", profile, seed)
+    classifier = FastIntentClassifier(threshold=0.0, margin=0.0)
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        if (error := await state.gate("generateContent")) is not None:
+            return error
+
+        body = await request.json()
+        parts: List[Dict[str, Any]] = [p for c in body.get("contents", []) for p in c.get("parts", [])]
+        if any("inlineData" in p or "inline_data" in p for p in parts):
+            text = "Ya terminé de cargar"
+        else:
+            prompt = "\n".join(p.get("text", "") for p in parts)
+            text = json.dumps(classify_prompt(prompt, classifier), ensure_ascii=False)
+
+        state.receipts.append({"route": "generateContent", "model": model})
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+        }
+
+    _add_control_routes(app, state)
+    return app
+
+
+def create_stub_apps(
+    profiles: Optional[Dict[str, StubProfile]] = None,
+    secret: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> Dict[str, FastAPI]:
+    """
+    Crear las tres apps stub
+
+    Args:
+        profiles: Perfil por stub ("evolution", "flowtify", "gemini")
+        secret: Secret HMAC para verificar webhooks Flowtify
+        seed: Semilla base
+
+    Returns:
+        Apps por nombre
+    """
+    profiles = profiles or {}
+    return {
+        "evolution": create_evolution_app(profiles.get("evolution", StubProfile()), seed),
+        "flowtify": create_flowtify_app(profiles.get("flowtify", StubProfile()), secret, seed),
+        "gemini": create_gemini_app(profiles.get("gemini", StubProfile(latency="lognormal", latency_ms=400)), seed),
+    }
+
+
+async def serve(apps: Dict[str, FastAPI], host: str, ports: Dict[str, int]) -> None:
+    """Servir todas las apps en el mismo event loop"""
+    import uvicorn
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=ports[name], log_level="warning", access_log=False))
+        for name, app in apps.items()
+    ]
+
+    # Cada uvicorn.Server instala sus propios handlers y solo el último recibe
+    # la señal: se reemplazan por uno que detiene a todos
+    def stop() -> None:
+        for server in servers:
+            server.should_exit = True
+
+    loop = asyncio.get_running_loop()
+    for server in servers:
+        server.install_signal_handlers = lambda: None
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+
+    for name in apps:
+        print(f"{name:10s} http://{host}:{ports[name]}")
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main() -> None:
+    """Punto de entrada principal"""
+    parser = argparse.ArgumentParser(description="Stubs locales de Evolution API, Flowtify y Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    for name, port in DEFAULT_PORTS.items():
+        parser.add_argument(f"--{name}-port", type=int, default=port)
+    parser.add_argument(
+        "--profile",
+        action="append",
+        default=[],
+        metavar="STUB:SPEC",
+        help="Perfil por stub, p. ej. gemini:latency=lognormal,latency_ms=600,latency_p99_ms=3000,rate_limit=15",
+    )
+    parser.add_argument("--secret", help="WEBHOOK_SECRET para verificar firmas Flowtify")
+    parser.add_argument("--seed", type=int, help="Semilla para latencias y errores reproducibles")
+    args = parser.parse_args()
+
+    profiles = {}
+    for item in args.profile:
+        name, _, spec = item.partition(":")
+        if name not in DEFAULT_PORTS:
+            parser.error(f"Unknown stub: {name}")
+        profiles[name] = StubProfile.parse(spec)
+
+    ports = {name: getattr(args, f"{name}_port") for name in DEFAULT_PORTS}
+    try:
+        asyncio.run(serve(create_stub_apps(profiles, args.secret, args.seed), args.host, ports))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
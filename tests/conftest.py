@@ -2,10 +2,12 @@
 Configuración de pytest y fixtures globales
 """
 import pytest
+from contextlib import asynccontextmanager, contextmanager
 from typing import AsyncGenerator
 from unittest.mock import AsyncMock
 
 from app.core.database import Database
+from app.core.query_stats import track_queries
 
 
 @pytest.fixture
@@ -24,6 +26,191 @@ def mock_database():
     return db
 
 
+FAKE_ROWS = [{"id": 1, "metadata": '{"a": 1}'}, {"id": 2, "metadata": None}]
+
+
+class FakeCursor:
+    """Cursor de aiomysql mínimo: SELECT devuelve FAKE_ROWS, el resto afecta 1 fila"""
+
+    def __init__(self, *args):
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        self.rowcount = len(FAKE_ROWS) if query.startswith("SELECT") else 1
+
+    async def executemany(self, query, args):
+        self.rowcount = len(args)
+
+    async def fetchall(self):
+        return [dict(row) for row in FAKE_ROWS]
+
+    async def fetchone(self):
+        return dict(FAKE_ROWS[0])
+
+
+class FakeConnection:
+    def cursor(self, cursor_class):
+        return FakeCursor()
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakePool:
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection()
+
+
+@pytest.fixture
+def pooled_database():
+    """
+    Database real sobre un pool falso de aiomysql
+
+    Ejercita acquire()/transaction() y la instrumentación de cursores sin
+    servidor MySQL: SELECT devuelve FAKE_ROWS y el resto afecta 1 fila.
+    """
+    db = Database()
+    db._pool = FakePool()
+    return db
+
+
+class RoutedCursor:
+    """Cursor de aiomysql mínimo que responde según la tabla del SELECT"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pool = connection.pool
+        self.rowcount = -1
+        self._rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        sql = " ".join(query.split())
+        self.pool.executed.append(sql)
+        if self.pool.fail_on and self.pool.fail_on in sql:
+            raise RuntimeError(f"forced failure: {self.pool.fail_on}")
+        self._rows = []
+        if sql.startswith("SELECT"):
+            self._rows = next((rows for fragment, rows in self.pool.routes if fragment in sql), [])
+            self.rowcount = len(self._rows)
+        else:
+            self.connection.pending.append(sql)
+            self.rowcount = 1
+
+    async def fetchall(self):
+        return [dict(row) for row in self._rows]
+
+    async def fetchone(self):
+        return dict(self._rows[0]) if self._rows else None
+
+
+class RoutedConnection:
+    """Conexión que solo confirma las escrituras al hacer commit"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = []
+
+    def cursor(self, cursor_class):
+        return RoutedCursor(self)
+
+    async def begin(self):
+        self.pending = []
+
+    async def commit(self):
+        self.pool.committed.extend(self.pending)
+        self.pending = []
+
+    async def rollback(self):
+        self.pool.rolled_back.extend(self.pending)
+        self.pending = []
+
+
+class RoutedPool:
+    def __init__(self):
+        self.routes = []  # [(fragmento de SQL normalizado, filas)]
+        self.fail_on = None  # Fragmento de SQL que lanza una excepción
+        self.executed = []
+        self.committed = []
+        self.rolled_back = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield RoutedConnection(self)
+
+
+@pytest.fixture
+def routed_database():
+    """
+    Database real sobre un pool falso que responde según la tabla consultada
+
+    Los SELECT devuelven las filas de la primera entrada de _pool.routes
+    cuyo fragmento aparece en la query (o ninguna). Las escrituras quedan en
+    _pool.committed o _pool.rolled_back según cómo termine su conexión, y
+    _pool.fail_on hace fallar las queries que contienen ese fragmento.
+    """
+    db = Database()
+    db._pool = RoutedPool()
+    return db
+
+
+class QueryBudget:
+    """Aserciones de número máximo de queries a la BD"""
+
+    @contextmanager
+    def __call__(self, max_queries: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.queries <= max_queries, (
+            f"{stats.queries} queries executed, budget is {max_queries}"
+        )
+
+    @staticmethod
+    def check(response, max_queries: int) -> None:
+        """Afirmar el presupuesto sobre el header X-DB-Queries de una respuesta"""
+        queries = int(response.headers["X-DB-Queries"])
+        assert queries <= max_queries, (
+            f"{response.request.method} {response.request.url.path}: "
+            f"{queries} queries executed, budget is {max_queries}"
+        )
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Presupuesto de queries por bloque o por endpoint
+
+    Uso:
+        with query_budget(8):
+            await service.process_wialon_event(event)
+
+        response = client.post("/api/v1/wialon/events", ...)
+        query_budget.check(response, 8)
+
+    Returns:
+        QueryBudget
+    """
+    return QueryBudget()
+
+
 @pytest.fixture
 async def test_database():
     """
@@ -0,0 +1,114 @@
+"""
+Tests para la ejecución no bloqueante de Gemini
+
+Ejecutar: pytest tests/integrations/test_gemini_client.py -v
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.integrations.gemini.client import GeminiClient, DEFAULT_CLASSIFICATION
+
+
+class SlowModel:
+    """Modelo simulado con latencia configurable"""
+
+    def __init__(self, delay: float, text: str = '{"intent": "arrival", "confidence": 0.9}'):
+        self.delay = delay
+        self.text = text
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_content_async(self, contents, generation_config=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return SimpleNamespace(text=self.text)
+
+
+@pytest.mark.asyncio
+class TestGeminiClient:
+    """Tests para GeminiClient"""
+
+    async def test_timeout_falls_back_to_default_classification(self):
+        """Un timeout cancela la llamada y devuelve intent 'other'"""
+        client = GeminiClient(api_key="test", timeout=0.05)
+        client.model = SlowModel(delay=1.0)
+
+        result = await client.classify_message("ya llegué", {"status": "en_ruta_carga"})
+
+        assert result == DEFAULT_CLASSIFICATION
+        assert client.get_stats()["timeouts"] == 1
+        assert client.model.active == 0
+
+    async def test_concurrency_is_bounded(self):
+        """No hay más llamadas en vuelo que max_concurrency"""
+        client = GeminiClient(api_key="test", timeout=5, max_concurrency=2)
+        client.model = SlowModel(delay=0.02)
+
+        results = await asyncio.gather(
+            *[client.classify_message("hola", {}) for _ in range(6)]
+        )
+
+        assert all(r["intent"] == "arrival" for r in results)
+        assert client.model.max_active == 2
+        stats = client.get_stats()
+        assert stats["calls"] == 6
+        assert stats["max_queue_wait_ms"] > 0
+
+    async def test_rest_endpoint_runs_sync_call_in_thread(self):
+        """Con endpoint REST (stub local) la llamada síncrona corre fuera del event loop"""
+        calls = []
+
+        class SyncModel:
+            def generate_content(self, contents, generation_config=None):
+                calls.append(threading.current_thread() is threading.main_thread())
+                return SimpleNamespace(text='{"intent": "arrival", "confidence": 0.9}')
+
+        client = GeminiClient(api_key="test", timeout=5, api_endpoint="http://127.0.0.1:8093")
+        client.model = SyncModel()
+
+        result = await client.classify_message("ya llegué", {})
+
+        assert result["intent"] == "arrival"
+        assert calls == [False]
+
+    async def test_rest_timeout_keeps_slot_until_thread_finishes(self):
+        """Tras un timeout REST el hilo sigue ocupando su cupo: nunca hay más hilos que max_concurrency"""
+        finish = threading.Event()
+        lock = threading.Lock()
+        active = []
+
+        class BlockingSyncModel:
+            max_active = 0
+
+            def generate_content(self, contents, generation_config=None):
+                with lock:
+                    active.append(1)
+                    BlockingSyncModel.max_active = max(BlockingSyncModel.max_active, len(active))
+                try:
+                    finish.wait(5)
+                finally:
+                    with lock:
+                        active.pop()
+                return SimpleNamespace(text='{"intent": "arrival", "confidence": 0.9}')
+
+        client = GeminiClient(api_key="test", timeout=0.05, max_concurrency=1, api_endpoint="http://127.0.0.1:8093")
+        client.model = BlockingSyncModel()
+
+        assert await client.classify_message("ya llegué", {}) == DEFAULT_CLASSIFICATION
+        assert client.get_stats()["in_flight"] == 1
+
+        client.timeout = 5
+        asyncio.get_running_loop().call_later(0.05, finish.set)
+        result = await client.classify_message("ya llegué", {})
+
+        assert result["intent"] == "arrival"
+        assert BlockingSyncModel.max_active == 1
+        stats = client.get_stats()
+        assert (stats["in_flight"], stats["calls"]) == (0, 2)
@@ -0,0 +1,83 @@
+"""
+Tests para los clientes HTTP compartidos
+
+Ejecutar: pytest tests/integrations/test_http_pool.py -v
+"""
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from app.integrations import http_pool as http_pool_module
+from app.integrations.evolution.client import EvolutionClient
+from app.integrations.http_pool import PooledHTTPClient, get_http_pool
+
+
+def _mock_pool(handler) -> PooledHTTPClient:
+    """Pool con transporte simulado (sin red)"""
+    pool = PooledHTTPClient(name="test")
+    pool._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+
+@pytest.mark.asyncio
+class TestPooledHTTPClient:
+    """Tests para PooledHTTPClient"""
+
+    async def test_evolution_reuses_single_client(self):
+        """Todas las llamadas de EvolutionClient usan el mismo AsyncClient"""
+        seen = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request.url.path)
+            return httpx.Response(200, json={"ok": True})
+
+        pool = _mock_pool(handler)
+        underlying = pool.client
+        client = EvolutionClient("http://evolution", "key", "SATECH", http_client=pool)
+
+        await client.send_text("120363@g.us", "hola")
+        await client.start_typing("120363@g.us")
+        await client.stop_typing("120363@g.us")
+
+        assert pool.client is underlying
+        assert seen == [
+            "/message/sendText/SATECH",
+            "/chat/presence/SATECH",
+            "/chat/presence/SATECH",
+        ]
+        stats = pool.get_stats()
+        assert stats["requests"] == 3
+        assert stats["errors"] == 0
+
+    async def test_errors_are_counted(self):
+        """Los errores de transporte se contabilizan y se propagan"""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("boom", request=request)
+
+        pool = _mock_pool(handler)
+
+        with pytest.raises(httpx.ConnectError):
+            await pool.get("http://floatify/health")
+
+        assert pool.get_stats()["errors"] == 1
+        await pool.aclose()
+        assert pool._client is None
+
+
+def test_existing_pool_keeps_its_timeout_and_warns_on_mismatch(monkeypatch):
+    """Un pool ya creado conserva su timeout; pedirlo con otro lo advierte"""
+    monkeypatch.setattr(http_pool_module, "http_pools", {})
+    logger = MagicMock()
+    monkeypatch.setattr(http_pool_module, "logger", logger)
+
+    pool = get_http_pool("evolution", timeout=15)
+    assert get_http_pool("evolution", timeout=15) is pool
+    logger.warning.assert_not_called()
+
+    assert get_http_pool("evolution", timeout=60) is pool
+    assert pool.timeout.read == 15
+    logger.warning.assert_called_once_with(
+        "http_pool_timeout_mismatch", pool="evolution", requested_timeout=60, pool_timeout=15
+    )
@@ -0,0 +1,90 @@
+"""
+Tests unitarios para la captura de webhooks crudos de Wialon
+
+Ejecutar: pytest tests/integrations/test_wialon_capture.py -v
+"""
+import time
+
+from app.integrations.wialon.capture import (
+    SegmentReader,
+    WebhookCapture,
+    decode_body,
+    iter_records,
+    list_segments,
+)
+
+
+BODY = b"unit_id=27538728&latitude=21.0505&address=Le\xc3\xb3n"
+
+
+def wait_written(capture, count, timeout=5.0):
+    """Esperar a que el hilo escritor vuelque count registros"""
+    deadline = time.monotonic() + timeout
+    while capture.get_stats()["written"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestWebhookCapture:
+    """Tests para WebhookCapture"""
+
+    def test_records_roundtrip_through_gzip_segment(self, tmp_path):
+        """Body crudo y Content-Type se recuperan tal cual tras el stop"""
+        capture = WebhookCapture(str(tmp_path))
+        capture.start()
+        assert capture.capture(
+            "application/x-www-form-urlencoded",
+            {"user-agent": "wialon"},
+            BODY,
+            parsed_data={"raw_data": {"unit_id": "27538728"}},
+        )
+        capture.capture("application/octet-stream", {}, b"\xff\xfe", success=False, error_message="bad")
+        capture.stop()
+
+        segments = list_segments(str(tmp_path))
+        assert len(segments) == 1 and segments[0].endswith(".ndjson.gz")
+
+        records = list(iter_records(segments))
+        assert [decode_body(r) for r in records] == [BODY, b"\xff\xfe"]
+        assert records[0]["content_type"] == "application/x-www-form-urlencoded"
+        assert records[1]["body_encoding"] == "base64"
+        assert capture.get_stats()["written"] == 2
+
+    def test_rotation_and_pruning(self, tmp_path):
+        """Los segmentos rotan por tamaño y se conservan solo max_segments"""
+        capture = WebhookCapture(str(tmp_path), segment_max_bytes=1, max_segments=2)
+        capture.start()
+        for i in range(4):
+            capture.capture("text/plain", {}, BODY)
+            # Un lote por registro para que cada uno rote
+            wait_written(capture, i + 1)
+        capture.stop()
+
+        assert capture.get_stats()["segments_opened"] == 4
+        assert len(list_segments(str(tmp_path))) <= 2
+
+    def test_overflow_and_sampling_never_block(self, tmp_path):
+        """Con la cola llena se cuenta overflow; sample_rate=0 no encola nada"""
+        full = WebhookCapture(str(tmp_path), queue_size=1)
+        full._running = True  # Sin hilo escritor: la cola no se drena
+        assert full.capture("text/plain", {}, BODY) is True
+        assert full.capture("text/plain", {}, BODY) is False
+        assert full.get_stats()["overflow"] == 1
+
+        sampled = WebhookCapture(str(tmp_path), sample_rate=0.0)
+        sampled._running = True
+        assert sampled.capture("text/plain", {}, BODY) is False
+        assert sampled.get_stats()["sampled_out"] == 1
+
+    def test_reader_follows_open_segment(self, tmp_path):
+        """El lector incremental ve los registros de un segmento aún abierto"""
+        capture = WebhookCapture(str(tmp_path))
+        capture.start()
+        capture.capture("text/plain", {}, b"first")
+        wait_written(capture, 1)
+
+        reader = SegmentReader(list_segments(str(tmp_path))[0])
+        assert [decode_body(r) for r in reader.read_new()] == [b"first"]
+
+        capture.capture("text/plain", {}, b"second")
+        capture.stop()
+        assert [decode_body(r) for r in reader.read_new()] == [b"second"]
@@ -31,3 +31,13 @@ def test_parse_wialon_event_sanitizes_placeholders():
     assert normalized["geofence_name"] is None
     assert normalized["speed"] == 0.0
 
+
+
+def test_connection_lost_last_message_time_stays_string():
+    body = "unit_id=12345&notification_type=connection_lost&event_time=1762896505&last_message_time=1762896205"
+
+    parsed = parse_wialon_event(body, content_type="application/x-www-form-urlencoded")
+    assert parsed["last_message_time"] == 1762896205
+
+    normalized = normalize_wialon_event(parsed)
+    assert normalized["last_message_time"] == "1762896205"
@@ -0,0 +1,83 @@
+"""
+Tests unitarios para la caché de clasificaciones
+
+Ejecutar: pytest tests/services/test_classification_cache.py -v
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.integrations.gemini.client import DEFAULT_CLASSIFICATION
+from app.services.classification_cache import ClassificationCache
+
+
+RESULT = {
+    "intent": "loading_complete",
+    "confidence": 0.93,
+    "entities": {},
+    "response": "Excelente, carga completada.",
+    "action": "update_substatus",
+    "new_substatus": "carga_completada",
+}
+CONTEXT = {"status": "en_zona_carga", "substatus": "cargando"}
+
+
+@pytest.mark.asyncio
+class TestClassificationCache:
+    """Tests para ClassificationCache"""
+
+    async def test_key_is_normalized_and_state_aware(self):
+        """Acentos/mayúsculas no importan; el estado del viaje sí"""
+        cache = ClassificationCache(max_size=10, ttl=60)
+        await cache.set(None, "Ya terminé, ¡LISTO!", CONTEXT, RESULT)
+
+        assert cache.get("ya termine listo", CONTEXT) == RESULT
+        assert cache.get("ya termine listo", {**CONTEXT, "substatus": "descargando"}) is None
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    async def test_entries_do_not_expose_message_text(self):
+        """El listado admin muestra la clave hasheada, nunca el texto del conductor"""
+        cache = ClassificationCache(max_size=10, ttl=60)
+        await cache.set(None, "Ya terminé, ¡LISTO!", CONTEXT, RESULT)
+
+        [entry] = cache.entries()
+        assert "text" not in entry
+        assert entry["key"] == cache._hash_key(cache.make_key("ya termine listo", CONTEXT))
+        assert entry["text_length"] == len("ya termine listo")
+        assert "termine" not in json.dumps(cache.entries())
+
+    async def test_default_fallback_is_not_cached(self):
+        """El resultado por defecto (timeout/JSON inválido) no se cachea"""
+        cache = ClassificationCache(max_size=10, ttl=60)
+
+        assert await cache.set(None, "hola", CONTEXT, dict(DEFAULT_CLASSIFICATION)) is False
+        assert cache.get("hola", CONTEXT) is None
+
+    async def test_persisted_entries_are_loaded(self, mock_database):
+        """Las entradas persistidas se cargan a memoria al arrancar"""
+        mock_database.fetch.return_value = [
+            {
+                "normalized_text": "ya termine listo",
+                "trip_status": "en_zona_carga",
+                "trip_substatus": "cargando",
+                "result": json.dumps(RESULT),
+                "expires_at": datetime.utcnow() + timedelta(hours=1),
+            }
+        ]
+        cache = ClassificationCache(max_size=10, ttl=60, persist=True)
+
+        assert await cache.load(mock_database) == 1
+        assert cache.get("Ya terminé listo", CONTEXT) == RESULT
+
+    async def test_set_writes_through_and_flush(self, mock_database):
+        """Con persistencia se escribe en la tabla y flush la vacía"""
+        cache = ClassificationCache(max_size=10, ttl=60, persist=True)
+
+        await cache.set(mock_database, "ya termine listo", CONTEXT, RESULT)
+        assert "ai_classification_cache" in mock_database.execute.await_args.args[0]
+
+        await cache.flush(mock_database)
+        assert cache.get("ya termine listo", CONTEXT) is None
+        assert mock_database.execute.await_args.args[0] == "DELETE FROM ai_classification_cache"
@@ -0,0 +1,93 @@
+"""
+Tests unitarios para el escritor write-behind de webhook_delivery_log
+
+Ejecutar: pytest tests/services/test_delivery_log_writer.py -v
+"""
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.delivery_log_writer import DeliveryLogWriter
+
+
+@pytest.fixture
+def cursor(mock_database):
+    """Cursor de la transacción de volcado"""
+    cursor = AsyncMock()
+
+    @asynccontextmanager
+    async def transaction():
+        yield cursor, MagicMock()
+
+    mock_database.transaction = transaction
+    return cursor
+
+
+@pytest.mark.asyncio
+class TestDeliveryLogWriter:
+    """Tests para DeliveryLogWriter"""
+
+    async def test_transitions_merge_into_one_row(self, mock_database, cursor):
+        """Intento + éxito antes del volcado se escriben como una sola fila 'sent'"""
+        writer = DeliveryLogWriter(mock_database)
+
+        log_id = writer.record_attempt("status_update", "trip-1", '{"a": 1}', "https://x/status")
+        writer.record_success(log_id)
+        written = await writer.flush()
+
+        assert written == 1
+        query, rows = cursor.executemany.await_args.args
+        assert "ON DUPLICATE KEY UPDATE" in query
+        assert rows[0][0] == log_id
+        assert rows[0][5] == "sent"
+        mock_database.execute.assert_not_called()
+        mock_database.fetchrow.assert_not_called()
+
+    async def test_result_after_flush_upserts_again(self, mock_database, cursor):
+        """El resultado llegado tras volcar el intento vuelve a escribirse"""
+        writer = DeliveryLogWriter(mock_database)
+
+        log_id = writer.record_attempt("status_update", "trip-1", "{}", "https://x")
+        await writer.flush()
+        writer.record_failure(log_id, "timeout")
+        await writer.flush()
+
+        rows = cursor.executemany.await_args.args[1]
+        assert rows[0][5] == "failed"
+        assert rows[0][6] == 1
+
+    async def test_dlq_decision_in_memory(self, mock_database, cursor):
+        """Al agotar reintentos se inserta en DLQ en el mismo volcado"""
+        writer = DeliveryLogWriter(mock_database, max_retries=1)
+
+        log_id = writer.record_attempt("status_update", None, "{}", "https://x")
+        assert writer.record_failure(log_id, "HTTP 500") is True
+        await writer.flush()
+
+        queries = [c.args[0] for c in cursor.executemany.await_args_list]
+        assert any("webhook_dead_letter_queue" in q for q in queries)
+        assert writer.get_stats()["dead_lettered"] == 1
+
+    async def test_failed_flush_spills_on_stop(self, mock_database, tmp_path):
+        """Si la BD no está disponible en el shutdown las filas van a disco y se recuperan"""
+        spill = tmp_path / "spill.jsonl"
+
+        @asynccontextmanager
+        async def broken_transaction():
+            raise ConnectionError("db down")
+            yield
+
+        mock_database.transaction = broken_transaction
+        writer = DeliveryLogWriter(mock_database, spill_path=str(spill))
+        await writer.start()
+        writer.record_attempt("status_update", None, "{}", "https://x")
+        await writer.stop()
+
+        assert spill.exists()
+
+        recovered = DeliveryLogWriter(mock_database, spill_path=str(spill))
+        await recovered.start()
+        assert recovered.get_stats()["buffered"] == 1
+        assert not spill.exists()
+        await recovered.stop()
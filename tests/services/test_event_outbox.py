@@ -0,0 +1,105 @@
+"""
+Tests de atomicidad del procesamiento de eventos en modo outbox
+
+Ejecutar: pytest tests/services/test_event_outbox.py -v
+"""
+import pytest
+
+from app.core.errors import BusinessLogicError
+from app.models.event import WialonEvent
+from app.services import event_service as event_service_module
+from app.services.event_service import EventService
+from app.services.geofence_cache import GeofenceCache
+from app.services.webhook_service import WebhookService
+
+
+TRIP = {
+    "id": "t1",
+    "unit_id": "u1",
+    "status": "en_ruta_carga",
+    "substatus": "rumbo_a_zona_carga",
+    "metadata": {"tenant_id": 24},
+}
+EVENT_PAYLOAD = {
+    "unit_name": "Torton 309",
+    "unit_id": "27538728",
+    "notification_type": "geofence_entry",
+    "notification_id": "notif-1",
+    "event_time": 1728280100,
+    "latitude": 21.05,
+    "longitude": -101.79,
+    "geofence_id": "9001",
+    "geofence_name": "PLANTA ACME - ZONA CARGA",
+}
+ROUTES = [
+    ("FROM trips t JOIN units u", [TRIP]),
+    ("FROM units WHERE wialon_unit_id", [{"id": "u1", "wialon_unit_id": "27538728", "name": "Torton 309"}]),
+    ("FROM trip_geofences", [{
+        "id": 10,
+        "floatify_geofence_id": "GEO-1-trip-1",
+        "wialon_geofence_id": "9001",
+        "name": "PLANTA ACME - ZONA CARGA",
+        "geofence_type": "polygon",
+        "visit_type": "loading",
+    }]),
+    ("FROM events WHERE wialon_notification_id", []),
+    ("FROM events WHERE id", [{"id": "e1", "trip_id": "t1", "processed": 0}]),
+    ("FROM trips t LEFT JOIN drivers", [{**TRIP, "unit_code": "18", "unit_name": "Torton 309"}]),
+    ("FROM trips WHERE id", [{**TRIP, "status": "en_zona_carga", "substatus": "esperando_inicio_carga"}]),
+]
+
+
+def writes(statements, fragment):
+    return [sql for sql in statements if fragment in sql]
+
+
+@pytest.fixture
+def service(routed_database, monkeypatch):
+    """EventService en modo outbox sobre el pool enrutado"""
+    routed_database._pool.routes = list(ROUTES)
+    monkeypatch.setattr(event_service_module, "geofence_cache", GeofenceCache(max_trips=10))
+    webhook_service = WebhookService(
+        db=routed_database,
+        target_url="https://test.flowtify.com/webhooks",
+        secret_key="test_secret_key_123456789",
+        outbox_enabled=True,
+    )
+    return EventService(routed_database, webhook_service=webhook_service)
+
+
+@pytest.mark.asyncio
+async def test_failed_outbox_insert_rolls_back_status_and_processed_flag(service, routed_database):
+    """Si el INSERT del outbox falla no se confirma el estado ni la marca de procesado"""
+    pool = routed_database._pool
+    pool.fail_on = "INSERT INTO webhook_delivery_log"
+
+    with pytest.raises(BusinessLogicError):
+        await service.process_wialon_event(WialonEvent(**EVENT_PAYLOAD))
+
+    assert writes(pool.executed, "INSERT INTO webhook_delivery_log")
+    assert writes(pool.committed, "UPDATE trips") == []
+    assert writes(pool.committed, "UPDATE events SET processed") == []
+    assert writes(pool.rolled_back, "UPDATE trips")
+
+    # Reintento del mismo evento: ya existe sin procesar, así que se reprocesa
+    pool.fail_on = None
+    pool.routes.insert(0, ("FROM events WHERE wialon_notification_id", [{"id": "e1", "trip_id": "t1", "processed": 0}]))
+
+    result = await service.process_wialon_event(WialonEvent(**EVENT_PAYLOAD))
+
+    assert result["event_id"] == "e1"
+    assert writes(pool.committed, "UPDATE trips")
+    assert writes(pool.committed, "INSERT INTO webhook_delivery_log")
+    assert writes(pool.committed, "UPDATE events SET processed")
+
+
+@pytest.mark.asyncio
+async def test_processed_duplicate_is_still_idempotent(service, routed_database):
+    """Un evento ya procesado no se vuelve a aplicar"""
+    pool = routed_database._pool
+    pool.routes.insert(0, ("FROM events WHERE wialon_notification_id", [{"id": "e1", "trip_id": "t1", "processed": 1}]))
+
+    result = await service.process_wialon_event(WialonEvent(**EVENT_PAYLOAD))
+
+    assert result["idempotent"] is True
+    assert writes(pool.committed, "UPDATE trips") == []
@@ -0,0 +1,144 @@
+"""
+Presupuesto de queries del camino real de ingesta de Wialon
+
+EventService.process_wialon_event y POST /wialon/events sobre un Database
+real con un pool falso que responde según la tabla consultada.
+
+Ejecutar: pytest tests/services/test_event_query_budget.py -v
+"""
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_event_service, get_ingestion_service
+from app.api.middleware import RequestLoggingMiddleware
+from app.api.routes import wialon
+from app.config import settings
+from app.core.active_trips import ActiveTripRegistry
+from app.core.database import Database
+from app.models.event import WialonEvent
+from app.services import event_service as event_service_module
+from app.services.event_service import EventService
+from app.services.geofence_cache import GeofenceCache
+
+
+UNIT = {"id": "u1", "wialon_unit_id": "27538728", "whatsapp_group_id": None, "name": "Torton 309"}
+TRIP = {
+    "id": "t1",
+    "unit_id": "u1",
+    "status": "en_ruta_carga",
+    "substatus": "rumbo_a_zona_carga",
+    "metadata": {"tenant_id": 24},
+}
+TRIP_GEOFENCE = {
+    "id": 10,
+    "floatify_geofence_id": "GEO-1-trip-1",
+    "wialon_geofence_id": "9001",
+    "name": "PLANTA ACME - ZONA CARGA",
+    "geofence_type": "polygon",
+    "visit_type": "loading",
+}
+EVENT_PAYLOAD = {
+    "unit_name": "Torton 309",
+    "unit_id": "27538728",
+    "notification_type": "geofence_entry",
+    "notification_id": "notif-1",
+    "event_time": 1728280100,
+    "latitude": 21.05,
+    "longitude": -101.79,
+    "geofence_id": "9001",
+    "geofence_name": "PLANTA ACME - ZONA CARGA",
+}
+
+# Filas por tabla consultada (fragmento de SQL normalizado -> filas)
+ROUTES = [
+    ("FROM trips t JOIN units u", [TRIP]),
+    ("FROM units WHERE wialon_unit_id", [UNIT]),
+    ("FROM trip_geofences", [TRIP_GEOFENCE]),
+    ("FROM events WHERE wialon_notification_id", []),
+    ("FROM events WHERE id", [{"id": "e1", "trip_id": "t1", "raw_payload": "{}"}]),
+    ("FROM trips WHERE id", [{**TRIP, "status": "en_zona_carga", "substatus": "esperando_inicio_carga"}]),
+]
+
+
+@pytest.fixture
+def routed_database(routed_database):
+    """Database cuyo pool responde con las filas de ROUTES"""
+    routed_database._pool.routes = ROUTES
+    return routed_database
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registro de viajes activos vacío (ya calentado) y caché de geocercas limpia"""
+    registry = ActiveTripRegistry()
+    empty = AsyncMock(spec=Database)
+    empty.fetch.return_value = []
+    asyncio.run(registry.warm(empty))
+    monkeypatch.setattr(event_service_module, "active_trips", registry)
+    monkeypatch.setattr(event_service_module, "geofence_cache", GeofenceCache(max_trips=10))
+    return registry
+
+
+def lookups(database):
+    """Consultas de viaje activo y de unidad ejecutadas"""
+    return [
+        sql for sql in database._pool.executed
+        if "JOIN units u" in sql or "FROM units WHERE" in sql
+    ]
+
+
+@pytest.mark.asyncio
+class TestWialonEventQueryBudget:
+    """Queries de process_wialon_event con y sin la unidad en el registro"""
+
+    async def test_registry_miss(self, routed_database, registry, query_budget):
+        """Sin la unidad en memoria: viaje y unidad salen de MySQL y quedan registrados"""
+        service = EventService(routed_database)
+
+        with query_budget(9):
+            result = await service.process_wialon_event(WialonEvent(**EVENT_PAYLOAD))
+
+        assert result["action"]["new_status"] == "en_zona_carga"
+        assert len(lookups(routed_database)) == 2
+        assert registry.lookup("27538728") is not None
+
+    async def test_registry_hit(self, routed_database, registry, query_budget):
+        """Con la unidad en memoria no hay lookups; con la geocerca cacheada tampoco su carga"""
+        registry.put(UNIT, TRIP)
+        service = EventService(routed_database)
+
+        with query_budget(7):
+            await service.process_wialon_event(WialonEvent(**EVENT_PAYLOAD))
+        assert lookups(routed_database) == []
+
+        # Segundo evento: el mapa de geocercas del viaje ya está en memoria
+        with query_budget(6):
+            await service.process_wialon_event(
+                WialonEvent(**{**EVENT_PAYLOAD, "notification_id": "notif-2"})
+            )
+        assert lookups(routed_database) == []
+
+
+@pytest.mark.parametrize("warm_unit, budget", [(False, 9), (True, 7)])
+def test_wialon_events_endpoint_query_budget(routed_database, registry, query_budget, warm_unit, budget, monkeypatch):
+    """POST /wialon/events expone X-DB-Queries dentro del presupuesto (acierto y fallo del registro)"""
+    monkeypatch.setattr(settings, "db_query_stats_enabled", True)
+    if warm_unit:
+        registry.put(UNIT, TRIP)
+    service = EventService(routed_database)
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+    app.include_router(wialon.router, prefix="/api/v1")
+    app.dependency_overrides[get_event_service] = lambda: service
+    app.dependency_overrides[get_ingestion_service] = lambda: None
+
+    response = TestClient(app).post("/api/v1/wialon/events", json=EVENT_PAYLOAD)
+
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    query_budget.check(response, budget)
+    assert len(lookups(routed_database)) == (0 if warm_unit else 2)
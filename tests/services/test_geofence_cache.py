@@ -0,0 +1,112 @@
+"""
+Tests unitarios para la caché de geocercas por viaje
+
+Ejecutar: pytest tests/services/test_geofence_cache.py -v
+"""
+import pytest
+
+from app.core.cache import LRUCache
+from app.services.geofence_cache import GeofenceCache
+
+
+TRIP_ROWS = [
+    {
+        "id": 10,
+        "floatify_geofence_id": "GEO-1-trip-1",
+        "wialon_geofence_id": "9001",
+        "name": "PLANTA ACME - ZONA CARGA",
+        "geofence_type": "polygon",
+        "visit_type": "loading",
+    },
+    {
+        "id": 11,
+        "floatify_geofence_id": "GEO-2-trip-1",
+        "wialon_geofence_id": "9002",
+        "name": "CEDIS - DESCARGA",
+        "geofence_type": "circle",
+        "visit_type": "unloading",
+    },
+]
+
+
+@pytest.mark.asyncio
+class TestGeofenceCache:
+    """Tests para GeofenceCache"""
+
+    async def test_resolves_by_wialon_and_floatify_id(self, mock_database):
+        """Ambos ids externos resuelven la misma geocerca"""
+        mock_database.fetch.return_value = TRIP_ROWS
+        cache = GeofenceCache(max_trips=10)
+
+        by_wialon = await cache.resolve(mock_database, "trip-1", "9001")
+        by_floatify = await cache.resolve(mock_database, "trip-1", "GEO-1-trip-1")
+
+        assert by_wialon == by_floatify
+        assert by_wialon.db_id == 10
+        assert by_wialon.role == "loading"
+        assert by_wialon.geofence_type == "polygon"
+
+    async def test_loads_once_per_trip(self, mock_database):
+        """Solo la primera resolución consulta la base de datos"""
+        mock_database.fetch.return_value = TRIP_ROWS
+        cache = GeofenceCache(max_trips=10)
+
+        await cache.resolve(mock_database, "trip-1", "9001")
+        await cache.resolve(mock_database, "trip-1", "9002")
+        missing = await cache.resolve(mock_database, "trip-1", "7777")
+
+        assert missing is None
+        assert mock_database.fetch.await_count == 1
+
+    async def test_no_query_without_geofence_id(self, mock_database):
+        """Eventos sin geocerca no cargan el mapa"""
+        cache = GeofenceCache(max_trips=10)
+
+        assert await cache.resolve(mock_database, "trip-1", None) is None
+        mock_database.fetch.assert_not_called()
+
+    async def test_primed_trip_needs_no_query(self, mock_database):
+        """Un viaje cargado al crearse no consulta la base de datos"""
+        cache = GeofenceCache(max_trips=10)
+        cache.prime("trip-1", GeofenceCache.build_map(TRIP_ROWS))
+
+        geofence = await cache.resolve(mock_database, "trip-1", "9002")
+
+        assert geofence.role == "unloading"
+        mock_database.fetch.assert_not_called()
+
+    async def test_invalidate_forces_reload(self, mock_database):
+        """Al finalizar el viaje se descarta el mapa"""
+        mock_database.fetch.return_value = TRIP_ROWS
+        cache = GeofenceCache(max_trips=10)
+
+        await cache.resolve(mock_database, "trip-1", "9001")
+        cache.invalidate("trip-1")
+        await cache.resolve(mock_database, "trip-1", "9001")
+
+        assert mock_database.fetch.await_count == 2
+
+
+class TestLRUCache:
+    """Tests para LRUCache"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_ttl_expiration(self):
+        cache = LRUCache(max_size=2, ttl=0.001)
+        cache.set("a", 1)
+
+        import time
+        time.sleep(0.01)
+
+        assert cache.get("a") is None
+        assert cache.get_stats()["expirations"] == 1
@@ -0,0 +1,210 @@
+"""
+Tests unitarios para WialonIngestionService
+
+Ejecutar: pytest tests/services/test_ingestion_service.py -v
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.models.event import WialonEvent
+from app.services.ingestion_service import WialonIngestionService
+
+
+def make_event(unit_id: str, notification_id: str) -> WialonEvent:
+    """Construir un evento mínimo de Wialon"""
+    return WialonEvent(
+        unit_name=f"Unidad {unit_id}",
+        unit_id=unit_id,
+        notification_type="geofence_entry",
+        notification_id=notification_id,
+        event_time=1700000000,
+        latitude=19.4326,
+        longitude=-99.1332,
+    )
+
+
+class RecordingEventService:
+    """EventService falso que registra el orden de procesamiento"""
+
+    def __init__(self, fail_for: str = None):
+        self.processed = []
+        self.fail_for = fail_for
+
+    async def process_wialon_event(self, event):
+        # Ceder el loop para intercalar workers de distintos shards
+        await asyncio.sleep(0)
+        if event.notification_id == self.fail_for:
+            raise RuntimeError("boom")
+        self.processed.append((event.unit_id, event.notification_id))
+        return {"success": True, "event_id": event.notification_id}
+
+
+@pytest.mark.asyncio
+class TestWialonIngestionService:
+    """Tests para WialonIngestionService"""
+
+    async def test_shard_is_stable_per_unit(self, mock_database):
+        """El mismo unit_id siempre cae en el mismo shard"""
+        service = WialonIngestionService(mock_database, RecordingEventService(), num_workers=4)
+
+        assert service.shard_for("28645824") == service.shard_for("28645824")
+        assert all(0 <= service.shard_for(str(u)) < 4 for u in range(100))
+
+    async def test_events_persisted_and_processed_in_order_per_unit(self, mock_database):
+        """Los eventos de una unidad se procesan en orden de llegada"""
+        mock_database.fetch.return_value = []
+        event_service = RecordingEventService()
+        service = WialonIngestionService(mock_database, event_service, num_workers=3)
+        await service.start()
+
+        for i in range(5):
+            for unit in ("A", "B", "C"):
+                await service.enqueue(make_event(unit, f"{unit}-{i}"))
+
+        await service.stop(drain_timeout=5)
+
+        for unit in ("A", "B", "C"):
+            order = [n for u, n in event_service.processed if u == unit]
+            assert order == [f"{unit}-{i}" for i in range(5)]
+
+        stats = service.get_stats()
+        assert stats["processed"] == 15
+        assert stats["failed"] == 0
+        assert stats["queue_depth"] == 0
+
+        inserts = [c for c in mock_database.execute.call_args_list if "INSERT INTO wialon_event_queue" in c.args[0]]
+        assert len(inserts) == 15
+
+    async def test_failed_event_is_marked_failed(self, mock_database):
+        """Al agotar los intentos la fila se marca 'failed' sin detener el worker"""
+        mock_database.fetch.return_value = []
+        event_service = RecordingEventService(fail_for="A-0")
+        service = WialonIngestionService(mock_database, event_service, num_workers=1, max_attempts=1)
+        await service.start()
+
+        await service.enqueue(make_event("A", "A-0"))
+        await service.enqueue(make_event("A", "A-1"))
+        await service.stop(drain_timeout=5)
+
+        assert event_service.processed == [("A", "A-1")]
+        assert service.get_stats()["failed"] == 1
+        failed = [c.args for c in mock_database.execute.call_args_list if "status = 'failed'" in c.args[0]]
+        assert len(failed) == 1
+        assert "AND claimed_by = %s" in failed[0][0]
+        assert failed[0][-1] == service.instance_id
+
+    async def test_failure_schedules_retry_with_backoff(self, mock_database):
+        """Con intentos disponibles la fila vuelve a 'pending' con next_attempt_at"""
+        mock_database.fetch.return_value = []
+        service = WialonIngestionService(
+            mock_database, RecordingEventService(fail_for="A-0"), num_workers=1, max_attempts=3, backoff_base=4
+        )
+        await service.start()
+        await service.enqueue(make_event("A", "A-0"))
+        await service.stop(drain_timeout=5)
+
+        retry = [c for c in mock_database.execute.call_args_list if "next_attempt_at = NOW(3)" in c.args[0]]
+        assert len(retry) == 1
+        assert "status = 'pending'" in retry[0].args[0]
+        assert 4 <= retry[0].args[2] <= 5
+        stats = service.get_stats()
+        assert (stats["retried"], stats["failed"]) == (1, 0)
+
+    async def test_full_shard_defers_rows_to_sweeper(self, mock_database):
+        """Con la cola del shard llena la fila queda 'pending' y lo siguiente no la adelanta"""
+        mock_database.fetch.return_value = []
+        gate = asyncio.Event()
+
+        class BlockingEventService(RecordingEventService):
+            async def process_wialon_event(self, event):
+                await gate.wait()
+                return await super().process_wialon_event(event)
+
+        service = WialonIngestionService(mock_database, BlockingEventService(), num_workers=1, queue_size=1)
+        await service.start()
+
+        await service.enqueue(make_event("A", "A-0"))
+        await asyncio.sleep(0)  # el worker toma A-0 y se bloquea
+        await service.enqueue(make_event("A", "A-1"))
+        await service.enqueue(make_event("A", "A-2"))
+        await asyncio.sleep(0)
+        await service.enqueue(make_event("A", "A-3"))
+
+        inserts = [c.args for c in mock_database.execute.call_args_list if "INSERT INTO wialon_event_queue" in c.args[0]]
+        assert [args[6] for args in inserts] == ["processing", "processing", "pending", "pending"]
+        stats = service.get_stats()
+        assert (stats["deferred"], stats["backlogged_shards"]) == (2, [0])
+
+        # Lo que sigue en memoria al detener se devuelve a 'pending'
+        await service.stop(drain_timeout=0.05)
+        release = [c.args for c in mock_database.execute.call_args_list if "SET status = 'pending', claimed_by = NULL" in c.args[0]]
+        assert sorted(release[-1][1:3]) == sorted([inserts[0][1], inserts[1][1]])
+        assert release[-1][3:] == (service.instance_id,)
+
+    async def test_pending_rows_claimed_in_pages_on_start(self, mock_database):
+        """El arranque reclama filas por lotes con un token propio hasta vaciar el backlog"""
+        rows = [
+            {"id": f"q-{i}", "payload": make_event("A", f"A-{i}").model_dump_json(), "received_at": None, "trace_id": None, "attempts": 0}
+            for i in range(2)
+        ]
+        mock_database.fetch.side_effect = [[rows[0]], [rows[1]], []]
+        event_service = RecordingEventService()
+        service = WialonIngestionService(mock_database, event_service, num_workers=2, recovery_batch_size=1)
+        await service.start()
+        await service.stop(drain_timeout=5)
+
+        assert event_service.processed == [("A", "A-0"), ("A", "A-1")]
+        assert service.get_stats()["recovered"] == 2
+
+        claims = [c.args for c in mock_database.execute.call_args_list if "SET status = 'processing'" in c.args[0]]
+        assert len(claims) == 3
+        assert "claimed_at < NOW(3) - INTERVAL %s SECOND" in claims[0][0]
+        tokens = [c.args[1] for c in mock_database.fetch.call_args_list]
+        assert tokens == [args[1] for args in claims]
+        assert len(set(tokens)) == 3
+
+    async def test_leases_renewed_while_shards_are_full(self, mock_database):
+        """Las filas en memoria renuevan su lease aunque no quepa nada más en las colas"""
+        mock_database.fetch.return_value = []
+        gate = asyncio.Event()
+
+        class BlockingEventService(RecordingEventService):
+            async def process_wialon_event(self, event):
+                await gate.wait()
+                return await super().process_wialon_event(event)
+
+        service = WialonIngestionService(mock_database, BlockingEventService(), num_workers=1, queue_size=1)
+        await service.start()
+        await service.enqueue(make_event("A", "A-0"))
+        await asyncio.sleep(0)  # el worker toma A-0 y se bloquea
+        await service.enqueue(make_event("A", "A-1"))
+        mock_database.execute.reset_mock()
+        mock_database.fetch.reset_mock()
+
+        await service._renew_leases()
+        assert await service._sweep() == 0
+
+        renew = [c.args for c in mock_database.execute.call_args_list if "SET claimed_at = NOW(3)" in c.args[0]]
+        assert len(renew) == 1
+        assert "claimed_by IN (%s)" in renew[0][0]
+        assert renew[0][1:] == (service.instance_id,)
+        mock_database.fetch.assert_not_called()  # sin capacidad no se reclama nada
+
+        gate.set()
+        await service.stop(drain_timeout=5)
+
+    async def test_settle_requires_own_claim(self, mock_database):
+        """Una fila re-reclamada por otra instancia no se marca con nuestro resultado"""
+        rows = [{"id": "q-1", "payload": make_event("A", "A-0").model_dump_json(), "received_at": None, "trace_id": None, "attempts": 0}]
+        mock_database.fetch.side_effect = [rows, []]
+        mock_database.execute.return_value = 0  # el UPDATE con nuestro token no encuentra la fila
+        service = WialonIngestionService(mock_database, RecordingEventService(), num_workers=1)
+        await service.start()
+        await service.stop(drain_timeout=5)
+
+        token = mock_database.fetch.call_args_list[0].args[1]
+        done = [c.args for c in mock_database.execute.call_args_list if "status = 'done'" in c.args[0]]
+        assert len(done) == 1
+        assert "WHERE id = %s AND claimed_by = %s" in done[0][0]
+        assert done[0][1:] == ("q-1", token)
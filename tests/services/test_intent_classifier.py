@@ -0,0 +1,90 @@
+"""
+Tests unitarios para el clasificador de intenciones por reglas
+
+Ejecutar: pytest tests/services/test_intent_classifier.py -v
+"""
+import pytest
+
+from app.services.intent_classifier import (
+    FastIntentClassifier,
+    is_substatus_transition_allowed,
+    normalize_text,
+)
+
+
+def test_normalize_text():
+    """Acentos, mayúsculas, puntuación y espacios se normalizan"""
+    assert normalize_text("  Ya  EMPECÉ a cargar!! ") == "ya empece a cargar"
+    assert normalize_text("okkk...") == "ok"
+
+
+class TestFastIntentClassifier:
+    """Tests para FastIntentClassifier"""
+
+    @pytest.mark.parametrize(
+        "text,status,intent,new_substatus",
+        [
+            ("ya empecé a cargar", "en_zona_carga", "loading_started", "cargando"),
+            ("ya terminé la carga", "en_zona_carga", "loading_complete", "carga_completada"),
+            ("ya empece a descargar", "en_zona_descarga", "unloading_started", "descargando"),
+            ("ya terminé de descargar me voy", "en_zona_descarga", "unloading_complete", "descarga_completada"),
+            ("Ok", "en_zona_carga", "other", None),
+        ],
+    )
+    def test_formulaic_phrases_hit(self, text, status, intent, new_substatus):
+        classifier = FastIntentClassifier()
+
+        result = classifier.classify(text, {"status": status, "substatus": None})
+
+        assert result["intent"] == intent
+        assert result["new_substatus"] == new_substatus
+        assert result["action"] == ("update_substatus" if new_substatus else "no_action")
+        assert result["response"]
+        assert result["source"] == "fast_path"
+
+    @pytest.mark.parametrize(
+        "text,status,substatus",
+        [
+            ("ya empece a descargar", "en_zona_carga", "cargando"),  # fuera de fase
+            ("ya empecé a cargar", "en_zona_carga", "carga_completada"),  # hacia atrás
+            ("ya empecé a cargar", "en_ruta_destino", "rumbo_a_descarga"),  # fuera de fase
+            ("ya terminé la carga", "en_zona_descarga", "descargando"),  # otra fase
+        ],
+    )
+    def test_invalid_substatus_transition_is_ignored(self, text, status, substatus):
+        """La intención se reconoce pero el subestado no cambia si la transición no es válida"""
+        classifier = FastIntentClassifier()
+
+        result = classifier.classify(text, {"status": status, "substatus": substatus})
+
+        assert result["new_substatus"] is None
+        assert result["action"] == "no_action"
+
+    def test_transition_map(self):
+        """Solo transiciones hacia adelante dentro de la fase del viaje"""
+        assert is_substatus_transition_allowed("en_zona_carga", "esperando_inicio_carga", "cargando")
+        assert is_substatus_transition_allowed("en_zona_descarga", "carga_completada", "descargando")
+        assert not is_substatus_transition_allowed("en_zona_carga", "cargando", "cargando")
+        assert not is_substatus_transition_allowed("en_zona_descarga", "descarga_completada", "descargando")
+
+    def test_substatus_disambiguates(self):
+        """'listo ya quedó' solo es carga completada si se está cargando"""
+        classifier = FastIntentClassifier()
+
+        assert classifier.classify("listo ya quedó", {"substatus": None}) is None
+        result = classifier.classify("listo ya quedó", {"substatus": "cargando"})
+        assert result["intent"] == "loading_complete"
+
+    def test_ambiguous_and_long_messages_fall_through(self):
+        """Mensajes sin reglas claras van a Gemini"""
+        classifier = FastIntentClassifier()
+
+        assert classifier.classify("oye a qué hora abren mañana", {}) is None
+        assert classifier.classify(
+            "ya empecé a cargar pero hay un problema con el montacargas y no sé cuánto tarde", {}
+        ) is None
+
+        stats = classifier.get_stats(avg_llm_latency_ms=800.0)
+        assert stats["hits"] == 0
+        assert stats["misses"] == 2
+        assert stats["estimated_latency_saved_ms"] == 0.0
@@ -0,0 +1,50 @@
+"""
+Tests unitarios para la aplicación de subestados en MessageService
+
+Ejecutar: pytest tests/services/test_message_service.py -v
+"""
+import pytest
+
+from app.config import settings
+from app.services.message_service import MessageService
+
+
+TRIP = {"id": "t1", "status": "en_ruta_destino", "substatus": "rumbo_a_descarga"}
+
+
+@pytest.fixture
+def service(mock_database):
+    return MessageService(mock_database, gemini_client=None, evolution_client=None)
+
+
+@pytest.mark.parametrize(
+    "trip, new_substatus",
+    [
+        (TRIP, "rumbo_a_descarga"),  # subestado fuera de SUBSTATUS_PHASE
+        ({**TRIP, "status": "en_zona_carga", "substatus": "carga_completada"}, "cargando"),  # hacia atrás
+    ],
+)
+def test_gemini_substatus_applied_as_before_by_default(service, monkeypatch, trip, new_substatus):
+    """Sin GEMINI_SUBSTATUS_VALIDATION el resultado de Gemini se aplica tal cual"""
+    monkeypatch.setattr(settings, "gemini_substatus_validation", False)
+    ai_result = {"action": "update_substatus", "new_substatus": new_substatus, "intent": "other"}
+
+    assert service._substatus_update_allowed(trip, ai_result) is True
+
+
+def test_gemini_substatus_validated_when_enabled(service, monkeypatch):
+    """Con GEMINI_SUBSTATUS_VALIDATION solo pasan transiciones hacia adelante en la fase"""
+    monkeypatch.setattr(settings, "gemini_substatus_validation", True)
+    trip = {"id": "t1", "status": "en_zona_carga", "substatus": "esperando_inicio_carga"}
+
+    assert service._substatus_update_allowed(trip, {"new_substatus": "cargando"}) is True
+    assert service._substatus_update_allowed(trip, {"new_substatus": "descargando"}) is False
+    assert service._substatus_update_allowed(TRIP, {"new_substatus": "rumbo_a_descarga"}) is False
+
+
+def test_fast_path_result_not_revalidated(service, monkeypatch):
+    """El fast path ya validó la transición al clasificar"""
+    monkeypatch.setattr(settings, "gemini_substatus_validation", True)
+    ai_result = {"new_substatus": "cargando", "source": "fast_path"}
+
+    assert service._substatus_update_allowed(TRIP, ai_result) is True
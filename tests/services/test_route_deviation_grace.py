@@ -0,0 +1,36 @@
+"""
+Tests unitarios para el período de gracia de notificaciones de desviación de ruta
+
+Ejecutar: pytest tests/services/test_route_deviation_grace.py -v
+"""
+from app.config import settings
+from app.services import event_service as event_service_module
+from app.services.event_service import EventService
+
+
+def test_grace_period_blocks_repeats_until_expired(mock_database, monkeypatch):
+    """La segunda desviación dentro del período se bloquea; pasado el período se permite"""
+    now = [1000.0]
+    monkeypatch.setattr(event_service_module.time, "time", lambda: now[0])
+    service = EventService(mock_database)
+
+    assert service._check_grace_period("t1", 300) is True
+    now[0] += 299
+    assert service._check_grace_period("t1", 300) is False
+    now[0] += 1
+    assert service._check_grace_period("t1", 300) is True
+    assert service.tracked_deviation_trips == 1
+
+
+def test_tracking_is_bounded_by_max_trips(mock_database, monkeypatch):
+    """Con más viajes que el máximo se expulsa el menos reciente en lugar de crecer"""
+    monkeypatch.setattr(settings, "route_deviation_tracking_max_trips", 3)
+    service = EventService(mock_database)
+
+    for index in range(10):
+        assert service._check_grace_period(f"t{index}", 300) is True
+
+    assert service.tracked_deviation_trips == 3
+    # t0 fue expulsado: cuenta como primera notificación otra vez
+    assert service._check_grace_period("t0", 300) is True
+    assert service._check_grace_period("t9", 300) is False
@@ -0,0 +1,149 @@
+"""
+Tests unitarios para el outbox de webhooks y WebhookDispatcher
+
+Ejecutar: pytest tests/services/test_webhook_dispatcher.py -v
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.webhook_dispatcher import WebhookDispatcher
+from app.services.webhook_service import WebhookService
+
+
+@pytest.fixture
+def outbox_service(mock_database):
+    """WebhookService en modo outbox"""
+    return WebhookService(
+        db=mock_database,
+        target_url="https://test.flowtify.com/webhooks",
+        secret_key="test_secret_key_123456789",
+        timeout=30,
+        outbox_enabled=True,
+    )
+
+
+def make_row(retry_count: int = 0):
+    """Fila reclamada de webhook_delivery_log"""
+    return {
+        "id": "log-1",
+        "webhook_type": "status_update",
+        "trip_id": "trip-123",
+        "payload": '{"event": "status_update"}',
+        "target_url": "https://test.flowtify.com/webhooks/status-update",
+        "retry_count": retry_count,
+        "trace_id": "trace-1",
+    }
+
+
+@pytest.mark.asyncio
+class TestWebhookOutbox:
+    """Tests del modo outbox de WebhookService"""
+
+    async def test_enqueue_uses_caller_transaction(self, outbox_service, mock_database):
+        """Con cursor, el INSERT va por la transacción del llamador y no hay HTTP"""
+        cursor = AsyncMock()
+        outbox_service.client = AsyncMock()
+
+        result = await outbox_service._dispatch_webhook(
+            endpoint="/status-update",
+            payload={"event": "status_update"},
+            webhook_type="status_update",
+            trip_id="trip-123",
+            cursor=cursor,
+        )
+
+        assert result["success"] is True
+        assert result["queued"] is True
+        query = cursor.execute.call_args.args[0]
+        assert "INSERT INTO webhook_delivery_log" in query
+        assert "next_attempt_at" in query
+        mock_database.execute.assert_not_called()
+        outbox_service.client.post.assert_not_called()
+
+    async def test_deliver_once_signs_stored_payload(self, outbox_service):
+        """La firma se calcula sobre el payload exacto que se envía"""
+        response = MagicMock(status_code=200)
+        outbox_service.client = AsyncMock()
+        outbox_service.client.post = AsyncMock(return_value=response)
+
+        result = await outbox_service.deliver_once(make_row())
+
+        assert result["success"] is True
+        kwargs = outbox_service.client.post.call_args.kwargs
+        assert kwargs["content"] == b'{"event": "status_update"}'
+        assert kwargs["headers"]["X-Webhook-Signature"] == outbox_service._generate_signature(kwargs["content"])
+
+
+@pytest.mark.asyncio
+class TestWebhookDispatcher:
+    """Tests para WebhookDispatcher"""
+
+    def make_dispatcher(self, mock_database, result):
+        service = MagicMock()
+        service.timeout = 30
+        service.deliver_once = AsyncMock(return_value=result)
+        service._log_webhook_success = AsyncMock()
+        service._log_webhook_failure = AsyncMock()
+        service._move_to_dead_letter_queue = AsyncMock()
+        return WebhookDispatcher(mock_database, service, max_attempts=3), service
+
+    async def test_success_marks_sent(self, mock_database):
+        dispatcher, service = self.make_dispatcher(mock_database, {"success": True, "status_code": 200})
+
+        await dispatcher._deliver(make_row())
+
+        service._log_webhook_success.assert_awaited_once_with("log-1")
+        assert dispatcher.get_stats()["delivered"] == 1
+
+    async def test_failure_is_rescheduled_with_backoff(self, mock_database):
+        dispatcher, service = self.make_dispatcher(mock_database, {"success": False, "error": "500"})
+
+        await dispatcher._deliver(make_row(retry_count=0))
+
+        args = mock_database.execute.call_args.args
+        assert "status = 'retrying'" in args[0]
+        assert args[2] == 1  # cuenta como intento
+        assert args[3] >= 2  # backoff del primer intento
+        service._move_to_dead_letter_queue.assert_not_called()
+
+    async def test_exhausted_retries_go_to_dlq(self, mock_database):
+        dispatcher, service = self.make_dispatcher(mock_database, {"success": False, "error": "500"})
+
+        await dispatcher._deliver(make_row(retry_count=2))
+
+        service._log_webhook_failure.assert_awaited_once()
+        service._move_to_dead_letter_queue.assert_awaited_once_with("log-1")
+        assert dispatcher.get_stats()["dead_lettered"] == 1
+
+    async def test_open_circuit_does_not_consume_attempt(self, mock_database):
+        dispatcher, service = self.make_dispatcher(
+            mock_database, {"success": False, "error": "Circuit breaker is OPEN", "circuit_open": True}
+        )
+
+        await dispatcher._deliver(make_row(retry_count=2))
+
+        args = mock_database.execute.call_args.args
+        assert args[2] == 0
+        service._move_to_dead_letter_queue.assert_not_called()
+
+    async def test_backoff_is_capped(self, mock_database):
+        dispatcher, _ = self.make_dispatcher(mock_database, {"success": True})
+        dispatcher.backoff_max = 60
+
+        assert dispatcher._backoff_seconds(1) >= 2
+        assert dispatcher._backoff_seconds(20) <= 66
+
+
+@pytest.mark.parametrize("outbox_enabled", [True, False])
+async def test_manual_retry_sets_next_attempt_only_with_outbox(mock_database, outbox_enabled):
+    """POST /webhooks/retry solo escribe next_attempt_at con el outbox habilitado"""
+    from app.api.routes.webhooks import retry_webhook
+
+    mock_database.fetchrow.return_value = make_row()
+    service = MagicMock(outbox_enabled=outbox_enabled)
+
+    result = await retry_webhook("log-1", database=mock_database, webhook_service=service)
+
+    assert result["success"] is True
+    query = mock_database.execute.await_args.args[0]
+    assert ("next_attempt_at" in query) is outbox_enabled
@@ -0,0 +1,37 @@
+"""
+Tests unitarios para WebhookEnvelope
+
+Ejecutar: pytest tests/services/test_webhook_envelope.py -v
+"""
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from app.services.webhook_envelope import WebhookEnvelope
+
+
+def test_single_buffer_feeds_signature_and_log():
+    """Firma, cuerpo y texto de auditoría salen del mismo buffer"""
+    envelope = WebhookEnvelope.from_payload(
+        {"speed": Decimal("72.5"), "at": datetime(2025, 1, 10, 12, 0, 0), "name": "Pérez"},
+        "speed_violation",
+    )
+
+    expected = hmac.new(b"secret", envelope.body, hashlib.sha256).hexdigest()
+    assert envelope.signature("secret") == expected
+    assert envelope.text.encode("utf-8") == envelope.body
+
+    decoded = json.loads(envelope.body)
+    assert decoded["speed"] == "72.5"
+    assert decoded["at"].startswith("2025-01-10")
+    assert decoded["name"] == "Pérez"
+
+
+def test_stored_payload_is_not_reserialized():
+    """El texto del outbox se envía byte a byte"""
+    stored = '{"event": "status_update"}'
+    envelope = WebhookEnvelope.from_stored(stored, "status_update")
+
+    assert envelope.body == stored.encode("utf-8")
@@ -0,0 +1,245 @@
+"""
+Tests unitarios para la proyección en memoria de viajes activos
+
+Ejecutar: pytest tests/test_active_trips.py -v
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.core.metrics import WIALON_EVENTS_DROPPED
+from app.models.event import WialonEvent
+from app.services import event_service as event_service_module
+from app.core.active_trips import ActiveTripRegistry
+from app.services import trip_service as trip_service_module
+from app.services.event_service import EventService
+from app.services.trip_service import TripService
+
+
+def make_unit(unit_id: str, wialon_id: str, group_id: str = None):
+    return {"id": unit_id, "wialon_unit_id": wialon_id, "whatsapp_group_id": group_id, "name": unit_id}
+
+
+def make_trip(trip_id: str, unit_id: str, status: str = "en_ruta_carga", tenant_id: int = 24):
+    return {
+        "id": trip_id,
+        "unit_id": unit_id,
+        "status": status,
+        "substatus": "cargando",
+        "metadata": {"tenant_id": tenant_id},
+    }
+
+
+def load_rows(mock_database, trips, units):
+    """fetch devuelve primero los viajes activos y luego sus unidades"""
+    mock_database.fetch.side_effect = [trips, units]
+
+
+@pytest.mark.asyncio
+class TestActiveTripRegistry:
+    """Tests para ActiveTripRegistry"""
+
+    async def test_inert_before_warm(self):
+        """Sin warm el registro no responde ni acepta escrituras"""
+        registry = ActiveTripRegistry()
+        registry.put(make_unit("u1", "100"), make_trip("t1", "u1"))
+
+        assert registry.lookup("100") is None
+        assert len(registry) == 0
+
+    async def test_warm_resolves_by_wialon_id_and_group(self, mock_database):
+        """Tras el warm unidad, viaje, grupo y tenant salen de memoria; gana el viaje más reciente"""
+        load_rows(
+            mock_database,
+            [make_trip("t-old", "u1"), make_trip("t-new", "u1", tenant_id=7), make_trip("t2", "u2")],
+            [make_unit("u1", "100", group_id="g1@g.us"), make_unit("u2", "200")],
+        )
+        registry = ActiveTripRegistry()
+
+        assert await registry.warm(mock_database) == 2
+        unit, trip = registry.lookup(100)
+        assert (unit["id"], trip["id"]) == ("u1", "t-new")
+        assert registry.lookup_by_group("g1@g.us")[1]["id"] == "t-new"
+        assert registry._by_wialon["100"].tenant_id == 7
+        assert registry.lookup("999") is None
+
+        # Las filas devueltas son copias
+        trip["status"] = "mutated"
+        assert registry.lookup("100")[1]["status"] == "en_ruta_carga"
+        assert mock_database.fetch.await_count == 2
+        assert registry.get_stats()["hits"] == 3
+
+    async def test_write_through_hooks(self, mock_database):
+        """update_status actualiza, un estado excluido descarta y el grupo nuevo se reindexa"""
+        load_rows(mock_database, [make_trip("t1", "u1")], [make_unit("u1", "100", group_id="g-old")])
+        registry = ActiveTripRegistry()
+        await registry.warm(mock_database)
+
+        registry.trip_written({**make_trip("t1", "u1"), "substatus": "carga_completada"})
+        assert registry.lookup("100")[1]["substatus"] == "carga_completada"
+
+        registry.unit_written(make_unit("u1", "100", group_id="g-new"))
+        assert registry.lookup_by_group("g-old") is None
+        assert registry.lookup_by_group("g-new")[0]["whatsapp_group_id"] == "g-new"
+
+        registry.trip_written(make_trip("t1", "u1", status="completed"))
+        assert registry.lookup("100") is None
+
+        registry.trip_created(make_unit("u1", "100"), make_trip("t3", "u1"))
+        assert registry.lookup("100")[1]["id"] == "t3"
+        assert registry.invalidate_unit("u1") is True
+        assert registry.lookup("100") is None
+
+    async def test_reconcile_corrects_drift_and_keeps_fresh_writes(self, mock_database):
+        """La reconciliación corrige la deriva pero no pisa escrituras hechas durante la lectura"""
+        load_rows(
+            mock_database,
+            [make_trip("t1", "u1"), make_trip("t2", "u2")],
+            [make_unit("u1", "100"), make_unit("u2", "200")],
+        )
+        registry = ActiveTripRegistry()
+        await registry.warm(mock_database)
+
+        release = asyncio.Event()
+
+        async def slow_fetch(query, *args):
+            if "FROM trips" in query:
+                await release.wait()
+                # Otro proceso terminó t2, cambió t1 y creó t4
+                return [make_trip("t1", "u1", status="en_zona_carga"), make_trip("t4", "u4")]
+            return [make_unit("u1", "100"), make_unit("u4", "400")]
+
+        mock_database.fetch.side_effect = slow_fetch
+        reconcile = asyncio.create_task(registry.reconcile(mock_database))
+        await asyncio.sleep(0)
+
+        # Escritura local mientras la reconciliación lee MySQL
+        registry.trip_written({**make_trip("t1", "u1"), "status": "en_ruta_destino"})
+        release.set()
+        drift = await reconcile
+
+        assert drift == {"added": 1, "removed": 1, "changed": 0}
+        assert registry.lookup("100")[1]["status"] == "en_ruta_destino"
+        assert registry.lookup("200") is None
+        assert registry.lookup("400")[1]["id"] == "t4"
+        assert registry.get_stats()["drift_total"] == 2
+
+    async def test_no_trip_cache_marks_expires_and_clears(self, mock_database):
+        """La marca sin viaje vence por TTL y se quita al indexar un viaje de la unidad"""
+        load_rows(mock_database, [], [])
+        registry = ActiveTripRegistry(no_trip_ttl=0.05)
+        registry.mark_no_trip("300")
+        assert registry.has_no_trip("300") is False  # inerte antes del warm
+
+        await registry.warm(mock_database)
+        registry.mark_no_trip("300")
+        assert registry.has_no_trip(300) is True
+        await asyncio.sleep(0.06)
+        assert registry.has_no_trip("300") is False
+
+        registry.mark_no_trip("300")
+        registry.trip_created(make_unit("u3", "300"), make_trip("t3", "u3"))
+        assert registry.has_no_trip("300") is False
+
+        registry.mark_no_trip("400")
+        assert registry.clear_no_trip("400") is True
+        assert registry.has_no_trip("400") is False
+
+    async def test_no_trip_mark_loses_to_trip_created_during_lookup(self, mock_database):
+        """Una marca de una consulta que se cruzó con la creación del viaje no descarta eventos"""
+        load_rows(mock_database, [], [])
+        registry = ActiveTripRegistry(no_trip_ttl=60)
+        await registry.warm(mock_database)
+
+        release = asyncio.Event()
+
+        async def lookup_without_trip():
+            # La consulta a MySQL no encontró viaje; el resultado llega tarde
+            await release.wait()
+            registry.mark_no_trip("500")
+
+        pending = asyncio.create_task(lookup_without_trip())
+        await asyncio.sleep(0)
+        registry.trip_created(make_unit("u5", "500"), make_trip("t5", "u5"))
+        release.set()
+        await pending
+
+        assert registry.has_no_trip("500") is False
+        assert registry.lookup("500")[1]["id"] == "t5"
+
+        # Una marca previa al índice tampoco sobrevive a un put
+        registry.mark_no_trip("600")
+        registry.put(make_unit("u6", "600"), make_trip("t6", "u6"))
+        assert registry.has_no_trip("600") is False
+        assert registry.get_stats()["no_trip"]["size"] == 0
+
+
+async def test_event_for_unit_without_trip_dropped_before_db(mock_database, monkeypatch):
+    """El segundo evento de una unidad sin viaje se descarta sin consultas y cuenta en la métrica"""
+    load_rows(mock_database, [], [])
+    registry = ActiveTripRegistry(no_trip_ttl=60)
+    await registry.warm(mock_database)
+    monkeypatch.setattr(event_service_module, "active_trips", registry)
+
+    service = EventService(mock_database)
+    mock_database.fetchrow.reset_mock()
+    mock_database.fetchrow.return_value = None
+    event = WialonEvent(
+        unit_name="Torton 309",
+        unit_id="27538728",
+        notification_type="geofence_entry",
+        event_time=1728280100,
+        latitude=21.05,
+        longitude=-101.79,
+    )
+    dropped = WIALON_EVENTS_DROPPED.labels("no_active_trip")
+    before = dropped.value
+
+    first = await service.process_wialon_event(event)
+    second = await service.process_wialon_event(event)
+
+    assert first["message"] == second["message"] == "No active trip found for unit"
+    assert mock_database.fetchrow.await_count == 1
+    assert dropped.value == before + 1
+
+
+@pytest.mark.parametrize("webhook_fails", [False, True])
+async def test_outbox_status_update_reaches_registry_only_after_commit(mock_database, monkeypatch, webhook_fails):
+    """En modo outbox el registro cambia después del commit; un rollback no lo toca"""
+    load_rows(mock_database, [make_trip("t1", "u1")], [make_unit("u1", "100")])
+    registry = ActiveTripRegistry()
+    await registry.warm(mock_database)
+    monkeypatch.setattr(trip_service_module, "active_trips", registry)
+
+    cursor = MagicMock()
+    cursor.execute = AsyncMock()
+    cursor.fetchone = AsyncMock(return_value={**make_trip("t1", "u1"), "substatus": "carga_completada"})
+    mock_database._deserialize_json_fields = lambda row: row
+    seen_inside = []
+
+    @asynccontextmanager
+    async def transaction():
+        yield cursor, MagicMock()
+
+    async def send_status_update(**kwargs):
+        # Dentro de la transacción el registro sigue con el estado confirmado
+        seen_inside.append(registry.lookup("100")[1]["substatus"])
+        if webhook_fails:
+            raise RuntimeError("outbox insert failed")
+
+    mock_database.transaction = transaction
+    mock_database.fetchrow.return_value = make_trip("t1", "u1")
+    webhook_service = MagicMock(outbox_enabled=True, send_status_update=send_status_update)
+    service = TripService(mock_database, evolution_client=None, webhook_service=webhook_service)
+
+    if webhook_fails:
+        with pytest.raises(RuntimeError):
+            await service.update_trip_status("t1", "en_zona_carga", "carga_completada")
+    else:
+        await service.update_trip_status("t1", "en_zona_carga", "carga_completada")
+
+    assert seen_inside == ["cargando"]
+    expected = "cargando" if webhook_fails else "carga_completada"
+    assert registry.lookup("100")[1]["substatus"] == expected
@@ -0,0 +1,34 @@
+"""
+Tests del contenedor de servicios
+
+Ejecutar: pytest tests/test_container.py -v
+"""
+import pytest
+
+from app.container import ServiceContainer
+from app.core.errors import ConfigurationError
+
+
+@pytest.mark.asyncio
+class TestServiceContainer:
+    """Tests para ServiceContainer"""
+
+    async def test_services_are_singletons(self, mock_database):
+        """El mismo EventService se reutiliza entre requests"""
+        container = ServiceContainer()
+        await container.startup(mock_database)
+
+        try:
+            event_service = container.require("event_service")
+            assert event_service is container.require("event_service")
+            assert event_service.webhook_service is container.webhook_service
+            assert container.message_service.gemini_client is container.gemini_client
+        finally:
+            await container.shutdown()
+
+        assert container.started is False
+
+    async def test_require_before_startup_fails(self):
+        """Pedir servicios sin lifespan es un error de configuración"""
+        with pytest.raises(ConfigurationError):
+            ServiceContainer().require("trip_service")
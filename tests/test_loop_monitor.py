@@ -0,0 +1,125 @@
+"""
+Tests unitarios para el monitor del event loop
+
+Ejecutar: pytest tests/test_loop_monitor.py -v
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import admin
+from app.config import settings
+from app.core.context import clear_trace_id, set_trace_id
+from app.core.loop_monitor import LoopMonitor
+
+
+def blocking_work(seconds: float) -> None:
+    """Trabajo síncrono que retiene el loop"""
+    time.sleep(seconds)
+
+
+class TestLoopMonitor:
+    """Tests para lag y callbacks lentos"""
+
+    async def test_slow_task_step_recorded_with_trace_and_stack(self):
+        """Un paso de tarea que bloquea queda registrado con su trace_id y la pila bloqueada"""
+        original_run = asyncio.events.Handle._run
+        monitor = LoopMonitor(interval=0.01, slow_callback_ms=30, max_entries=5)
+        monitor.start()
+        try:
+            async def handler():
+                set_trace_id("trace-slow")
+                try:
+                    blocking_work(0.12)
+                finally:
+                    clear_trace_id()
+
+            await asyncio.create_task(handler(), name="slow-handler")
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        assert asyncio.events.Handle._run is original_run
+
+        report = monitor.slow_callbacks()
+        entry = report["worst"][0]
+        assert entry["duration_ms"] >= 100
+        assert "slow-handler" in entry["callback"]
+        assert entry["trace_id"] == "trace-slow"
+        assert entry["stack_source"] == "blocked"
+        assert any("blocking_work" in line for line in entry["stack"])
+
+        stats = monitor.get_stats()
+        assert stats["slow_callbacks"] >= 1
+        assert stats["samples"] >= 1
+        assert stats["max_lag_ms"] >= 50
+
+    async def test_worst_buffer_keeps_longest(self):
+        """El top conserva los callbacks más largos; recent, los últimos"""
+        monitor = LoopMonitor(interval=1.0, slow_callback_ms=5, max_entries=2)
+        monitor.start()
+        try:
+            loop = asyncio.get_running_loop()
+            for seconds in (0.03, 0.008, 0.02):
+                loop.call_soon(blocking_work, seconds)
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+        finally:
+            await monitor.stop()
+
+        report = monitor.slow_callbacks()
+        assert [round(e["duration_ms"], -1) for e in report["worst"]] == [30, 20]
+        assert len(report["recent"]) == 2
+        assert report["recent"][0]["duration_ms"] >= 20
+        assert monitor.reset() == 3
+        assert monitor.slow_callbacks() == {"worst": [], "recent": []}
+
+
+def _loop_factory(name: str):
+    if name == "uvloop":
+        return pytest.importorskip("uvloop").new_event_loop
+    return asyncio.new_event_loop
+
+
+@pytest.mark.parametrize("loop_name,mode", [("asyncio", "handle_timer"), ("uvloop", "heartbeat")])
+def test_blocked_loop_detected_on_each_loop_implementation(loop_name, mode):
+    """uvloop no pasa por Handle._run: el latido detecta el bloqueo y el vigía captura la pila"""
+    factory = _loop_factory(loop_name)
+    monitor = LoopMonitor(interval=0.01, slow_callback_ms=30, max_entries=5)
+
+    async def scenario():
+        monitor.start()
+        try:
+            async def handler():
+                blocking_work(0.15)
+
+            await asyncio.create_task(handler(), name="slow-handler")
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+
+    with asyncio.Runner(loop_factory=factory) as runner:
+        runner.run(scenario())
+
+    assert monitor.get_stats()["slow_callback_detection"] == mode
+    entry = monitor.slow_callbacks()["worst"][0]
+    assert entry["duration_ms"] >= 100
+    assert "slow-handler" in entry["callback"]
+    assert entry["stack_source"] == "blocked"
+    assert any("blocking_work" in line for line in entry["stack"])
+
+
+def test_event_loop_routes_require_admin_token(monkeypatch):
+    """GET y DELETE /admin/event-loop exigen X-Admin-Token"""
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "admin_api_token", "secret")
+
+    assert client.get("/admin/event-loop").status_code == 403
+    assert client.delete("/admin/event-loop").status_code == 403
+    assert client.get("/admin/event-loop", headers={"X-Admin-Token": "secret"}).status_code == 200
+    assert client.delete("/admin/event-loop", headers={"X-Admin-Token": "secret"}).json()["success"] is True
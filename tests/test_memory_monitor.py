@@ -0,0 +1,72 @@
+"""
+Tests unitarios para el monitor de memoria
+
+Ejecutar: pytest tests/test_memory_monitor.py -v
+"""
+from app.core.memory_monitor import MemoryMonitor
+
+
+class LeakyRecord:
+    """Objeto que la prueba acumula para simular una fuga"""
+
+    def __init__(self, index: int):
+        self.payload = "x" * 64 + str(index)
+
+
+class TestMemoryMonitor:
+    """Tests para muestras, umbrales y snapshots"""
+
+    async def test_sample_tracks_containers_growth_and_alerts(self):
+        """Crecimiento por tipo y alerta al cruzar el umbral de una estructura vigilada"""
+        registry = {}
+        monitor = MemoryMonitor(container_alert_size=100, rss_alert_mb=0)
+        monitor.watch("registry", lambda: len(registry))
+        monitor.watch("broken", lambda: 1 / 0)
+
+        await monitor.sample()
+        registry.update({i: LeakyRecord(i) for i in range(500)})
+        sample = await monitor.sample()
+
+        assert sample["containers"] == {"registry": 500, "broken": -1}
+        growth = {entry["type"]: entry["delta"] for entry in sample["type_growth"]}
+        assert growth["LeakyRecord"] >= 500
+        assert monitor.get_stats()["alerting"] == ["registry"]
+
+        registry.clear()
+        await monitor.sample()
+        assert monitor.get_stats()["alerting"] == []
+        assert [point["containers"]["registry"] for point in monitor.history()] == [0, 500, 0]
+
+    async def test_container_thresholds_are_per_container(self):
+        """Cada estructura alerta con su umbral; la configuración prevalece sobre watch()"""
+        monitor = MemoryMonitor(
+            container_alert_size=100,
+            container_alert_sizes={"sessions": 1000, "muted": 0},
+            rss_alert_mb=0,
+        )
+        monitor.watch("default", lambda: 150)
+        monitor.watch("cache", lambda: 150, alert_size=200)
+        monitor.watch("sessions", lambda: 150, alert_size=10)
+        monitor.watch("muted", lambda: 10 ** 6)
+
+        await monitor.sample()
+
+        stats = monitor.get_stats()
+        assert stats["alert_sizes"] == {"default": 100, "cache": 200, "sessions": 1000, "muted": 0}
+        assert stats["alerting"] == ["default"]
+
+    def test_tracemalloc_baseline_and_diff(self):
+        """El diff contra la referencia señala la línea que acumula memoria"""
+        monitor = MemoryMonitor(tracemalloc_frames=1)
+        try:
+            assert monitor.diff() is None
+            monitor.take_baseline()
+            leaked = [LeakyRecord(i) for i in range(2000)]
+
+            diff = monitor.diff(limit=10)
+            assert diff["growth_kb"] > 0
+            assert any("test_memory_monitor.py" in entry["site"] for entry in diff["top_growth"])
+            assert len(leaked) == 2000
+        finally:
+            assert monitor.stop_tracing() is True
+        assert monitor.diff() is None
@@ -0,0 +1,70 @@
+"""
+Tests unitarios para las métricas en proceso y GET /metrics
+
+Ejecutar: pytest tests/test_metrics.py -v
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.middleware import RequestLoggingMiddleware
+from app.api.routes import metrics as metrics_route
+from app.core.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Tests para el formato de exposición"""
+
+    def test_render_counter_and_histogram(self):
+        """Buckets acumulados, +Inf, suma, conteo y etiquetas escapadas"""
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs_total", "Jobs", ("kind",))
+        histogram = registry.histogram("job_seconds", "Job latency", ("kind",), buckets=(0.1, 1.0))
+
+        counter.labels('say "hi"').inc()
+        counter.labels('say "hi"').inc(2)
+        for value in (0.05, 0.5, 3.0):
+            histogram.labels("a").observe(value)
+
+        text = registry.render()
+        assert "# TYPE jobs_total counter" in text
+        assert 'jobs_total{kind="say \\"hi\\""} 3' in text
+        assert 'job_seconds_bucket{kind="a",le="0.1"} 1' in text
+        assert 'job_seconds_bucket{kind="a",le="1"} 2' in text
+        assert 'job_seconds_bucket{kind="a",le="+Inf"} 3' in text
+        assert 'job_seconds_sum{kind="a"} 3.55' in text
+        assert 'job_seconds_count{kind="a"} 3' in text
+
+
+class MetricsTripRepository:
+    """Repositorio de prueba para la etiqueta caller de las queries"""
+
+    def __init__(self, database):
+        self.database = database
+
+    async def find_for_metrics(self, trip_id):
+        return await self.database.fetchrow("SELECT * FROM trips WHERE id = %s", trip_id)
+
+
+def test_metrics_endpoint_exposes_routes_and_queries(pooled_database):
+    """Latencia por plantilla de ruta y queries etiquetadas por método del repositorio"""
+    repository = MetricsTripRepository(pooled_database)
+
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+    app.include_router(metrics_route.router)
+
+    @app.get("/metrics-test/trips/{trip_id}")
+    async def get_trip(trip_id: str):
+        return await repository.find_for_metrics(trip_id)
+
+    client = TestClient(app)
+    client.get("/metrics-test/trips/a")
+    client.get("/metrics-test/trips/b")
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/metrics-test/trips/{trip_id}",status="200"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics-test/trips/{trip_id}"} 2' in text
+    assert 'db_query_duration_seconds_count{caller="MetricsTripRepository.find_for_metrics"} 2' in text
+    assert 'db_pool_connections{state="max"}' in text
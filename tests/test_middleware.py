@@ -0,0 +1,53 @@
+"""
+Tests unitarios para RequestLoggingMiddleware (ASGI puro)
+
+Ejecutar: pytest tests/test_middleware.py -v
+"""
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.middleware import RequestLoggingMiddleware
+from app.core.context import get_trace_id
+from app.core.metrics import HTTP_REQUESTS
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/middleware-test")
+    async def echo(request: Request):
+        return {"state": request.state.trace_id, "context": get_trace_id()}
+
+    @app.get("/middleware-test/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def test_trace_id_propagated_to_state_context_and_headers():
+    """El X-Trace-ID entrante llega a request.state, al contexto y vuelve en la respuesta"""
+    client = TestClient(build_app())
+
+    response = client.get("/middleware-test", headers={"X-Trace-ID": "trace-abc"})
+
+    assert response.json() == {"state": "trace-abc", "context": "trace-abc"}
+    assert response.headers["X-Trace-ID"] == "trace-abc"
+    assert float(response.headers["X-Process-Time"]) >= 0
+
+    generated = client.get("/middleware-test")
+    assert generated.headers["X-Trace-ID"] == generated.json()["state"]
+
+
+def test_unhandled_error_recorded_as_500():
+    """Una excepción no manejada se registra como 500 y se propaga"""
+    client = TestClient(build_app())
+    counter = HTTP_REQUESTS.labels("GET", "/middleware-test/fail", 500)
+    before = counter.value
+
+    with pytest.raises(RuntimeError):
+        client.get("/middleware-test/fail")
+
+    assert counter.value == before + 1
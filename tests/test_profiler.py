@@ -0,0 +1,129 @@
+"""
+Tests unitarios para el profiler de muestreo y POST /admin/profiler
+
+Ejecutar: pytest tests/test_profiler.py -v
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import admin
+from app.config import settings
+from app.core.profiler import SamplingProfiler
+
+
+def burn_cpu(seconds: float) -> None:
+    """Trabajo de CPU que retiene el loop"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class SlowRepository:
+    """Repositorio de prueba que espera I/O"""
+
+    async def fetch(self, release: asyncio.Event) -> None:
+        await release.wait()
+
+
+class TestSamplingProfiler:
+    """Tests para la captura de pilas"""
+
+    async def test_running_and_awaiting_stacks(self):
+        """El trabajo de CPU va a top_self y las esperas quedan con su cadena de awaits"""
+        profiler = SamplingProfiler(interval_ms=2)
+        release = asyncio.Event()
+        waiter = asyncio.create_task(SlowRepository().fetch(release))
+
+        async def busy():
+            for _ in range(10):
+                burn_cpu(0.01)
+                await asyncio.sleep(0)
+
+        busy_task = asyncio.create_task(busy())
+        result = await profiler.profile(seconds=0.2)
+        release.set()
+        await asyncio.gather(waiter, busy_task)
+
+        assert result["samples"] > 0
+        assert any(entry["function"].endswith(":burn_cpu") for entry in result["top_self"])
+        assert ":SlowRepository.fetch;asyncio.locks:Event.wait;[Future]" in result["collapsed"]
+        for line in result["collapsed"].splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert stack.split(";")[0] in ("[running]", "[awaiting]", "[idle]")
+            assert int(count) > 0
+
+    async def test_route_filter_and_request_limit(self):
+        """Con filtro solo cuentan los requests que coinciden y la captura termina al llegar a N"""
+        profiler = SamplingProfiler(interval_ms=2)
+        capture = asyncio.create_task(
+            profiler.profile(seconds=5, requests=2, route="/wialon/events")
+        )
+        await asyncio.sleep(0.01)
+
+        assert profiler.request_started("/api/v1/trips/create") is False
+        for _ in range(2):
+            assert profiler.request_started("/api/v1/wialon/events") is True
+            await asyncio.sleep(0.01)
+            profiler.request_finished()
+
+        result = await asyncio.wait_for(capture, timeout=1)
+        assert result["requests_completed"] == 2
+        assert result["route"] == "/wialon/events"
+        assert profiler.active is False
+
+
+@pytest.mark.parametrize("loop_name", ["asyncio", "uvloop"])
+def test_idle_loop_counted_as_idle(loop_name):
+    """Un loop sin tareas en curso cuenta como [idle] también bajo uvloop (hoja Runner.run)"""
+    factory = pytest.importorskip("uvloop").new_event_loop if loop_name == "uvloop" else asyncio.new_event_loop
+
+    async def scenario():
+        profiler = SamplingProfiler(interval_ms=2)
+        busy = asyncio.create_task(asyncio.to_thread(burn_cpu, 0.05))
+        result = await profiler.profile(seconds=0.1)
+        await busy
+        return result
+
+    with asyncio.Runner(loop_factory=factory) as runner:
+        result = runner.run(scenario())
+
+    assert result["samples"] > 0
+    assert result["idle_samples"] >= result["samples"] * 0.8
+    leaves = [line.rsplit(" ", 1)[0].split(";")[-1] for line in result["collapsed"].splitlines()]
+    assert "asyncio.runners:Runner.run" not in leaves
+
+
+def test_profiler_endpoint_requires_admin_token(monkeypatch):
+    """Sin ADMIN_API_TOKEN o con token incorrecto el profiler responde 403"""
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "admin_api_token", None)
+    assert client.post("/admin/profiler?seconds=0.01").status_code == 403
+
+    monkeypatch.setattr(settings, "admin_api_token", "secret")
+    assert client.post("/admin/profiler?seconds=0.01", headers={"X-Admin-Token": "nope"}).status_code == 403
+
+    response = client.post(
+        "/admin/profiler?seconds=0.05&format=collapsed", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert "profile.collapsed" in response.headers["content-disposition"]
+
+
+def test_every_admin_route_requires_admin_token(monkeypatch):
+    """El token se exige a nivel de router: ninguna ruta /admin responde sin él"""
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "admin_api_token", "secret")
+
+    for route in admin.router.routes:
+        for method in route.methods:
+            response = client.request(method, route.path)
+            assert response.status_code == 403, f"{method} {route.path}"
@@ -0,0 +1,65 @@
+"""
+Tests unitarios para las estadísticas de queries por request
+
+Ejecutar: pytest tests/test_query_stats.py -v
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.middleware import RequestLoggingMiddleware
+from app.core.metrics import metrics
+from app.core.query_stats import InstrumentedCursor, get_query_stats, track_queries
+
+
+@pytest.mark.asyncio
+class TestQueryStats:
+    """Tests para QueryStats y la instrumentación de Database"""
+
+    async def test_counts_queries_rows_and_connections(self, pooled_database):
+        """execute/fetch y cursores de transacción cuentan queries, filas y conexiones"""
+        with track_queries() as stats:
+            await pooled_database.execute("UPDATE trips SET status = %s", "x")
+            rows = await pooled_database.fetch("SELECT * FROM trips")
+            async with pooled_database.transaction() as (cursor, conn):
+                await cursor.execute("SELECT * FROM units")
+                await cursor.executemany("INSERT INTO events VALUES (%s)", [(1,), (2,), (3,)])
+
+        assert rows[0]["metadata"] == {"a": 1}
+        assert (stats.queries, stats.rows, stats.connections) == (4, 1 + 2 + 2 + 3, 3)
+        assert stats.as_headers()["X-DB-Queries"] == "4"
+
+    async def test_untracked_cursor_is_not_wrapped(self, pooled_database, monkeypatch):
+        """Fuera de track_queries y sin métricas el cursor es el original"""
+        monkeypatch.setattr(metrics, "enabled", False)
+        assert get_query_stats() is None
+        async with pooled_database.acquire() as (cursor, conn):
+            assert not isinstance(cursor, InstrumentedCursor)
+
+    async def test_nested_tracking_propagates_to_outer(self, pooled_database):
+        """Las queries de un bloque interno también cuentan en el externo"""
+        with track_queries() as outer:
+            await pooled_database.fetchrow("SELECT * FROM trips")
+            with track_queries() as inner:
+                await pooled_database.fetchval("SELECT * FROM units")
+
+        assert inner.queries == 1
+        assert outer.queries == 2
+
+
+def test_middleware_exposes_query_headers(pooled_database, query_budget):
+    """Cada respuesta lleva X-DB-* con las queries de su propio request"""
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/trips")
+    async def list_trips():
+        await pooled_database.fetch("SELECT * FROM trips")
+        return {"trip": await pooled_database.fetchrow("SELECT * FROM trips")}
+
+    client = TestClient(app)
+    for _ in range(2):
+        response = client.get("/trips")
+        assert response.headers["X-DB-Queries"] == "2"
+        assert response.headers["X-DB-Rows"] == "4"
+        query_budget.check(response, 2)
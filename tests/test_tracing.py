@@ -0,0 +1,84 @@
+"""
+Tests unitarios para los spans por etapa y el header Server-Timing
+
+Ejecutar: pytest tests/test_tracing.py -v
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.middleware import RequestLoggingMiddleware
+from app.core.context import clear_trace_id, set_trace_id
+from app.core.metrics import PIPELINE_STAGE_DURATION
+from app.core.tracing import get_trace, span, start_trace
+
+
+class TestTrace:
+    """Tests para la acumulación de spans"""
+
+    async def test_spans_recorded_in_active_trace(self):
+        """Los spans (también de tareas hijas) se agregan a la traza con su trace_id"""
+        set_trace_id("trace-123")
+        try:
+            with start_trace() as trace:
+                with span("test.lookup"):
+                    await asyncio.sleep(0)
+
+                async def child():
+                    with span("test.lookup"):
+                        await asyncio.sleep(0)
+
+                await asyncio.gather(child(), child())
+        finally:
+            clear_trace_id()
+
+        assert trace.trace_id == "trace-123"
+        assert [name for name, _ in trace.spans] == ["test.lookup"] * 3
+        assert list(trace.stage_totals()) == ["test.lookup"]
+        assert get_trace() is None
+
+    def test_span_recorded_on_error(self):
+        """El span se registra aunque la etapa falle"""
+        count_before = PIPELINE_STAGE_DURATION.labels("test.failing").count
+
+        with start_trace() as trace:
+            with pytest.raises(ValueError):
+                with span("test.failing"):
+                    raise ValueError("boom")
+
+        assert trace.spans[0][0] == "test.failing"
+        assert PIPELINE_STAGE_DURATION.labels("test.failing").count == count_before + 1
+
+    def test_server_timing_format(self):
+        """Etapas repetidas se suman y total va al final"""
+        with start_trace() as trace:
+            trace.record("wialon.trip_lookup", 1.5)
+            trace.record("wialon.webhooks", 2.0)
+            trace.record("wialon.trip_lookup", 0.25)
+
+        assert trace.server_timing(total_ms=10) == (
+            "wialon.trip_lookup;dur=1.75, wialon.webhooks;dur=2.00, total;dur=10.00"
+        )
+        assert trace.as_log_fields() == {
+            "stages_ms": {"wialon.trip_lookup": 1.75, "wialon.webhooks": 2.0}
+        }
+
+
+def test_middleware_sets_server_timing_header():
+    """RequestLoggingMiddleware publica las etapas del request en Server-Timing"""
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/tracing-test")
+    async def traced():
+        with span("test.stage"):
+            await asyncio.sleep(0)
+        return {"ok": True}
+
+    response = TestClient(app).get("/tracing-test")
+
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("test.stage;dur=")
+    assert "total;dur=" in timing